@@ -65,8 +65,9 @@ class AIService {
 
   /**
    * Generate a response for the current conversation
+   * Pass { regenerate: true } to skip the server's stored draft for this thread
    */
-  async generateResponse(conversationData, prospectName = null) {
+  async generateResponse(conversationData, prospectName = null, options = {}) {
     try {
       // Extract messages in the format expected by the AI
       const messages = conversationData.messages.map((msg) => ({
@@ -95,6 +96,9 @@ class AIService {
         // confirm_phase_change will be set by the caller if user approves/rejects
         confirm_phase_change: conversationData.confirm_phase_change,
       };
+      if (options.regenerate) {
+        payload.regenerate = true;
+      }
 
       console.log("Calling AI service with payload:", payload);
 
@@ -216,6 +220,30 @@ class AIService {
     }
   }
 
+  /**
+   * Merge scraped messages into the stored conversation via the AI backend.
+   * Only messages the server does not have yet are written. Resolves to
+   * { thread_id, action, appended, message_count, indices }.
+   */
+  async syncConversation(payload) {
+    const response = await fetch(`${this.baseUrl}/conversations/sync`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify(payload),
+    });
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(
+        `Conversation sync failed (${response.status}): ${errorText}`
+      );
+    }
+
+    return await response.json();
+  }
+
   /**
    * Get the initial message template for placeholder extraction.
    */
@@ -2,12 +2,26 @@
 Single-pass analyzer that returns phase + key metrics via Responses API.
 """
 
+import copy
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from io_models import Conversation
-from llm_service import ResponsesClient
+from llm_service import ResponsesClient, build_json_request
+from usage import TokenBudgetExceeded
+from analyzer_router import DEEP, FAST, STANDARD, RouteOption, get_analyzer_router, pick_tier, route_features
 from config import Config
+from phase_signals import PhaseSignals, extract_signals
+from thread_features import conversation_features
 
+ANALYZER_MODEL = "gpt-5-mini"
+ANALYZER_REASONING_EFFORT = "low"
+
+# Cheapest first (see analyzer_router.py); "standard" is the default above
+ANALYZER_ROUTES = [
+    RouteOption(FAST, Config.ANALYZER_FAST_MODEL, Config.ANALYZER_FAST_REASONING_EFFORT),
+    RouteOption(STANDARD, ANALYZER_MODEL, ANALYZER_REASONING_EFFORT),
+    RouteOption(DEEP, Config.ANALYZER_DEEP_MODEL, Config.ANALYZER_DEEP_REASONING_EFFORT),
+]
 
 ANALYSIS_SCHEMA: Dict[str, Any] = {
     "name": "AnalysisResult",
@@ -40,8 +54,17 @@ def _conversation_to_text(conv: Conversation) -> str:
     return "\n".join(lines)
 
 
-def analyze_conversation(conv: Conversation, current_phase: str = None) -> Dict[str, Any]:
-    """Run a single Responses API call to analyze the conversation."""
+def analysis_schema(signals: PhaseSignals) -> Dict[str, Any]:
+    """ANALYSIS_SCHEMA with the phase enum narrowed to the phases the signals allow."""
+    schema = copy.deepcopy(ANALYSIS_SCHEMA)
+    schema["schema"]["properties"]["phase"]["enum"] = list(signals.allowed_phases)
+    return schema
+
+
+def build_analysis_prompts(
+    conv: Conversation, current_phase: str = None, signals: Optional[PhaseSignals] = None
+) -> Tuple[str, str]:
+    """(system_prompt, user_prompt) for analyzing the conversation."""
     system_prompt = (
         "You are a strategic sales conversation analyst for Prodicity, a selective fellowship for high school students. "
         "Your role is to think like a strategist, not just an observer. Analyze conversations deeply and provide "
@@ -67,11 +90,7 @@ def analyze_conversation(conv: Conversation, current_phase: str = None) -> Dict[
         "Phase Guidelines:\n"
         "- 'building_rapport': Early stage, building relationship, asking questions, not selling yet\n"
         "- 'doing_the_ask': Ready to introduce Prodicity, student is engaged and asking questions\n"
-        "- 'post_selling': The pitch has already been made. User is asking questions (price, details, logistics). We are clarifying, not introducing.\n"
-        "CRITICAL PHASE RULES:\n"
-        "1. 'post_selling' is a ONE-WAY phase. Once you are in 'post_selling', you MUST stay in 'post_selling'. You can NEVER go back to 'doing_the_ask' or 'building_rapport' from 'post_selling'.\n"
-        "2. If current phase is 'doing_the_ask', you MUST generate an instruction to introduce/pitch Prodicity. Do NOT generate instructions to 'continue building rapport' - the phase is already set to selling, so you must sell.\n"
-        "3. If current phase is 'building_rapport', you can generate instructions to continue building rapport or to move forward to selling (if ready).\n\n"
+        "- 'post_selling': The pitch has already been made. User is asking questions (price, details, logistics). We are clarifying, not introducing.\n\n"
         "SILENT OBJECTION DETECTION & STRATEGY (Priority 2 - only if no direct question):\n\n"
         "Analyze the prospect's text for these specific hidden barriers ONLY if they haven't asked a direct question. If detected, set the 'instruction_for_writer' to the corresponding TACTIC.\n\n"
         "1. THE \"BUSY\" OBJECTION (Time/Stress)\n"
@@ -122,41 +141,49 @@ def analyze_conversation(conv: Conversation, current_phase: str = None) -> Dict[
         "  * 'INFO REQUEST: Explain program mechanics specifically (Mentors: Stanford/MIT, Weekly Structure: Flexible, Outcomes: Research/Startup). End with: Does that align with your goals?'\n"
         "  * 'PRICE QUESTION: State price clearly ($485/mo) with value sandwich (1. Mentorship caliber, 2. Price + Aid availability, 3. ROI: College portfolio). End with: Is that within your budget range?'\n"
         "  * 'GENERAL OBJECTION: Validate the concern, offer specific solution (flexible schedule/parent info packet), and ask a closing question.'\n"
-        "- phase: The current conversation phase - 'building_rapport' if we're still building relationship, or 'doing_the_ask' if we're ready to introduce Prodicity. This should align with your move_forward decision."
+        "- phase: One of the allowed phases, chosen by the PHASE rule in the request. This should align with your move_forward decision."
     )
 
     # Count messages for context
-    total_messages = len(conv.messages)
-    prospect_messages = sum(1 for m in conv.messages if m.sender == "prospect")
-    
+    features = conversation_features(conv)
+    total_messages = features.message_count
+    prospect_messages = features.prospect_message_count
+    signals = signals or extract_signals(conv, current_phase)
+
+    # Only the instruction rule for the current phase (and pitch state) is sent
+    if current_phase == "post_selling" or (current_phase == "doing_the_ask" and signals.has_pitched):
+        phase_instruction = ""
+        default_instruction = "Clarify what they asked about and keep the application moving. Do NOT repeat the pitch."
+    elif current_phase == "doing_the_ask":
+        phase_instruction = (
+            "   - CRITICAL: Current phase is 'doing_the_ask', so you MUST instruct the writer to introduce/pitch Prodicity. "
+            "Do NOT instruct them to 'continue building rapport'.\n"
+        )
+        default_instruction = (
+            "Introduce Prodicity naturally by connecting it to their mentioned project. "
+            "Reference what they told you. End with application CTA."
+        )
+    else:
+        phase_instruction = ""
+        default_instruction = (
+            "Continue building rapport - ask about their school or current projects, "
+            "or move forward to selling if they are ready."
+        )
+
     user_prompt = (
         "Analyze this sales conversation strategically and provide a strategic plan:\n\n"
         "1. REASONING: Explain WHY the student said what they said. What are their underlying motivations, concerns, or interests? "
         "What signals are they sending about their readiness?\n\n"
         "2. MOVE_FORWARD: Make a clear strategic decision - should we advance the sale (introduce Prodicity) or continue building rapport? "
-        "Base this on your assessment of the student's readiness, not on rigid rules. A highly engaged student after 3 messages might be ready, "
-        "while a disinterested student after 10 messages might not be.\n\n"
-        "3. INSTRUCTION_FOR_WRITER: Give a specific, actionable command for the copywriter.\n"
-        "   - CRITICAL: If current phase is 'doing_the_ask', you MUST instruct the writer to introduce/pitch Prodicity. Do NOT instruct them to 'continue building rapport' - the phase is already set to selling.\n"
-        "   - PRIORITY 1 (DIRECT QUESTIONS): Did the prospect ask a specific question (e.g., 'How much?', 'What is it?', 'Tell me more')? IF YES -> You MUST instruct the writer to answer it using the 'SALES CONVERSATION MANAGEMENT' tactics. Do not ignore the question to pitch.\n"
-        "   - PRIORITY 2 (SILENT OBJECTIONS): If (and ONLY if) there is no direct question, check for Silent Objections (Busy, Cost, Imposter). If detected, use the corresponding TACTIC.\n"
-        "   - PRIORITY 3 (DEFAULT): If neither, provide general guidance to advance the conversation:\n"
-        "     * If current phase is 'doing_the_ask': You MUST instruct to introduce Prodicity (e.g., 'Introduce Prodicity naturally by connecting it to their mentioned project. Reference what they told you. End with application CTA.')\n"
-        "     * If current phase is 'building_rapport': Continue building rapport (e.g., 'Continue building rapport - ask about their school or current projects to deepen the relationship.')\n"
-        "   Examples:\n"
-        "   - 'PRICE QUESTION: State price ($485/mo) with value sandwich (Mentorship caliber, Price + Aid, ROI). End with: Is that within your budget range?'\n"
-        "   - 'INFO REQUEST: Explain program mechanics (Mentors, Structure, Outcomes). End with: Does that align with your goals?'\n"
-        "   - 'BUSY OBJECTION: Validate workload, pivot to flexibility and low-lift nature.'\n"
-        "   - 'COST OBJECTION: Frame value first, then price + financial aid.'\n"
-        "   - 'IMPOSTER OBJECTION: Reassure that Prodicity helps them find and start projects - no expertise needed.'\n"
-        "   - 'Introduce Prodicity naturally by connecting it to their mentioned project. Reference what they told you. End with application CTA.'\n"
-        "   - 'Continue building rapport - ask about their school or current projects to deepen the relationship.'\n\n"
-        "4. PHASE: Determine the conversation phase based on your move_forward decision and conversation state:\n"
-        "   - CRITICAL RULE #1: If current phase is 'post_selling', you MUST set phase to 'post_selling'. This is a one-way phase - once in post_selling, you NEVER go back to 'doing_the_ask' or 'building_rapport' (unless explicitly transitioning away, which is rare).\n"
-        "   - If move_forward is False, set phase to 'building_rapport'\n"
-        "   - If move_forward is True AND you have NOT yet pitched Prodicity (check conversation for pitch indicators: 'Prodicity', 'fellowship', 'application', 'Stanford/MIT mentors'), set phase to 'doing_the_ask'\n"
-        "   - If move_forward is True AND you have ALREADY pitched Prodicity (found pitch indicators in conversation history) AND the user is asking follow-up questions, set phase to 'post_selling'\n"
-        "   - If current phase is 'doing_the_ask' AND user asks a question after you've pitched (pitch indicators found), set phase to 'post_selling'\n\n"
+        "Base this on your assessment of the student's readiness, not on rigid rules.\n\n"
+        "3. INSTRUCTION_FOR_WRITER: Give a specific, actionable command for the copywriter (see the examples above).\n"
+        f"{phase_instruction}"
+        "   - PRIORITY 1 (DIRECT QUESTIONS): If the prospect asked a specific question, instruct the writer to answer it using the 'SALES CONVERSATION MANAGEMENT' tactics. Do not ignore the question to pitch.\n"
+        "   - PRIORITY 2 (SILENT OBJECTIONS): Only if there is no direct question, check for Silent Objections (Busy, Cost, Imposter) and use the corresponding TACTIC.\n"
+        f"   - PRIORITY 3 (DEFAULT): {default_instruction}\n\n"
+        f"4. PHASE: {signals.phase_rule()}\n\n"
+        "Signals (computed from the full thread - treat as facts, do not re-check the history):\n"
+        + "\n".join(signals.facts()) + "\n\n"
         f"Conversation context:\n"
         f"- Title: {conv.title}\n"
         f"- Total messages: {total_messages} (Prospect: {prospect_messages})\n"
@@ -171,29 +198,84 @@ def analyze_conversation(conv: Conversation, current_phase: str = None) -> Dict[
         "- Give actionable instructions: Your instruction_for_writer should be specific enough that the copywriter knows exactly what to do."
     )
 
-    # Use GPT-5-mini with Responses API
-    client = ResponsesClient(model="gpt-5-mini")
-    
-    # Time the API call
-    api_start = time.time()
-    if Config.DEBUG:
-        print("[Analyzer] Calling OpenAI API (gpt-5-mini)...")
-    
-    result = client.json_response(
+    return system_prompt, user_prompt
+
+
+def build_analysis_request(conv: Conversation, current_phase: str = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    (endpoint, body) of the analyzer call, for the offline Batch API path.
+    The tier comes from the request's features alone; batch latency is not a concern.
+    """
+    signals = extract_signals(conv, current_phase)
+    system_prompt, user_prompt = build_analysis_prompts(conv, current_phase, signals)
+    tier = pick_tier(route_features(conv, signals))[0] if Config.ANALYZER_ROUTER_ENABLED else STANDARD
+    option = next(option for option in ANALYZER_ROUTES if option.name == tier)
+    return build_json_request(
+        option.model,
         system_prompt=system_prompt,
         user_prompt=user_prompt,
-        json_schema=ANALYSIS_SCHEMA,
-        reasoning_effort="low",
+        json_schema=analysis_schema(signals),
+        reasoning_effort=option.reasoning_effort,
     )
-    
-    api_time = time.time() - api_start
-    if Config.DEBUG:
-        if api_time < 1:
-            print(f"[Analyzer] OpenAI API call completed: {api_time*1000:.0f}ms")
-        else:
-            print(f"[Analyzer] OpenAI API call completed: {api_time:.2f}s")
-    
-    return result
+
+
+def analyze_conversation(
+    conv: Conversation,
+    current_phase: str = None,
+    latency_target_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Run a single Responses API call to analyze the conversation.
+
+    The model and reasoning effort are picked per request by the analyzer
+    router. If a non-default option fails, the call is retried once with the
+    standard option.
+    """
+    signals = extract_signals(conv, current_phase)
+    system_prompt, user_prompt = build_analysis_prompts(conv, current_phase, signals)
+
+    router = get_analyzer_router(ANALYZER_ROUTES)
+    decision = router.route(conv, signals, latency_target_ms=latency_target_ms)
+    option = router.option(decision.option)
+
+    while True:
+        client = ResponsesClient(model=option.model)
+
+        # Time the API call
+        api_start = time.time()
+        if Config.DEBUG:
+            print(f"[Analyzer] Calling OpenAI API ({option.model}, effort={option.reasoning_effort})...")
+
+        try:
+            result = client.json_response(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                json_schema=analysis_schema(signals),
+                reasoning_effort=option.reasoning_effort,
+                stage="analyzer",
+                phase=current_phase,
+            )
+        except TokenBudgetExceeded:
+            raise
+        except Exception:
+            router.record(decision, ok=False, latency_ms=(time.time() - api_start) * 1000)
+            if option.name == STANDARD:
+                raise
+            if Config.DEBUG:
+                print(f"[Analyzer] {option.name} option failed, retrying with {STANDARD}")
+            decision = router.fallback(decision, STANDARD)
+            option = router.option(STANDARD)
+            continue
+
+        api_time = time.time() - api_start
+        router.record(decision, ok=True, latency_ms=api_time * 1000)
+        if Config.DEBUG:
+            if api_time < 1:
+                print(f"[Analyzer] OpenAI API call completed: {api_time*1000:.0f}ms")
+            else:
+                print(f"[Analyzer] OpenAI API call completed: {api_time:.2f}s")
+
+        return result
 
 
 
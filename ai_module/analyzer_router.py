@@ -0,0 +1,299 @@
+"""
+Per-request model / reasoning-effort routing for the analyzer.
+
+Every analyzer call used to go to the same model at the same reasoning
+effort. The router sorts a request into a tier from cheap features (thread
+length, whether the prospect just asked a question, phase, pitch state):
+
+- fast: early rapport small talk. A small model is enough.
+- standard: the default analyzer settings.
+- deep: post-pitch questions and objections. These get more reasoning.
+
+It then checks that tier against live stats for each option: p90 latency
+and error rate over the last ROUTER_WINDOW calls. An option whose error rate
+is above ANALYZER_ROUTER_MAX_ERROR_RATE is skipped. With a latency target
+(per request, or ANALYZER_LATENCY_TARGET_MS), the router steps down to
+cheaper tiers until the p90 fits. A skipped option gets no new samples, so
+its stats would otherwise never recover. Two things prevent that: samples
+expire after ANALYZER_ROUTER_STATS_MAX_AGE_SECONDS, and a share
+(ANALYZER_ROUTER_PROBE_RATE) of the requests that wanted the skipped tier
+are sent to it anyway as probes. Probes are random, so they are off while a
+cassette records or replays provider calls. Every decision is counted in metrics
+(`analyzer.route.<tier>`) and kept in a bounded log for GET /analyzer/routing.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import metrics
+from cassette import cassette_active
+from config import Config
+from io_models import Conversation
+from phase_signals import PhaseSignals
+from thread_features import conversation_features, is_deleted, is_question
+
+# Calls per option that the latency/error stats cover
+ROUTER_WINDOW = 50
+# Calls before an option's stats are trusted
+MIN_SAMPLES = 5
+
+FAST = "fast"
+STANDARD = "standard"
+DEEP = "deep"
+
+
+@dataclass(frozen=True)
+class RouteOption:
+    """One model / reasoning-effort combination the analyzer can use."""
+    name: str
+    model: str
+    reasoning_effort: str
+
+
+@dataclass
+class RouteDecision:
+    """Why a request went to an option."""
+    timestamp: float
+    tier: str  # What the features asked for
+    option: str  # What was chosen
+    model: str
+    reasoning_effort: str
+    reasons: List[str]
+    features: Dict[str, Any]
+    thread_id: Optional[str] = None
+    latency_target_ms: Optional[float] = None
+    expected_latency_ms: Optional[float] = None
+    outcome: Optional[str] = None  # "ok" / "error", filled in after the call
+    latency_ms: Optional[float] = None
+
+
+@dataclass
+class _OptionStats:
+    # (time.monotonic(), value) samples
+    latencies: Deque[Tuple[float, float]] = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+    outcomes: Deque[Tuple[float, bool]] = field(default_factory=lambda: deque(maxlen=ROUTER_WINDOW))
+
+    def add(self, ok: bool, latency_ms: float):
+        now = time.monotonic()
+        self.outcomes.append((now, ok))
+        if ok:
+            self.latencies.append((now, latency_ms))
+
+    def _expire(self):
+        """Drop samples older than ANALYZER_ROUTER_STATS_MAX_AGE_SECONDS."""
+        max_age = Config.ANALYZER_ROUTER_STATS_MAX_AGE_SECONDS
+        if not max_age:
+            return
+        cutoff = time.monotonic() - max_age
+        for samples in (self.latencies, self.outcomes):
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+
+    def calls(self) -> int:
+        self._expire()
+        return len(self.outcomes)
+
+    def p90(self) -> Optional[float]:
+        self._expire()
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        return metrics.percentile([latency for _, latency in self.latencies], 90)
+
+    def error_rate(self) -> Optional[float]:
+        self._expire()
+        if len(self.outcomes) < MIN_SAMPLES:
+            return None
+        return sum(1 for _, ok in self.outcomes if not ok) / len(self.outcomes)
+
+
+def route_features(conv: Conversation, signals: PhaseSignals) -> Dict[str, Any]:
+    """The cheap per-request features the tier is picked from."""
+    features = conversation_features(conv)
+    last_prospect = next(
+        (m.text for m in reversed(conv.messages) if m.sender == "prospect" and not is_deleted(m.text)),
+        "",
+    )
+    return {
+        "message_count": features.message_count,
+        "prospect_message_count": features.prospect_message_count,
+        "last_is_question": is_question(last_prospect),
+        "last_prospect_chars": len(last_prospect),
+        "current_phase": signals.current_phase,
+        "has_pitched": signals.has_pitched,
+        "questions_since_pitch": signals.questions_since_pitch,
+    }
+
+
+def pick_tier(features: Dict[str, Any]) -> Tuple[str, List[str]]:
+    """(tier, reasons) for a request's features."""
+    phase = features["current_phase"]
+    question = features["last_is_question"]
+    if features["has_pitched"] and features["questions_since_pitch"] and question:
+        return DEEP, ["post-pitch question"]
+    if phase == "post_selling" and question:
+        return DEEP, ["question in post_selling"]
+    if phase == "doing_the_ask" and question:
+        return DEEP, ["question during the ask"]
+    if (
+        not features["has_pitched"]
+        and phase in (None, "building_rapport")
+        and features["prospect_message_count"] <= Config.ANALYZER_ROUTER_FAST_MAX_PROSPECT_MESSAGES
+        and not question
+    ):
+        return FAST, ["early rapport, no question"]
+    return STANDARD, ["default"]
+
+
+class AnalyzerRouter:
+    """Chooses a RouteOption per request from its features and live per-option stats."""
+
+    def __init__(self, options: List[RouteOption]):
+        # Ordered cheapest/fastest first
+        self.options = list(options)
+        self._by_name = {option.name: option for option in self.options}
+        self._stats: Dict[str, _OptionStats] = {option.name: _OptionStats() for option in self.options}
+        self._decisions: Deque[RouteDecision] = deque(maxlen=Config.ANALYZER_ROUTER_LOG_SIZE)
+        self._lock = threading.Lock()
+
+    def option(self, name: str) -> RouteOption:
+        return self._by_name[name]
+
+    def route(
+        self,
+        conv: Conversation,
+        signals: PhaseSignals,
+        latency_target_ms: Optional[float] = None,
+    ) -> RouteDecision:
+        features = route_features(conv, signals)
+        tier, reasons = pick_tier(features)
+        latency_target_ms = latency_target_ms or Config.ANALYZER_LATENCY_TARGET_MS or None
+        if not Config.ANALYZER_ROUTER_ENABLED:
+            tier, reasons = STANDARD, ["routing disabled"]
+
+        names = [option.name for option in self.options]
+        with self._lock:
+            p90 = {name: stats.p90() for name, stats in self._stats.items()}
+            errors = {name: stats.error_rate() for name, stats in self._stats.items()}
+
+        # Unhealthy options are skipped; if every option is unhealthy, keep the tier
+        healthy = names
+        if Config.ANALYZER_ROUTER_ENABLED:
+            healthy = [
+                name for name in names
+                if errors[name] is None or errors[name] <= Config.ANALYZER_ROUTER_MAX_ERROR_RATE
+            ] or names
+        start = names.index(tier)
+        # The wanted tier, then cheaper ones, then more expensive ones
+        order = [name for name in names[start::-1] + names[start + 1:] if name in healthy]
+        chosen = order[0]
+        for name in names:
+            if name not in healthy:
+                reasons.append(f"skipping {name} (error rate {errors[name]:.0%})")
+
+        if latency_target_ms and Config.ANALYZER_ROUTER_ENABLED:
+            fitting = [name for name in order if p90[name] is None or p90[name] <= latency_target_ms]
+            if fitting and fitting[0] != chosen:
+                reasons.append(f"{chosen} p90 {p90[chosen]:.0f}ms over {latency_target_ms:.0f}ms target")
+                chosen = fitting[0]
+            elif not fitting:
+                chosen = min(order, key=lambda name: p90[name])
+                reasons.append(f"no option within {latency_target_ms:.0f}ms, using the fastest")
+
+        if (
+            Config.ANALYZER_ROUTER_ENABLED
+            and not cassette_active()
+            and chosen != tier
+            and random.random() < Config.ANALYZER_ROUTER_PROBE_RATE
+        ):
+            # Probe the skipped tier so its stats can show it has recovered
+            reasons.append(f"probing {tier}")
+            chosen = tier
+            metrics.increment("analyzer.route.probes")
+
+        option = self._by_name[chosen]
+        decision = RouteDecision(
+            timestamp=time.time(),
+            tier=tier,
+            option=option.name,
+            model=option.model,
+            reasoning_effort=option.reasoning_effort,
+            reasons=reasons,
+            features=features,
+            thread_id=conv.thread_id,
+            latency_target_ms=latency_target_ms,
+            expected_latency_ms=p90[chosen],
+        )
+        with self._lock:
+            self._decisions.append(decision)
+        metrics.increment(f"analyzer.route.{option.name}")
+        if option.name != tier:
+            metrics.increment("analyzer.route.overridden")
+        if Config.DEBUG:
+            print(
+                f"[Router] {conv.thread_id or '-'}: tier={tier} -> {option.name} "
+                f"({option.model}, effort={option.reasoning_effort}); {'; '.join(reasons)}"
+            )
+        return decision
+
+    def fallback(self, failed: RouteDecision, name: str) -> RouteDecision:
+        """A follow-up decision to retry a failed call on option `name`."""
+        option = self._by_name[name]
+        decision = RouteDecision(
+            timestamp=time.time(),
+            tier=failed.tier,
+            option=option.name,
+            model=option.model,
+            reasoning_effort=option.reasoning_effort,
+            reasons=failed.reasons + [f"{failed.option} failed"],
+            features=failed.features,
+            thread_id=failed.thread_id,
+            latency_target_ms=failed.latency_target_ms,
+        )
+        with self._lock:
+            self._decisions.append(decision)
+            decision.expected_latency_ms = self._stats[name].p90()
+        metrics.increment(f"analyzer.route.{option.name}")
+        metrics.increment("analyzer.route.fallbacks")
+        return decision
+
+    def record(self, decision: RouteDecision, ok: bool, latency_ms: float):
+        """Feed a call's outcome back into its option's stats."""
+        with self._lock:
+            self._stats[decision.option].add(ok, latency_ms)
+            decision.outcome = "ok" if ok else "error"
+            decision.latency_ms = latency_ms
+        metrics.observe(f"analyzer.route.{decision.option}.latency_ms", latency_ms)
+        if not ok:
+            metrics.increment(f"analyzer.route.{decision.option}.errors")
+
+    def snapshot(self, limit: int = 50) -> Dict[str, Any]:
+        """Per-option stats and the most recent decisions."""
+        with self._lock:
+            options = [
+                {
+                    **asdict(option),
+                    "calls": self._stats[option.name].calls(),
+                    "p90_ms": self._stats[option.name].p90(),
+                    "error_rate": self._stats[option.name].error_rate(),
+                }
+                for option in self.options
+            ]
+            decisions = [asdict(decision) for decision in list(self._decisions)[-limit:]] if limit > 0 else []
+        return {"enabled": Config.ANALYZER_ROUTER_ENABLED, "options": options, "decisions": decisions}
+
+
+_router: Optional[AnalyzerRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_analyzer_router(options: List[RouteOption]) -> AnalyzerRouter:
+    """Process-wide router over `options` (created on first use)."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = AnalyzerRouter(options)
+        return _router
@@ -0,0 +1,7 @@
+"""
+Benchmark suite for the AI module.
+
+Run from the ai_module directory:
+  python -m benchmarks.micro
+  python -m benchmarks.load --scenario generate --concurrency 8
+"""
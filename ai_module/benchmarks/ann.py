@@ -0,0 +1,104 @@
+"""
+Recall and latency of the HNSW index against exact search over the same store.
+
+Uses the synthetic corpus from benchmarks.vectors. Reports build time, then
+recall@k and query latency for each ef_search value, plus exact search for
+reference. Ground truth is exact search over the same (possibly quantized)
+store, so the numbers isolate the approximation error of the graph.
+
+Usage (from ai_module/):
+  python -m benchmarks.ann
+  python -m benchmarks.ann --docs 100000 --dim 512 --dtype int8 --ef 32 64 128 256
+  python -m benchmarks.ann --save-baseline ann
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from benchmarks import baseline
+from benchmarks.vectors import synthetic_corpus
+from embedding_store import EmbeddingStore
+from hnsw_index import HNSWIndex
+from metrics import summarize
+
+
+def _timed_queries(search, queries) -> tuple:
+    found, samples_ms = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = search(query)
+        samples_ms.append((time.perf_counter() - start) * 1000)
+        found.append([doc_id for doc_id, _ in hits])
+    return found, summarize(samples_ms)
+
+
+def run(docs: int, num_queries: int, k: int, dim: int, dtype: str, m: int, ef_construction: int,
+        ef_values: List[int]) -> Dict[str, Dict[str, Any]]:
+    corpus, queries = synthetic_corpus(docs, num_queries)
+    workdir = tempfile.mkdtemp(prefix="kb-ann-")
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        store = EmbeddingStore.create(f"{workdir}/store", list(range(docs)), corpus, dim=dim, dtype=dtype)
+
+        truth, exact_stats = _timed_queries(lambda q: store.search(q, k=k), queries)
+        truth_sets = [set(ids) for ids in truth]
+        exact_stats.update({"unit": "ms", "recall_at_k": 1.0})
+        results["exact"] = exact_stats
+        print(f"  {'exact':<12} recall@{k}=1.000 p50={exact_stats['p50']:>8.2f}ms p95={exact_stats['p95']:>8.2f}ms")
+
+        build_start = time.perf_counter()
+        index = HNSWIndex.build(store, m=m, ef_construction=ef_construction)
+        build_s = time.perf_counter() - build_start
+        index.save()
+        load_start = time.perf_counter()
+        index = HNSWIndex.load(store)
+        load_ms = (time.perf_counter() - load_start) * 1000
+        print(f"  built in {build_s:.1f}s ({docs / build_s:.0f} inserts/s), loaded in {load_ms:.0f}ms")
+
+        for ef in ef_values:
+            found, stats = _timed_queries(lambda q: index.search(q, k=k, ef_search=ef), queries)
+            hits = sum(len(set(f) & t) for f, t in zip(found, truth_sets))
+            stats.update({
+                "unit": "ms",
+                "recall_at_k": hits / sum(len(t) for t in truth_sets),
+                "build_s": build_s,
+                "load_ms": load_ms,
+            })
+            results[f"hnsw.ef{ef}"] = stats
+            print(
+                f"  {'hnsw ef=' + str(ef):<12} recall@{k}={stats['recall_at_k']:.3f} "
+                f"p50={stats['p50']:>8.2f}ms p95={stats['p95']:>8.2f}ms"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="HNSW recall/latency against exact search")
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--dtype", default="float32")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128])
+    baseline.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    print(f"HNSW benchmark ({args.docs} docs, {args.queries} queries, k={args.k}, {args.dtype}:{args.dim})...")
+    results = run(args.docs, args.queries, args.k, args.dim, args.dtype, args.m, args.ef_construction, args.ef)
+    report = baseline.build_report("ann", results, {
+        "docs": args.docs, "queries": args.queries, "k": args.k, "dim": args.dim,
+        "dtype": args.dtype, "m": args.m, "ef_construction": args.ef_construction,
+    })
+    return baseline.handle_report(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
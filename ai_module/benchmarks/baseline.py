@@ -0,0 +1,130 @@
+"""
+Save benchmark results as JSON baselines and compare later runs against them.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Metrics where a larger value is better; everything else is treated as latency
+HIGHER_IS_BETTER = {"throughput_rps", "ops_per_sec"}
+COMPARED_METRICS = (
+    "p50", "p95", "p99", "mean", "throughput_rps", "ops_per_sec",
+    "input_chars", "input_tokens", "output_tokens", "reasoning_tokens",
+)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(BASELINE_DIR),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def build_report(kind: str, results: Dict[str, Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Wrap raw results with enough metadata to make a baseline reproducible."""
+    return {
+        "kind": kind,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+    }
+
+
+def baseline_path(name: str) -> str:
+    if name.endswith(".json") or os.sep in name:
+        return name
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save(report: Dict[str, Any], name: str) -> str:
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+        fh.write("\n")
+    return path
+
+
+def load(name: str) -> Dict[str, Any]:
+    with open(baseline_path(name), "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.10) -> List[Dict[str, Any]]:
+    """
+    Compare two reports benchmark-by-benchmark.
+
+    Returns one row per (benchmark, metric) with the relative change; rows whose
+    change is worse than `tolerance` are flagged as regressions.
+    """
+    rows: List[Dict[str, Any]] = []
+    for bench, stats in current.get("results", {}).items():
+        base_stats = baseline.get("results", {}).get(bench)
+        if not base_stats:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric not in stats or metric not in base_stats:
+                continue
+            old, new = float(base_stats[metric]), float(stats[metric])
+            if old == 0:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append({
+                "benchmark": bench,
+                "metric": metric,
+                "baseline": old,
+                "current": new,
+                "change": change,
+                "regression": worse > tolerance,
+            })
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> bool:
+    """Print a comparison table; returns True when any regression was found."""
+    regressed = False
+    for row in rows:
+        marker = "REGRESSION" if row["regression"] else ""
+        regressed = regressed or row["regression"]
+        print(
+            f"  {row['benchmark']:<32} {row['metric']:<15} "
+            f"{row['baseline']:>12.4f} -> {row['current']:>12.4f} ({row['change']:+.1%}) {marker}"
+        )
+    return regressed
+
+
+def add_arguments(parser):
+    """Register the shared --output/--save-baseline/--compare flags on an argparse parser."""
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save the report as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression (default 0.10)")
+
+
+def handle_report(report: Dict[str, Any], args) -> int:
+    """Persist/compare a finished report according to CLI flags. Returns a process exit code."""
+    if args.output:
+        save(report, args.output)
+        print(f"Report written to {args.output}")
+    if args.save_baseline:
+        print(f"Baseline saved to {save(report, args.save_baseline)}")
+    if args.compare:
+        print(f"\nComparison against baseline '{args.compare}' (tolerance {args.tolerance:.0%}):")
+        if print_comparison(compare(report, load(args.compare), args.tolerance)):
+            return 1
+    return 0
@@ -0,0 +1,61 @@
+"""
+Sample threads and knowledge base documents used by the benchmarks.
+"""
+
+from typing import Any, Dict, List
+
+OPENER = (
+    "hey Ivan, I'm currently researching what students at lynbrook are working on outside of school, "
+    "like nonprofits, research, internships, or passion projects. Are you working on any great projects or ideas?"
+)
+
+_PROSPECT_TURNS = [
+    "Yeah I'm building a tutoring app with a friend from Lynbrook High",
+    "We started last summer, it matches students with peer tutors",
+    "Honestly it's hard to balance with APs and robotics",
+    "I'd love to turn it into a nonprofit and scale to other schools in San Jose",
+    "Who's your friend from Lynbrook? How do you know them?",
+    "What is Prodicity exactly? How does the fellowship work?",
+    "How much does it cost? Is there financial aid?",
+    "When is the application deadline?",
+]
+
+_YOU_TURNS = [
+    "That's awesome - what got you interested in tutoring?",
+    "Nice, how many students are using it so far?",
+    "That makes sense, the grind at Lynbrook is real. Where do you want to take it?",
+    "Love that vision. A friend of mine from Lynbrook is in Prodicity, a fellowship with Stanford/MIT mentors.",
+    "We met through a hackathon last year. Prodicity helps students ship startups, research and nonprofits.",
+    "Mentors meet weekly with you and the schedule is flexible around school.",
+    "It's $485/mo and financial aid is available. Here's the application link.",
+]
+
+KB_DOCUMENTS: List[Dict[str, Any]] = [
+    {"question": "Who is your friend from Lynbrook?", "answer": "Alex Chen, a Prodicity fellow who built a robotics nonprofit.", "source": "friends", "tags": ["friend", "lynbrook"]},
+    {"question": "How much does Prodicity cost?", "answer": "$3,910 total: $1K deposit then $485/mo. Financial aid is available.", "source": "pricing", "tags": ["pricing", "financial aid"]},
+    {"question": "What is Prodicity?", "answer": "A selective fellowship pairing high schoolers with Stanford/MIT mentors to ship real outcomes.", "source": "program", "tags": ["program", "fellowship"]},
+    {"question": "When is the application deadline?", "answer": "Applications are reviewed on a rolling basis; interviews start next month.", "source": "application", "tags": ["application", "deadline"]},
+    {"question": "How flexible is the schedule?", "answer": "Weekly mentor calls scheduled around school, about 3-5 hours per week.", "source": "program", "tags": ["schedule", "busy"]},
+    {"question": "Who is your friend from Monta Vista?", "answer": "Priya Patel, who published research on microplastics with her mentor.", "source": "friends", "tags": ["friend", "monta vista"]},
+]
+
+
+def thread_messages(turns: int) -> List[Dict[str, Any]]:
+    """Build an alternating thread ending on a prospect message with `turns` prospect replies."""
+    messages: List[Dict[str, Any]] = [{"sender": "you", "text": OPENER}]
+    for i in range(turns):
+        messages.append({"sender": "prospect", "text": _PROSPECT_TURNS[i % len(_PROSPECT_TURNS)]})
+        if i < turns - 1:
+            messages.append({"sender": "you", "text": _YOU_TURNS[i % len(_YOU_TURNS)]})
+    return messages
+
+
+def generate_payload(turns: int = 4, thread_id: str = "bench-thread") -> Dict[str, Any]:
+    """Request body for POST /generate and POST /analyze."""
+    return {
+        "thread_id": thread_id,
+        "prospect_name": "Ivan",
+        "messages": thread_messages(turns),
+        "current_phase": "building_rapport",
+        "confirm_phase_change": True,
+    }
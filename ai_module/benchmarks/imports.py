@@ -0,0 +1,150 @@
+"""
+Import-time (cold start) benchmark.
+
+Each sample imports a module in a fresh interpreter, so restarts and
+serverless cold starts pay the same cost. The run fails (exit code 1) when a
+module's median import time is over its budget, or when importing it loads
+a package that should only be imported on first use (the provider SDKs, the
+Supabase client, httpx).
+
+Usage (from ai_module/):
+  python -m benchmarks.imports
+  python -m benchmarks.imports --repeat 20 --save-baseline imports
+  python -m benchmarks.imports --compare imports
+  python -m benchmarks.imports --profile main   # slowest imports under main
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from benchmarks import baseline
+from metrics import summarize
+
+AI_MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median budget in ms per module
+IMPORT_BUDGETS_MS: Dict[str, float] = {
+    "main": 400.0,
+    "generation": 150.0,
+    "knowledge_base": 100.0,
+}
+
+# Packages that must only be imported when first used
+LAZY_PACKAGES = ("openai", "anthropic", "supabase", "httpx", "langchain", "nltk")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "loaded": [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def _probe(module: str) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter; returns its import time and the lazy packages it loaded."""
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, lazy=LAZY_PACKAGES)],
+        cwd=AI_MODULE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    # Modules may print while importing; the probe's line is the last one
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def profile(module: str, top: int) -> List[Dict[str, Any]]:
+    """The `top` slowest imports (cumulative, in ms) under `module`, from `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=AI_MODULE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2, "ms": int(cumulative) / 1000})
+    rows.sort(key=lambda row: -row["ms"])
+    return rows[:top]
+
+
+def run(modules: List[str], repeat: int, warmup: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for module in modules:
+        # The first imports also write bytecode caches; keep them out of the samples
+        for _ in range(warmup):
+            _probe(module)
+        samples = [_probe(module) for _ in range(repeat)]
+        stats = summarize(sample["ms"] for sample in samples)
+        stats["unit"] = "ms"
+        stats["budget_ms"] = IMPORT_BUDGETS_MS.get(module)
+        stats["loaded_lazy_packages"] = sorted({name for sample in samples for name in sample["loaded"]})
+        results[f"import.{module}"] = stats
+        print(
+            f"  import {module:<24} p50={stats['p50']:>8.1f}ms p95={stats['p95']:>8.1f}ms "
+            f"max={stats['max']:>8.1f}ms"
+            + (f" budget={stats['budget_ms']:.0f}ms" if stats["budget_ms"] else "")
+            + (f" loaded={','.join(stats['loaded_lazy_packages'])}" if stats["loaded_lazy_packages"] else "")
+        )
+    return results
+
+
+def check_budgets(results: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Budget and lazy-import violations, one message each."""
+    failures = []
+    for name, stats in results.items():
+        if stats["budget_ms"] and stats["p50"] > stats["budget_ms"]:
+            failures.append(f"{name}: p50 {stats['p50']:.1f}ms over the {stats['budget_ms']:.0f}ms budget")
+        if stats["loaded_lazy_packages"]:
+            failures.append(f"{name}: imported {', '.join(stats['loaded_lazy_packages'])} eagerly")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time (cold start) benchmark")
+    parser.add_argument("--module", action="append", default=[], help="Module to time (default: every budgeted module)")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--budget-ms", type=float, help="Override the median budget for every timed module")
+    parser.add_argument("--profile", metavar="MODULE", help="Print the slowest imports under MODULE and exit")
+    parser.add_argument("--top", type=int, default=20)
+    baseline.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        for row in profile(args.profile, args.top):
+            print(f"  {row['ms']:>8.1f}ms  {'  ' * row['depth']}{row['module']}")
+        return 0
+
+    modules = args.module or list(IMPORT_BUDGETS_MS)
+    if args.budget_ms is not None:
+        for module in modules:
+            IMPORT_BUDGETS_MS[module] = args.budget_ms
+
+    print(f"Timing imports in fresh interpreters ({args.repeat} samples each)...")
+    results = run(modules, args.repeat, args.warmup)
+    report = baseline.build_report(
+        "imports", results, {"repeat": args.repeat, "warmup": args.warmup, "budgets_ms": dict(IMPORT_BUDGETS_MS)}
+    )
+    exit_code = baseline.handle_report(report, args)
+
+    failures = check_budgets(results)
+    if failures:
+        print("\nImport budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
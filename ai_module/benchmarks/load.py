@@ -0,0 +1,189 @@
+"""
+Load test for the Flask API against local provider stand-ins.
+
+Starts stub OpenAI/Anthropic/Supabase servers, serves the real Flask app on a
+local port, drives the chosen endpoints at a fixed concurrency and reports
+throughput plus p50/p95/p99 latency.
+
+Usage (from ai_module/):
+  python -m benchmarks.load
+  python -m benchmarks.load --scenario generate --concurrency 16 --requests 400 \\
+      --openai-ms 600 --anthropic-ms 1200 --distribution lognormal --error-rate 0.01
+  python -m benchmarks.load --save-baseline load
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks import baseline
+from benchmarks.fixtures import KB_DOCUMENTS, generate_payload
+from benchmarks.stubs import LatencyProfile, StubProviders
+from metrics import summarize
+
+SCENARIOS = ("generate", "analyze", "kb_search")
+
+KB_QUERIES = [
+    "friend background connection school lynbrook",
+    "pricing cost financial aid program fee",
+    "program fellowship details prodicity",
+    "application deadline how to apply",
+]
+
+
+def _request_for(scenario: str, i: int) -> Tuple[str, str, Optional[bytes]]:
+    if scenario == "kb_search":
+        query = urllib.parse.quote(KB_QUERIES[i % len(KB_QUERIES)])
+        return "GET", f"/kb/search?q={query}&k=5", None
+    payload = generate_payload(turns=2 + i % 6, thread_id=f"bench-{i}")
+    path = "/generate" if scenario == "generate" else "/analyze"
+    return "POST", path, json.dumps(payload).encode("utf-8")
+
+
+def _send(base_url: str, method: str, path: str, body: Optional[bytes], timeout: float) -> Tuple[int, float]:
+    request = urllib.request.Request(
+        base_url + path,
+        data=body,
+        method=method,
+        headers={"Content-Type": "application/json"} if body else {},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except Exception:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+class _AppServer:
+    """Serve the Flask app on an ephemeral port in a background thread."""
+
+    def __init__(self):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        from main import app
+
+        class _QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                return
+
+        self._server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=_QuietHandler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="bench-app", daemon=True)
+
+    def __enter__(self) -> "_AppServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        return False
+
+
+def run_scenario(base_url: str, scenario: str, concurrency: int, requests: int, warmup: int, timeout: float) -> Dict[str, Any]:
+    for i in range(warmup):
+        _send(base_url, *_request_for(scenario, i), timeout)
+
+    latencies_ms: List[float] = []
+    statuses: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def worker(i: int):
+        status, elapsed = _send(base_url, *_request_for(scenario, i), timeout)
+        with lock:
+            latencies_ms.append(elapsed * 1000)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    wall = time.perf_counter() - start
+
+    stats = summarize(latencies_ms)
+    stats.update({
+        "unit": "ms",
+        "throughput_rps": requests / wall if wall else 0.0,
+        "wall_seconds": wall,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "error_rate": 1 - statuses.get("200", 0) / requests if requests else 0.0,
+    })
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the AI API against local provider stand-ins")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Endpoint(s) to drive (default: all)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    parser.add_argument("--openai-ms", type=float, default=400.0, help="Mean stand-in latency for OpenAI calls")
+    parser.add_argument("--anthropic-ms", type=float, default=800.0, help="Mean stand-in latency for Anthropic calls")
+    parser.add_argument("--supabase-ms", type=float, default=40.0, help="Mean stand-in latency for Supabase calls")
+    parser.add_argument("--spread", type=float, default=0.5, help="Spread as a fraction of the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected error rate per provider call")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--provider-concurrency", type=int, default=0,
+                        help="OpenAI/Anthropic stand-ins answer 429 above this many calls in flight (0 = no limit)")
+    baseline.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    def profile(mean_ms: float, ceiling: int = 0) -> LatencyProfile:
+        return LatencyProfile(
+            distribution=args.distribution,
+            mean_ms=mean_ms,
+            spread_ms=mean_ms * args.spread,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            max_concurrency=ceiling,
+        )
+
+    scenarios = args.scenario or list(SCENARIOS)
+    results: Dict[str, Dict[str, Any]] = {}
+    with StubProviders(
+        openai=profile(args.openai_ms, args.provider_concurrency),
+        anthropic=profile(args.anthropic_ms, args.provider_concurrency),
+        supabase=profile(args.supabase_ms),
+    ) as stubs:
+        stubs.seed_kb(KB_DOCUMENTS)
+        with _AppServer() as app_server:
+            for scenario in scenarios:
+                print(f"Driving {scenario}: {args.requests} requests at concurrency {args.concurrency}...")
+                stats = run_scenario(
+                    app_server.url, scenario, args.concurrency, args.requests, args.warmup, args.timeout
+                )
+                results[scenario] = stats
+                print(
+                    f"  throughput={stats['throughput_rps']:.1f} req/s p50={stats['p50']:.0f}ms "
+                    f"p95={stats['p95']:.0f}ms p99={stats['p99']:.0f}ms statuses={stats['statuses']}"
+                )
+        provider_calls = {
+            "openai": stubs.openai.request_count,
+            "anthropic": stubs.anthropic.request_count,
+            "supabase": stubs.supabase.request_count,
+        }
+        throttled = {"openai": stubs.openai.throttled_count, "anthropic": stubs.anthropic.throttled_count}
+    print(f"Provider calls: {provider_calls} (429s: {throttled})")
+
+    params = {k: v for k, v in vars(args).items() if k not in ("output", "save_baseline", "compare", "tolerance")}
+    params["provider_calls"] = provider_calls
+    params["provider_429s"] = throttled
+    report = baseline.build_report("load", results, params)
+    return baseline.handle_report(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Micro-benchmarks for the CPU-bound parts of a /generate request.
+
+Usage (from ai_module/):
+  python -m benchmarks.micro
+  python -m benchmarks.micro --iterations 5000 --save-baseline micro
+  python -m benchmarks.micro --compare micro
+"""
+
+import argparse
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks import baseline
+from benchmarks.fixtures import KB_DOCUMENTS, generate_payload
+from metrics import summarize
+
+RAW_REPLY = (
+    '"That\'s awesome 🚀 - **how long** have you been working on it?\n\n'
+    'Prodicity pairs you with Stanford/MIT mentors — flexible around APs ✨"'
+)
+
+
+def _thread_data(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "title": f"Conversation with {payload['prospect_name']}",
+        "description": None,
+        "participants": [
+            {"id": "you", "name": "You", "role": "you"},
+            {"id": "prospect", "name": payload["prospect_name"], "role": "prospect"},
+        ],
+    }
+
+
+def _benchmarks() -> Dict[str, Callable[[], Any]]:
+    from config import Config
+    from ingest import build_conversation
+    from kb_lexical import BM25Index
+    from orchestrator import _build_kb_query
+    from response_generator import _sanitize_response
+    from static_scripts import get_prompt_blocks
+
+    # Keep debug prints out of the timed region
+    Config.DEBUG = False
+
+    short = generate_payload(turns=2)
+    long = generate_payload(turns=25)
+    short_conv = build_conversation(_thread_data(short), short["messages"])
+    long_conv = build_conversation(_thread_data(long), long["messages"])
+    # Enough copies of the fixture documents to resemble a real corpus
+    lexical = BM25Index()
+    lexical.build({**doc, "id": i} for i, doc in enumerate(KB_DOCUMENTS * 50))
+    long_query = _build_kb_query(long_conv, "post_selling")
+
+    return {
+        "build_conversation.short": lambda: build_conversation(_thread_data(short), short["messages"]),
+        "build_conversation.long": lambda: build_conversation(_thread_data(long), long["messages"]),
+        "build_kb_query.building_rapport": lambda: _build_kb_query(short_conv, "building_rapport"),
+        "build_kb_query.post_selling": lambda: _build_kb_query(long_conv, "post_selling"),
+        "bm25_search.pricing": lambda: lexical.search_with_coverage("how much does it cost pricing", k=10),
+        "bm25_search.kb_query": lambda: lexical.search_with_coverage(long_query, k=10),
+        "get_prompt_blocks.building_rapport": lambda: get_prompt_blocks("building_rapport"),
+        "get_prompt_blocks.doing_the_ask": lambda: get_prompt_blocks("doing_the_ask"),
+        "sanitize_response": lambda: _sanitize_response(RAW_REPLY),
+    }
+
+
+def run(iterations: int, warmup: int, only: List[str]) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, fn in _benchmarks().items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        for _ in range(warmup):
+            fn()
+        samples_us: List[float] = []
+        total_start = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            fn()
+            samples_us.append((time.perf_counter() - start) * 1e6)
+        total = time.perf_counter() - total_start
+        stats = summarize(samples_us)
+        stats["ops_per_sec"] = iterations / total if total else 0.0
+        stats["unit"] = "us"
+        results[name] = stats
+        print(
+            f"  {name:<38} p50={stats['p50']:>9.2f}us p95={stats['p95']:>9.2f}us "
+            f"p99={stats['p99']:>9.2f}us ops/s={stats['ops_per_sec']:>10.0f}"
+        )
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for prompt/query building")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--only", action="append", default=[], help="Run benchmarks with this name prefix")
+    baseline.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    print(f"Running micro-benchmarks ({args.iterations} iterations each)...")
+    results = run(args.iterations, args.warmup, args.only)
+    report = baseline.build_report(
+        "micro", results, {"iterations": args.iterations, "warmup": args.warmup}
+    )
+    return baseline.handle_report(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Analyzer prompt size (and, with --live, token usage and latency) per scenario.
+
+Input size is measured offline from the exact request the analyzer would
+send. With --live the requests are also sent to the configured OpenAI
+endpoint, and the reported usage (input, output and reasoning tokens) and
+latency are recorded. Save a baseline before a prompt change and compare
+after it.
+
+Usage (from ai_module/):
+  python -m benchmarks.prompts
+  python -m benchmarks.prompts --save-baseline prompts
+  python -m benchmarks.prompts --compare prompts
+  python -m benchmarks.prompts --live --repeat 3 --compare prompts-live
+"""
+
+import argparse
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from benchmarks import baseline
+from benchmarks.fixtures import generate_payload
+
+# (name, prospect turns, current_phase)
+SCENARIOS: List[Tuple[str, int, str]] = [
+    ("rapport.short", 2, "building_rapport"),
+    ("rapport.long", 6, "building_rapport"),
+    ("ask.pitched", 6, "doing_the_ask"),
+    ("post_selling.questions", 8, "post_selling"),
+]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _request_text(body: Dict[str, Any]) -> str:
+    if "input" in body:
+        return body["input"]
+    return "\n".join(message["content"] for message in body.get("messages", []))
+
+
+def run(live: bool, repeat: int) -> Dict[str, Dict[str, Any]]:
+    from analyzer import ANALYZER_MODEL, build_analysis_request
+    from config import Config
+    from generation import build_request_conversation
+    from metrics import summarize
+    from usage import normalize_usage
+
+    Config.DEBUG = False
+    client = None
+    if live:
+        from llm_service import ResponsesClient
+
+        client = ResponsesClient(model=ANALYZER_MODEL).client
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, turns, phase in SCENARIOS:
+        conv = build_request_conversation(generate_payload(turns=turns, thread_id=f"prompts-{name}"))
+        endpoint, body = build_analysis_request(conv, phase)
+        text = _request_text(body)
+        stats: Dict[str, Any] = {"input_chars": len(text), "input_tokens": _estimate_tokens(text)}
+
+        if client is not None:
+            latencies: List[float] = []
+            usage = {"input_tokens": 0, "output_tokens": 0, "reasoning_tokens": 0}
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if endpoint.endswith("/responses"):
+                    response = client.responses.create(**body)
+                else:
+                    response = client.chat.completions.create(**body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                counts = normalize_usage(response.usage)
+                for key in usage:
+                    usage[key] += counts[key]
+            stats.update(summarize(latencies))
+            stats.update({key: value / repeat for key, value in usage.items()})
+            stats["unit"] = "ms"
+
+        results[name] = stats
+        line = f"  {name:<26} chars={stats['input_chars']:>6} input_tokens={stats['input_tokens']:>6.0f}"
+        if client is not None:
+            line += (
+                f" output_tokens={stats['output_tokens']:>6.0f} reasoning={stats['reasoning_tokens']:>6.0f}"
+                f" p50={stats['p50']:>8.0f}ms"
+            )
+        print(line)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Analyzer prompt size / token usage per scenario")
+    parser.add_argument("--live", action="store_true", help="Send the requests and record usage and latency")
+    parser.add_argument("--repeat", type=int, default=3, help="Calls per scenario with --live")
+    baseline.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    print("Analyzer prompt sizes" + (" and live usage" if args.live else "") + "...")
+    results = run(args.live, max(1, args.repeat))
+    report = baseline.build_report("prompts", results, {"live": args.live, "repeat": args.repeat})
+    return baseline.handle_report(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
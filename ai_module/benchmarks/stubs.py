@@ -0,0 +1,749 @@
+"""
+Local stand-ins for the OpenAI, Anthropic and Supabase HTTP APIs.
+
+Each StubServer speaks just enough of one provider's wire format for the SDKs
+used by the AI module (Responses, chat.completions, embeddings, Anthropic
+Messages, both Batch APIs, PostgREST tables and RPC) and injects configurable
+latency and error rates so throughput can be measured without spending API
+credits.
+"""
+
+import hashlib
+import json
+import math
+import os
+import uuid
+from email.parser import BytesParser
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+STUB_API_KEY = "stub-key"
+# supabase-py validates that the key looks like a JWT
+STUB_SUPABASE_KEY = "stub.stub.stub"
+
+DEFAULT_EMBEDDING_DIM = 1536
+
+
+@dataclass
+class LatencyProfile:
+    """Latency distribution and error injection for one stand-in provider."""
+    distribution: str = "fixed"  # "fixed" | "uniform" | "lognormal"
+    mean_ms: float = 0.0
+    spread_ms: float = 0.0  # uniform: +/- spread, lognormal: stddev
+    error_rate: float = 0.0
+    error_status: int = 500
+    max_concurrency: int = 0  # Answer 429 (Retry-After: 1) above this many requests in flight; 0 = no limit
+
+    def sample_seconds(self, rng: random.Random) -> float:
+        if self.mean_ms <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            value = rng.uniform(self.mean_ms - self.spread_ms, self.mean_ms + self.spread_ms)
+        elif self.distribution == "lognormal":
+            # Parameterize by the desired mean/stddev of the resulting distribution
+            spread = max(self.spread_ms, 1e-6)
+            sigma2 = math.log(1 + (spread / self.mean_ms) ** 2)
+            mu = math.log(self.mean_ms) - sigma2 / 2
+            value = rng.lognormvariate(mu, math.sqrt(sigma2))
+        else:
+            value = self.mean_ms
+        return max(value, 0.0) / 1000.0
+
+
+def fake_embedding(text: str, dim: int = DEFAULT_EMBEDDING_DIM) -> List[float]:
+    """Deterministic unit vector derived from the token hashes of text."""
+    vector = [0.0] * dim
+    for token in re.findall(r"\w+", (text or "").lower()):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        for i in range(0, 8, 2):
+            slot = int.from_bytes(digest[i:i + 2], "little") % dim
+            vector[slot] += 1.0 if digest[i] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def _multipart_file(content_type: str, raw: bytes) -> Dict[str, Any]:
+    """Form fields of a multipart upload; the file part's bytes are under "file"."""
+    message = BytesParser().parsebytes(b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + raw)
+    fields: Dict[str, Any] = {}
+    for part in message.get_payload():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        fields[name] = payload if part.get_filename() else payload.decode("utf-8")
+    return fields
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "StubServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - signature fixed by base class
+        return
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not raw:
+            return None
+        if (self.headers.get("Content-Type") or "").startswith("multipart/"):
+            return _multipart_file(self.headers["Content-Type"], raw)
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        # bytes are sent as-is (file contents, JSONL results)
+        raw = isinstance(payload, bytes)
+        body = payload if raw else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method: str):
+        body = self._read_json() if method in ("POST", "PATCH", "DELETE") else None
+        parsed = urlparse(self.path)
+        stub = self.server
+        stub.record_request()
+        if not stub.enter():
+            self._send(429, {"error": {"message": "stub concurrency limit"}}, {"Retry-After": "1"})
+            return
+        try:
+            delay, fail = stub.draw()
+            if delay:
+                time.sleep(delay)
+            if fail:
+                headers = {"Retry-After": "1"} if stub.profile.error_status == 429 else None
+                self._send(stub.profile.error_status, {"error": {"message": "stub injected error"}}, headers)
+                return
+            status, payload, *extra = stub.route(method, parsed.path, parse_qs(parsed.query), body, self.headers)
+            self._send(status, payload, extra[0] if extra else None)
+        finally:
+            stub.leave()
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP stand-in for a single provider ("openai", "anthropic" or "supabase")."""
+
+    daemon_threads = True
+
+    def __init__(self, provider: str, profile: Optional[LatencyProfile] = None, seed: int = 0):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.provider = provider
+        self.profile = profile or LatencyProfile()
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"kb_documents": [], "conversations": []}
+        # Batch APIs: uploaded/output files and batches (reported in progress for `batch_polls` retrievals)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.batch_polls = 1
+        self.request_count = 0
+        self.throttled_count = 0
+        self.in_flight = 0
+        self.fail_next = 0  # The next N requests fail with profile.error_status (for retry tests)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self.serve_forever, name=f"stub-{self.provider}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def record_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def enter(self) -> bool:
+        """Admit a request unless max_concurrency are already in flight."""
+        with self._lock:
+            if self.profile.max_concurrency and self.in_flight >= self.profile.max_concurrency:
+                self.throttled_count += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def draw(self):
+        with self._lock:
+            delay = self.profile.sample_seconds(self._rng)
+            fail = self.profile.error_rate > 0 and self._rng.random() < self.profile.error_rate
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                fail = True
+        return delay, fail
+
+    # ------------------------------------------------------------------ #
+    # Routing
+    # ------------------------------------------------------------------ #
+
+    def route(self, method: str, path: str, query: Dict[str, List[str]], body: Any, headers) -> tuple:
+        if self.provider == "openai":
+            if path.endswith("/files") and method == "POST":
+                return 200, self._upload_file(body or {})
+            if path.startswith("/v1/files/") and path.endswith("/content"):
+                return 200, self.files.get(path.split("/")[3], b"")
+            if path.endswith("/batches") and method == "POST":
+                return 200, self._openai_batch(body or {})
+            if path.startswith("/v1/batches/"):
+                return self._poll_batch(path.split("/")[3])
+            if path.endswith("/responses"):
+                return 200, self._responses(body or {})
+            if path.endswith("/chat/completions"):
+                return 200, self._chat(body or {})
+            if path.endswith("/embeddings"):
+                return 200, self._embeddings(body or {})
+        elif self.provider == "anthropic":
+            if path.endswith("/messages/batches") and method == "POST":
+                return 200, self._anthropic_batch(body or {})
+            if path.startswith("/v1/messages/batches/") and path.endswith("/results"):
+                return 200, self.files.get(path.split("/")[4], b"")
+            if path.startswith("/v1/messages/batches/"):
+                return self._poll_batch(path.split("/")[4])
+            if path.endswith("/messages"):
+                return 200, self._anthropic(body or {})
+        elif self.provider == "supabase":
+            if path.startswith("/rest/v1/rpc/"):
+                return self._rpc(path.rsplit("/", 1)[-1], body or {})
+            if path.startswith("/rest/v1/"):
+                return self._table(method, path[len("/rest/v1/"):], query, body, headers)
+        return 404, {"error": {"message": f"stub route not found: {method} {path}"}}
+
+    # OpenAI ------------------------------------------------------------ #
+
+    @staticmethod
+    def _analysis_json(prompt: str) -> str:
+        """Canned analyzer verdict that advances phases roughly like the real analyzer."""
+        match = re.search(r"Current phase:\s*(\w+)", prompt or "")
+        phase = match.group(1) if match and match.group(1) in (
+            "building_rapport", "doing_the_ask", "post_selling"
+        ) else "building_rapport"
+        prospect_lines = re.findall(r"^Prospect: (.*)$", prompt or "", re.MULTILINE)
+        if phase == "building_rapport" and len(prospect_lines) >= 4:
+            phase = "doing_the_ask"
+        elif phase == "doing_the_ask" and prospect_lines and "?" in prospect_lines[-1]:
+            phase = "post_selling"
+        return json.dumps({
+            "reasoning": "Stub analysis: prospect is engaged and sharing details.",
+            "move_forward": phase != "building_rapport",
+            "instruction_for_writer": "Continue building rapport - ask about their current project.",
+            "phase": phase,
+        })
+
+    def _responses(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = body.get("input") if isinstance(body.get("input"), str) else json.dumps(body.get("input"))
+        text = self._analysis_json(prompt)
+        input_tokens = _estimate_tokens(prompt)
+        output_tokens = _estimate_tokens(text)
+        return {
+            "id": "resp_stub",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "stub"),
+            "status": "completed",
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "output": [{
+                "type": "message",
+                "id": "msg_stub",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": output_tokens},
+                "total_tokens": input_tokens + 2 * output_tokens,
+            },
+        }
+
+    def _chat(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        text = self._analysis_json(prompt)
+        input_tokens = _estimate_tokens(prompt)
+        output_tokens = _estimate_tokens(text)
+        return {
+            "id": "chatcmpl_stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": text},
+            }],
+            "usage": {
+                "prompt_tokens": input_tokens,
+                "completion_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    def _embeddings(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = int(body.get("dimensions") or DEFAULT_EMBEDDING_DIM)
+        data = [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text, dim)}
+            for i, text in enumerate(inputs or [])
+        ]
+        tokens = sum(_estimate_tokens(t) for t in inputs or [])
+        return {
+            "object": "list",
+            "model": body.get("model", "stub"),
+            "data": data,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    # Anthropic --------------------------------------------------------- #
+
+    def _anthropic(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages", [])
+        prompt = str(body.get("system", "")) + "\n".join(str(m.get("content", "")) for m in messages)
+        text = "That's really cool - how long have you been working on it?"
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub"),
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": _estimate_tokens(prompt), "output_tokens": _estimate_tokens(text)},
+        }
+
+    # Batch APIs -------------------------------------------------------- #
+
+    def _upload_file(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        content = fields.get("file") or b""
+        self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": "batch_input.jsonl",
+            "purpose": fields.get("purpose", "batch"),
+            "status": "processed",
+        }
+
+    def _openai_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Run every line of the input file right away; the batch reports completion after polling."""
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        output = []
+        for line in self.files.get(body.get("input_file_id"), b"").decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            handler = self._responses if request["url"].endswith("/responses") else self._chat
+            output.append(json.dumps({
+                "id": f"batch_req_{len(output)}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": "req_stub", "body": handler(request.get("body") or {})},
+                "error": None,
+            }))
+        output_file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self.files[output_file_id] = "\n".join(output).encode("utf-8")
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint"),
+            "input_file_id": body.get("input_file_id"),
+            "completion_window": body.get("completion_window", "24h"),
+            "created_at": int(time.time()),
+            "status": "completed",
+            "output_file_id": output_file_id,
+            "error_file_id": None,
+            "request_counts": {"total": len(output), "completed": len(output), "failed": 0},
+        }
+        self.batches[batch_id] = {"object": batch, "polls_left": self.batch_polls}
+        return {**batch, "status": "validating", "output_file_id": None}
+
+    def _anthropic_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:12]}"
+        lines = [
+            json.dumps({
+                "custom_id": request["custom_id"],
+                "result": {"type": "succeeded", "message": self._anthropic(request.get("params") or {})},
+            })
+            for request in body.get("requests", [])
+        ]
+        self.files[batch_id] = "\n".join(lines).encode("utf-8")
+        now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        batch = {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended",
+            "request_counts": {"processing": 0, "succeeded": len(lines), "errored": 0, "canceled": 0, "expired": 0},
+            "created_at": now,
+            "ended_at": now,
+            "expires_at": now,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch_id}/results",
+        }
+        self.batches[batch_id] = {"object": batch, "polls_left": self.batch_polls}
+        return {**batch, "processing_status": "in_progress", "ended_at": None, "results_url": None}
+
+    def _poll_batch(self, batch_id: str) -> tuple:
+        with self._lock:
+            entry = self.batches.get(batch_id)
+            if entry is None:
+                return 404, {"error": {"message": f"batch not found: {batch_id}"}}
+            batch = entry["object"]
+            if entry["polls_left"] > 0:
+                entry["polls_left"] -= 1
+                if batch.get("object") == "batch":
+                    return 200, {**batch, "status": "in_progress", "output_file_id": None}
+                return 200, {**batch, "processing_status": "in_progress", "ended_at": None, "results_url": None}
+        return 200, batch
+
+    # Supabase ---------------------------------------------------------- #
+
+    def _rpc(self, name: str, body: Dict[str, Any]) -> tuple:
+        threshold = float(body.get("match_threshold", 0.0))
+        count = int(body.get("match_count", 5))
+        if name == "match_kb_documents":
+            return 200, self._match(body.get("query_embedding") or [], threshold, count)
+        if name == "match_kb_documents_batch":
+            rows = []
+            for i, embedding in enumerate(body.get("query_embeddings") or []):
+                query = json.loads(embedding) if isinstance(embedding, str) else embedding
+                rows.extend({**row, "query_index": i} for row in self._match(query, threshold, count))
+            return 200, rows
+        if name == "append_conversation_messages":
+            return 200, self._append_messages(body)
+        return 404, {"message": f"function {name} not found"}
+
+    def _append_messages(self, body: Dict[str, Any]) -> int:
+        """append_conversation_messages: guarded append, -1 when message_count moved on."""
+        with self._lock:
+            for row in self.tables.get("conversations", []):
+                if row.get("thread_id") == body.get("p_thread_id"):
+                    if row.get("message_count") != body.get("p_expected_count"):
+                        return -1
+                    row["messages"] = list(row.get("messages") or []) + list(body.get("p_messages") or [])
+                    row["message_count"] = row["message_count"] + len(body.get("p_messages") or [])
+                    self._conversation_triggers(row)
+                    return row["message_count"]
+        return -1
+
+    @staticmethod
+    def _conversation_triggers(row: Dict[str, Any]):
+        """Columns the conversations triggers maintain (see the migration_*.sql files)."""
+        messages = row.get("messages") or []
+        row["message_hashes"] = [
+            hashlib.md5(f"{m.get('sender') or ''}|{m.get('text') or ''}".encode("utf-8")).hexdigest()
+            for m in messages
+        ]
+        if messages:
+            row["last_sender"] = messages[-1].get("sender")
+
+    def _match(self, query: List[float], threshold: float, count: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = list(self.tables["kb_documents"])
+        scored = []
+        for row in rows:
+            embedding = row.get("embedding") or []
+            similarity = sum(a * b for a, b in zip(query, embedding))
+            if similarity >= threshold:
+                result = {k: v for k, v in row.items() if k != "embedding"}
+                result["similarity"] = similarity
+                scored.append(result)
+        scored.sort(key=lambda r: r["similarity"], reverse=True)
+        return scored[:count]
+
+    def _table(self, method: str, table: str, query: Dict[str, List[str]], body: Any, headers) -> tuple:
+        with self._lock:
+            rows = self.tables.setdefault(table, [])
+            if method == "POST":
+                inserted = []
+                for item in body if isinstance(body, list) else [body or {}]:
+                    row = dict(item)
+                    row.setdefault("id", len(rows) + 1)
+                    row.setdefault("created_at", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+                    if table == "conversations":
+                        if any(r.get("thread_id") == row.get("thread_id") for r in rows):
+                            return 409, {"code": "23505", "message": "duplicate key value violates unique constraint"}
+                        self._conversation_triggers(row)
+                    rows.append(row)
+                    inserted.append(row)
+                return 201, inserted
+            matched = [row for row in rows if self._matches(row, query)]
+            if method == "DELETE":
+                rows[:] = [row for row in rows if not any(row is m for m in matched)]
+                return 200, matched
+            if method == "PATCH":
+                for row in matched:
+                    row.update(body or {})
+                    if table == "conversations" and "messages" in (body or {}):
+                        self._conversation_triggers(row)
+                if "count=" in (headers.get("Prefer") or ""):
+                    return 200, [dict(row) for row in matched], {"Content-Range": f"0-{len(matched) - 1}/{len(matched)}"}
+                return 200, matched
+            order = (query.get("order") or [None])[0]
+            if order:
+                # Stable sorts from the last key to the first
+                for term in reversed(order.split(",")):
+                    column, _, direction = term.partition(".")
+                    matched.sort(key=lambda r: str(r.get(column) or ""), reverse=direction.startswith("desc"))
+            total = len(matched)
+            offset = int((query.get("offset") or [0])[0])
+            limit = (query.get("limit") or [None])[0]
+            matched = matched[offset:offset + int(limit)] if limit else matched[offset:]
+            select = (query.get("select") or ["*"])[0]
+            if select != "*":
+                columns = [c.strip() for c in select.split(",")]
+                matched = [{c: row.get(c) for c in columns} for row in matched]
+            if "count=" in (headers.get("Prefer") or ""):
+                # PostgREST reports exact counts in Content-Range ("0-9/42")
+                content_range = f"{offset}-{offset + len(matched) - 1}/{total}" if matched else f"*/{total}"
+                return 200, [dict(row) for row in matched], {"Content-Range": content_range}
+            return 200, [dict(row) for row in matched]
+
+    @classmethod
+    def _matches(cls, row: Dict[str, Any], query: Dict[str, List[str]]) -> bool:
+        for column, values in query.items():
+            if column in ("select", "order", "limit", "offset"):
+                continue
+            for value in values:
+                if column in ("or", "and"):
+                    if not cls._logic(row, column, value[1:-1]):
+                        return False
+                elif not cls._compare(row.get(column), value):
+                    return False
+        return True
+
+    @staticmethod
+    def _compare(current: Any, value: str) -> bool:
+        """One PostgREST filter ("op.operand") against a column value; strings compare lexically."""
+        op, _, operand = value.partition(".")
+        if len(operand) >= 2 and operand[0] == operand[-1] == '"':
+            operand = operand[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+        if op == "is":
+            return current is None if operand == "null" else str(current).lower() == operand
+        if op == "in":
+            return str(current) in [item.strip().strip('"') for item in StubServer._split_terms(operand[1:-1])]
+        if op == "eq":
+            return str(current) == operand
+        if op == "neq":
+            return str(current) != operand
+        if current is None:
+            return False
+        if op == "lt":
+            return str(current) < operand
+        if op == "lte":
+            return str(current) <= operand
+        if op == "gt":
+            return str(current) > operand
+        if op == "gte":
+            return str(current) >= operand
+        return True
+
+    @staticmethod
+    def _split_terms(inner: str) -> List[str]:
+        """Split on top-level commas, skipping commas inside parentheses or double quotes."""
+        terms, depth, quoted, start = [], 0, False, 0
+        for i, char in enumerate(inner):
+            if char == '"' and (i == 0 or inner[i - 1] != "\\"):
+                quoted = not quoted
+            elif not quoted and char == "(":
+                depth += 1
+            elif not quoted and char == ")":
+                depth -= 1
+            elif not quoted and depth == 0 and char == ",":
+                terms.append(inner[start:i])
+                start = i + 1
+        terms.append(inner[start:])
+        return terms
+
+    @classmethod
+    def _logic(cls, row: Dict[str, Any], kind: str, inner: str) -> bool:
+        """Evaluate an or=(...) / and=(...) logic tree such as `a.lt.1,and(a.eq.1,b.lt.2)`."""
+        results = []
+        for term in cls._split_terms(inner):
+            if term.startswith(("and(", "or(")):
+                nested, _, rest = term.partition("(")
+                results.append(cls._logic(row, nested, rest[:-1]))
+            else:
+                column, _, condition = term.partition(".")
+                results.append(cls._compare(row.get(column), condition))
+        return all(results) if kind == "and" else any(results)
+
+    def seed(self, table: str, rows: List[Dict[str, Any]]):
+        """Insert rows into an in-memory table (Supabase stand-in only)."""
+        with self._lock:
+            target = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                row.setdefault("id", len(target) + 1)
+                if table == "conversations" and "messages" in row:
+                    self._conversation_triggers(row)
+                target.append(row)
+
+
+def _reset_local_stores():
+    """Drop the draft store, job queue and KB singletons so they reopen at the current paths and URLs."""
+    import drafts
+    import jobs
+    import knowledge_base
+
+    with drafts._store_lock:
+        if drafts._store is not None:
+            drafts._store.close()
+        drafts._store = None
+    with jobs._queue_lock:
+        if jobs._queue is not None:
+            jobs._queue.stop(timeout=1.0)
+        jobs._queue = None
+
+    knowledge_base._supabase_client = None
+    knowledge_base._lexical_index = None
+    knowledge_base._lexical_loaded_at = 0.0
+    knowledge_base._lexical_refreshing = False
+    knowledge_base._lexical_pending.clear()
+    knowledge_base._corpus_signature = None
+    knowledge_base._corpus_checked_at = 0.0
+    knowledge_base._result_cache.clear()
+    knowledge_base._embedding_store = None
+    knowledge_base._embedding_store_stale = False
+    knowledge_base._store_writer = True
+    knowledge_base._ann_index = None
+    knowledge_base._ann_building = None
+
+
+class StubProviders:
+    """
+    Start stand-ins for all three providers and point the AI module at them.
+
+    Usage:
+        with StubProviders(openai=LatencyProfile(mean_ms=400)) as stubs:
+            ...  # Config/env now target the local servers
+    """
+
+    def __init__(
+        self,
+        openai: Optional[LatencyProfile] = None,
+        anthropic: Optional[LatencyProfile] = None,
+        supabase: Optional[LatencyProfile] = None,
+        seed: int = 0,
+    ):
+        self.openai = StubServer("openai", openai, seed=seed)
+        self.anthropic = StubServer("anthropic", anthropic, seed=seed + 1)
+        self.supabase = StubServer("supabase", supabase, seed=seed + 2)
+        self._saved_env: Dict[str, Optional[str]] = {}
+        self._saved_config: Dict[str, Any] = {}
+        self._state_dir: Optional[str] = None
+
+    def __enter__(self) -> "StubProviders":
+        for server in (self.openai, self.anthropic, self.supabase):
+            server.start()
+        self._apply_environment()
+        return self
+
+    def __exit__(self, *exc):
+        self._restore_environment()
+        for server in (self.openai, self.anthropic, self.supabase):
+            server.stop()
+        return False
+
+    def seed_kb(self, documents: List[Dict[str, Any]]):
+        """Seed kb_documents with embeddings computed the same way the stub embeds queries."""
+        rows = []
+        for doc in documents:
+            text = "\n".join(filter(None, [doc.get("question"), doc.get("answer")]))
+            rows.append({**doc, "tags": doc.get("tags", []), "embedding": fake_embedding(text)})
+        self.supabase.seed("kb_documents", rows)
+
+    def _apply_environment(self):
+        from config import Config
+
+        env = {
+            "OPENAI_API_KEY": STUB_API_KEY,
+            "OPENAI_BASE_URL": f"{self.openai.url}/v1",
+            "ANTHROPIC_API_KEY": STUB_API_KEY,
+            "ANTHROPIC_BASE_URL": self.anthropic.url,
+            "SUPABASE_URL": self.supabase.url,
+            "SUPABASE_SERVICE_KEY": STUB_SUPABASE_KEY,
+        }
+        for key, value in env.items():
+            self._saved_env[key] = os.environ.get(key)
+            os.environ[key] = value
+
+        # Config reads the environment at import time, so patch the class too
+        overrides = {
+            "OPENAI_API_KEY": STUB_API_KEY,
+            "ANTHROPIC_API_KEY": STUB_API_KEY,
+            "SUPABASE_URL": self.supabase.url,
+            "SUPABASE_SERVICE_KEY": STUB_SUPABASE_KEY,
+            "DEBUG": False,
+        }
+        # Drafts, jobs and the local KB store persist on disk; a fresh directory
+        # per run keeps a rerun from replaying the previous run's state
+        self._state_dir = tempfile.mkdtemp(prefix="stub-providers-")
+        overrides["DRAFT_STORE_PATH"] = os.path.join(self._state_dir, "drafts.sqlite3")
+        overrides["JOBS_DB_PATH"] = os.path.join(self._state_dir, "jobs.sqlite3")
+        overrides["KB_EMBEDDING_STORE_PATH"] = os.path.join(self._state_dir, "kb_store")
+        for key, value in overrides.items():
+            self._saved_config[key] = getattr(Config, key)
+            setattr(Config, key, value)
+        _reset_local_stores()
+
+    def _restore_environment(self):
+        from config import Config
+
+        for key, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        for key, value in self._saved_config.items():
+            setattr(Config, key, value)
+        _reset_local_stores()
+        if self._state_dir:
+            shutil.rmtree(self._state_dir, ignore_errors=True)
+            self._state_dir = None
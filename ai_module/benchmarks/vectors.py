@@ -0,0 +1,110 @@
+"""
+Recall and latency of compressed embedding stores against full float32 search.
+
+The corpus is synthetic: unit vectors whose per-dimension variance decays
+like Matryoshka-trained embeddings (leading dimensions carry the most
+signal), with queries drawn near corpus points. Ground truth is exact
+float32 search over all 1536 dimensions.
+
+Usage (from ai_module/):
+  python -m benchmarks.vectors
+  python -m benchmarks.vectors --docs 100000 --queries 200 --configs float32:1536 int8:512 int8:256
+  python -m benchmarks.vectors --save-baseline vectors
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks import baseline
+from embedding_store import EmbeddingStore, truncate
+from metrics import summarize
+
+FULL_DIM = 1536
+DEFAULT_CONFIGS = ["float32:1536", "float16:1536", "int8:1536", "float32:512", "float16:512", "int8:512", "int8:256"]
+
+
+def synthetic_corpus(docs: int, queries: int, seed: int = 0):
+    """(corpus, queries): unit vectors with decaying per-dimension variance."""
+    rng = np.random.default_rng(seed)
+    decay = (np.arange(FULL_DIM, dtype=np.float32) + 1.0) ** -0.5
+    corpus = truncate(rng.standard_normal((docs, FULL_DIM), dtype=np.float32) * decay, FULL_DIM)
+    anchors = corpus[rng.integers(0, docs, size=queries)]
+    noise = rng.standard_normal((queries, FULL_DIM), dtype=np.float32) * decay * 0.6
+    return corpus, truncate(anchors + noise, FULL_DIM)
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    scores = queries @ corpus.T
+    return [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in scores]
+
+
+def recall_at_k(found: List[List[Any]], truth: List[set]) -> float:
+    hits = sum(len(set(f) & t) for f, t in zip(found, truth))
+    return hits / sum(len(t) for t in truth)
+
+
+def run(docs: int, num_queries: int, k: int, configs: List[str]) -> Dict[str, Dict[str, Any]]:
+    corpus, queries = synthetic_corpus(docs, num_queries)
+    truth = exact_top_k(corpus, queries, k)
+    ids = list(range(docs))
+    workdir = tempfile.mkdtemp(prefix="kb-vectors-")
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for spec in configs:
+            dtype, _, dim = spec.partition(":")
+            path = f"{workdir}/{dtype}-{dim}"
+            EmbeddingStore.create(path, ids, corpus, dim=int(dim), dtype=dtype)
+
+            open_start = time.perf_counter()
+            store = EmbeddingStore(path)
+            open_ms = (time.perf_counter() - open_start) * 1000
+
+            found, samples_ms = [], []
+            for query in queries:
+                start = time.perf_counter()
+                hits = store.search(query, k=k)
+                samples_ms.append((time.perf_counter() - start) * 1000)
+                found.append([doc_id for doc_id, _ in hits])
+
+            stats = summarize(samples_ms)
+            stats.update({
+                "unit": "ms",
+                "recall_at_k": recall_at_k(found, truth),
+                "size_mb": store.size_bytes() / 1e6,
+                "open_ms": open_ms,
+            })
+            results[spec] = stats
+            print(
+                f"  {spec:<14} recall@{k}={stats['recall_at_k']:.3f} p50={stats['p50']:>8.2f}ms "
+                f"p95={stats['p95']:>8.2f}ms size={stats['size_mb']:>8.1f}MB open={open_ms:.1f}ms"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Recall/latency of quantized and truncated embedding stores")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS, help="dtype:dim pairs")
+    baseline.add_arguments(parser)
+    args = parser.parse_args(argv)
+
+    print(f"Embedding store benchmark ({args.docs} docs, {args.queries} queries, k={args.k})...")
+    results = run(args.docs, args.queries, args.k, args.configs)
+    report = baseline.build_report(
+        "vectors", results, {"docs": args.docs, "queries": args.queries, "k": args.k}
+    )
+    return baseline.handle_report(report, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+Record/replay transport for LLM and embedding HTTP calls.
+
+Every OpenAI and Anthropic client in the module is built on an httpx client
+from `build_http_client()`. Depending on `Config.LLM_CASSETTE_MODE` that
+client either talks to the network directly ("passthrough"), forwards and
+records each request/response pair ("record"), or serves responses from the
+on-disk cassette without touching the network ("replay").
+
+Cassettes are JSON Lines files (gzip-compressed when the path ends in .gz),
+one entry per canonical request hash.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Optional
+
+import httpx
+
+from config import Config
+
+MODES = ("passthrough", "record", "replay")
+
+# Only headers the SDKs actually read are kept; the body is stored decoded
+_KEPT_HEADERS = {"content-type", "retry-after", "x-request-id", "request-id"}
+
+
+class CassetteMissError(RuntimeError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def canonical_request_key(method: str, path: str, query: str, body: bytes) -> str:
+    """Hash a request independently of host, headers, query parameter order and JSON key order."""
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(query, keep_blank_values=True)))
+    try:
+        payload: Any = json.loads(body) if body else None
+        body_repr = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        body_repr = hashlib.sha256(body).hexdigest()
+    canonical = "\n".join([method.upper(), path, query, body_repr])
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """In-memory index of recorded interactions backed by an append-only file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with self._open("r") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with self._open("a") as fh:
+                fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def _encode_body(content: bytes) -> Dict[str, Any]:
+    try:
+        return {"json": json.loads(content)}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {"b64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(stored: Dict[str, Any]) -> bytes:
+    if "json" in stored:
+        return json.dumps(stored["json"]).encode("utf-8")
+    return base64.b64decode(stored.get("b64", ""))
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport implementing the record/replay/passthrough modes."""
+
+    def __init__(
+        self,
+        mode: str,
+        cassette: Cassette,
+        replay_latency: bool = False,
+        inner: Optional[httpx.BaseTransport] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Invalid cassette mode '{mode}'. Valid modes: {MODES}")
+        self.mode = mode
+        self.cassette = cassette
+        self.replay_latency = replay_latency
+        self._inner = inner or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "passthrough":
+            return self._inner.handle_request(request)
+
+        body = request.read()
+        key = canonical_request_key(
+            request.method, request.url.path, request.url.query.decode("ascii"), body
+        )
+
+        if self.mode == "replay":
+            entry = self.cassette.get(key)
+            if entry is None:
+                raise CassetteMissError(
+                    f"No recorded response for {request.method} {request.url.path} "
+                    f"(key {key[:12]}) in cassette {self.cassette.path}"
+                )
+            if self.replay_latency and entry.get("latency_ms"):
+                time.sleep(entry["latency_ms"] / 1000.0)
+            return httpx.Response(
+                entry["status"],
+                headers=entry.get("headers", {}),
+                content=_decode_body(entry["body"]),
+                request=request,
+            )
+
+        # record
+        start = time.time()
+        response = self._inner.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        latency_ms = (time.time() - start) * 1000
+        headers = {k: v for k, v in response.headers.items() if k.lower() in _KEPT_HEADERS}
+        self.cassette.put({
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": headers,
+            "body": _encode_body(content),
+            "latency_ms": round(latency_ms, 1),
+        })
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def close(self):
+        self._inner.close()
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(path: str) -> Cassette:
+    """Return the shared Cassette for path, loading it on first use."""
+    with _cassettes_lock:
+        if path not in _cassettes:
+            _cassettes[path] = Cassette(path)
+        return _cassettes[path]
+
+
+def use_cassette(mode: str, path: Optional[str] = None, replay_latency: Optional[bool] = None):
+    """Switch the cassette mode for clients created from now on (e.g. from a script or simulator)."""
+    if mode not in MODES:
+        raise ValueError(f"Invalid cassette mode '{mode}'. Valid modes: {MODES}")
+    Config.LLM_CASSETTE_MODE = mode
+    if path:
+        Config.LLM_CASSETTE_PATH = path
+    if replay_latency is not None:
+        Config.LLM_CASSETTE_REPLAY_LATENCY = replay_latency
+
+
+def cassette_active() -> bool:
+    """True while provider calls are recorded or replayed, so they must be reproducible."""
+    return (Config.LLM_CASSETTE_MODE or "passthrough").lower() != "passthrough"
+
+
+def build_http_client(timeout: float = 60.0) -> httpx.Client:
+    """Create the httpx client that provider SDK clients should be built on."""
+    mode = (Config.LLM_CASSETTE_MODE or "passthrough").lower()
+    if mode == "passthrough":
+        return httpx.Client(timeout=timeout)
+    transport = CassetteTransport(
+        mode,
+        get_cassette(Config.LLM_CASSETTE_PATH),
+        replay_latency=Config.LLM_CASSETTE_REPLAY_LATENCY,
+    )
+    return httpx.Client(timeout=timeout, transport=transport)
@@ -30,6 +30,130 @@ class Config:
     SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY", os.getenv("SUPABASE_KEY", ""))
     SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "")
     
+    # Knowledge base retrieval: BM25 + vector search fused by reciprocal rank
+    KB_HYBRID_SEARCH = os.getenv("KB_HYBRID_SEARCH", "True").lower() == "true"
+    KB_LEXICAL_REFRESH_SECONDS = float(os.getenv("KB_LEXICAL_REFRESH_SECONDS", "300"))
+    KB_LEXICAL_MIN_COVERAGE = float(os.getenv("KB_LEXICAL_MIN_COVERAGE", "0.6"))  # Skip embedding above this
+    KB_LEXICAL_MIN_MARGIN = float(os.getenv("KB_LEXICAL_MIN_MARGIN", "1.5"))  # ...when top hit beats #2 by this
+    KB_RRF_K = int(os.getenv("KB_RRF_K", "60"))
+    KB_MULTI_QUERY = os.getenv("KB_MULTI_QUERY", "True").lower() == "true"  # Per-intent sub-queries
+    KB_CACHE_MAX_ENTRIES = int(os.getenv("KB_CACHE_MAX_ENTRIES", "512"))  # 0 disables the result cache
+    KB_CACHE_TTL_SECONDS = float(os.getenv("KB_CACHE_TTL_SECONDS", "600"))
+    KB_CHANGE_POLL_SECONDS = float(os.getenv("KB_CHANGE_POLL_SECONDS", "30"))  # 0 disables external change checks
+    # Vector search backend: "supabase" (match_kb_documents RPC) or "local" (embedding_store.py)
+    KB_VECTOR_BACKEND = os.getenv("KB_VECTOR_BACKEND", "supabase").lower()
+    KB_EMBEDDING_STORE_PATH = os.getenv("KB_EMBEDDING_STORE_PATH", "kb_store")
+    KB_EMBEDDING_DIM = int(os.getenv("KB_EMBEDDING_DIM", "512"))  # Matryoshka truncation of the 1536-d vectors
+    KB_EMBEDDING_DTYPE = os.getenv("KB_EMBEDDING_DTYPE", "int8").lower()  # float32, float16 or int8
+    KB_ANN_INDEX = os.getenv("KB_ANN_INDEX", "exact").lower()  # "exact" or "hnsw" (local backend only)
+    KB_HNSW_M = int(os.getenv("KB_HNSW_M", "16"))
+    KB_HNSW_EF_CONSTRUCTION = int(os.getenv("KB_HNSW_EF_CONSTRUCTION", "100"))
+    KB_HNSW_EF_SEARCH = int(os.getenv("KB_HNSW_EF_SEARCH", "64"))
+    KB_HNSW_SAVE_INTERVAL_SECONDS = float(os.getenv("KB_HNSW_SAVE_INTERVAL_SECONDS", "60"))
+    
+    # Embedding micro-batching (see embedding_batcher.py)
+    EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "True").lower() == "true"
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+    EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64"))
+    EMBEDDING_BATCH_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_BATCH_MAX_IN_FLIGHT", "4"))
+    EMBEDDING_BATCH_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_BATCH_TIMEOUT_SECONDS", "60"))
+    
+    # Record/replay of LLM and embedding calls ("passthrough", "record", "replay")
+    LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "passthrough").lower()
+    LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", os.path.join("cassettes", "llm.jsonl"))
+    LLM_CASSETTE_REPLAY_LATENCY = os.getenv("LLM_CASSETTE_REPLAY_LATENCY", "False").lower() == "true"
+    
+    # Background draft pre-generation (see draft_worker.py)
+    DRAFT_WORKER_ENABLED = os.getenv("DRAFT_WORKER_ENABLED", "False").lower() == "true"
+    DRAFT_WORKER_SOURCE = os.getenv("DRAFT_WORKER_SOURCE", "supabase")  # "supabase" or path to a JSON file of rows
+    DRAFT_WORKER_CONCURRENCY = int(os.getenv("DRAFT_WORKER_CONCURRENCY", "2"))
+    DRAFT_WORKER_POLL_SECONDS = float(os.getenv("DRAFT_WORKER_POLL_SECONDS", "60"))
+    DRAFT_WORKER_MIN_INTERVAL_SECONDS = float(os.getenv("DRAFT_WORKER_MIN_INTERVAL_SECONDS", "2"))
+    DRAFT_WORKER_ACTIVE_HOURS = os.getenv("DRAFT_WORKER_ACTIVE_HOURS", "")  # e.g. "22-7" (local time); empty = always
+    DRAFT_WORKER_SCAN_LIMIT = int(os.getenv("DRAFT_WORKER_SCAN_LIMIT", "50"))
+    DRAFT_TTL_SECONDS = float(os.getenv("DRAFT_TTL_SECONDS", str(6 * 3600)))
+    # Persistent draft store (see drafts.py)
+    DRAFT_STORE_PATH = os.getenv("DRAFT_STORE_PATH", "drafts.sqlite3")
+    DRAFT_STORE_MAX_ENTRIES = int(os.getenv("DRAFT_STORE_MAX_ENTRIES", "5000"))
+
+    # /generate idempotency keys and single-flight coalescing (see idempotency.py)
+    IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "True").lower() == "true"
+    IDEMPOTENCY_REPLAY_SECONDS = float(os.getenv("IDEMPOTENCY_REPLAY_SECONDS", "30"))  # Completed responses kept for repeats
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+    
+    # Asynchronous generation jobs (see jobs.py)
+    JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.sqlite3")
+    JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+    JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "200"))  # Reject new jobs beyond this depth
+    JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", str(24 * 3600)))
+    JOBS_MAX_WAIT_SECONDS = float(os.getenv("JOBS_MAX_WAIT_SECONDS", "30"))  # Long-poll cap
+    JOBS_CALLBACK_TIMEOUT_SECONDS = float(os.getenv("JOBS_CALLBACK_TIMEOUT_SECONDS", "10"))
+    JOBS_CALLBACK_ALLOWED_HOSTS = os.getenv("JOBS_CALLBACK_ALLOWED_HOSTS", "")  # Comma-separated; empty = any public host
+    JOBS_RECOVER_ON_START = os.getenv("JOBS_RECOVER_ON_START", "True").lower() == "true"  # Re-queue jobs left running
+    
+    # Follow-up candidates (see followups.py)
+    FOLLOWUPS_PAGE_SIZE = int(os.getenv("FOLLOWUPS_PAGE_SIZE", "50"))
+    FOLLOWUPS_MAX_PAGE_SIZE = int(os.getenv("FOLLOWUPS_MAX_PAGE_SIZE", "200"))
+    
+    # Offline Batch API runs (see offline_batch.py)
+    BATCH_WORK_DIR = os.getenv("BATCH_WORK_DIR", "batch_runs")
+    BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", "60"))
+    BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+    
+    # Per-thread feature records (see thread_features.py)
+    THREAD_FEATURES_CACHE_SIZE = int(os.getenv("THREAD_FEATURES_CACHE_SIZE", "5000"))
+    THREAD_FEATURES_PERSIST = os.getenv("THREAD_FEATURES_PERSIST", "True").lower() == "true"  # Read/write conversations.features
+
+    # Token usage ledger (see usage.py)
+    USAGE_LEDGER_SIZE = int(os.getenv("USAGE_LEDGER_SIZE", "10000"))  # Most recent provider calls kept for /usage
+    USAGE_MAX_TOKENS_PER_REQUEST = int(os.getenv("USAGE_MAX_TOKENS_PER_REQUEST", "0"))  # 0 = no cap; /generate "token_budget" overrides
+
+    # Analyzer model/effort routing (see analyzer_router.py)
+    ANALYZER_ROUTER_ENABLED = os.getenv("ANALYZER_ROUTER_ENABLED", "True").lower() == "true"  # False = always gpt-5-mini/low
+    ANALYZER_FAST_MODEL = os.getenv("ANALYZER_FAST_MODEL", "gpt-5-nano")
+    ANALYZER_FAST_REASONING_EFFORT = os.getenv("ANALYZER_FAST_REASONING_EFFORT", "low")
+    ANALYZER_DEEP_MODEL = os.getenv("ANALYZER_DEEP_MODEL", "gpt-5-mini")
+    ANALYZER_DEEP_REASONING_EFFORT = os.getenv("ANALYZER_DEEP_REASONING_EFFORT", "medium")
+    ANALYZER_ROUTER_FAST_MAX_PROSPECT_MESSAGES = int(os.getenv("ANALYZER_ROUTER_FAST_MAX_PROSPECT_MESSAGES", "2"))
+    ANALYZER_LATENCY_TARGET_MS = float(os.getenv("ANALYZER_LATENCY_TARGET_MS", "0"))  # 0 = no target; /generate "latency_target_ms" overrides
+    ANALYZER_ROUTER_MAX_ERROR_RATE = float(os.getenv("ANALYZER_ROUTER_MAX_ERROR_RATE", "0.25"))  # Skip options failing more often
+    ANALYZER_ROUTER_LOG_SIZE = int(os.getenv("ANALYZER_ROUTER_LOG_SIZE", "500"))  # Recent decisions kept for /analyzer/routing
+    ANALYZER_ROUTER_STATS_MAX_AGE_SECONDS = float(os.getenv("ANALYZER_ROUTER_STATS_MAX_AGE_SECONDS", "300"))  # Older samples expire; 0 = never
+    ANALYZER_ROUTER_PROBE_RATE = float(os.getenv("ANALYZER_ROUTER_PROBE_RATE", "0.05"))  # Share of requests sent to a skipped tier
+    ANALYZE_BULK_MAX_THREADS = int(os.getenv("ANALYZE_BULK_MAX_THREADS", "200"))  # Threads per /analyze/bulk request
+    ANALYZE_BULK_CONCURRENCY = int(os.getenv("ANALYZE_BULK_CONCURRENCY", "8"))  # Analyzer calls in flight per bulk request
+    
+    # Upstream rate limiting (see rate_limiter.py); 0 RPM/TPM means no bucket
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    OPENAI_RPM = float(os.getenv("OPENAI_RPM", "0"))
+    OPENAI_TPM = float(os.getenv("OPENAI_TPM", "0"))
+    ANTHROPIC_RPM = float(os.getenv("ANTHROPIC_RPM", "0"))
+    ANTHROPIC_TPM = float(os.getenv("ANTHROPIC_TPM", "0"))
+    RATE_LIMITS = os.getenv("RATE_LIMITS", "")  # Per model, e.g. "openai/gpt-5-mini=500:200000,anthropic/claude-sonnet-4-5=50:30000"
+    RATE_LIMIT_INITIAL_CONCURRENCY = int(os.getenv("RATE_LIMIT_INITIAL_CONCURRENCY", "8"))
+    RATE_LIMIT_MAX_CONCURRENCY = int(os.getenv("RATE_LIMIT_MAX_CONCURRENCY", "64"))
+    RATE_LIMIT_LATENCY_FACTOR = float(os.getenv("RATE_LIMIT_LATENCY_FACTOR", "3.0"))  # Latency over baseline x this is congestion
+    RATE_LIMIT_LATENCY_BACKOFF = float(os.getenv("RATE_LIMIT_LATENCY_BACKOFF", "0.9"))  # Window multiplier on congestion (0.5 on a 429)
+    RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))  # Retries of a throttled call
+    RATE_LIMIT_TRANSIENT_RETRIES = int(os.getenv("RATE_LIMIT_TRANSIENT_RETRIES", "2"))  # Retries on 5xx/timeouts/connection errors
+    RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "120"))  # Queueing + backoff per call
+
+    # Pre-fork production server (see gunicorn.conf.py and serving.py)
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))  # 0 = one per CPU, at most 4
+    SERVER_THREADS = int(os.getenv("SERVER_THREADS", "8"))  # Request threads per worker (calls are I/O-bound)
+    SERVER_TIMEOUT_SECONDS = int(os.getenv("SERVER_TIMEOUT_SECONDS", "120"))
+    SERVER_PRELOAD_KB = os.getenv("SERVER_PRELOAD_KB", "True").lower() == "true"  # Build KB indexes in the master
+    SERVER_BACKGROUND_LOCK_PATH = os.getenv("SERVER_BACKGROUND_LOCK_PATH", "background.lock")  # Elects the process running the draft worker and writing the local KB store
+
+    # Warm-up and readiness (see warmup.py and GET /health/ready)
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "True").lower() == "true"
+    WARMUP_COMPONENTS = os.getenv("WARMUP_COMPONENTS", "prompts,kb,connections,queries")  # Comma-separated
+    WARMUP_QUERIES = os.getenv(
+        "WARMUP_QUERIES",
+        "how much does it cost|what is prodicity|how does the program work|who are the mentors",
+    )  # "|"-separated KB queries retrieved (and embedded) at boot
+    WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))  # Ready (degraded) after this even if still warming
+
     # AI Strategy Configuration
     MAX_CONVERSATION_LENGTH = 50  # Max messages to consider for context
     MIN_MESSAGES_FOR_SELL = 5  # Minimum messages before considering sell phase
@@ -48,11 +172,3 @@ class Config:
             print("Warning: ANTHROPIC_API_KEY is not set. Response generation will fail without it.")
         return True
 
-# Validate configuration on import
-try:
-    Config.validate()
-except ValueError as e:
-    # Log warning but don't fail (for development)
-    print(f"Warning: {e}")
-
-
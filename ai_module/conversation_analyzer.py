@@ -1,13 +1,26 @@
 """
 Adapter retained for backward compatibility. Delegates to the new orchestrator pipeline.
+
+/analyze only reports the phase and recommendation, so it runs the pipeline in
+analyze-only mode: one analyzer call, no KB retrieval or prompt assembly.
+analyze_many classifies a batch of threads (POST /analyze/bulk) with bounded
+concurrency, which keeps dashboard-wide phase refreshes to one request.
 """
 
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from config import Config
 from ingest import build_conversation
 from orchestrator import run_pipeline
+from usage import usage_scope
 
 
-def analyze_conversation_state(messages: List[Dict[str, Any]], prospect_name: str = "") -> Dict[str, Any]:
+def analyze_conversation_state(
+    messages: List[Dict[str, Any]],
+    prospect_name: str = "",
+    thread_id: Optional[str] = None,
+) -> Dict[str, Any]:
     if not messages:
         return {
             "phase": "building_rapport",
@@ -27,6 +40,7 @@ def analyze_conversation_state(messages: List[Dict[str, Any]], prospect_name: st
     thread_data = {
         "title": f"Conversation with {prospect_name}" if prospect_name else "Conversation",
         "description": None,
+        "thread_id": thread_id,
         "participants": [
             {"id": "you", "name": "You", "role": "you"},
             {"id": "prospect", "name": prospect_name or "Prospect", "role": "prospect"},
@@ -34,7 +48,8 @@ def analyze_conversation_state(messages: List[Dict[str, Any]], prospect_name: st
     }
 
     conv = build_conversation(thread_data, messages)
-    result = run_pipeline(conv)
+    with usage_scope(thread_id=thread_id):
+        result = run_pipeline(conv, analyze_only=True)
 
     # Map to legacy structure for backward compatibility
     # Note: sentiment_score and engagement_score are now hardcoded to 0.0 since we use pure agentic decision
@@ -54,3 +69,23 @@ def analyze_conversation_state(messages: List[Dict[str, Any]], prospect_name: st
     }
 
 
+def _analyze_thread(thread: Dict[str, Any]) -> Dict[str, Any]:
+    thread_id = thread.get("thread_id")
+    try:
+        state = analyze_conversation_state(thread.get("messages") or [], thread.get("prospect_name", ""), thread_id)
+    except Exception as e:
+        if Config.DEBUG:
+            print(f"[Analyze] Thread {thread_id} failed: {e}")
+        return {"thread_id": thread_id, "error": str(e)}
+    return {"thread_id": thread_id, **state}
+
+
+def analyze_many(threads: List[Dict[str, Any]], concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Analyze each thread ({"thread_id", "prospect_name", "messages"}) and return
+    the results in input order. A failed thread gets {"thread_id", "error"}
+    instead of failing the batch.
+    """
+    workers = max(1, min(concurrency or Config.ANALYZE_BULK_CONCURRENCY, len(threads)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analyze") as pool:
+        return list(pool.map(_analyze_thread, threads))
@@ -0,0 +1,370 @@
+"""
+Incremental conversation sync: merge newly scraped messages into a stored thread.
+
+The extension used to fetch the whole stored row, merge message arrays in the
+browser and PATCH the complete `messages` array back. The payload grew with
+thread length, and concurrent scrapes overwrote each other.
+
+Here the stored side is read as `message_hashes`, one md5(sender|text) per
+message, kept current by a trigger (migration_add_conversation_sync.sql).
+The merge is a linear pass over the hashes (KMP), and a normal sync writes
+only the new suffix through the `append_conversation_messages` RPC. That RPC
+also checks the expected message count, so two racing scrapes cannot both
+append from the same base. The caller gets the canonical index of every
+message it sent, so later scrapes only need to upload what is new. The
+thread's feature record (thread_features.py) is folded forward over the
+appended messages and stored in the same row.
+
+Merge outcomes:
+  created     - no stored row yet, so the messages are inserted as-is
+  unchanged   - every scraped message is already stored, in order
+  appended    - the scrape overlaps the stored tail (or not at all) and the
+                rest is appended
+  rewritten   - the scrape holds older history in front of the stored head
+                (the user scrolled up), or a stored message was deleted or
+                edited since, so the full array is replaced
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import Config
+from thread_features import ThreadFeatures, get_feature_store
+
+# Conversation columns the extension may update alongside messages
+SYNC_FIELDS = ("title", "url", "description", "status", "phase", "placeholders")
+
+# Optimistic-concurrency retries when another writer changed the row meanwhile
+MAX_SYNC_ATTEMPTS = 3
+
+
+class SyncConflictError(RuntimeError):
+    """The stored conversation kept changing under the merge."""
+
+
+def normalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Same minimal message schema as SupabaseService.saveConversation (index is set on merge)."""
+    return {
+        "index": None,
+        "text": message.get("text") or "",
+        "sender": message.get("sender") or ("you" if message.get("isFromYou") else "prospect"),
+        "attachments": message.get("attachments") if isinstance(message.get("attachments"), list) else [],
+        "reactions": message.get("reactions") if isinstance(message.get("reactions"), list) else [],
+        "mentions": message.get("mentions") if isinstance(message.get("mentions"), list) else [],
+        "links": message.get("links") if isinstance(message.get("links"), list) else [],
+    }
+
+
+def message_hash(message: Dict[str, Any]) -> str:
+    """md5 of "sender|text" (the trigger computes the same value in SQL)."""
+    return hashlib.md5(f"{message.get('sender') or ''}|{message.get('text') or ''}".encode("utf-8")).hexdigest()
+
+
+def _failure_table(pattern: Sequence[str]) -> List[int]:
+    """KMP failure function: longest proper prefix of pattern[:i+1] that is also its suffix."""
+    table = [0] * len(pattern)
+    k = 0
+    for i in range(1, len(pattern)):
+        while k and pattern[i] != pattern[k]:
+            k = table[k - 1]
+        if pattern[i] == pattern[k]:
+            k += 1
+        table[i] = k
+    return table
+
+
+def _scan(pattern: Sequence[str], text: Sequence[str]):
+    """
+    Run KMP of `pattern` over `text`.
+
+    Returns (last full-match end position or -1, length of the longest
+    prefix of pattern that is a suffix of text). The last match is the one
+    nearest the stored tail, which matters when short messages ("ok") repeat.
+    """
+    if not pattern:
+        return 0, 0
+    table = _failure_table(pattern)
+    k = 0
+    found = -1
+    for i, item in enumerate(text):
+        while k and item != pattern[k]:
+            k = table[k - 1]
+        if item == pattern[k]:
+            k += 1
+        if k == len(pattern):
+            found = i + 1
+            k = table[k - 1]
+    return found, k
+
+
+@dataclass
+class MergePlan:
+    """How scraped messages relate to the stored hashes."""
+    action: str
+    indices: List[int]
+    append: List[int] = field(default_factory=list)  # scraped positions to append
+    prepend: int = 0  # rewritten: number of older scraped messages placed before the stored ones
+    replace: List[int] = field(default_factory=list)  # anchored rewrite: scraped positions replacing stored ones
+    # Anchored rewrite: the merged thread as ("stored", i) / ("scraped", j) entries
+    layout: Optional[List[Tuple[str, int]]] = None
+
+    @property
+    def written(self) -> int:
+        return len(self.append) + self.prepend + len(self.replace)
+
+
+def _longest_common_run(stored: Sequence[str], scraped: Sequence[str]) -> Tuple[int, int, int]:
+    """
+    (stored start, scraped start, length) of the longest run the two share;
+    ties go to the run nearest the stored tail. O(len(stored) * len(scraped)).
+    """
+    best = (0, 0, 0)
+    previous = [0] * (len(scraped) + 1)
+    for i, item in enumerate(stored):
+        current = [0] * (len(scraped) + 1)
+        for j, other in enumerate(scraped):
+            if item == other:
+                current[j + 1] = previous[j] + 1
+                if current[j + 1] >= best[2]:
+                    best = (i + 1 - current[j + 1], j + 1 - current[j + 1], current[j + 1])
+        previous = current
+    return best
+
+
+def _anchored_plan(stored: Sequence[str], scraped: Sequence[str]) -> Optional[MergePlan]:
+    """
+    Align the scrape on its longest common run with the stored messages. The
+    scrape is what the thread shows now, so where it covers a stored position
+    with a different hash (a message deleted or edited since) it replaces it.
+    Older scraped messages go in front, newer ones at the end.
+    """
+    stored_start, scraped_start, length = _longest_common_run(stored, scraped)
+    if not length:
+        return None
+    n, m = len(stored), len(scraped)
+    offset = stored_start - scraped_start  # scraped[j] lines up with stored[j + offset]
+    first = min(0, offset)
+    layout: List[Tuple[str, int]] = []
+    replace: List[int] = []
+    append: List[int] = []
+    for position in range(first, max(n, m + offset)):
+        j = position - offset
+        if 0 <= j < m:
+            layout.append(("scraped", j))
+            if position >= n:
+                append.append(j)
+            elif position >= 0 and stored[position] != scraped[j]:
+                replace.append(j)
+        else:
+            layout.append(("stored", position))
+    return MergePlan(
+        "rewritten",
+        [j + offset - first for j in range(m)],
+        append=append,
+        prepend=-first,
+        replace=replace,
+        layout=layout,
+    )
+
+
+def plan_merge(stored: Sequence[str], scraped: Sequence[str]) -> MergePlan:
+    """
+    Merge plan for scraped message hashes against stored ones, in
+    O(len(stored) + len(scraped)). Only a scrape that overlaps without lining
+    up (a message deleted or edited since) falls back to the quadratic anchored merge.
+    """
+    n, m = len(stored), len(scraped)
+    if not n:
+        return MergePlan("created" if m else "unchanged", list(range(m)), append=list(range(m)))
+    if not m:
+        return MergePlan("unchanged", [])
+
+    # Scrape already stored in order (e.g. re-opening a thread with no news)
+    end, tail_overlap = _scan(scraped, stored)
+    if end >= 0:
+        return MergePlan("unchanged", list(range(end - m, end)))
+
+    # The stored tail is a prefix of the scrape: append the rest
+    if tail_overlap:
+        start = n - tail_overlap
+        return MergePlan(
+            "appended",
+            list(range(start, start + m)),
+            append=list(range(tail_overlap, m)),
+        )
+
+    # Older history in front of the stored head (scrolled up): older + stored (+ newer)
+    covered_end, head_overlap = _scan(stored, scraped)
+    if covered_end >= 0:
+        older = covered_end - n
+        return MergePlan(
+            "rewritten",
+            list(range(m)),
+            append=list(range(covered_end, m)),
+            prepend=older,
+        )
+    if head_overlap:
+        older = m - head_overlap
+        return MergePlan("rewritten", list(range(m)), prepend=older)
+
+    # Overlap broken by a message deleted or edited since it was stored: replace it in place
+    anchored = _anchored_plan(stored, scraped)
+    if anchored is not None:
+        return anchored
+
+    # No overlap: keep the stored messages and append the scrape (like saveConversation)
+    return MergePlan("appended", list(range(n, n + m)), append=list(range(m)))
+
+
+def _reindexed(messages: List[Dict[str, Any]], start: int) -> List[Dict[str, Any]]:
+    return [{**message, "index": start + i} for i, message in enumerate(messages)]
+
+
+def sync_conversation(
+    thread_id: str,
+    messages: List[Dict[str, Any]],
+    fields: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Merge scraped `messages` (oldest first) into the stored thread.
+
+    Returns {"thread_id", "action", "appended", "message_count", "indices"},
+    where indices[i] is the canonical index of messages[i].
+    """
+    from knowledge_base import _get_supabase
+
+    supabase = _get_supabase()
+    scraped = [normalize_message(message) for message in messages]
+    scraped_hashes = [message_hash(message) for message in scraped]
+    fields = {key: value for key, value in (fields or {}).items() if key in SYNC_FIELDS}
+
+    columns = "thread_id, message_count, message_hashes" + (", features" if Config.THREAD_FEATURES_PERSIST else "")
+
+    for attempt in range(MAX_SYNC_ATTEMPTS):
+        rows = (
+            supabase.table("conversations")
+            .select(columns)
+            .eq("thread_id", thread_id)
+            .limit(1)
+            .execute()
+        ).data or []
+
+        if not rows:
+            features = _features_for(None, scraped)
+            payload = {
+                "thread_id": thread_id,
+                "messages": _reindexed(scraped, 0),
+                "message_count": len(scraped),
+                "status": "unknown",
+                "phase": "building_rapport",
+                "placeholders": {},
+                **fields,
+            }
+            if Config.THREAD_FEATURES_PERSIST:
+                payload["features"] = features.to_dict()
+            try:
+                supabase.table("conversations").insert(payload, returning="minimal").execute()
+            except Exception as e:
+                # A concurrent scrape created the row first - merge against it instead
+                if attempt + 1 < MAX_SYNC_ATTEMPTS and "duplicate" in str(e).lower():
+                    continue
+                raise
+            get_feature_store().put(thread_id, features)
+            plan = plan_merge([], scraped_hashes)
+            return _result(thread_id, plan, len(scraped), len(scraped))
+
+        stored_hashes = rows[0].get("message_hashes") or []
+        stored_count = rows[0].get("message_count")
+        if stored_count is None:
+            stored_count = len(stored_hashes)
+        plan = plan_merge(stored_hashes, scraped_hashes)
+        features = None
+
+        if plan.action == "rewritten":
+            total, features = _rewrite(supabase, thread_id, scraped, plan, stored_count)
+        elif plan.append:
+            suffix = _reindexed([scraped[i] for i in plan.append], stored_count)
+            stored_features = ThreadFeatures.from_dict(rows[0].get("features"))
+            if stored_features is not None and stored_features.message_count == stored_count:
+                # Fold in only the appended messages
+                features = _features_for(stored_features, suffix)
+            total = (
+                supabase.rpc(
+                    "append_conversation_messages",
+                    {"p_thread_id": thread_id, "p_expected_count": stored_count, "p_messages": suffix},
+                ).execute()
+            ).data
+        else:
+            total = stored_count
+
+        if total is None or total < 0:
+            if Config.DEBUG:
+                print(f"[Sync] {thread_id} changed during merge (attempt {attempt + 1}), retrying")
+            continue
+        updates = dict(fields)
+        if features is not None:
+            get_feature_store().put(thread_id, features)
+            if Config.THREAD_FEATURES_PERSIST:
+                # A record that lags a concurrent append is still valid: readers fold the rest
+                updates["features"] = features.to_dict()
+        if updates:
+            supabase.table("conversations").update(updates, returning="minimal").eq("thread_id", thread_id).execute()
+        return _result(thread_id, plan, plan.written, total)
+
+    raise SyncConflictError(f"Conversation {thread_id} kept changing during sync")
+
+
+def _features_for(features: Optional[ThreadFeatures], messages: List[Dict[str, Any]]) -> ThreadFeatures:
+    """`features` (or a fresh record) extended with `messages`, leaving the original untouched."""
+    base = ThreadFeatures.from_dict(features.to_dict()) if features is not None else ThreadFeatures()
+    return base.extend((message["sender"], message["text"]) for message in messages)
+
+
+def _rewrite(
+    supabase, thread_id: str, scraped: List[Dict[str, Any]], plan: MergePlan, stored_count: int
+) -> Tuple[int, Optional[ThreadFeatures]]:
+    """
+    Replace the messages with the plan's layout (default: older scraped + stored
+    + newer scraped), guarded by the stored count.
+    """
+    stored = (
+        supabase.table("conversations").select("messages").eq("thread_id", thread_id).limit(1).execute()
+    ).data or [{}]
+    stored_messages = list(stored[0].get("messages") or [])
+    if plan.layout is not None:
+        if len(stored_messages) != stored_count:
+            return -1, None
+        merged = [stored_messages[i] if side == "stored" else scraped[i] for side, i in plan.layout]
+    else:
+        merged = scraped[:plan.prepend] + stored_messages + [scraped[i] for i in plan.append]
+    merged = _reindexed(merged, 0)
+    # Set like append_conversation_messages does: the last_activity_at trigger copies it
+    updates = {
+        "messages": merged,
+        "message_count": len(merged),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    response = (
+        supabase.table("conversations")
+        .update(updates, count="exact", returning="minimal")
+        .eq("thread_id", thread_id)
+        .eq("message_count", stored_count)
+        .execute()
+    )
+    if not response.count:
+        return -1, None
+    return len(merged), _features_for(None, merged)
+
+
+def _result(thread_id: str, plan: MergePlan, written: int, total: int) -> Dict[str, Any]:
+    if Config.DEBUG:
+        print(f"[Sync] {thread_id}: {plan.action}, {written} written, {total} total")
+    return {
+        "thread_id": thread_id,
+        "action": plan.action,
+        "appended": written,
+        "message_count": total,
+        "indices": plan.indices,
+    }
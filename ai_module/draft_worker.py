@@ -0,0 +1,261 @@
+"""
+Background worker that pre-generates drafts for threads awaiting a reply.
+
+It polls the Supabase `conversations` table (or a local JSON stand-in) for
+threads whose latest message is from the prospect and that have no draft for
+their current state, then runs the full pipeline with bounded concurrency and
+pacing so the draft is ready when the thread is opened. Drafts are keyed by a
+conversation fingerprint, so any new message invalidates them.
+
+Drafts are kept in the persistent draft store (drafts.py), so the worker
+can run inside the API process:
+  DRAFT_WORKER_ENABLED=true python main.py
+The standalone entry point is for smoke-testing a source:
+  python draft_worker.py --once --source rows.json
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from config import Config
+from drafts import SOURCE_WORKER, DraftStore, awaiting_reply, get_draft_store
+from generation import request_fingerprint, run_generation
+from response_generator import prompt_version
+
+SELLING_PHASES = ("doing_the_ask", "post_selling")
+
+
+class SupabaseConversationSource:
+    """Reads recently updated rows from the Supabase `conversations` table."""
+
+    def fetch(self, limit: int) -> List[Dict[str, Any]]:
+        from knowledge_base import _get_supabase
+
+        response = (
+            _get_supabase()
+            .table("conversations")
+            .select("thread_id, title, phase, placeholders, messages, updated_at")
+            .order("updated_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data or []
+
+
+class LocalConversationSource:
+    """Reads conversation rows from a JSON file (a list of `conversations` rows)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def fetch(self, limit: int) -> List[Dict[str, Any]]:
+        with open(self.path, "r", encoding="utf-8") as fh:
+            rows = json.load(fh)
+        rows.sort(key=lambda r: r.get("updated_at") or "", reverse=True)
+        return rows[:limit]
+
+
+def source_from_config(source: Optional[str] = None):
+    source = source or Config.DRAFT_WORKER_SOURCE
+    if not source or source == "supabase":
+        return SupabaseConversationSource()
+    return LocalConversationSource(source)
+
+
+def row_to_request(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the /generate body the extension would send for this conversation row."""
+    messages = sorted(row.get("messages") or [], key=lambda m: m.get("index") or 0)
+    placeholders = row.get("placeholders") or {}
+    title = row.get("title") or ""
+    phase = row.get("phase") or "building_rapport"
+    return {
+        "thread_id": row.get("thread_id"),
+        "prospect_name": placeholders.get("name") or title or "Unknown",
+        "title": title,
+        "description": "",
+        "messages": [{"sender": m.get("sender"), "text": m.get("text", "")} for m in messages if m.get("text")],
+        "current_phase": phase,
+        # Mirrors popup.js: a manually selected selling phase is always confirmed
+        "confirm_phase_change": True if phase in SELLING_PHASES else None,
+    }
+
+
+def within_active_hours(spec: str, now: Optional[datetime] = None) -> bool:
+    """Check a "start-end" local-hour window such as "22-7"; empty means always active."""
+    if not spec:
+        return True
+    start, _, end = spec.partition("-")
+    hour = (now or datetime.now()).hour
+    start_hour, end_hour = int(start), int(end or start)
+    if start_hour <= end_hour:
+        return start_hour <= hour < end_hour
+    return hour >= start_hour or hour < end_hour
+
+
+class DraftWorker:
+    """Polls for threads awaiting a reply and pre-generates their drafts."""
+
+    def __init__(
+        self,
+        source=None,
+        store: Optional[DraftStore] = None,
+        concurrency: Optional[int] = None,
+        poll_seconds: Optional[float] = None,
+        min_interval_seconds: Optional[float] = None,
+        active_hours: Optional[str] = None,
+        scan_limit: Optional[int] = None,
+    ):
+        self.source = source or source_from_config()
+        self.store = store or get_draft_store()
+        self.concurrency = concurrency or Config.DRAFT_WORKER_CONCURRENCY
+        self.poll_seconds = poll_seconds if poll_seconds is not None else Config.DRAFT_WORKER_POLL_SECONDS
+        self.min_interval_seconds = (
+            min_interval_seconds if min_interval_seconds is not None else Config.DRAFT_WORKER_MIN_INTERVAL_SECONDS
+        )
+        self.active_hours = active_hours if active_hours is not None else Config.DRAFT_WORKER_ACTIVE_HOURS
+        self.scan_limit = scan_limit or Config.DRAFT_WORKER_SCAN_LIMIT
+
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="draft-worker")
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._in_flight: Set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.generated = 0
+        self.failed = 0
+
+    def start(self) -> "DraftWorker":
+        self._thread = threading.Thread(target=self._loop, name="draft-worker-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_seconds + 1)
+        self._pool.shutdown(wait=wait)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if within_active_hours(self.active_hours):
+                    self.run_once()
+            except Exception as e:
+                print(f"[DraftWorker] Poll failed: {e}")
+            self._stop.wait(self.poll_seconds)
+
+    def candidates(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Requests for threads awaiting a reply that have no draft for their current state."""
+        pending = []
+        for row in rows:
+            body = row_to_request(row)
+            thread_id = body["thread_id"]
+            if not thread_id or not body["messages"]:
+                continue
+            fingerprint = request_fingerprint(body)
+            # A new message landed since the last draft - drop it right away
+            self.store.invalidate(thread_id, fingerprint)
+            if not awaiting_reply(body["messages"]):
+                continue
+            if not self.store.needs_draft(thread_id, fingerprint, prompt_version()):
+                continue
+            with self._lock:
+                if thread_id in self._in_flight:
+                    continue
+            pending.append(body)
+        return pending
+
+    def run_once(self) -> int:
+        """Scan once and submit pre-generation jobs; returns how many were submitted."""
+        submitted = 0
+        for body in self.candidates(self.source.fetch(self.scan_limit)):
+            if self._stop.is_set() or not within_active_hours(self.active_hours):
+                break
+            # Bounded concurrency: wait for a free slot before submitting
+            self._slots.acquire()
+            with self._lock:
+                self._in_flight.add(body["thread_id"])
+            self._pool.submit(self._generate, body)
+            submitted += 1
+            # Pace submissions so bulk pre-generation never bursts the provider limits
+            if self.min_interval_seconds:
+                self._stop.wait(self.min_interval_seconds)
+        return submitted
+
+    def _generate(self, body: Dict[str, Any]):
+        thread_id = body["thread_id"]
+        try:
+            start = time.time()
+            payload, status_code = run_generation(body)
+            if status_code == 200 and not payload.get("response"):
+                self.failed += 1
+                return
+            self.store.put(
+                thread_id, request_fingerprint(body), payload, status_code, prompt_version(), source=SOURCE_WORKER
+            )
+            self.generated += 1
+            if Config.DEBUG:
+                print(f"[DraftWorker] Pre-generated draft for {thread_id} in {time.time() - start:.2f}s")
+        except Exception as e:
+            self.failed += 1
+            print(f"[DraftWorker] Failed to pre-generate draft for {thread_id}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(thread_id)
+            self._slots.release()
+
+    def drain(self):
+        """Block until all submitted jobs finished."""
+        for _ in range(self.concurrency):
+            self._slots.acquire()
+        for _ in range(self.concurrency):
+            self._slots.release()
+
+
+_worker: Optional[DraftWorker] = None
+
+
+def start_background_worker() -> Optional[DraftWorker]:
+    """Start the process-wide worker when DRAFT_WORKER_ENABLED is set."""
+    global _worker
+    if not Config.DRAFT_WORKER_ENABLED or _worker is not None:
+        return _worker
+    _worker = DraftWorker().start()
+    print(
+        f"[DraftWorker] Started (source={Config.DRAFT_WORKER_SOURCE}, "
+        f"concurrency={_worker.concurrency}, poll={_worker.poll_seconds}s)"
+    )
+    return _worker
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate drafts for threads awaiting a reply")
+    parser.add_argument("--source", help="'supabase' or a JSON file of conversation rows")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    parser.add_argument("--concurrency", type=int)
+    args = parser.parse_args(argv)
+
+    worker = DraftWorker(source=source_from_config(args.source), concurrency=args.concurrency)
+    if args.once:
+        submitted = worker.run_once()
+        worker.drain()
+        worker.stop()
+        print(f"Submitted {submitted} jobs: {worker.generated} drafts generated, {worker.failed} failed")
+        return 0
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop(wait=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
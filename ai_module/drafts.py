@@ -0,0 +1,261 @@
+"""
+Persistent draft store keyed by thread and conversation fingerprint.
+
+Every draft /generate writes (or the background worker pre-generates) is kept
+in SQLite (DRAFT_STORE_PATH) with its phase, reasoning and the writer's
+prompt version. Reopening the popup on an unchanged thread then gets the
+stored draft instantly instead of paying for the analyzer and writer again.
+The store survives restarts and is shared by every gunicorn worker.
+
+A draft is only served for the exact conversation state and prompt version
+it was generated from. Any new message (or a different phase/approval input)
+changes the fingerprint, and a lookup with a different fingerprint drops the
+stale draft. Drafts older than DRAFT_TTL_SECONDS are dropped, and beyond
+DRAFT_STORE_MAX_ENTRIES the least recently used ones are.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import metrics
+from config import Config
+
+DELETED_MESSAGE_TEXT = "This message has been deleted."
+
+
+def conversation_fingerprint(
+    messages: List[Dict[str, Any]],
+    current_phase: Optional[str] = None,
+    confirm_phase_change: Optional[bool] = None,
+) -> str:
+    """Hash the inputs that determine a draft: message senders/texts plus phase-gate flags."""
+    digest = hashlib.sha256()
+    digest.update(f"{current_phase or 'building_rapport'}|{confirm_phase_change}".encode("utf-8"))
+    for msg in messages:
+        digest.update(b"\x1e")
+        digest.update(f"{msg.get('sender', '')}\x1f{(msg.get('text') or '').strip()}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def awaiting_reply(messages: List[Dict[str, Any]]) -> bool:
+    """True when the latest non-deleted message is from the prospect."""
+    for msg in reversed(messages):
+        if (msg.get("text") or "").strip() == DELETED_MESSAGE_TEXT:
+            continue
+        return msg.get("sender") == "prospect"
+    return False
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drafts (
+    thread_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    phase TEXT,
+    reasoning TEXT,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    served INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS drafts_used_at ON drafts (used_at);
+CREATE INDEX IF NOT EXISTS drafts_created_at ON drafts (created_at);
+"""
+
+# Where a draft came from
+SOURCE_REQUEST = "request"
+SOURCE_WORKER = "worker"
+
+
+@dataclass
+class Draft:
+    """A stored /generate payload for one conversation state."""
+    thread_id: str
+    fingerprint: str
+    prompt_version: str
+    payload: Dict[str, Any]
+    status_code: int
+    phase: Optional[str]
+    reasoning: Optional[str]
+    source: str
+    created_at: float
+    used_at: float
+    served: int = 0
+
+
+def _row_to_draft(row: sqlite3.Row) -> Draft:
+    return Draft(
+        thread_id=row["thread_id"],
+        fingerprint=row["fingerprint"],
+        prompt_version=row["prompt_version"],
+        payload=json.loads(row["payload"]),
+        status_code=row["status_code"],
+        phase=row["phase"],
+        reasoning=row["reasoning"],
+        source=row["source"],
+        created_at=row["created_at"],
+        used_at=row["used_at"],
+        served=row["served"],
+    )
+
+
+class DraftStore:
+    """SQLite-backed store of the latest draft per thread."""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.db_path = db_path or Config.DRAFT_STORE_PATH
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.DRAFT_TTL_SECONDS
+        self.max_entries = max_entries if max_entries is not None else Config.DRAFT_STORE_MAX_ENTRIES
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    def _stale(self, draft: Draft, fingerprint: str, prompt_version: Optional[str], now: float) -> bool:
+        return (
+            draft.fingerprint != fingerprint
+            or (prompt_version is not None and draft.prompt_version != prompt_version)
+            or (bool(self.ttl_seconds) and now - draft.created_at > self.ttl_seconds)
+        )
+
+    def _load(self, thread_id: str) -> Optional[Draft]:
+        row = self._db.execute("SELECT * FROM drafts WHERE thread_id = ?", (thread_id,)).fetchone()
+        return _row_to_draft(row) if row else None
+
+    def get(self, thread_id: str, fingerprint: str, prompt_version: Optional[str] = None) -> Optional[Draft]:
+        """Return the draft for this exact conversation state (and prompt version), dropping it if stale."""
+        now = time.time()
+        with self._lock, self._db:
+            draft = self._load(thread_id)
+            if draft is None:
+                metrics.increment("drafts.misses")
+                return None
+            if self._stale(draft, fingerprint, prompt_version, now):
+                self._db.execute("DELETE FROM drafts WHERE thread_id = ?", (thread_id,))
+                metrics.increment("drafts.invalidations")
+                metrics.increment("drafts.misses")
+                return None
+            self._db.execute(
+                "UPDATE drafts SET used_at = ?, served = served + 1 WHERE thread_id = ?", (now, thread_id)
+            )
+        draft.used_at, draft.served = now, draft.served + 1
+        metrics.increment("drafts.hits")
+        return draft
+
+    def needs_draft(self, thread_id: str, fingerprint: str, prompt_version: Optional[str] = None) -> bool:
+        """True when no current draft is stored for this conversation state."""
+        with self._lock:
+            draft = self._load(thread_id)
+        return draft is None or self._stale(draft, fingerprint, prompt_version, time.time())
+
+    def put(
+        self,
+        thread_id: str,
+        fingerprint: str,
+        payload: Dict[str, Any],
+        status_code: int,
+        prompt_version: str = "",
+        source: str = SOURCE_REQUEST,
+    ) -> Draft:
+        """Store (or replace) the thread's draft, then garbage-collect."""
+        now = time.time()
+        draft = Draft(
+            thread_id=thread_id,
+            fingerprint=fingerprint,
+            prompt_version=prompt_version,
+            payload=payload,
+            status_code=status_code,
+            phase=payload.get("phase") or payload.get("suggested_phase"),
+            reasoning=payload.get("reasoning"),
+            source=source,
+            created_at=now,
+            used_at=now,
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO drafts (thread_id, fingerprint, prompt_version, payload, status_code, "
+                "phase, reasoning, source, created_at, used_at, served) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    thread_id, fingerprint, prompt_version, json.dumps(payload), status_code,
+                    draft.phase, draft.reasoning, source, now, now,
+                ),
+            )
+        metrics.increment("drafts.stored")
+        self.gc()
+        return draft
+
+    def invalidate(self, thread_id: str, fingerprint: Optional[str] = None) -> bool:
+        """Drop the thread's draft (only if it no longer matches `fingerprint`, when given)."""
+        with self._lock, self._db:
+            if fingerprint is None:
+                deleted = self._db.execute("DELETE FROM drafts WHERE thread_id = ?", (thread_id,)).rowcount
+            else:
+                deleted = self._db.execute(
+                    "DELETE FROM drafts WHERE thread_id = ? AND fingerprint != ?", (thread_id, fingerprint)
+                ).rowcount
+        if deleted:
+            metrics.increment("drafts.invalidations")
+        return bool(deleted)
+
+    def gc(self) -> int:
+        """Delete drafts older than the TTL, then the least recently used beyond max_entries."""
+        deleted = 0
+        with self._lock, self._db:
+            if self.ttl_seconds:
+                deleted += self._db.execute(
+                    "DELETE FROM drafts WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+            if self.max_entries:
+                deleted += self._db.execute(
+                    "DELETE FROM drafts WHERE thread_id IN "
+                    "(SELECT thread_id FROM drafts ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+        if deleted:
+            metrics.increment("drafts.evicted", deleted)
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0), COALESCE(SUM(served), 0) FROM drafts"
+            ).fetchone()
+        return {"drafts": row[0], "payload_bytes": row[1], "served": row[2]}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[DraftStore] = None
+_store_pid: Optional[int] = None
+_store_lock = threading.Lock()
+
+
+def get_draft_store() -> DraftStore:
+    """
+    The process-wide store, shared by the /generate endpoint and the background
+    worker. Reopened after a fork: SQLite connections must not cross processes.
+    """
+    global _store, _store_pid
+    with _store_lock:
+        if _store is None or _store_pid != os.getpid():
+            _store = DraftStore()
+            _store_pid = os.getpid()
+            metrics.register_gauge("drafts.count", lambda: get_draft_store().stats()["drafts"])
+        return _store
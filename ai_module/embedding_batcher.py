@@ -0,0 +1,171 @@
+"""
+Process-wide micro-batcher for embedding requests.
+
+Concurrent requests each used to send their own `embeddings.create` call.
+The batcher collects texts for up to EMBEDDING_BATCH_WINDOW_MS (or until
+EMBEDDING_BATCH_MAX_SIZE texts are waiting), sends one request with list
+input and hands each caller its vector. Identical texts in a batch are
+embedded once. Up to EMBEDDING_BATCH_MAX_IN_FLIGHT batches run at a time,
+so a slow request does not hold back the next batch.
+
+Callers block with `embed()` / `embed_many()` from threads, or await
+`embed_async()` from asyncio code.
+
+A batch runs on a pool thread, outside the callers' usage scopes. With a
+`record_fn`, each submit captures its caller's context and the batch's usage
+is recorded once per caller, inside that caller's context, in proportion to
+the share of the batch its texts made up.
+"""
+
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from config import Config
+
+_STOP = object()
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding calls from many threads/tasks into batched requests.
+
+    `embed_fn(texts)` returns the vectors, or `(vectors, usage)` when
+    `record_fn(usage, share, latency_ms)` is given to attribute the usage.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], Any],
+        window_ms: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        record_fn: Optional[Callable[[Any, float, float], None]] = None,
+    ):
+        self.embed_fn = embed_fn
+        self.record_fn = record_fn
+        self.window_seconds = (window_ms if window_ms is not None else Config.EMBEDDING_BATCH_WINDOW_MS) / 1000.0
+        self.max_batch = max_batch or Config.EMBEDDING_BATCH_MAX_SIZE
+        max_in_flight = max_in_flight or Config.EMBEDDING_BATCH_MAX_IN_FLIGHT
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embedding-batch")
+        self._thread = threading.Thread(target=self._collect, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------ #
+    # Callers
+    # ------------------------------------------------------------------ #
+
+    def submit(self, text: str, context: Optional[contextvars.Context] = None) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future, context or contextvars.copy_context()))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        return self.submit(text).result(timeout=timeout)
+
+    def embed_many(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """Queue all texts at once so they share a batch (with any concurrent callers)."""
+        context = contextvars.copy_context()
+        futures = [self.submit(text, context) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    async def embed_async(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stop(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+        self._pool.shutdown(wait=True)
+
+    # ------------------------------------------------------------------ #
+    # Batching loop
+    # ------------------------------------------------------------------ #
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch: List[Tuple[str, Future, contextvars.Context]] = [first]
+            deadline = time.monotonic() + self.window_seconds
+            stopping = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._pool.submit(self._flush, batch)
+            if stopping:
+                return
+
+    def _flush(self, batch: List[Tuple[str, Future, contextvars.Context]]):
+        unique_texts = list(dict.fromkeys(text for text, _, _ in batch))
+        metrics.increment("embeddings.requests", len(batch))
+        metrics.increment("embeddings.batches")
+        metrics.observe("embeddings.batch_size", len(batch))
+        start = time.time()
+        try:
+            result = self.embed_fn(unique_texts)
+            embeddings, usage = result if self.record_fn is not None else (result, None)
+            embeddings = list(embeddings)
+            if len(embeddings) != len(unique_texts):
+                raise ValueError(f"Embedding call returned {len(embeddings)} vectors for {len(unique_texts)} texts")
+            vectors = dict(zip(unique_texts, embeddings))
+            latency_ms = (time.time() - start) * 1000
+            metrics.observe("embeddings.batch_ms", latency_ms)
+            if self.record_fn is not None:
+                self._record(batch, usage, latency_ms)
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+        except Exception as e:
+            metrics.increment("embeddings.batch_errors")
+            # Fail every caller still waiting, rather than leaving it to time out
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _record(self, batch: List[Tuple[str, Future, contextvars.Context]], usage: Any, latency_ms: float):
+        """Record the batch's usage once per submitting context, weighted by the length of its texts."""
+        weights: Dict[int, List[Any]] = {}
+        for text, _, context in batch:
+            entry = weights.setdefault(id(context), [context, 0])
+            entry[1] += len(text) or 1
+        total = sum(weight for _, weight in weights.values())
+        for context, weight in weights.values():
+            try:
+                context.run(self.record_fn, usage, weight / total, latency_ms)
+            except Exception as e:
+                if Config.DEBUG:
+                    print(f"[Embeddings] Usage recording failed: {e}")
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+_batcher_pid: Optional[int] = None
+_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher(
+    embed_fn: Callable[[List[str]], Any],
+    record_fn: Optional[Callable[[Any, float, float], None]] = None,
+) -> EmbeddingBatcher:
+    """Return the process-wide batcher (recreated after a fork, whose threads do not survive)."""
+    global _batcher, _batcher_pid
+    with _batcher_lock:
+        if _batcher is None or _batcher_pid != os.getpid():
+            _batcher = EmbeddingBatcher(embed_fn, record_fn=record_fn)
+            _batcher_pid = os.getpid()
+        return _batcher
@@ -0,0 +1,353 @@
+"""
+Local, memory-mapped store of knowledge base embeddings.
+
+Vectors are kept in a compact on-disk layout so every worker process can map
+the same pages instead of loading full-precision copies:
+
+  <dir>/CURRENT                  name of the live generation
+  <dir>/<generation>/meta.json   dim, dtype, count, source model
+  <dir>/<generation>/ids.json    kb_documents ids, one per row
+  <dir>/<generation>/vectors.bin count x dim matrix (float32, float16 or int8)
+  <dir>/<generation>/scales.bin  per-vector float32 scale (int8 only)
+
+Only one process writes a store (under the pre-fork server, the worker
+elected by SERVER_BACKGROUND_LOCK_PATH; see serving.py). `create` builds a
+new generation in a temporary directory and swaps CURRENT to it, so workers
+still mapping the old files never see them change. `append` only grows the
+data files of the live generation, then replaces ids.json and meta.json.
+Readers map the `count` rows meta.json promises, and reopen the store when
+CURRENT is rewritten (`changed()`).
+
+`text-embedding-3-small` embeddings are Matryoshka-trained, so the leading
+dimensions carry most of the signal: vectors are truncated to `dim` and
+re-normalized before quantization.
+
+Build or refresh a store from Supabase (from ai_module/):
+  python embedding_store.py build --dim 512 --dtype int8
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import Config
+
+DTYPES = ("float32", "float16", "int8")
+CURRENT_FILE = "CURRENT"
+GENERATION_PREFIX = "gen-"
+# Files of a store written before generations, removed once one is live
+_LEGACY_FILES = ("meta.json", "ids.json", "vectors.bin", "scales.bin", "hnsw.npz")
+
+
+def _write_atomic(path: str, text: str):
+    """Replace `path` in one step, so a reader sees either the old or the new content."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    os.replace(tmp_path, path)
+
+
+def generation_path(path: str) -> str:
+    """Directory holding the live files of the store at `path` (the path itself for a pre-generation store)."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE), "r", encoding="utf-8") as fh:
+            return os.path.join(path, fh.read().strip())
+    except FileNotFoundError:
+        return path
+
+
+def store_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(generation_path(path), "meta.json"))
+
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    """Identity of CURRENT (a new inode on every swap or append), or None when there is none."""
+    try:
+        stat = os.stat(os.path.join(path, CURRENT_FILE))
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Keep the first `dim` components of each row and re-normalize to unit length."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    single = vectors.ndim == 1
+    if single:
+        vectors = vectors[None, :]
+    vectors = vectors[:, :dim]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    return vectors[0] if single else vectors
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Return (stored matrix, per-vector scales or None) for the given storage dtype."""
+    if dtype == "float32":
+        return vectors.astype(np.float32), None
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unsupported dtype '{dtype}' (expected one of {', '.join(DTYPES)})")
+
+
+class EmbeddingStore:
+    """Append-only, memory-mapped matrix of (optionally quantized) embeddings."""
+
+    def __init__(self, path: str):
+        self.root = path
+        # Taken before reading, so a swap while opening shows up in changed()
+        self.stamp = _stamp(path)
+        self.path = generation_path(path)
+        with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as fh:
+            self.meta: Dict[str, Any] = json.load(fh)
+        self.dim: int = self.meta["dim"]
+        self.dtype: str = self.meta["dtype"]
+        self._lock = threading.RLock()
+        self._map()
+
+    # ------------------------------------------------------------------ #
+    # Construction
+    # ------------------------------------------------------------------ #
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        ids: Sequence[Any],
+        vectors: Sequence[Sequence[float]],
+        dim: Optional[int] = None,
+        dtype: str = "float32",
+        model: str = "",
+    ) -> "EmbeddingStore":
+        """
+        Write a new generation of the store at `path` and make it the live one.
+        Processes that have the previous generation open keep reading it until
+        they reopen.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype '{dtype}' (expected one of {', '.join(DTYPES)})")
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        dim = min(dim or matrix.shape[1], matrix.shape[1])
+        stored, scales = quantize(truncate(matrix, dim), dtype) if len(ids) else (np.empty((0, dim)), None)
+
+        generation = f"{GENERATION_PREFIX}{time.time_ns():020d}"
+        build_dir = os.path.join(path, f".{generation}.tmp")
+        os.makedirs(build_dir)
+        np.ascontiguousarray(stored, dtype=np.dtype(dtype)).tofile(os.path.join(build_dir, "vectors.bin"))
+        if dtype == "int8":
+            (scales if scales is not None else np.empty(0, np.float32)).tofile(os.path.join(build_dir, "scales.bin"))
+        with open(os.path.join(build_dir, "ids.json"), "w", encoding="utf-8") as fh:
+            json.dump(list(ids), fh)
+        meta = {"dim": dim, "dtype": dtype, "count": len(ids), "model": model}
+        with open(os.path.join(build_dir, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+
+        os.replace(build_dir, os.path.join(path, generation))
+        _write_atomic(os.path.join(path, CURRENT_FILE), generation)
+        cls._prune(path, generation)
+        return cls(path)
+
+    @staticmethod
+    def _prune(path: str, current: str):
+        """Delete generations older than the previous one (a reader may still be opening that one)."""
+        generations = sorted(
+            name for name in os.listdir(path)
+            if name.startswith(GENERATION_PREFIX) and os.path.isdir(os.path.join(path, name))
+        )
+        keep = generations[max(0, generations.index(current) - 1):]
+        for name in generations:
+            if name not in keep:
+                # Open maps of deleted files stay valid until their process lets go
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+        for name in _LEGACY_FILES:
+            if os.path.isfile(os.path.join(path, name)):
+                os.remove(os.path.join(path, name))
+
+    def _map(self):
+        count = self.meta["count"]
+        vectors_path = os.path.join(self.path, "vectors.bin")
+        if count:
+            self.vectors = np.memmap(vectors_path, dtype=np.dtype(self.dtype), mode="r", shape=(count, self.dim))
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=np.dtype(self.dtype))
+        self.scales = None
+        if self.dtype == "int8":
+            self.scales = (
+                np.memmap(os.path.join(self.path, "scales.bin"), dtype=np.float32, mode="r", shape=(count,))
+                if count else np.empty(0, np.float32)
+            )
+        with open(os.path.join(self.path, "ids.json"), "r", encoding="utf-8") as fh:
+            # ids.json is replaced before meta.json, so it may already list rows appended since
+            self.ids: List[Any] = json.load(fh)[:count]
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def changed(self) -> bool:
+        """True once the writer has swapped in a new generation or appended rows since this store was opened."""
+        return _stamp(self.root) != self.stamp
+
+    def append(self, ids: Sequence[Any], vectors: Sequence[Sequence[float]]) -> List[int]:
+        """Add rows (e.g. from add_document) and return their row numbers. Only the writer process appends."""
+        if not ids:
+            return []
+        matrix = truncate(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1), self.dim)
+        stored, scales = quantize(matrix, self.dtype)
+        with self._lock:
+            start = self.meta["count"]
+            # Rows past `count` are invisible to readers, so the data files grow in place
+            with open(os.path.join(self.path, "vectors.bin"), "r+b") as fh:
+                fh.seek(start * self.dim * np.dtype(self.dtype).itemsize)
+                stored.tofile(fh)
+                fh.truncate()
+            if scales is not None:
+                with open(os.path.join(self.path, "scales.bin"), "r+b") as fh:
+                    fh.seek(start * 4)
+                    scales.tofile(fh)
+                    fh.truncate()
+            _write_atomic(os.path.join(self.path, "ids.json"), json.dumps(self.ids + list(ids)))
+            self.meta["count"] = start + len(ids)
+            _write_atomic(os.path.join(self.path, "meta.json"), json.dumps(self.meta))
+            # Rewriting CURRENT tells readers to reopen ("." for a pre-generation store)
+            _write_atomic(os.path.join(self.root, CURRENT_FILE), os.path.relpath(self.path, self.root))
+            self.stamp = _stamp(self.root)
+            self._map()
+            return list(range(start, start + len(ids)))
+
+    # ------------------------------------------------------------------ #
+    # Access
+    # ------------------------------------------------------------------ #
+
+    def row(self, doc_id: Any) -> Optional[int]:
+        return self._row_of.get(doc_id)
+
+    def prepare_query(self, query: Sequence[float]) -> np.ndarray:
+        """Truncate and normalize a full-size query embedding to the store's dimension."""
+        return truncate(np.asarray(query, dtype=np.float32), self.dim)
+
+    def dequantize(self, rows) -> np.ndarray:
+        """float32 copies of the given rows (a slice, index array or single row)."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            scales = np.asarray(self.scales[rows], dtype=np.float32)
+            vectors = vectors * (scales[..., None] if vectors.ndim > 1 else scales)
+        return vectors
+
+    def similarities(self, query: np.ndarray, rows=None, chunk_rows: int = 4096) -> np.ndarray:
+        """Cosine similarity of a prepared query against the given rows (default: all), chunked."""
+        if rows is not None:
+            return self.dequantize(rows) @ query
+        out = np.empty(len(self.ids), dtype=np.float32)
+        for start in range(0, len(self.ids), chunk_rows):
+            end = min(start + chunk_rows, len(self.ids))
+            block = np.asarray(self.vectors[start:end], dtype=np.float32) @ query
+            if self.scales is not None:
+                block *= self.scales[start:end]
+            out[start:end] = block
+        return out
+
+    def search(self, query: Sequence[float], k: int = 5, threshold: float = 0.0) -> List[Tuple[Any, float]]:
+        """Exact (brute-force) top-k over the store: [(doc_id, similarity), ...]."""
+        return self.search_many([query], k=k, threshold=threshold)[0]
+
+    def search_many(
+        self, queries: Sequence[Sequence[float]], k: int = 5, threshold: float = 0.0, chunk_rows: int = 4096
+    ) -> List[List[Tuple[Any, float]]]:
+        """Exact top-k for several queries in one pass over the vectors (one matrix product per chunk)."""
+        if not self.ids or not len(queries):
+            return [[] for _ in queries]
+        prepared = np.stack([self.prepare_query(query) for query in queries])
+        scores = np.empty((len(prepared), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), chunk_rows):
+            end = min(start + chunk_rows, len(self.ids))
+            block = np.asarray(self.vectors[start:end], dtype=np.float32) @ prepared.T
+            if self.scales is not None:
+                block *= self.scales[start:end, None]
+            scores[:, start:end] = block.T
+
+        k = min(k, len(self.ids))
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            results.append([(self.ids[row], float(row_scores[row])) for row in top if row_scores[row] >= threshold])
+        return results
+
+    def size_bytes(self) -> int:
+        return sum(
+            os.path.getsize(os.path.join(self.path, name))
+            for name in ("vectors.bin", "scales.bin", "ids.json", "meta.json")
+            if os.path.exists(os.path.join(self.path, name))
+        )
+
+
+def parse_embedding(value: Any) -> List[float]:
+    """pgvector columns come back from PostgREST as "[0.1,0.2,...]" strings."""
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value or [])
+
+
+def build_from_supabase(path: str, dim: Optional[int] = None, dtype: str = "float32", page_size: int = 500) -> EmbeddingStore:
+    """Download every kb_documents embedding and write a fresh store."""
+    from knowledge_base import EMBEDDING_MODEL, _get_supabase
+
+    supabase = _get_supabase()
+    ids: List[Any] = []
+    vectors: List[List[float]] = []
+    while True:
+        page = (
+            supabase.table("kb_documents")
+            .select("id, embedding")
+            .order("id")
+            .range(len(ids), len(ids) + page_size - 1)
+            .execute()
+        ).data or []
+        for row in page:
+            embedding = parse_embedding(row.get("embedding"))
+            if embedding:
+                ids.append(row["id"])
+                vectors.append(embedding)
+        if len(page) < page_size:
+            break
+    return EmbeddingStore.create(path, ids, vectors, dim=dim, dtype=dtype, model=EMBEDDING_MODEL)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the local KB embedding store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Rebuild the store from Supabase kb_documents")
+    build.add_argument("--path", default=Config.KB_EMBEDDING_STORE_PATH)
+    build.add_argument("--dim", type=int, default=Config.KB_EMBEDDING_DIM)
+    build.add_argument("--dtype", choices=DTYPES, default=Config.KB_EMBEDDING_DTYPE)
+    info = sub.add_parser("info", help="Print store metadata")
+    info.add_argument("--path", default=Config.KB_EMBEDDING_STORE_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        store = build_from_supabase(args.path, dim=args.dim, dtype=args.dtype)
+    else:
+        store = EmbeddingStore(args.path)
+    print(
+        f"{store.path}: {len(store)} vectors, dim={store.dim}, dtype={store.dtype}, "
+        f"{store.size_bytes() / 1024:.1f} KiB"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
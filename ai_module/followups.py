@@ -0,0 +1,159 @@
+"""
+Server-side follow-up candidates for the extension's follow-up panel.
+
+A candidate is a conversation where we sent the last message, nothing new has
+happened since before the end of last week, and no reminder has been sent yet.
+The query runs against the precomputed `last_sender` / `last_activity_at`
+columns and their partial index (migration_add_followup_candidates.sql).
+Only candidate rows are transferred, never message arrays, and each comes
+with its follow-up script already rendered.
+
+Pages use keyset pagination on (last_activity_at, thread_id). Marking
+threads as reminded between pages removes them from the result set, and
+keyset paging neither skips nor repeats rows when that happens.
+"""
+
+import base64
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import Config
+
+# Mirrors FollowUpService.FOLLOW_UP_SCRIPTS in follow_up.js
+FOLLOW_UP_SCRIPTS: Dict[str, str] = {
+    "unknown": "Hey {name}, it's been a while, and I wanted to reach out again on that last message.",
+    "interested": (
+        "Hey {name}, it's been a while, and I wanted to reach out again on that last message.\n"
+        "We're finalizing applications and starting interviews."
+    ),
+}
+
+CANDIDATE_COLUMNS = "thread_id, title, url, status, placeholders, last_activity_at"
+
+# PostgREST `in` filters travel in the URL, so large mark requests are chunked
+MARK_CHUNK_SIZE = 100
+
+
+def last_week_end(now: Optional[datetime] = None) -> datetime:
+    """End of the previous calendar week (Sunday 23:59:59.999, local time), like follow_up.js."""
+    now = now or datetime.now().astimezone()
+    this_monday = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    return this_monday - timedelta(milliseconds=1)
+
+
+def prospect_name(row: Dict[str, Any]) -> str:
+    """Name from placeholders, else from a "Lead: Name" title, else the title itself."""
+    name = (row.get("placeholders") or {}).get("name")
+    if name:
+        return name
+    title = (row.get("title") or "").strip()
+    if title:
+        match = re.match(r"Lead:\s*(.+)", title, re.IGNORECASE)
+        return match.group(1).strip() if match else title
+    return "there"
+
+
+def render_script(status: str, row: Dict[str, Any]) -> str:
+    template = FOLLOW_UP_SCRIPTS.get(status, "")
+    return template.replace("{name}", prospect_name(row)) if template else ""
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row.get("last_activity_at"), row.get("thread_id")]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> List[str]:
+    try:
+        last_activity_at, thread_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    return [last_activity_at, thread_id]
+
+
+def _quote(value: Any) -> str:
+    """Double-quote a value for a PostgREST logic-tree filter (thread ids may contain , . or =)."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def find_candidates(
+    statuses: Sequence[str] = ("unknown", "interested"),
+    before: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    One page of follow-up candidates, newest activity first.
+
+    Returns {"candidates": [...], "next_cursor": str or None}. Each candidate
+    has thread_id, status, name, script, title, url and last_activity_at.
+    """
+    from knowledge_base import _get_supabase
+
+    unknown = [status for status in statuses if status not in FOLLOW_UP_SCRIPTS]
+    if unknown:
+        raise ValueError(f"Unsupported status: {', '.join(unknown)}")
+    limit = max(1, min(limit or Config.FOLLOWUPS_PAGE_SIZE, Config.FOLLOWUPS_MAX_PAGE_SIZE))
+    before = before or last_week_end()
+
+    query = (
+        _get_supabase()
+        .table("conversations")
+        .select(CANDIDATE_COLUMNS)
+        .in_("status", list(statuses))
+        .eq("last_sender", "you")
+        .is_("reminded_at", "null")
+        .lte("last_activity_at", before.isoformat())
+    )
+    if cursor:
+        last_activity_at, thread_id = decode_cursor(cursor)
+        query = query.or_(
+            f"last_activity_at.lt.{_quote(last_activity_at)},"
+            f"and(last_activity_at.eq.{_quote(last_activity_at)},thread_id.lt.{_quote(thread_id)})"
+        )
+    # One extra row tells whether another page exists
+    rows = (
+        query.order("last_activity_at", desc=True).order("thread_id", desc=True).limit(limit + 1).execute()
+    ).data or []
+
+    page = rows[:limit]
+    candidates = [
+        {
+            "thread_id": row.get("thread_id"),
+            "status": row.get("status"),
+            "name": prospect_name(row),
+            "script": render_script(row.get("status"), row),
+            "title": row.get("title"),
+            "url": row.get("url"),
+            "placeholders": row.get("placeholders") or {},
+            "last_activity_at": row.get("last_activity_at"),
+        }
+        for row in page
+    ]
+    next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+    if Config.DEBUG:
+        print(f"[FollowUps] {len(candidates)} candidates (statuses={list(statuses)}, more={next_cursor is not None})")
+    return {"candidates": candidates, "next_cursor": next_cursor}
+
+
+def mark_reminded(thread_ids: Sequence[str], reminded_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Set reminded_at on many threads with one PATCH per chunk; returns {"updated": n, "reminded_at": iso}."""
+    from knowledge_base import _get_supabase
+
+    reminded_at = (reminded_at or datetime.now(timezone.utc)).isoformat()
+    unique_ids = list(dict.fromkeys(thread_id for thread_id in thread_ids if thread_id))
+    updated = 0
+    for start in range(0, len(unique_ids), MARK_CHUNK_SIZE):
+        chunk = unique_ids[start:start + MARK_CHUNK_SIZE]
+        # Minimal return: an exact count instead of echoing whole rows (with messages) back
+        response = (
+            _get_supabase()
+            .table("conversations")
+            .update({"reminded_at": reminded_at}, count="exact", returning="minimal")
+            .in_("thread_id", chunk)
+            .execute()
+        )
+        updated += response.count or 0
+    return {"updated": updated, "reminded_at": reminded_at}
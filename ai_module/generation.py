@@ -0,0 +1,156 @@
+"""
+Draft generation shared by the /generate endpoint and the background draft worker.
+"""
+
+from typing import Any, Dict, Tuple
+
+from config import Config
+from drafts import SOURCE_WORKER, conversation_fingerprint, get_draft_store
+from ingest import build_conversation
+from io_models import Conversation
+from orchestrator import run_pipeline
+from response_generator import generate_response, prompt_version
+from usage import usage_scope
+
+
+def request_input_summary(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Echo of the request that is returned alongside every draft."""
+    messages = data.get("messages", [])
+    return {
+        "thread_id": data.get("thread_id", "unknown"),
+        "prospect_name": data.get("prospect_name", "Unknown"),
+        "title": data.get("title", ""),
+        "description": data.get("description", ""),
+        "message_count": len(messages),
+    }
+
+
+def request_fingerprint(data: Dict[str, Any]) -> str:
+    return conversation_fingerprint(
+        data.get("messages", []),
+        data.get("current_phase"),
+        data.get("confirm_phase_change"),
+    )
+
+
+def build_request_conversation(data: Dict[str, Any]) -> Conversation:
+    """Conversation for a validated /generate request body."""
+    prospect_name = data.get("prospect_name", "Unknown")
+    messages = data.get("messages", [])
+
+    # Build conversation from request data
+    thread_data = {
+        "title": data.get("title", f"Conversation with {prospect_name}"),
+        "description": data.get("description"),
+        "thread_id": data.get("thread_id"),
+        "participants": [
+            {"id": "you", "name": "You", "role": "you"},
+            {"id": "prospect", "name": prospect_name, "role": "prospect"},
+        ],
+    }
+
+    return build_conversation(thread_data, messages)
+
+
+def draft_payload(data: Dict[str, Any], analysis: Dict[str, Any], response_text: str) -> Dict[str, Any]:
+    """The 200 /generate payload for a pipeline result and the writer's reply."""
+    return {
+        "response": response_text,
+        "phase": analysis["phase"],
+        "reasoning": analysis["reasoning"],  # Map reasoning directly
+        "engagement_score": 0.0,  # Hardcoded - no longer calculated
+        "sentiment_score": 0.0,  # Hardcoded - no longer calculated
+        "ready_for_ask": analysis["ready_for_ask"],
+        "input": request_input_summary(data),
+    }
+
+
+def approval_payload(data: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """The 202 /generate payload when the permission gate blocks a phase change."""
+    return {
+        "status": "approval_required",
+        "suggested_phase": analysis.get("suggested_phase"),
+        "reasoning": analysis.get("reasoning"),
+        "message": "AI wants to transition to selling phase. Approval required.",
+        "input": request_input_summary(data),
+    }
+
+
+def run_generation(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Run the analyzer + writer for a validated /generate request body.
+
+    Returns (payload, status_code): 202 with an approval request when the
+    permission gate blocks a phase change, otherwise 200 with the draft.
+
+    Provider calls are tagged with the thread and phase in the usage ledger and
+    limited to the body's "token_budget" (default USAGE_MAX_TOKENS_PER_REQUEST);
+    usage.TokenBudgetExceeded is raised once it is used up. An optional
+    "latency_target_ms" steers the analyzer router toward faster options.
+    """
+    current_phase = data.get("current_phase")  # Optional: current phase from Supabase
+    confirm_phase_change = data.get("confirm_phase_change")  # Optional: user approval flag
+    token_budget = data.get("token_budget") or Config.USAGE_MAX_TOKENS_PER_REQUEST
+
+    conv = build_request_conversation(data)
+
+    with usage_scope(thread_id=data.get("thread_id"), phase=current_phase, max_tokens=token_budget):
+        # Run analysis once - reuse for both response generation and metadata
+        # Pass permission gate parameters
+        analysis = run_pipeline(
+            conv,
+            current_phase=current_phase,
+            confirm_phase_change=confirm_phase_change,
+            latency_target_ms=data.get("latency_target_ms"),
+        )
+
+        # Check if approval is required
+        if analysis.get("status") == "approval_required":
+            # Return 202 Accepted with approval request
+            return approval_payload(data, analysis), 202
+
+        # Generate response using the orchestrator pipeline (pass analysis to avoid duplicate call)
+        response_text = generate_response(conv, analysis_result=analysis)
+
+    return draft_payload(data, analysis, response_text), 200
+
+
+def _with_request_echo(payload: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Attach the caller's input summary and a short preview of the latest messages."""
+    payload = dict(payload)
+    summary = request_input_summary(data)
+    if "response" in payload:
+        summary["recent_messages_preview"] = [
+            {
+                "sender": msg.get("sender", "unknown"),
+                "text_preview": (msg.get("text", "")[:100] + "..." if len(msg.get("text", "")) > 100 else msg.get("text", ""))
+            }
+            for msg in data.get("messages", [])[-3:]
+        ]
+    payload["input"] = summary
+    return payload
+
+
+def generate_for_request(data: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    Serve the stored draft for this exact conversation state, or generate and
+    store one now. "regenerate": true in the body skips the stored draft.
+    """
+    thread_id = data.get("thread_id")
+    fingerprint = request_fingerprint(data)
+    store = get_draft_store() if thread_id else None
+
+    if store is not None and not data.get("regenerate"):
+        draft = store.get(thread_id, fingerprint, prompt_version())
+        if draft is not None:
+            if Config.DEBUG:
+                print(f"[Generation] Serving stored draft for thread {thread_id} ({draft.source})")
+            payload = _with_request_echo(draft.payload, data)
+            payload["cached"] = True
+            payload["pregenerated"] = draft.source == SOURCE_WORKER
+            return payload, draft.status_code
+
+    payload, status_code = run_generation(data)
+    if store is not None and (status_code == 202 or payload.get("response")):
+        store.put(thread_id, fingerprint, payload, status_code, prompt_version())
+    return _with_request_echo(payload, data), status_code
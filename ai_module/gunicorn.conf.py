@@ -0,0 +1,36 @@
+"""
+Pre-fork production server configuration (see serving.py).
+
+Run from ai_module/:
+  gunicorn -c gunicorn.conf.py main:app
+"""
+
+import os
+
+import serving
+from config import Config
+
+bind = f"{Config.FLASK_HOST}:{Config.FLASK_PORT}"
+# serving.after_fork() divides the provider rate limits by this count
+workers = serving.worker_count()
+# Requests spend most of their time waiting on the providers, so each worker serves several at once
+worker_class = "gthread"
+threads = Config.SERVER_THREADS
+timeout = Config.SERVER_TIMEOUT_SECONDS
+graceful_timeout = 30
+# Import the app (and build the shared state) once in the master
+preload_app = True
+
+if os.getenv("FLASK_DEBUG") is None:
+    # Per-call debug logs are on by default for `python main.py`, not in production
+    Config.DEBUG = False
+
+
+def when_ready(server):
+    serving.check_config()
+    serving.preload()
+    serving.freeze()
+
+
+def post_fork(server, worker):
+    serving.after_fork(worker.age)
@@ -0,0 +1,257 @@
+"""
+Pure-CPU HNSW (hierarchical navigable small world) index over an EmbeddingStore.
+
+Brute-force similarity is linear in the number of KB documents; HNSW answers
+top-k queries by walking a layered proximity graph instead, touching a few
+thousand vectors even for hundreds of thousands of documents. Vectors stay
+in the memory-mapped store; the index only holds the graph.
+
+- `insert` adds store rows incrementally (add_document appends then inserts).
+- `delete` tombstones a document: it still routes searches but is never returned.
+- `save`/`load` persist the graph next to the store (`hnsw.npz`); rows
+  appended to the store after the last save are inserted on load.
+- `ef_search` trades recall for latency per query.
+"""
+
+import heapq
+import math
+import os
+import random
+import threading
+from typing import Any, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+INDEX_FILE = "hnsw.npz"
+
+
+class HNSWIndex:
+    """Layered proximity graph over the rows of an EmbeddingStore (cosine similarity)."""
+
+    def __init__(
+        self,
+        store: EmbeddingStore,
+        m: int = 16,
+        ef_construction: int = 100,
+        ef_search: int = 64,
+        seed: int = 0,
+    ):
+        self.store = store
+        self.m = m
+        self.m0 = 2 * m  # Layer 0 keeps twice as many links
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / math.log(m)
+        self._rng = random.Random(seed)
+        self._lock = threading.RLock()
+
+        self.levels: List[int] = []
+        # links[node][level] -> neighbour rows
+        self.links: List[List[List[int]]] = []
+        self.entry_point: Optional[int] = None
+        self.max_level = -1
+        self.tombstones: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.levels) - len(self.tombstones)
+
+    # ------------------------------------------------------------------ #
+    # Graph primitives
+    # ------------------------------------------------------------------ #
+
+    def _similarities(self, query: np.ndarray, rows: Sequence[int]) -> np.ndarray:
+        return self.store.similarities(query, rows=np.asarray(rows, dtype=np.int64))
+
+    def _search_layer(self, query: np.ndarray, entry: List[Tuple[float, int]], ef: int, level: int) -> List[Tuple[float, int]]:
+        """Best-first search of one layer; returns up to ef (similarity, row) pairs, best first."""
+        visited = {row for _, row in entry}
+        # Max-heap of candidates to expand (negated similarity) and min-heap of current results
+        candidates = [(-sim, row) for sim, row in entry]
+        heapq.heapify(candidates)
+        results = list(entry)
+        heapq.heapify(results)
+
+        while candidates:
+            neg_sim, row = heapq.heappop(candidates)
+            if -neg_sim < results[0][0] and len(results) >= ef:
+                break
+            neighbours = [n for n in self.links[row][level] if n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for sim, neighbour in zip(self._similarities(query, neighbours).tolist(), neighbours):
+                if len(results) < ef or sim > results[0][0]:
+                    heapq.heappush(candidates, (-sim, neighbour))
+                    heapq.heappush(results, (sim, neighbour))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _greedy_descend(self, query: np.ndarray, target_level: int) -> List[Tuple[float, int]]:
+        """Walk from the entry point down to `target_level` with ef=1."""
+        entry_sim = float(self._similarities(query, [self.entry_point])[0])
+        entry = [(entry_sim, self.entry_point)]
+        for level in range(self.max_level, target_level, -1):
+            entry = self._search_layer(query, entry, 1, level)
+        return entry
+
+    def _select_neighbours(self, candidates: List[Tuple[float, int]], limit: int) -> List[int]:
+        """
+        HNSW neighbour heuristic: keep a candidate only if it is closer to the
+        new node than to every neighbour already kept, which preserves links
+        across clusters; fill up with the nearest leftovers.
+        """
+        if len(candidates) <= limit:
+            return [row for _, row in candidates]
+        rows = [row for _, row in candidates]
+        vectors = self.store.dequantize(np.asarray(rows, dtype=np.int64))
+        pairwise = vectors @ vectors.T
+
+        selected: List[int] = []
+        skipped: List[int] = []
+        for i, (sim, _) in enumerate(candidates):
+            if len(selected) >= limit:
+                break
+            if selected and float(pairwise[i, selected].max()) > sim:
+                skipped.append(i)
+                continue
+            selected.append(i)
+        for i in skipped:
+            if len(selected) >= limit:
+                break
+            selected.append(i)
+        return [rows[i] for i in selected]
+
+    def _random_level(self) -> int:
+        return int(-math.log(1.0 - self._rng.random()) * self._level_mult)
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+
+    def insert(self, row: int):
+        """Link store row `row` into the graph (rows must be inserted in order)."""
+        with self._lock:
+            if row != len(self.levels):
+                raise ValueError(f"Expected row {len(self.levels)}, got {row}")
+            level = self._random_level()
+            self.levels.append(level)
+            self.links.append([[] for _ in range(level + 1)])
+            if self.entry_point is None:
+                self.entry_point, self.max_level = row, level
+                return
+
+            query = self.store.dequantize(row)
+            entry = self._greedy_descend(query, level)
+            for layer in range(min(level, self.max_level), -1, -1):
+                candidates = self._search_layer(query, entry, self.ef_construction, layer)
+                limit = self.m0 if layer == 0 else self.m
+                neighbours = self._select_neighbours(candidates, self.m)
+                self.links[row][layer] = neighbours
+                for neighbour in neighbours:
+                    links = self.links[neighbour][layer]
+                    links.append(row)
+                    if len(links) > limit:
+                        # Keep the neighbour's closest links
+                        sims = self._similarities(self.store.dequantize(neighbour), links)
+                        keep = np.argsort(-sims)[:limit]
+                        self.links[neighbour][layer] = [links[i] for i in keep]
+                entry = candidates
+
+            if level > self.max_level:
+                self.entry_point, self.max_level = row, level
+
+    def catch_up(self) -> int:
+        """Insert store rows that are not in the graph yet; returns how many were added."""
+        added = 0
+        with self._lock:
+            while len(self.levels) < len(self.store):
+                self.insert(len(self.levels))
+                added += 1
+        return added
+
+    def delete(self, doc_id: Any) -> bool:
+        """Tombstone a document so it is never returned (it still routes searches)."""
+        row = self.store.row(doc_id)
+        if row is None or row >= len(self.levels):
+            return False
+        with self._lock:
+            self.tombstones.add(row)
+        return True
+
+    def search(
+        self, query: Sequence[float], k: int = 5, threshold: float = 0.0, ef_search: Optional[int] = None
+    ) -> List[Tuple[Any, float]]:
+        """Approximate top-k: [(doc_id, similarity), ...], best first."""
+        with self._lock:
+            if self.entry_point is None:
+                return []
+            prepared = self.store.prepare_query(query)
+            # Over-fetch by the number of tombstones so deletes do not starve results
+            ef = max(ef_search or self.ef_search, k) + min(len(self.tombstones), k)
+            entry = self._greedy_descend(prepared, 0)
+            found = self._search_layer(prepared, entry, ef, 0)
+        results = []
+        for sim, row in found:
+            if row in self.tombstones or sim < threshold:
+                continue
+            results.append((self.store.ids[row], float(sim)))
+            if len(results) >= k:
+                break
+        return results
+
+    # ------------------------------------------------------------------ #
+    # Persistence
+    # ------------------------------------------------------------------ #
+
+    def save(self, path: Optional[str] = None):
+        """Write the graph to <store>/hnsw.npz (atomically replaced)."""
+        path = path or os.path.join(self.store.path, INDEX_FILE)
+        with self._lock:
+            count = len(self.levels)
+            arrays = {
+                "params": np.array([self.m, self.ef_construction, self.ef_search], dtype=np.int64),
+                "levels": np.array(self.levels, dtype=np.int32),
+                "entry": np.array([-1 if self.entry_point is None else self.entry_point, self.max_level], dtype=np.int64),
+                "tombstones": np.array(sorted(self.tombstones), dtype=np.int64),
+            }
+            for layer in range(self.max_level + 1):
+                width = self.m0 if layer == 0 else self.m
+                nodes = [node for node in range(count) if self.levels[node] >= layer]
+                matrix = np.full((len(nodes), width), -1, dtype=np.int32)
+                for i, node in enumerate(nodes):
+                    links = self.links[node][layer]
+                    matrix[i, :len(links)] = links
+                arrays[f"nodes_{layer}"] = np.array(nodes, dtype=np.int32)
+                arrays[f"links_{layer}"] = matrix
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as fh:
+            np.savez(fh, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, store: EmbeddingStore, path: Optional[str] = None, ef_search: Optional[int] = None) -> "HNSWIndex":
+        """Load a saved graph and insert any store rows appended since it was written."""
+        path = path or os.path.join(store.path, INDEX_FILE)
+        with np.load(path) as data:
+            m, ef_construction, saved_ef = (int(v) for v in data["params"])
+            index = cls(store, m=m, ef_construction=ef_construction, ef_search=ef_search or saved_ef)
+            index.levels = data["levels"].tolist()
+            entry, max_level = (int(v) for v in data["entry"])
+            index.entry_point = None if entry < 0 else entry
+            index.max_level = max_level
+            index.tombstones = set(data["tombstones"].tolist())
+            index.links = [[[] for _ in range(level + 1)] for level in index.levels]
+            for layer in range(max_level + 1):
+                for node, links in zip(data[f"nodes_{layer}"].tolist(), data[f"links_{layer}"].tolist()):
+                    index.links[node][layer] = [n for n in links if n >= 0]
+        index.catch_up()
+        return index
+
+    @classmethod
+    def build(cls, store: EmbeddingStore, **params) -> "HNSWIndex":
+        index = cls(store, **params)
+        index.catch_up()
+        return index
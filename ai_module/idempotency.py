@@ -0,0 +1,152 @@
+"""
+Single-flight coalescing and short-term replay for /generate.
+
+Double-clicks and client retries often send the same /generate while the
+first is still running, and each copy used to run its own analyzer and
+writer calls. Requests now carry an idempotency key: the `Idempotency-Key`
+header, or by default a hash of thread_id and the conversation fingerprint.
+
+- The first request for a key runs the pipeline ("executed").
+- Requests for the key that arrive while it runs wait for it and get the
+  same response ("coalesced"). Its error too, if it fails.
+- Requests for the key within IDEMPOTENCY_REPLAY_SECONDS after it finished
+  get the stored response ("replayed"). Failures are not stored.
+
+A caller-supplied key that is reused with a different body is rejected with
+IdempotencyConflict. Coalescing is per process: under gunicorn, duplicates
+that land on different workers each run.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+from config import Config
+
+EXECUTED = "executed"
+COALESCED = "coalesced"
+REPLAYED = "replayed"
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """An Idempotency-Key was reused with a different request body."""
+
+
+def body_hash(data: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def default_key(thread_id: Optional[str], fingerprint: str) -> str:
+    """Key for requests without an Idempotency-Key header: thread plus conversation state."""
+    return hashlib.sha256(f"{thread_id or ''}\x1f{fingerprint}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Flight:
+    body_hash: Optional[str]
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+    finished_at: Optional[float] = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time and keeps successful results for a replay window."""
+
+    def __init__(self, replay_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.replay_seconds = replay_seconds if replay_seconds is not None else Config.IDEMPOTENCY_REPLAY_SECONDS
+        self.max_entries = max_entries if max_entries is not None else Config.IDEMPOTENCY_MAX_ENTRIES
+        self._flights: "OrderedDict[str, _Flight]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, flight: _Flight, now: float) -> bool:
+        return flight.finished_at is not None and now - flight.finished_at > self.replay_seconds
+
+    def _prune(self, now: float):
+        """Drop expired results, then the oldest finished ones over max_entries. Caller holds the lock."""
+        for key in [key for key, flight in self._flights.items() if self._expired(flight, now)]:
+            del self._flights[key]
+        finished = [key for key, flight in self._flights.items() if flight.finished_at is not None]
+        for key in finished[:max(0, len(self._flights) - self.max_entries)]:
+            del self._flights[key]
+
+    def do(self, key: str, fn: Callable[[], Any], request_hash: Optional[str] = None) -> Tuple[Any, str]:
+        """
+        Run fn() for `key`, or share the in-flight or recent result.
+        Returns (result, EXECUTED | COALESCED | REPLAYED).
+        With `request_hash`, a key already used for a different body raises IdempotencyConflict.
+        """
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            flight = self._flights.get(key)
+            if flight is not None and request_hash is not None and flight.body_hash not in (None, request_hash):
+                metrics.increment("generate.idempotency.conflicts")
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            if flight is None:
+                flight = self._flights[key] = _Flight(body_hash=request_hash)
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            outcome = REPLAYED if flight.done.is_set() else COALESCED
+            metrics.increment(f"generate.idempotency.{outcome}")
+            if Config.DEBUG:
+                print(f"[Idempotency] {outcome} request for key {key[:12]}")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, outcome
+
+        metrics.increment(f"generate.idempotency.{EXECUTED}")
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                # Failures are shared with the requests already waiting, but not replayed
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            raise
+        finally:
+            flight.finished_at = time.time()
+            flight.done.set()
+        if not self.replay_seconds:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+        return flight.result, EXECUTED
+
+    def forget(self, key: str) -> bool:
+        """Drop a finished result so the next request for `key` runs again."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None or not flight.done.is_set():
+                return False
+            del self._flights[key]
+            return True
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(1 for flight in self._flights.values() if not flight.done.is_set())
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+            metrics.register_gauge("generate.idempotency.in_flight", _single_flight.in_flight)
+        return _single_flight
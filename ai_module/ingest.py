@@ -47,7 +47,7 @@ def build_conversation(thread_data: Dict[str, Any], messages_data: List[Dict[str
     Build a Conversation from thread and messages data.
 
     Args:
-        thread_data: Dict with 'title', 'description?', 'participants?'
+        thread_data: Dict with 'title', 'description?', 'participants?', 'thread_id?'
         messages_data: List of message dicts (already sorted by DB)
 
     Returns:
@@ -60,4 +60,5 @@ def build_conversation(thread_data: Dict[str, Any], messages_data: List[Dict[str
         description=thread_data.get("description"),
         participants=participants,
         messages=messages,
+        thread_id=thread_data.get("thread_id"),
     )
@@ -156,6 +156,7 @@ class Conversation:
     description: Optional[str] = None
     participants: List[Participant] = field(default_factory=list)
     messages: List[Message] = field(default_factory=list)
+    thread_id: Optional[str] = None  # Keys the per-thread feature record (thread_features.py)
     
     def __post_init__(self):
         """Validate conversation."""
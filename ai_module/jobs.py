@@ -0,0 +1,374 @@
+"""
+Asynchronous generation jobs backed by a persistent local queue.
+
+POST /jobs/generate enqueues a /generate request body and returns a job id
+right away; a bounded pool of worker threads runs the pipeline and stores the
+result, so the work is not lost when the caller's HTTP request is aborted.
+Callers collect the result by long-polling GET /jobs/<id>?wait=N, by
+streaming GET /jobs/<id>/events (SSE), or by passing a `callback_url` that
+receives the finished job as a JSON POST. Callback hosts must be on
+JOBS_CALLBACK_ALLOWED_HOSTS, or without an allow-list resolve only to public
+addresses, so a caller cannot make the server POST to loopback, private or
+link-local services.
+
+Jobs are stored in SQLite (JOBS_DB_PATH), so queued jobs survive a restart;
+jobs that were running when the process died are re-queued on startup. Under
+the pre-fork server every worker process drains the same database: claims are
+conditional updates, and the master re-queues interrupted jobs once before
+forking (workers start with JOBS_RECOVER_ON_START off).
+"""
+
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import metrics
+from config import Config
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    status_code INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the queue already holds JOBS_MAX_QUEUED pending jobs."""
+
+
+def check_callback_url(url: str):
+    """
+    Raise ValueError unless job results may be POSTed to `url`: an http(s) URL
+    whose host is on JOBS_CALLBACK_ALLOWED_HOSTS or, without an allow-list,
+    resolves only to public addresses.
+    """
+    parsed = urllib.parse.urlsplit(str(url))
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("'callback_url' must be an http(s) URL")
+    host = parsed.hostname.lower()
+    allowed = [name.strip().lower() for name in Config.JOBS_CALLBACK_ALLOWED_HOSTS.split(",") if name.strip()]
+    if allowed:
+        if host not in allowed:
+            raise ValueError(f"'callback_url' host {host} is not in JOBS_CALLBACK_ALLOWED_HOSTS")
+        return
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, ValueError):
+        raise ValueError(f"'callback_url' host {host} does not resolve")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"'callback_url' host {host} resolves to a non-public address ({ip})")
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Refuse redirects: one could send the callback on to an internal address."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirects)
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    job = {
+        "job_id": row["id"],
+        "status": row["status"],
+        "status_code": row["status_code"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "error": row["error"],
+        "created_at": row["created_at"],
+        "started_at": row["started_at"],
+        "finished_at": row["finished_at"],
+    }
+    if row["started_at"]:
+        job["wait_ms"] = (row["started_at"] - row["created_at"]) * 1000
+    if row["finished_at"] and row["started_at"]:
+        job["run_ms"] = (row["finished_at"] - row["started_at"]) * 1000
+    return job
+
+
+def recover_interrupted_jobs(db_path: Optional[str] = None) -> int:
+    """Put jobs interrupted by a crash/restart back on the queue."""
+    db = sqlite3.connect(db_path or Config.JOBS_DB_PATH)
+    try:
+        with db:
+            db.executescript(_SCHEMA)
+            recovered = db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING)
+            ).rowcount
+    finally:
+        db.close()
+    if recovered:
+        print(f"[Jobs] Re-queued {recovered} interrupted jobs")
+    return recovered
+
+
+class JobQueue:
+    """SQLite-backed FIFO of generation jobs drained by a bounded worker pool."""
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        runner: Optional[Callable[[Dict[str, Any]], Tuple[Dict[str, Any], int]]] = None,
+        max_queued: Optional[int] = None,
+    ):
+        if runner is None:
+            from generation import generate_for_request
+            runner = generate_for_request
+        self.db_path = db_path or Config.JOBS_DB_PATH
+        self.workers = workers or Config.JOBS_WORKERS
+        self.runner = runner
+        self.max_queued = max_queued if max_queued is not None else Config.JOBS_MAX_QUEUED
+
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db_lock = threading.Lock()
+        # Wakes idle workers on submit and long-poll waiters on every status change
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+        with self._db_lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+        if Config.JOBS_RECOVER_ON_START:
+            recover_interrupted_jobs(self.db_path)
+
+        metrics.register_gauge("jobs.queue_depth", lambda: self.count(QUEUED))
+        metrics.register_gauge("jobs.running", lambda: self.count(RUNNING))
+
+    # ------------------------------------------------------------------ #
+    # Lifecycle
+    # ------------------------------------------------------------------ #
+
+    def start(self) -> "JobQueue":
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    # ------------------------------------------------------------------ #
+    # Queue operations
+    # ------------------------------------------------------------------ #
+
+    def submit(self, data: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
+        """Persist a new job and wake a worker; raises QueueFullError when saturated."""
+        self.prune()
+        if self.max_queued and self.count(QUEUED) >= self.max_queued:
+            metrics.increment("jobs.rejected")
+            raise QueueFullError(f"Job queue is full ({self.max_queued} pending)")
+
+        job_id = uuid.uuid4().hex
+        with self._db_lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, request, callback_url, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(data), callback_url, time.time()),
+            )
+        metrics.increment("jobs.submitted")
+        with self._changed:
+            self._changed.notify_all()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def count(self, status: str) -> int:
+        with self._db_lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def wait(self, job_id: str, timeout: float, seen_status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Long-poll: block up to `timeout` seconds until the job finishes (or, when
+        `seen_status` is given, until its status differs from it).
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return job
+            if seen_status is not None and job["status"] != seen_status:
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, 1.0))
+
+    def prune(self, retention_seconds: Optional[float] = None) -> int:
+        """Delete finished jobs older than the retention window."""
+        retention = retention_seconds if retention_seconds is not None else Config.JOBS_RETENTION_SECONDS
+        if not retention:
+            return 0
+        cutoff = time.time() - retention
+        with self._db_lock, self._db:
+            return self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (SUCCEEDED, FAILED, cutoff)
+            ).rowcount
+
+    # ------------------------------------------------------------------ #
+    # Workers
+    # ------------------------------------------------------------------ #
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Atomically move the oldest queued job to running."""
+        while True:
+            with self._db_lock, self._db:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    return None
+                started_at = time.time()
+                # Conditional so two worker processes never claim the same job
+                claimed = self._db.execute(
+                    "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                    (RUNNING, started_at, row["id"], QUEUED),
+                ).rowcount
+            if claimed:
+                break
+        metrics.observe("jobs.wait_ms", (started_at - row["created_at"]) * 1000)
+        return row
+
+    def _finish(self, job_id: str, status: str, result=None, status_code=None, error=None):
+        finished_at = time.time()
+        with self._db_lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, status_code = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, status_code, error, finished_at, job_id),
+            )
+        with self._changed:
+            self._changed.notify_all()
+
+    def _work(self):
+        while not self._stop.is_set():
+            # Claim under the condition so a submit between claim and wait is not missed
+            with self._changed:
+                row = self._claim()
+                if row is None:
+                    self._changed.wait(5.0)
+                    continue
+                self._changed.notify_all()
+            self._run(row)
+
+    def _run(self, row: sqlite3.Row):
+        job_id = row["id"]
+        start = time.time()
+        try:
+            result, status_code = self.runner(json.loads(row["request"]))
+            self._finish(job_id, SUCCEEDED, result=result, status_code=status_code)
+            metrics.increment("jobs.succeeded")
+        except Exception as e:
+            print(f"[Jobs] Job {job_id} failed: {e}")
+            self._finish(job_id, FAILED, status_code=500, error=str(e))
+            metrics.increment("jobs.failed")
+        metrics.observe("jobs.run_ms", (time.time() - start) * 1000)
+
+        if row["callback_url"]:
+            self._send_callback(row["callback_url"], self.get(job_id))
+
+    def _send_callback(self, url: str, job: Dict[str, Any], attempts: int = 3):
+        """POST the finished job to the caller's callback URL, retrying with backoff."""
+        body = json.dumps(job).encode("utf-8")
+        for attempt in range(attempts):
+            try:
+                # Checked again at delivery: the host may resolve elsewhere by now
+                check_callback_url(url)
+            except ValueError as e:
+                metrics.increment("jobs.callbacks_rejected")
+                print(f"[Jobs] Not sending callback for job {job['job_id']}: {e}")
+                return
+            try:
+                req = urllib.request.Request(
+                    url, data=body, method="POST", headers={"Content-Type": "application/json"}
+                )
+                with _callback_opener.open(req, timeout=Config.JOBS_CALLBACK_TIMEOUT_SECONDS):
+                    pass
+                metrics.increment("jobs.callbacks_sent")
+                return
+            except Exception as e:
+                if Config.DEBUG:
+                    print(f"[Jobs] Callback to {url} failed (attempt {attempt + 1}): {e}")
+                if attempt + 1 < attempts:
+                    self._stop.wait(2 ** attempt)
+        metrics.increment("jobs.callbacks_failed")
+        print(f"[Jobs] Giving up on callback for job {job['job_id']} to {url}")
+
+
+def sse_events(queue: JobQueue, job_id: str, keepalive_seconds: float = 15.0) -> Iterator[str]:
+    """Server-sent events: one `status` event per state change, then a final `result`."""
+    seen_status = None
+    job = queue.get(job_id)
+    while True:
+        if job is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+            return
+        if job["status"] in FINISHED_STATES:
+            yield f"event: result\ndata: {json.dumps(job)}\n\n"
+            return
+        if job["status"] != seen_status:
+            seen_status = job["status"]
+            yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': seen_status})}\n\n"
+        else:
+            # Comment line keeps proxies from closing an idle stream
+            yield ": keepalive\n\n"
+        job = queue.wait(job_id, keepalive_seconds, seen_status=seen_status)
+
+
+_queue: Optional[JobQueue] = None
+_queue_pid: Optional[int] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Return the process-wide queue, creating it and starting its workers on first
+    use (and again after a fork, whose threads do not survive).
+    """
+    global _queue, _queue_pid
+    with _queue_lock:
+        if _queue is None or _queue_pid != os.getpid():
+            _queue = JobQueue().start()
+            _queue_pid = os.getpid()
+            if Config.DEBUG:
+                print(f"[Jobs] Started {_queue.workers} workers (db={_queue.db_path})")
+        return _queue
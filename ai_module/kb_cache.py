@@ -0,0 +1,88 @@
+"""
+LRU + TTL cache for knowledge base retrieval results.
+
+Entries are keyed by the normalized query, k, threshold and the corpus
+version. `knowledge_base` bumps the version whenever the corpus changes
+(single or bulk inserts, or an external change noticed by polling), so a
+cached result is never served for a corpus it was not computed from.
+"""
+
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from config import Config
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", (query or "").strip().lower())
+
+
+class KBResultCache:
+    """Thread-safe LRU of retrieval results with per-entry expiry."""
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries if max_entries is not None else Config.KB_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.KB_CACHE_TTL_SECONDS
+        self._entries: "OrderedDict[Tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, k: int, threshold: float, version: int) -> Tuple:
+        return (normalize_query(query), k, round(threshold, 4), version)
+
+    def get(self, key: Tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.increment("kb.cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.increment("kb.cache_hits")
+        # Callers may mutate the snippets they get back
+        return copy.deepcopy(entry[1])
+
+    def put(self, key: Tuple, results: List[Dict[str, Any]]):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict_versions_before(self, version: int):
+        """Drop entries computed against an older corpus version."""
+        with self._lock:
+            for key in [key for key in self._entries if key[3] < version]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hit_ratio(),
+            }
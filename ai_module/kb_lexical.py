@@ -0,0 +1,151 @@
+"""
+In-process BM25 inverted index over knowledge base documents.
+
+`_build_kb_query` produces keyword-heavy queries (school names, people,
+topic phrases) that exact term matching handles better than embeddings.
+The index scores `question`, `answer` and `tags`, with question and tag
+terms counted more heavily, and `rrf_fuse` merges its ranking with the
+vector search ranking by reciprocal-rank fusion.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by do does for from has have how i if in is it its me my of on or
+    so that the their them they this to was we what when where which who why will with you your
+    """.split()
+)
+
+# Terms in these fields are counted this many times (a simple BM25F approximation)
+FIELD_WEIGHTS = {"question": 2, "tags": 2, "answer": 1}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords or possessive suffixes."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall((text or "").lower()):
+        token = token.split("'", 1)[0]
+        if token and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def document_terms(row: Dict[str, Any]) -> Counter:
+    """Weighted term frequencies for a kb_documents row."""
+    terms: Counter = Counter()
+    for field_name, weight in FIELD_WEIGHTS.items():
+        value = row.get(field_name)
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value)
+        for token in tokenize(value or ""):
+            terms[token] += weight
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 over kb_documents rows, supporting incremental adds and removals."""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[Any, int]] = defaultdict(dict)
+        self._lengths: Dict[Any, int] = {}
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def build(self, rows: Iterable[Dict[str, Any]]):
+        """Replace the index contents with `rows`."""
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._lengths = {}
+            self._rows = {}
+            self._total_length = 0
+            for row in rows:
+                self.add(row)
+
+    def add(self, row: Dict[str, Any]):
+        """Index (or re-index) a single row; rows must carry an `id`."""
+        doc_id = row.get("id")
+        if doc_id is None:
+            return
+        terms = document_terms(row)
+        with self._lock:
+            self.remove(doc_id)
+            for term, freq in terms.items():
+                self._postings[term][doc_id] = freq
+            length = sum(terms.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            self._rows[doc_id] = row
+
+    def remove(self, doc_id: Any):
+        with self._lock:
+            if doc_id not in self._rows:
+                return
+            for term in document_terms(self._rows.pop(doc_id)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._lengths.pop(doc_id, 0)
+
+    def get(self, doc_id: Any) -> Optional[Dict[str, Any]]:
+        return self._rows.get(doc_id)
+
+    def idf(self, term: str) -> float:
+        n = len(self._rows)
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Any, float]]:
+        """Return up to k (doc_id, score) pairs, best first."""
+        return self.search_with_coverage(query, k)[0]
+
+    def search_with_coverage(self, query: str, k: int = 5) -> Tuple[List[Tuple[Any, float]], float]:
+        """
+        Search and also report how much of the query the top hit explains:
+        the idf-weighted share of query terms that appear in it (0-1). Terms
+        missing from the corpus count with the maximum idf, so a query that is
+        mostly unknown words is never treated as a confident lexical match.
+        """
+        query_terms = set(tokenize(query))
+        with self._lock:
+            if not self._rows or not query_terms:
+                return [], 0.0
+            avg_length = self._total_length / len(self._rows)
+            known = {term: self.idf(term) for term in query_terms if term in self._postings}
+            scores: Dict[Any, float] = defaultdict(float)
+            for term, idf in known.items():
+                for doc_id, freq in self._postings[term].items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            if not ranked:
+                return [], 0.0
+            top_id = ranked[0][0]
+            matched_idf = sum(idf for term, idf in known.items() if top_id in self._postings[term])
+            unknown_idf = self.idf("") * (len(query_terms) - len(known))
+            coverage = matched_idf / (sum(known.values()) + unknown_idf)
+            return ranked, coverage
+
+
+def rrf_fuse(rankings: Iterable[List[Any]], k: int = 60) -> List[Tuple[Any, float]]:
+    """Reciprocal-rank fusion of several best-first id lists."""
+    fused: Dict[Any, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -4,46 +4,250 @@ Supabase-backed knowledge base storage and retrieval helpers.
 
 from __future__ import annotations
 
-from typing import List, Dict, Optional, Any
-
-from supabase import create_client, Client
-from openai import OpenAI
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, List, Dict, Optional, Any, Tuple
 
+import metrics
 from config import Config
+from kb_cache import KBResultCache
+from kb_lexical import BM25Index, rrf_fuse
+from provider_clients import get_openai_client
+from rate_limiter import limited_call
+from usage import normalize_usage, record_usage
+
+if TYPE_CHECKING:
+    # The supabase import is deferred to first use to keep startup fast
+    from supabase import Client
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIM = 1536
 
 _supabase_client: Optional[Client] = None
+_supabase_pid: Optional[int] = None
+_supabase_lock = threading.Lock()
+
+# Process-wide lexical index over kb_documents, reloaded every KB_LEXICAL_REFRESH_SECONDS
+_lexical_index: Optional[BM25Index] = None
+_lexical_loaded_at = 0.0
+_lexical_lock = threading.Lock()
+_lexical_refreshing = False
+_lexical_pending: List[tuple] = []  # Local (op, arg) writes made during a refresh, replayed onto the new index
+
+# Bumped whenever the corpus changes; part of every result cache key
+_corpus_version = 0
+_corpus_signature: Optional[tuple] = None
+_corpus_checked_at = 0.0
+_corpus_lock = threading.Lock()
+# kb_documents writes by this process: in progress, and completed so far
+_pending_writes = 0
+_write_serial = 0
+_result_cache = KBResultCache()
+
+# Local memory-mapped vector store, used when KB_VECTOR_BACKEND=local
+_embedding_store = None
+_embedding_store_stale = False
+_embedding_store_lock = threading.Lock()
+# Whether this process builds and appends to the local store. Under the
+# pre-fork server only the worker holding SERVER_BACKGROUND_LOCK_PATH does;
+# the others reopen the store when the writer changes it (see serving.py)
+_store_writer = True
+
+# HNSW graph over the local store, used when KB_ANN_INDEX=hnsw
+_ann_index = None
+_ann_saved_at = 0.0
+_ann_building: Optional[str] = None  # store generation a background graph build is running for
+metrics.register_gauge("kb.cache_hit_ratio", _result_cache.hit_ratio)
 
 
 def _get_supabase() -> Client:
-    """Create or reuse a Supabase client."""
-    global _supabase_client
-    if _supabase_client is None:
-        if not Config.SUPABASE_URL or not Config.SUPABASE_SERVICE_KEY:
-            raise RuntimeError(
-                "Supabase configuration missing. Set SUPABASE_URL and SUPABASE_SERVICE_KEY."
+    """Create or reuse the process's Supabase client (recreated after a fork, whose connections are not shared)."""
+    global _supabase_client, _supabase_pid
+    with _supabase_lock:
+        if _supabase_client is None or _supabase_pid != os.getpid():
+            if not Config.SUPABASE_URL or not Config.SUPABASE_SERVICE_KEY:
+                raise RuntimeError(
+                    "Supabase configuration missing. Set SUPABASE_URL and SUPABASE_SERVICE_KEY."
+                )
+            from supabase import create_client
+            _supabase_client = create_client(
+                Config.SUPABASE_URL,
+                Config.SUPABASE_SERVICE_KEY,
             )
-        _supabase_client = create_client(
-            Config.SUPABASE_URL,
-            Config.SUPABASE_SERVICE_KEY,
-        )
-    return _supabase_client
+            _supabase_pid = os.getpid()
+        return _supabase_client
 
 
-def _embed_text(text: str) -> List[float]:
-    """Generate embedding vector using OpenAI."""
+def _embed_texts(texts: List[str]) -> List[List[float]]:
+    """Generate embedding vectors for several texts in one OpenAI request."""
+    start = time.time()
+    embeddings, usage = _request_embeddings(texts)
+    _record_embedding_usage(usage, 1.0, (time.time() - start) * 1000)
+    return embeddings
+
+
+def _request_embeddings(texts: List[str]) -> Tuple[List[List[float]], Any]:
+    """One OpenAI embeddings request; returns the vectors and the response's usage (not recorded)."""
     if not Config.OPENAI_API_KEY:
         raise RuntimeError("OPENAI_API_KEY is required for embeddings.")
-    client = OpenAI(api_key=Config.OPENAI_API_KEY)
-    response = client.embeddings.create(model=EMBEDDING_MODEL, input=text)
-    embedding = response.data[0].embedding
-    if len(embedding) != EMBEDDING_DIM:
-        raise ValueError(
-            f"Unexpected embedding dimension {len(embedding)} (expected {EMBEDDING_DIM})"
-        )
-    return embedding
+    client = get_openai_client()
+    request = {"model": EMBEDDING_MODEL, "input": texts}
+    response, _ = limited_call("openai", EMBEDDING_MODEL, lambda: client.embeddings.create(**request), request)
+    embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    for embedding in embeddings:
+        if len(embedding) != EMBEDDING_DIM:
+            raise ValueError(
+                f"Unexpected embedding dimension {len(embedding)} (expected {EMBEDDING_DIM})"
+            )
+    return embeddings, getattr(response, "usage", None)
+
+
+def _record_embedding_usage(usage: Any, share: float, latency_ms: float):
+    """Record `share` of an embeddings request's tokens in the current usage scope."""
+    if usage is not None and share < 1.0:
+        counts = normalize_usage(usage)
+        usage = {"prompt_tokens": round(counts["input_tokens"] * share), "completion_tokens": 0}
+    record_usage("embedding", "openai", EMBEDDING_MODEL, usage, latency_ms=latency_ms)
+
+
+def _embed_text(text: str) -> List[float]:
+    """Generate embedding vector using OpenAI (coalesced with concurrent calls when batching is on)."""
+    return _embed_queries([text])[0]
+
+
+def _embed_queries(texts: List[str]) -> List[List[float]]:
+    """Embed query texts, sharing a micro-batch with concurrent callers when EMBEDDING_BATCH_ENABLED."""
+    if Config.EMBEDDING_BATCH_ENABLED:
+        from embedding_batcher import get_embedding_batcher
+        batcher = get_embedding_batcher(_request_embeddings, record_fn=_record_embedding_usage)
+        return batcher.embed_many(texts, timeout=Config.EMBEDDING_BATCH_TIMEOUT_SECONDS)
+    return _embed_texts(texts)
+
+
+def corpus_version() -> int:
+    return _corpus_version
+
+
+def bump_corpus_version(reason: str = "") -> int:
+    """Mark the corpus as changed so cached retrieval results are no longer served."""
+    global _corpus_version
+    with _corpus_lock:
+        _corpus_version += 1
+        version = _corpus_version
+    _result_cache.evict_versions_before(version)
+    metrics.increment("kb.corpus_changes")
+    if Config.DEBUG:
+        print(f"[KB] Corpus version {version} ({reason or 'changed'})")
+    return version
+
+
+def _corpus_fingerprint() -> tuple:
+    """Cheap summary of kb_documents (row count + latest update) used to notice external edits."""
+    response = (
+        _get_supabase()
+        .table("kb_documents")
+        .select("id, updated_at", count="exact")
+        .order("updated_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    latest = (response.data or [{}])[0]
+    return response.count, latest.get("id"), latest.get("updated_at")
+
+
+def _poll_corpus_changes():
+    """Every KB_CHANGE_POLL_SECONDS, bump the version if kb_documents changed outside this process."""
+    global _corpus_signature, _corpus_checked_at, _lexical_loaded_at, _embedding_store_stale
+    if not Config.KB_CHANGE_POLL_SECONDS:
+        return
+    with _corpus_lock:
+        if time.time() - _corpus_checked_at < Config.KB_CHANGE_POLL_SECONDS:
+            return
+        _corpus_checked_at = time.time()
+        serial = _write_serial
+    try:
+        signature = _corpus_fingerprint()
+    except Exception as e:
+        if Config.DEBUG:
+            print(f"[KB] Corpus change check failed: {e}")
+        return
+    with _corpus_lock:
+        if _pending_writes or _write_serial != serial:
+            # This process wrote meanwhile; the write records the signature itself
+            return
+        previous, _corpus_signature = _corpus_signature, signature
+    if previous is not None and previous != signature:
+        # Reload the lexical index and local vectors on their next use as well
+        _lexical_loaded_at = 0.0
+        _embedding_store_stale = True
+        bump_corpus_version("external change")
+
+
+@contextmanager
+def _local_write():
+    """
+    Wrap a kb_documents write by this process, which updates the local indexes
+    itself. Afterwards the corpus signature is read again, so the next poll
+    does not take the write for an external change and rebuild everything.
+    """
+    global _pending_writes, _write_serial, _corpus_signature
+    with _corpus_lock:
+        _pending_writes += 1
+    try:
+        yield
+    finally:
+        signature = None
+        if Config.KB_CHANGE_POLL_SECONDS:
+            try:
+                signature = _corpus_fingerprint()
+            except Exception as e:
+                if Config.DEBUG:
+                    print(f"[KB] Corpus signature refresh failed: {e}")
+        with _corpus_lock:
+            _pending_writes -= 1
+            _write_serial += 1
+            # Without a fresh signature the next poll only records one
+            _corpus_signature = signature
+
+
+def set_store_writer(writer: bool):
+    """Make this process the local store's writer, or a reader of what the writer builds."""
+    global _store_writer
+    _store_writer = writer
+
+
+def preload() -> Dict[str, int]:
+    """
+    Build the process-wide KB structures (lexical index, local vector store and
+    HNSW graph) now instead of on the first request. Called in the server
+    master before forking, so workers share these read-only pages.
+    """
+    loaded: Dict[str, int] = {}
+    if Config.KB_VECTOR_BACKEND == "local":
+        store = _get_embedding_store()
+        loaded["vectors"] = len(store) if store is not None else 0
+        if Config.KB_ANN_INDEX == "hnsw":
+            index = _get_ann_index(wait=True)
+            loaded["hnsw"] = len(index) if index is not None else 0
+    if Config.KB_HYBRID_SEARCH or Config.KB_VECTOR_BACKEND == "local":
+        loaded["lexical"] = len(_get_lexical_index())
+    return loaded
+
+
+def ping() -> Dict[str, Any]:
+    """Open this process's Supabase connection with the corpus fingerprint query (used by warm-up)."""
+    start = time.perf_counter()
+    signature = _corpus_fingerprint()
+    return {"ms": round((time.perf_counter() - start) * 1000, 1), "documents": signature[0]}
+
+
+def cache_stats() -> Dict[str, Any]:
+    stats = _result_cache.stats()
+    stats["corpus_version"] = _corpus_version
+    return stats
 
 
 def add_document(
@@ -73,16 +277,518 @@ def add_document(
         "embedding": embedding,
     }
 
-    result = supabase.table("kb_documents").insert(payload).execute()
-    if not result.data:
-        raise RuntimeError("Failed to insert knowledge base document.")
-    return result.data[0]
+    with _local_write():
+        result = supabase.table("kb_documents").insert(payload).execute()
+        if not result.data:
+            raise RuntimeError("Failed to insert knowledge base document.")
+        document = result.data[0]
+        _update_lexical_index("add", {k: v for k, v in document.items() if k != "embedding"})
+        if _embedding_store is not None:
+            _index_local_vectors([document["id"]], [embedding])
+        bump_corpus_version("document added")
+    return document
+
+
+def add_documents(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Bulk-ingest knowledge base entries ({question, answer, source, tags}).
+
+    Embeds all entries in one request and inserts them in one call.
+    Returns the inserted Supabase rows.
+    """
+    for entry in entries:
+        if not entry.get("answer") or not str(entry["answer"]).strip():
+            raise ValueError("Answer text cannot be empty.")
+    if not entries:
+        return []
+
+    embeddings = _embed_texts(
+        ["\n".join(filter(None, [entry.get("question"), entry["answer"]])) for entry in entries]
+    )
+    payload = [
+        {
+            "source": entry.get("source"),
+            "question": entry.get("question"),
+            "answer": entry["answer"],
+            "tags": entry.get("tags") or [],
+            "embedding": embedding,
+        }
+        for entry, embedding in zip(entries, embeddings)
+    ]
+
+    with _local_write():
+        result = _get_supabase().table("kb_documents").insert(payload).execute()
+        if not result.data:
+            raise RuntimeError("Failed to insert knowledge base documents.")
+        for document in result.data:
+            _update_lexical_index("add", {k: v for k, v in document.items() if k != "embedding"})
+        if _embedding_store is not None:
+            _index_local_vectors([document["id"] for document in result.data], embeddings)
+        bump_corpus_version(f"{len(result.data)} documents added")
+    return result.data
+
+
+def _fetch_corpus(page_size: int = 1000) -> List[Dict[str, Any]]:
+    """Load every kb_documents row (without embeddings) for the lexical index."""
+    supabase = _get_supabase()
+    rows: List[Dict[str, Any]] = []
+    while True:
+        page = (
+            supabase.table("kb_documents")
+            .select("id, source, question, answer, tags")
+            .order("id")
+            .range(len(rows), len(rows) + page_size - 1)
+            .execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+def _get_lexical_index() -> BM25Index:
+    """
+    The lexical index. The first call builds it; once it is older than the
+    refresh interval, a background thread rebuilds it from the corpus and swaps
+    it in, and callers keep searching the current index meanwhile.
+    """
+    global _lexical_index, _lexical_loaded_at, _lexical_refreshing
+    with _lexical_lock:
+        if _lexical_index is None:
+            index = BM25Index()
+            index.build(_fetch_corpus())
+            _lexical_index = index
+            _lexical_loaded_at = time.time()
+            if Config.DEBUG:
+                print(f"[KB] Lexical index loaded: {len(index)} documents")
+        elif not _lexical_refreshing and time.time() - _lexical_loaded_at > Config.KB_LEXICAL_REFRESH_SECONDS:
+            _lexical_refreshing = True
+            threading.Thread(target=_refresh_lexical_index, name="kb-lexical-refresh", daemon=True).start()
+        return _lexical_index
+
+
+def _refresh_lexical_index():
+    """Rebuild the lexical index off the request path, replay local writes made meanwhile, and swap it in."""
+    global _lexical_index, _lexical_loaded_at, _lexical_refreshing
+    with _lexical_lock:
+        # The index reflects the corpus as of the fetch; an external change
+        # seen while fetching resets this to 0 and triggers another refresh
+        _lexical_loaded_at = time.time()
+    try:
+        index = BM25Index()
+        index.build(_fetch_corpus())
+        with _lexical_lock:
+            for op, arg in _lexical_pending:
+                getattr(index, op)(arg)
+            _lexical_index = index
+        if Config.DEBUG:
+            print(f"[KB] Lexical index refreshed: {len(index)} documents")
+    except Exception as e:
+        print(f"[KB] Lexical index refresh failed, keeping the current index: {e}")
+    finally:
+        with _lexical_lock:
+            _lexical_pending.clear()
+            _lexical_refreshing = False
+
+
+def _update_lexical_index(op: str, arg: Any):
+    """Apply a local "add" (row) or "remove" (id) to the lexical index and to any refresh in progress."""
+    with _lexical_lock:
+        if _lexical_index is None:
+            return
+        if _lexical_refreshing:
+            _lexical_pending.append((op, arg))
+        getattr(_lexical_index, op)(arg)
+
+
+def _format_result(row: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+    result = {
+        "id": row.get("id"),
+        "source": row.get("source"),
+        "question": row.get("question"),
+        "snippet": row.get("answer"),
+        "tags": row.get("tags", []),
+        "similarity": row.get("similarity"),
+    }
+    result.update(extra)
+    return result
+
+
+def _get_embedding_store():
+    """
+    The local embedding store. The writer builds it from Supabase when it is
+    missing or stale; other processes reopen it whenever the writer has changed
+    it, and get None until it exists.
+    """
+    global _embedding_store, _embedding_store_stale
+    from embedding_store import EmbeddingStore, build_from_supabase, store_exists
+
+    with _embedding_store_lock:
+        if _embedding_store is not None and not _embedding_store_stale and not _embedding_store.changed():
+            return _embedding_store
+        path = Config.KB_EMBEDDING_STORE_PATH
+        if _store_writer and (_embedding_store_stale or not store_exists(path)):
+            # A new generation, so the graph is rebuilt for it too
+            _embedding_store = build_from_supabase(
+                path, dim=Config.KB_EMBEDDING_DIM, dtype=Config.KB_EMBEDDING_DTYPE
+            )
+        elif store_exists(path):
+            _embedding_store = EmbeddingStore(path)
+        else:
+            return None
+        _embedding_store_stale = False
+        if Config.DEBUG:
+            print(
+                f"[KB] Local embedding store: {len(_embedding_store)} vectors "
+                f"(dim={_embedding_store.dim}, dtype={_embedding_store.dtype})"
+            )
+        return _embedding_store
+
+
+def _get_ann_index(wait: bool = False):
+    """
+    The HNSW graph for the local store, or None while it is not ready yet
+    (callers search the store exactly meanwhile). A graph saved in the store's
+    generation is loaded; otherwise the writer builds one and saves it, and
+    other processes pick it up once saved. Loading and building run in a
+    background thread, never under _embedding_store_lock; `wait` runs them in
+    the calling thread instead (preload, before the server takes traffic).
+    """
+    global _ann_building
+    from hnsw_index import INDEX_FILE
+
+    store = _get_embedding_store()
+    if store is None:
+        return None
+    with _embedding_store_lock:
+        if _ann_index is not None and _ann_index.store is store:
+            return _ann_index
+        if _ann_index is not None and _ann_index.store.path == store.path:
+            # Same generation reopened after an append: link in the new rows
+            _ann_index.store = store
+            _ann_index.catch_up()
+            return _ann_index
+        if not _store_writer and not os.path.exists(os.path.join(store.path, INDEX_FILE)):
+            return None
+        if not wait:
+            if _ann_building != store.path:
+                _ann_building = store.path
+                threading.Thread(target=_build_ann_index, args=(store,), name="kb-hnsw-build", daemon=True).start()
+            return None
+    return _build_ann_index(store)
+
+
+def _build_ann_index(store):
+    """Load or build the graph for `store`'s generation and swap it in once it is complete."""
+    global _ann_index, _ann_saved_at, _ann_building
+    from hnsw_index import INDEX_FILE, HNSWIndex
+
+    try:
+        saved = os.path.exists(os.path.join(store.path, INDEX_FILE))
+        if saved:
+            index = HNSWIndex.load(store, ef_search=Config.KB_HNSW_EF_SEARCH)
+        else:
+            index = HNSWIndex.build(
+                store,
+                m=Config.KB_HNSW_M,
+                ef_construction=Config.KB_HNSW_EF_CONSTRUCTION,
+                ef_search=Config.KB_HNSW_EF_SEARCH,
+            )
+        with _embedding_store_lock:
+            current = _embedding_store
+            if current is None or current.path != store.path:
+                # The store was rebuilt meanwhile; its generation gets its own graph
+                return None
+            # Link in rows appended while the graph was being built
+            index.store = current
+            index.catch_up()
+            _ann_index = index
+            _ann_saved_at = time.time()
+        if _store_writer and not saved:
+            index.save()
+        if Config.DEBUG:
+            print(f"[KB] HNSW index ready: {len(index)} vectors (ef_search={index.ef_search})")
+        return index
+    except Exception as e:
+        print(f"[KB] HNSW index build failed, using exact search: {e}")
+        return None
+    finally:
+        with _embedding_store_lock:
+            if _ann_building == store.path:
+                _ann_building = None
+
+
+def _save_ann_index_if_due(force: bool = False):
+    """Persist the graph at most every KB_HNSW_SAVE_INTERVAL_SECONDS (load() catches up the rest)."""
+    global _ann_saved_at
+    if _ann_index is None or not _store_writer or _ann_index.store is not _embedding_store:
+        # A graph for a superseded generation is replaced by the one being built
+        return
+    if force or time.time() - _ann_saved_at >= Config.KB_HNSW_SAVE_INTERVAL_SECONDS:
+        _ann_index.save()
+        _ann_saved_at = time.time()
+
+
+def _index_local_vectors(ids: List[Any], embeddings: List[List[float]]):
+    """Append new documents to the local store and link them into the HNSW graph (writer only)."""
+    if not _store_writer:
+        # The writer notices the insert by polling and rebuilds the store
+        return
+    _embedding_store.append(ids, embeddings)
+    index = _ann_index
+    if index is not None and index.store is _embedding_store:
+        # A graph still being built links these rows in when it is swapped in
+        index.catch_up()
+        _save_ann_index_if_due()
+
+
+def _local_vector_search(embeddings: List[List[float]], k: int, threshold: float) -> List[List[Dict[str, Any]]]:
+    """
+    Nearest neighbours from the local store, joined with document fields from
+    the lexical index. None while the writer has not built the store yet.
+    """
+    index = _get_ann_index() if Config.KB_ANN_INDEX == "hnsw" else None
+    if index is not None:
+        hit_lists = [index.search(embedding, k=k, threshold=threshold) for embedding in embeddings]
+    else:
+        store = _get_embedding_store()
+        if store is None:
+            return None
+        hit_lists = store.search_many(embeddings, k=k, threshold=threshold)
+    lexical = _get_lexical_index()
+    results = []
+    for hits in hit_lists:
+        rows = []
+        for doc_id, similarity in hits:
+            row = lexical.get(doc_id)
+            if row is not None:
+                rows.append({**row, "similarity": similarity})
+        results.append(rows)
+    return results
+
+
+def _rpc_vector_search(embedding: List[float], k: int, threshold: float) -> List[Dict[str, Any]]:
+    """Run the match_kb_documents RPC (or a plain table read) for one embedding."""
+    # Get Supabase client
+    supabase = _get_supabase()
+
+    # Try vector similarity search via RPC
+    try:
+        response = supabase.rpc(
+            "match_kb_documents",
+            {
+                "query_embedding": embedding,
+                "match_threshold": threshold,
+                "match_count": k,
+            },
+        ).execute()
+    except Exception:
+        # Fallback if RPC is not available - use simple table query
+        response = (
+            supabase.table("kb_documents")
+            .select("id, source, question, answer, tags")
+            .limit(k)
+            .execute()
+        )
+    return response.data or []
+
+
+def _vector_search_many(embeddings: List[List[float]], k: int, threshold: float) -> List[List[Dict[str, Any]]]:
+    """
+    Vector search for several embeddings in one probe: a single local store pass,
+    or one match_kb_documents_batch RPC (see migration_add_match_kb_documents_batch.sql),
+    falling back to one match_kb_documents call per embedding.
+    """
+    if Config.KB_VECTOR_BACKEND == "local":
+        results = _local_vector_search(embeddings, k, threshold)
+        if results is not None:
+            return results
+    if len(embeddings) == 1:
+        return [_rpc_vector_search(embeddings[0], k, threshold)]
+
+    try:
+        response = _get_supabase().rpc(
+            "match_kb_documents_batch",
+            {
+                # pgvector parses the text form, which PostgREST can pass inside an array
+                "query_embeddings": [json.dumps(embedding) for embedding in embeddings],
+                "match_threshold": threshold,
+                "match_count": k,
+            },
+        ).execute()
+        results: List[List[Dict[str, Any]]] = [[] for _ in embeddings]
+        for row in response.data or []:
+            results[row["query_index"]].append(row)
+        return results
+    except Exception as e:
+        if Config.DEBUG:
+            print(f"[KB] Batch match RPC unavailable, querying one by one: {e}")
+        return [_rpc_vector_search(embedding, k, threshold) for embedding in embeddings]
+
+
+def _vector_search(query: str, k: int, threshold: float) -> List[Dict[str, Any]]:
+    """Embed the query and run the vector search."""
+    # Generate embedding for semantic search
+    embedding = _embed_text(query)
+    return _vector_search_many([embedding], k, threshold)[0]
+
+
+def _lexical_is_confident(hits: List[tuple], coverage: float) -> bool:
+    """A dominant lexical hit that explains most of the query makes the embedding call unnecessary."""
+    if not hits or coverage < Config.KB_LEXICAL_MIN_COVERAGE:
+        return False
+    if len(hits) == 1:
+        return True
+    return hits[0][1] >= Config.KB_LEXICAL_MIN_MARGIN * hits[1][1]
+
+
+def _lexical_results(index: BM25Index, hits: List[tuple], k: int) -> List[Dict[str, Any]]:
+    return [
+        _format_result(index.get(doc_id), bm25_score=score, retrieval="lexical")
+        for doc_id, score in hits[:k]
+    ]
+
+
+def _fused_results(index: BM25Index, hits: List[tuple], vector_rows: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """Merge lexical hits and vector rows by reciprocal-rank fusion."""
+    rows_by_id: Dict[Any, Dict[str, Any]] = {doc_id: index.get(doc_id) for doc_id, _ in hits}
+    rows_by_id.update({row.get("id"): row for row in vector_rows})
+    bm25_scores = dict(hits)
+
+    fused = rrf_fuse(
+        [[doc_id for doc_id, _ in hits], [row.get("id") for row in vector_rows]],
+        k=Config.KB_RRF_K,
+    )
+    return [
+        _format_result(rows_by_id[doc_id], bm25_score=bm25_scores.get(doc_id), rrf_score=score, retrieval="hybrid")
+        for doc_id, score in fused[:k]
+    ]
+
+
+def _hybrid_search(query: str, k: int, threshold: float) -> List[Dict[str, Any]]:
+    """BM25 first; skip the embedding when it is confident, otherwise fuse with vector results by RRF."""
+    index = _get_lexical_index()
+    hits, coverage = index.search_with_coverage(query, k=k * 2)
+
+    if _lexical_is_confident(hits, coverage):
+        if Config.DEBUG:
+            print(f"[KB] Lexical match confident (coverage={coverage:.2f}), skipping embedding")
+        return _lexical_results(index, hits, k)
+
+    return _fused_results(index, hits, _vector_search(query, k * 2, threshold), k)
+
+
+def _merge_with_quotas(ranked: List[tuple], k: int) -> List[Dict[str, Any]]:
+    """
+    Merge per-intent result lists into k snippets: every intent first gets up
+    to k // len(ranked) (at least 1) of its best unseen results, then the
+    remaining slots are filled round-robin by rank.
+    """
+    quota = max(1, k // len(ranked))
+    merged: List[Dict[str, Any]] = []
+    seen: set = set()
+    positions = [0] * len(ranked)
+
+    def take(i: int) -> bool:
+        intent, results = ranked[i]
+        while positions[i] < len(results):
+            result = results[positions[i]]
+            positions[i] += 1
+            key = result.get("id") if result.get("id") is not None else result.get("snippet")
+            if key not in seen:
+                seen.add(key)
+                merged.append({**result, "intent": intent})
+                return True
+        return False
+
+    for i in range(len(ranked)):
+        for _ in range(quota):
+            if len(merged) >= k or not take(i):
+                break
+    progress = True
+    while len(merged) < k and progress:
+        progress = False
+        for i in range(len(ranked)):
+            if len(merged) < k and take(i):
+                progress = True
+    return merged
+
+
+def retrieve_multi(sub_queries: List[tuple], k: int = 5, threshold: float = 0.7) -> List[Dict[str, Any]]:
+    """
+    Retrieve for several (intent, query) pairs at once and merge with per-intent quotas.
+
+    Sub-queries the lexical index answers confidently skip embedding; the rest
+    are embedded in one request and searched in one batched vector probe, so a
+    conversation touching several topics costs no extra round-trips. Each
+    result carries the `intent` it was retrieved for.
+    """
+    from kb_lexical import tokenize
+
+    # Group terms by intent and drop sub-queries with no searchable words
+    grouped: Dict[str, List[str]] = {}
+    for intent, text in sub_queries:
+        if text and text.strip():
+            grouped.setdefault(intent, []).append(text.strip())
+    intents = [(intent, " ".join(texts)) for intent, texts in grouped.items() if tokenize(" ".join(texts))]
+    if not intents:
+        return []
+    if len(intents) == 1:
+        return [{**result, "intent": intents[0][0]} for result in retrieve(intents[0][1], k=k, threshold=threshold)]
+
+    try:
+        _poll_corpus_changes()
+        cache_key = KBResultCache.key(
+            "\x1e".join(f"{intent}:{query}" for intent, query in intents), k, threshold, _corpus_version
+        )
+        cached = _result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        per_intent_k = k
+        ranked: Dict[str, List[Dict[str, Any]]] = {}
+        pending: List[tuple] = []
+        index = _get_lexical_index() if Config.KB_HYBRID_SEARCH else None
+        for intent, query in intents:
+            hits: List[tuple] = []
+            if index is not None:
+                hits, coverage = index.search_with_coverage(query, k=per_intent_k * 2)
+                if _lexical_is_confident(hits, coverage):
+                    ranked[intent] = _lexical_results(index, hits, per_intent_k)
+                    continue
+            pending.append((intent, query, hits))
+
+        if pending:
+            embeddings = _embed_queries([query for _, query, _ in pending])
+            vector_lists = _vector_search_many(embeddings, per_intent_k * 2, threshold)
+            for (intent, _, hits), vector_rows in zip(pending, vector_lists):
+                if index is not None:
+                    ranked[intent] = _fused_results(index, hits, vector_rows, per_intent_k)
+                else:
+                    ranked[intent] = [_format_result(row) for row in vector_rows[:per_intent_k]]
+        if Config.DEBUG:
+            print(f"[KB] Multi-query: {len(intents)} intents, {len(pending)} embedded in one batch")
+
+        results = _merge_with_quotas([(intent, ranked.get(intent, [])) for intent, _ in intents], k)
+        _result_cache.put(cache_key, results)
+        return results
+    except (RuntimeError, ValueError):
+        # KB not configured (missing Supabase or OpenAI API key)
+        return []
+    except Exception as e:
+        import sys
+        print(f"[KB] Error retrieving knowledge base: {e}", file=sys.stderr)
+        return []
 
 
 def retrieve(query: str, k: int = 5, threshold: float = 0.7) -> List[Dict[str, Any]]:
     """
     Retrieve top-k knowledge base snippets for the given query.
 
+    With KB_HYBRID_SEARCH (default) a local BM25 index is searched first; a
+    confident lexical hit is returned without embedding the query, otherwise
+    lexical and vector rankings are fused by reciprocal rank. Results are
+    cached per normalized query/k/threshold until the corpus changes.
+
     Returns list of dictionaries containing source, question, snippet, and similarity.
     Returns empty list if KB is not configured or on any error.
     """
@@ -91,43 +797,18 @@ def retrieve(query: str, k: int = 5, threshold: float = 0.7) -> List[Dict[str, A
         return []
 
     try:
-        # Generate embedding for semantic search
-        embedding = _embed_text(query)
-        
-        # Get Supabase client
-        supabase = _get_supabase()
-
-        # Try vector similarity search via RPC
-        try:
-            response = supabase.rpc(
-                "match_kb_documents",
-                {
-                    "query_embedding": embedding,
-                    "match_threshold": threshold,
-                    "match_count": k,
-                },
-            ).execute()
-        except Exception:
-            # Fallback if RPC is not available - use simple table query
-            response = (
-                supabase.table("kb_documents")
-                .select("id, source, question, answer, tags")
-                .limit(k)
-                .execute()
-            )
-        
-        rows = response.data or []
-        return [
-            {
-                "id": row.get("id"),
-                "source": row.get("source"),
-                "question": row.get("question"),
-                "snippet": row.get("answer"),
-                "tags": row.get("tags", []),
-                "similarity": row.get("similarity"),
-            }
-            for row in rows
-        ]
+        _poll_corpus_changes()
+        cache_key = KBResultCache.key(query, k, threshold, _corpus_version)
+        cached = _result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if Config.KB_HYBRID_SEARCH:
+            results = _hybrid_search(query, k, threshold)
+        else:
+            results = [_format_result(row) for row in _vector_search(query, k, threshold)]
+        _result_cache.put(cache_key, results)
+        return results
     except (RuntimeError, ValueError) as e:
         # KB not configured (missing Supabase or OpenAI API key)
         # Return empty list - system will work without KB
@@ -139,6 +820,24 @@ def retrieve(query: str, k: int = 5, threshold: float = 0.7) -> List[Dict[str, A
         return []
 
 
+def delete_document(doc_id: Any) -> bool:
+    """
+    Delete a knowledge base entry.
+
+    Removes the Supabase row and drops the document from the local indexes
+    (a tombstone in the HNSW graph). Returns False if no row matched.
+    """
+    with _local_write():
+        result = _get_supabase().table("kb_documents").delete().eq("id", doc_id).execute()
+        if not result.data:
+            return False
+        _update_lexical_index("remove", doc_id)
+        if _ann_index is not None and _ann_index.delete(doc_id):
+            _save_ann_index_if_due(force=True)
+        bump_corpus_version("document deleted")
+    return True
+
+
 def list_recent(limit: int = 20) -> List[Dict[str, Any]]:
     """Return recent KB entries for UI display."""
     supabase = _get_supabase()
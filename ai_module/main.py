@@ -2,18 +2,31 @@
 Flask API for LinkedIn Sales Agent AI Module.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
+from analyzer import ANALYZER_ROUTES
+from analyzer_router import get_analyzer_router
 from config import Config
-from ingest import build_conversation
-from response_generator import generate_response
-from orchestrator import run_pipeline
+from conversation_sync import SYNC_FIELDS, SyncConflictError, sync_conversation
+from datetime import datetime
+from followups import find_candidates as find_followups, mark_reminded
+from generation import generate_for_request, request_fingerprint
+from idempotency import (
+    EXECUTED, MAX_KEY_LENGTH, IdempotencyConflict, body_hash, default_key as default_idempotency_key, get_single_flight,
+)
+from jobs import QueueFullError, check_callback_url, get_job_queue, sse_events
 from knowledge_base import (
     add_document as kb_add_document,
+    add_documents as kb_add_documents,
+    delete_document as kb_delete_document,
     retrieve as kb_retrieve,
     list_recent as kb_list_recent,
 )
 from static_scripts import PHASE_LIBRARY, get_phase_config
+from usage import TokenBudgetExceeded, get_ledger, record_dict
+from warmup import get_readiness, start_warm_up
+import metrics
+import os
 import traceback
 
 app = Flask(__name__)
@@ -22,7 +35,8 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Accept"]
+        "allow_headers": ["Content-Type", "Accept", "Idempotency-Key"],
+        "expose_headers": ["Idempotency-Key", "Idempotency-Status"]
     }
 })
 
@@ -31,6 +45,37 @@ def health():
     """Health check endpoint."""
     return jsonify({"status": "healthy", "service": "LinkedIn Sales Agent AI"}), 200
 
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """
+    Readiness check: 503 while this worker is still warming up (see warmup.py),
+    200 once every warm-up component has finished.
+    """
+    snapshot = get_readiness().snapshot()
+    snapshot["service"] = "LinkedIn Sales Agent AI"
+    return jsonify(snapshot), 200 if snapshot["ready"] else 503
+
+def _validate_generate_request(data):
+    """Return an error message for an invalid /generate body, or None."""
+    # Validate required fields
+    required_fields = ["messages", "prospect_name"]
+    for field in required_fields:
+        if field not in data:
+            return f"Missing required field: {field}"
+    
+    # Validate messages
+    if not isinstance(data.get("messages", []), list):
+        return "messages must be a list"
+    token_budget = data.get("token_budget")
+    if token_budget is not None and (isinstance(token_budget, bool) or not isinstance(token_budget, int) or token_budget <= 0):
+        return "token_budget must be a positive integer"
+    latency_target_ms = data.get("latency_target_ms")
+    if latency_target_ms is not None and (isinstance(latency_target_ms, bool) or not isinstance(latency_target_ms, (int, float)) or latency_target_ms <= 0):
+        return "latency_target_ms must be a positive number"
+    if not isinstance(data.get("regenerate", False), bool):
+        return "regenerate must be a boolean"
+    return None
+
 @app.route('/generate', methods=['POST'])
 def generate_response_endpoint():
     """
@@ -48,10 +93,23 @@ def generate_response_endpoint():
             }
         ],
         "current_phase": "building_rapport" (optional),
-        "confirm_phase_change": true/false (optional)
+        "confirm_phase_change": true/false (optional),
+        "token_budget": 20000 (optional, max input+output tokens for this request),
+        "latency_target_ms": 3000 (optional, analyzer latency target for model routing),
+        "regenerate": true (optional, skip the stored draft and write a new one)
     }
     
-    Returns:
+    A thread's draft is stored (DRAFT_STORE_PATH) and served again, with
+    "cached": true, until the conversation changes or "regenerate" is set.
+    
+    Optional header Idempotency-Key (default: derived from thread_id and the
+    messages, none for a regenerate): identical requests in flight share one pipeline run, and a
+    repeat within IDEMPOTENCY_REPLAY_SECONDS gets the stored response. The
+    response's Idempotency-Status header says which happened (executed,
+    coalesced or replayed). Reusing a key with a different body returns 422.
+    
+    Returns 429 when the token budget runs out before the draft is written.
+    Otherwise:
     {
         "response": "Generated response text",
         "phase": "building_rapport" or "doing_the_ask",
@@ -68,100 +126,223 @@ def generate_response_endpoint():
             return jsonify({"error": "Request must be JSON"}), 400
         
         data = request.get_json()
+        error = _validate_generate_request(data)
+        if error:
+            return jsonify({"error": error}), 400
         
-        # Validate required fields
-        required_fields = ["messages", "prospect_name"]
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}), 400
+        # A regenerate must not be answered with a replay of the draft it replaces
+        if not idempotency_key and data.get("thread_id") and not data.get("regenerate"):
+            idempotency_key = default_idempotency_key(data["thread_id"], request_fingerprint(data))
         
-        # Extract data
-        thread_id = data.get("thread_id", "unknown")
-        prospect_name = data.get("prospect_name", "Unknown")
-        messages = data.get("messages", [])
-        current_phase = data.get("current_phase")  # Optional: current phase from Supabase
-        confirm_phase_change = data.get("confirm_phase_change")  # Optional: user approval flag
+        # Serve the stored draft when the conversation is unchanged, otherwise
+        # run analysis + response generation (returns 202 when approval is required).
+        # Identical requests in flight share one run; recent results are replayed.
+        if idempotency_key and Config.IDEMPOTENCY_ENABLED:
+            (result, status_code), outcome = get_single_flight().do(
+                idempotency_key,
+                lambda: generate_for_request(data),
+                request_hash=body_hash(data) if request.headers.get('Idempotency-Key') else None,
+            )
+        else:
+            (result, status_code), outcome = generate_for_request(data), EXECUTED
+        if data.get("regenerate") and data.get("thread_id") and Config.IDEMPOTENCY_ENABLED:
+            # Later plain requests should get the new draft from the store, not a replay of the old one
+            get_single_flight().forget(default_idempotency_key(data["thread_id"], request_fingerprint(data)))
         
-        # Validate messages
-        if not isinstance(messages, list):
-            return jsonify({"error": "messages must be a list"}), 400
+        response = jsonify(result)
+        if idempotency_key:
+            response.headers['Idempotency-Key'] = idempotency_key
+            response.headers['Idempotency-Status'] = outcome
+        return response, status_code
+    
+    except IdempotencyConflict as e:
+        return jsonify({"error": str(e), "status": "idempotency_conflict"}), 422
+    except TokenBudgetExceeded as e:
+        return jsonify({"error": str(e), "status": "token_budget_exceeded"}), 429
+    except Exception as e:
+        print(f"Error generating response: {e}")
+        print(traceback.format_exc())
+        return jsonify({
+            "error": str(e),
+            "response": "Thanks for sharing! Tell me more about that.",
+            "strategy": "error_fallback"
+        }), 500
+
+@app.route('/jobs/generate', methods=['POST'])
+def submit_generate_job():
+    """
+    Enqueue a /generate request and return immediately.
+    
+    Accepts the same JSON body as /generate plus an optional "callback_url"
+    that receives the finished job as a JSON POST.
+    
+    Returns 202:
+    {
+        "job_id": "...",
+        "status": "queued",
+        "status_url": "/jobs/<job_id>",
+        "events_url": "/jobs/<job_id>/events"
+    }
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
         
-        # Build conversation from request data
-        thread_data = {
-            "title": data.get("title", f"Conversation with {prospect_name}"),
-            "description": data.get("description"),
-            "participants": [
-                {"id": "you", "name": "You", "role": "you"},
-                {"id": "prospect", "name": prospect_name, "role": "prospect"},
-            ],
-        }
+        data = request.get_json()
+        error = _validate_generate_request(data)
+        if error:
+            return jsonify({"error": error}), 400
         
-        conv = build_conversation(thread_data, messages)
+        callback_url = data.pop("callback_url", None)
+        if callback_url:
+            try:
+                check_callback_url(callback_url)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
         
-        # Run analysis once - reuse for both response generation and metadata
-        # Pass permission gate parameters
-        analysis = run_pipeline(conv, current_phase=current_phase, confirm_phase_change=confirm_phase_change)
+        try:
+            job = get_job_queue().submit(data, callback_url=callback_url)
+        except QueueFullError as e:
+            return jsonify({"error": str(e)}), 503
         
-        # Check if approval is required
-        if analysis.get("status") == "approval_required":
-            # Return 202 Accepted with approval request
-            return jsonify({
-                "status": "approval_required",
-                "suggested_phase": analysis.get("suggested_phase"),
-                "reasoning": analysis.get("reasoning"),
-                "message": "AI wants to transition to selling phase. Approval required.",
-                "input": {
-                    "thread_id": thread_id,
-                    "prospect_name": prospect_name,
-                    "title": data.get("title", ""),
-                    "description": data.get("description", ""),
-                    "message_count": len(messages),
-                }
-            }), 202
+        job_id = job["job_id"]
+        return jsonify({
+            "job_id": job_id,
+            "status": job["status"],
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events",
+        }), 202
+    except Exception as e:
+        print(f"Error submitting job: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Return a job's status and, once finished, its /generate result.
+    
+    Pass ?wait=N to long-poll up to N seconds (capped by JOBS_MAX_WAIT_SECONDS)
+    for the job to finish.
+    """
+    try:
+        try:
+            wait = float(request.args.get('wait', '0'))
+        except ValueError:
+            return jsonify({"error": "Parameter 'wait' must be a number"}), 400
         
-        # Generate response using the orchestrator pipeline (pass analysis to avoid duplicate call)
-        response_text = generate_response(conv, analysis_result=analysis)
+        queue = get_job_queue()
+        if wait > 0:
+            job = queue.wait(job_id, min(wait, Config.JOBS_MAX_WAIT_SECONDS))
+        else:
+            job = queue.get(job_id)
         
-        # Build response in expected format
+        if job is None:
+            return jsonify({"error": f"Job '{job_id}' not found"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        print(f"Error getting job: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Stream a job's status changes and final result as server-sent events."""
+    try:
+        queue = get_job_queue()
+        if queue.get(job_id) is None:
+            return jsonify({"error": f"Job '{job_id}' not found"}), 404
+        return Response(
+            sse_events(queue, job_id),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except Exception as e:
+        print(f"Error streaming job events: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Return process metrics: counters, gauges and latency histograms."""
+    try:
+        return jsonify(metrics.snapshot()), 200
+    except Exception as e:
+        print(f"Error reading metrics: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+USAGE_GROUP_FIELDS = ("stage", "model", "provider", "phase", "thread_id", "batch")
+
+@app.route('/usage', methods=['GET'])
+def get_usage():
+    """
+    Token usage and estimated cost of provider calls.
+
+    Query: group_by (comma-separated record fields, default "stage,model"),
+    stage, thread_id, since (ISO timestamp), records (number of most recent
+    matching calls to include, default 0). Groups cover the in-process ledger
+    window (USAGE_LEDGER_SIZE calls); "totals" cover the whole process lifetime.
+    """
+    try:
+        group_by = [f.strip() for f in request.args.get('group_by', 'stage,model').split(',') if f.strip()]
+        unknown = [f for f in group_by if f not in USAGE_GROUP_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Cannot group by {', '.join(unknown)} (allowed: {', '.join(USAGE_GROUP_FIELDS)})"}), 400
+        try:
+            records_limit = int(request.args.get('records', '0'))
+        except ValueError:
+            return jsonify({"error": "Parameter 'records' must be an integer"}), 400
+
+        since = None
+        if request.args.get('since'):
+            try:
+                since = datetime.fromisoformat(request.args['since'].replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                return jsonify({"error": "Parameter 'since' must be an ISO 8601 timestamp"}), 400
+
+        ledger = get_ledger()
+        filters = {"stage": request.args.get('stage'), "thread_id": request.args.get('thread_id'), "since": since}
         result = {
-            "response": response_text,
-            "phase": analysis["phase"],
-            "reasoning": analysis["reasoning"],  # Map reasoning directly
-            "engagement_score": 0.0,  # Hardcoded - no longer calculated
-            "sentiment_score": 0.0,  # Hardcoded - no longer calculated
-            "ready_for_ask": analysis["ready_for_ask"],
-            "input": {
-                "thread_id": thread_id,
-                "prospect_name": prospect_name,
-                "title": data.get("title", ""),
-                "description": data.get("description", ""),
-                "message_count": len(messages),
-                "recent_messages_preview": [
-                    {
-                        "sender": msg.get("sender", "unknown"),
-                        "text_preview": (msg.get("text", "")[:100] + "..." if len(msg.get("text", "")) > 100 else msg.get("text", ""))
-                    }
-                    for msg in messages[-3:]
-                ]
-            }
+            "group_by": group_by,
+            "groups": ledger.summary(group_by, **filters),
+            "totals": ledger.totals(),
         }
-        
+        if records_limit > 0:
+            result["records"] = [record_dict(r) for r in ledger.records(**filters)[-records_limit:]]
         return jsonify(result), 200
-    
     except Exception as e:
-        print(f"Error generating response: {e}")
+        print(f"Error reading usage: {e}")
         print(traceback.format_exc())
-        return jsonify({
-            "error": str(e),
-            "response": "Thanks for sharing! Tell me more about that.",
-            "strategy": "error_fallback"
-        }), 500
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/analyzer/routing', methods=['GET'])
+def get_analyzer_routing():
+    """
+    Analyzer router state: per-option call count, p90 latency and error rate,
+    plus the most recent routing decisions (query: limit, default 50).
+    """
+    try:
+        try:
+            limit = int(request.args.get('limit', '50'))
+        except ValueError:
+            return jsonify({"error": "Parameter 'limit' must be an integer"}), 400
+        return jsonify(get_analyzer_router(ANALYZER_ROUTES).snapshot(limit)), 200
+    except Exception as e:
+        print(f"Error reading analyzer routing: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/analyze', methods=['POST'])
 def analyze_conversation():
     """
     Analyze conversation state without generating response.
     
+    Runs the pipeline in analyze-only mode (one analyzer call, no KB retrieval).
+    
     Returns:
     {
         "phase": "building_rapport" or "doing_the_ask",
@@ -188,7 +369,7 @@ def analyze_conversation():
         if not isinstance(messages, list):
             return jsonify({"error": "messages must be a list"}), 400
         
-        state = analyze_conversation_state(messages, prospect_name)
+        state = analyze_conversation_state(messages, prospect_name, data.get("thread_id"))
         return jsonify(state), 200
     
     except Exception as e:
@@ -197,6 +378,56 @@ def analyze_conversation():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/analyze/bulk', methods=['POST'])
+def analyze_conversations_bulk():
+    """
+    Analyze many threads in one request (e.g. a dashboard-wide phase refresh).
+    
+    Expected JSON input:
+    {
+        "threads": [
+            {"thread_id": "...", "prospect_name": "...", "messages": [...]},
+            ...
+        ]
+    }
+    
+    Threads are analyzed concurrently (ANALYZE_BULK_CONCURRENCY), at most
+    ANALYZE_BULK_MAX_THREADS per request. Returns, in input order:
+    {
+        "results": [{"thread_id": "...", "phase": "...", "recommendation": "...", "analysis_details": {...}}, ...],
+        "count": 2,
+        "failed": 0
+    }
+    A thread that fails gets {"thread_id": "...", "error": "..."} in its place.
+    """
+    try:
+        from conversation_analyzer import analyze_many
+        
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+        
+        threads = request.get_json().get("threads")
+        if not isinstance(threads, list) or not threads:
+            return jsonify({"error": "'threads' must be a non-empty list"}), 400
+        if len(threads) > Config.ANALYZE_BULK_MAX_THREADS:
+            return jsonify({"error": f"At most {Config.ANALYZE_BULK_MAX_THREADS} threads per request"}), 400
+        for i, thread in enumerate(threads):
+            if not isinstance(thread, dict) or not isinstance(thread.get("messages", []), list):
+                return jsonify({"error": f"threads[{i}] must be an object with a 'messages' list"}), 400
+        
+        results = analyze_many(threads)
+        return jsonify({
+            "results": results,
+            "count": len(results),
+            "failed": sum(1 for result in results if "error" in result),
+        }), 200
+    
+    except Exception as e:
+        print(f"Error analyzing conversations: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/kb/add', methods=['POST'])
 def add_kb_entry():
     """Add a new knowledge base document."""
@@ -231,6 +462,52 @@ def add_kb_entry():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/kb/bulk-add', methods=['POST'])
+def bulk_add_kb_entries():
+    """Add many knowledge base documents at once: {"documents": [{question, answer, source, tags}, ...]}."""
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+
+        documents = request.get_json().get("documents")
+        if not isinstance(documents, list) or not documents:
+            return jsonify({"error": "'documents' must be a non-empty list"}), 400
+
+        for i, document in enumerate(documents):
+            if not isinstance(document, dict) or not str(document.get("answer") or "").strip():
+                return jsonify({"error": f"documents[{i}]: 'answer' is required"}), 400
+            tags = document.get("tags")
+            if tags is not None and not isinstance(tags, list):
+                return jsonify({"error": f"documents[{i}]: 'tags' must be a list of strings"}), 400
+
+        inserted = kb_add_documents(documents)
+        return jsonify({"ok": True, "documents": inserted, "count": len(inserted)}), 201
+    except Exception as e:
+        print(f"Error bulk adding KB documents: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/kb/delete', methods=['POST'])
+def delete_kb_entry():
+    """Delete a knowledge base document: {"id": ...}."""
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+
+        doc_id = request.get_json().get("id")
+        if doc_id is None:
+            return jsonify({"error": "'id' is required"}), 400
+
+        if not kb_delete_document(doc_id):
+            return jsonify({"error": f"Document '{doc_id}' not found"}), 404
+        return jsonify({"ok": True, "id": doc_id}), 200
+    except Exception as e:
+        print(f"Error deleting KB document: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/kb/search', methods=['GET'])
 def search_kb():
     """Search the knowledge base for relevant snippets."""
@@ -269,6 +546,91 @@ def recent_kb():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/followups', methods=['GET'])
+def list_followups():
+    """
+    Follow-up candidates with rendered scripts, one page at a time.
+
+    Query: status (comma-separated, default "unknown,interested"), limit,
+    cursor (next_cursor of the previous page), before (ISO timestamp,
+    default end of last week).
+    """
+    try:
+        statuses = [s.strip() for s in request.args.get('status', 'unknown,interested').split(',') if s.strip()]
+        try:
+            limit = int(request.args.get('limit', str(Config.FOLLOWUPS_PAGE_SIZE)))
+        except ValueError:
+            return jsonify({"error": "Parameter 'limit' must be an integer"}), 400
+
+        before = None
+        if request.args.get('before'):
+            try:
+                before = datetime.fromisoformat(request.args['before'].replace('Z', '+00:00'))
+            except ValueError:
+                return jsonify({"error": "Parameter 'before' must be an ISO 8601 timestamp"}), 400
+
+        try:
+            page = find_followups(statuses, before=before, limit=limit, cursor=request.args.get('cursor'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        page["count"] = len(page["candidates"])
+        return jsonify(page), 200
+    except Exception as e:
+        print(f"Error listing follow-ups: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/followups/reminded', methods=['POST'])
+def mark_followups_reminded():
+    """Mark threads as reminded in bulk: {"thread_ids": [...]}."""
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+
+        thread_ids = request.get_json().get("thread_ids")
+        if not isinstance(thread_ids, list) or not thread_ids:
+            return jsonify({"error": "'thread_ids' must be a non-empty list"}), 400
+
+        return jsonify(mark_reminded(thread_ids)), 200
+    except Exception as e:
+        print(f"Error marking follow-ups as reminded: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/conversations/sync', methods=['POST'])
+def sync_conversation_messages():
+    """
+    Merge newly scraped messages into a stored conversation.
+
+    Body: {"thread_id": str, "messages": [...oldest first], plus optional
+    title/url/description/status/phase/placeholders}. Only messages the
+    server does not have yet are written; the response carries the canonical
+    index of every message sent.
+    """
+    try:
+        if not request.is_json:
+            return jsonify({"error": "Request must be JSON"}), 400
+
+        data = request.get_json()
+        thread_id = data.get("thread_id")
+        messages = data.get("messages")
+        if not thread_id:
+            return jsonify({"error": "'thread_id' is required"}), 400
+        if not isinstance(messages, list):
+            return jsonify({"error": "'messages' must be a list"}), 400
+
+        fields = {key: data[key] for key in SYNC_FIELDS if key in data}
+        return jsonify(sync_conversation(thread_id, messages, fields)), 200
+    except SyncConflictError as e:
+        return jsonify({"error": str(e)}), 409
+    except Exception as e:
+        print(f"Error syncing conversation: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/scripts/initial-message', methods=['GET'])
 def get_initial_message_template():
     """Return the initial message template for placeholder extraction."""
@@ -438,10 +800,19 @@ def get_script():
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
+    from serving import check_config, start_background_services
+    check_config()
     print(f"Starting LinkedIn Sales Agent AI on {Config.FLASK_HOST}:{Config.FLASK_PORT}")
     print(f"OpenAPI Model: {Config.OPENAI_MODEL}")
     print(f"Temperature: {Config.TEMPERATURE}")
     
+    # Development server; production runs `gunicorn -c gunicorn.conf.py main:app` (see serving.py)
+    # With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+    if not Config.DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
+        # /health/ready answers 503 until this finishes
+        start_warm_up()
+    
     app.run(
         host=Config.FLASK_HOST,
         port=Config.FLASK_PORT,
@@ -0,0 +1,107 @@
+"""
+Lightweight latency statistics shared by the benchmarks and the simulator,
+plus a process-wide registry of counters, gauges and histograms.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Return the pct-th percentile (0-100) of values using linear interpolation."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return float(ordered[0])
+    rank = (pct / 100.0) * (len(ordered) - 1)
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return float(ordered[int(rank)])
+    weight = rank - lower
+    return float(ordered[lower] * (1 - weight) + ordered[upper] * weight)
+
+
+def summarize(values: Iterable[float]) -> Dict[str, float]:
+    """Summarize a list of samples as count/mean/p50/p95/p99/max."""
+    samples = list(values)
+    if not samples:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": float(max(samples)),
+    }
+
+
+# --------------------------------------------------------------------------- #
+# Process-wide metrics registry (exposed via GET /metrics)
+# --------------------------------------------------------------------------- #
+
+# Histograms keep a bounded window of recent samples for percentiles
+HISTOGRAM_WINDOW = 2048
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_histograms: Dict[str, Deque[float]] = {}
+_histogram_totals: Dict[str, int] = {}
+_gauges: Dict[str, Callable[[], Any]] = {}
+
+
+def increment(name: str, amount: float = 1) -> None:
+    """Add to a monotonically increasing counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name: str, value: float) -> None:
+    """Record one sample (e.g. a latency in ms) in a histogram."""
+    with _lock:
+        window = _histograms.get(name)
+        if window is None:
+            window = _histograms[name] = deque(maxlen=HISTOGRAM_WINDOW)
+        window.append(value)
+        _histogram_totals[name] = _histogram_totals.get(name, 0) + 1
+
+
+def register_gauge(name: str, fn: Callable[[], Any]) -> None:
+    """Register a callable that is evaluated every time metrics are read."""
+    with _lock:
+        _gauges[name] = fn
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return counters, gauges and histogram summaries as plain JSON-able data."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {name: (list(window), _histogram_totals[name]) for name, window in _histograms.items()}
+        gauges = dict(_gauges)
+
+    gauge_values: Dict[str, Any] = {}
+    for name, fn in gauges.items():
+        try:
+            gauge_values[name] = fn()
+        except Exception as e:
+            gauge_values[name] = f"error: {e}"
+
+    summaries = {}
+    for name, (samples, total) in histograms.items():
+        summary = summarize(samples)
+        summary["total"] = total
+        summaries[name] = summary
+
+    return {"counters": counters, "gauges": gauge_values, "histograms": summaries}
+
+
+def reset() -> None:
+    """Clear all counters and histograms (gauges stay registered)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _histogram_totals.clear()
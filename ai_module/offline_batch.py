@@ -0,0 +1,409 @@
+"""
+Offline Batch API mode for bulk analysis and follow-up drafting.
+
+Bulk work such as nightly follow-ups and backlog triage does not need an
+answer within seconds. It is sent through the providers' Batch APIs instead
+of the synchronous ResponsesClient / Anthropic calls. Those calls share rate
+limits with interactive drafts, while batches are cheaper per token and have
+their own, higher limits.
+
+A run has two stages because the writer prompt depends on the analysis:
+  1. analyze - one analyzer request per thread, sent to the OpenAI Batch API
+  2. write   - the phase gate and KB retrieval run locally, then one writer
+               request per thread goes to the Anthropic Message Batches API
+Each request carries a short custom_id that the manifest maps to its thread,
+so results are matched up no matter what order the provider returns them in.
+
+Run state is kept in BATCH_WORK_DIR/<run_id>/manifest.json so a run survives
+restarts (a batch can take up to BATCH_COMPLETION_WINDOW). Results are
+written to results.json next to it: one /generate-shaped payload per thread.
+
+Usage (from ai_module/):
+  python offline_batch.py submit --source rows.json
+  python offline_batch.py status <run_id>     # advances the run if its batch finished
+  python offline_batch.py run --source supabase --poll-seconds 60
+The stand-in providers in benchmarks/stubs.py implement both Batch APIs.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from drafts import awaiting_reply
+from generation import approval_payload, build_request_conversation, draft_payload, request_fingerprint
+from usage import accumulate, empty_totals, record_usage
+
+# Item states
+PENDING = "pending"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Run stages
+ANALYZE = "analyze"
+WRITE = "write"
+FINISHED = "finished"
+
+MANIFEST_FILE = "manifest.json"
+RESULTS_FILE = "results.json"
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API: JSONL input file -> batch -> output/error files."""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            from cassette import build_http_client
+
+            self._client = OpenAI(api_key=Config.OPENAI_API_KEY, http_client=build_http_client(timeout=60.0))
+        return self._client
+
+    def submit(self, endpoint: str, requests: List[Tuple[str, Dict[str, Any]]]) -> str:
+        lines = [
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body})
+            for custom_id, body in requests
+        ]
+        upload = self.client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl"),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint=endpoint,
+            completion_window=Config.BATCH_COMPLETION_WINDOW,
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """None while the batch runs, else {custom_id: {"text", "model", "usage"} or {"error": ...}}."""
+        from llm_service import response_body_text
+
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        results: Dict[str, Dict[str, Any]] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    error = item.get("error") or (response.get("body") or {}).get("error") or response.get("status_code")
+                    results[item["custom_id"]] = {"error": str(error)}
+                else:
+                    body = response.get("body") or {}
+                    results[item["custom_id"]] = {
+                        "text": response_body_text(batch.endpoint, body),
+                        "model": body.get("model"),
+                        "usage": body.get("usage"),
+                    }
+        return results
+
+
+class AnthropicBatchBackend:
+    """Anthropic Message Batches API: requests are messages.create params."""
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from anthropic import Anthropic
+            from cassette import build_http_client
+
+            self._client = Anthropic(api_key=Config.ANTHROPIC_API_KEY, http_client=build_http_client())
+        return self._client
+
+    def submit(self, endpoint: str, requests: List[Tuple[str, Dict[str, Any]]]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": params} for custom_id, params in requests]
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        batch = self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+        results: Dict[str, Dict[str, Any]] = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                text = "".join(block.text for block in message.content if block.type == "text")
+                results[entry.custom_id] = {"text": text, "model": message.model, "usage": message.usage}
+            else:
+                error = getattr(entry.result, "error", None)
+                results[entry.custom_id] = {"error": str(getattr(error, "error", error) or entry.result.type)}
+        return results
+
+
+def collect_requests(source, limit: int) -> List[Dict[str, Any]]:
+    """/generate bodies for every thread in `source` whose latest message is from the prospect."""
+    from draft_worker import row_to_request
+
+    bodies = []
+    for row in source.fetch(limit):
+        body = row_to_request(row)
+        if body["thread_id"] and body["messages"] and awaiting_reply(body["messages"]):
+            bodies.append(body)
+    return bodies
+
+
+class BatchRun:
+    """One bulk analyze + write run, persisted as a manifest so it can be resumed."""
+
+    def __init__(self, path: str, manifest: Dict[str, Any], analyze_backend=None, write_backend=None):
+        self.path = path
+        self.manifest = manifest
+        self.analyze_backend = analyze_backend or OpenAIBatchBackend()
+        self.write_backend = write_backend or AnthropicBatchBackend()
+
+    @property
+    def run_id(self) -> str:
+        return self.manifest["run_id"]
+
+    @property
+    def stage(self) -> str:
+        return self.manifest["stage"]
+
+    @classmethod
+    def create(cls, bodies: List[Dict[str, Any]], work_dir: Optional[str] = None, **backends) -> "BatchRun":
+        """Write a manifest for `bodies` and submit the analyzer batch."""
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(work_dir or Config.BATCH_WORK_DIR, run_id)
+        os.makedirs(path, exist_ok=True)
+        manifest = {
+            "run_id": run_id,
+            "created_at": time.time(),
+            "stage": ANALYZE,
+            "batches": {},
+            # custom_ids are positional: provider ids allow only [A-Za-z0-9_-]
+            "items": [
+                {
+                    "custom_id": f"thread-{i}",
+                    "thread_id": body["thread_id"],
+                    "fingerprint": request_fingerprint(body),
+                    "request": body,
+                    "status": PENDING,
+                }
+                for i, body in enumerate(bodies)
+            ],
+        }
+        run = cls(path, manifest, **backends)
+        run._submit_analysis()
+        return run
+
+    @classmethod
+    def load(cls, run_id: str, work_dir: Optional[str] = None, **backends) -> "BatchRun":
+        path = os.path.join(work_dir or Config.BATCH_WORK_DIR, run_id)
+        with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as fh:
+            return cls(path, json.load(fh), **backends)
+
+    def save(self):
+        tmp_path = os.path.join(self.path, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.manifest, fh, default=str)
+        os.replace(tmp_path, os.path.join(self.path, MANIFEST_FILE))
+
+    def _pending(self) -> List[Dict[str, Any]]:
+        return [item for item in self.manifest["items"] if item["status"] == PENDING]
+
+    # ------------------------------------------------------------------ #
+    # Stages
+    # ------------------------------------------------------------------ #
+
+    def _submit_analysis(self):
+        from analyzer import build_analysis_request
+
+        by_endpoint: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for item in self._pending():
+            body = item["request"]
+            conv = build_request_conversation(body)
+            endpoint, request = build_analysis_request(conv, current_phase=body.get("current_phase"))
+            by_endpoint.setdefault(endpoint, []).append((item["custom_id"], request))
+        # A batch is limited to a single endpoint
+        self.manifest["batches"] = {
+            endpoint: self.analyze_backend.submit(endpoint, requests) for endpoint, requests in by_endpoint.items()
+        }
+        self.manifest["stage"] = ANALYZE
+        self.save()
+        if Config.DEBUG:
+            print(f"[Batch] Run {self.run_id}: submitted {len(self._pending())} analyzer requests")
+        if not by_endpoint:
+            self._finish({})
+
+    def _collect(self, backend) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Merged results of the current stage's batches, or None while any is still running."""
+        merged: Dict[str, Dict[str, Any]] = {}
+        for endpoint, batch_id in self.manifest["batches"].items():
+            results = backend.poll(batch_id)
+            if results is None:
+                return None
+            merged.update(results)
+        return merged
+
+    def _record_usage(self, stage: str, provider: str, item: Dict[str, Any], result: Dict[str, Any]):
+        """
+        Add a batch result's token usage (billed at the Batch API discount) to the
+        usage ledger and to the run's per-stage totals in the manifest.
+        """
+        if result.get("usage") is None:
+            return
+        record = record_usage(
+            stage,
+            provider,
+            result.get("model") or "unknown",
+            result["usage"],
+            phase=item["request"].get("current_phase"),
+            thread_id=item.get("thread_id"),
+            batch=True,
+        )
+        accumulate(self.manifest.setdefault("usage", {}).setdefault(stage, empty_totals()), record)
+
+    def _submit_writes(self, analyses: Dict[str, Dict[str, Any]]):
+        from llm_service import parse_json_text
+        from orchestrator import run_pipeline
+        from response_generator import build_writer_request
+
+        writes: List[Tuple[str, Dict[str, Any]]] = []
+        for item in self._pending():
+            result = analyses.get(item["custom_id"]) or {"error": "missing from batch output"}
+            self._record_usage("analyzer", "openai", item, result)
+            if "error" in result:
+                item.update(status=FAILED, error=f"analyze: {result['error']}")
+                continue
+            body = item["request"]
+            conv = build_request_conversation(body)
+            pipeline = run_pipeline(
+                conv,
+                current_phase=body.get("current_phase"),
+                confirm_phase_change=body.get("confirm_phase_change"),
+                analysis=parse_json_text(result["text"]),
+            )
+            if pipeline.get("status") == "approval_required":
+                item.update(status=DONE, status_code=202, payload=approval_payload(body, pipeline))
+                continue
+            request = build_writer_request(conv, analysis_result=pipeline)
+            if request is None:
+                item.update(status=SKIPPED, error="no reply needed")
+                continue
+            item["pipeline"] = pipeline
+            writes.append((item["custom_id"], request))
+
+        self.manifest["batches"] = {"messages": self.write_backend.submit("messages", writes)} if writes else {}
+        self.manifest["stage"] = WRITE
+        self.save()
+        if Config.DEBUG:
+            print(f"[Batch] Run {self.run_id}: submitted {len(writes)} writer requests")
+        if not writes:
+            self._finish({})
+
+    def _finish(self, replies: Dict[str, Dict[str, Any]]):
+        from response_generator import _sanitize_response
+
+        for item in self._pending():
+            result = replies.get(item["custom_id"]) or {"error": "missing from batch output"}
+            self._record_usage("writer", "anthropic", item, result)
+            pipeline = item.pop("pipeline", None)
+            text = _sanitize_response(result.get("text", "").strip())
+            if "error" in result or not text:
+                item.update(status=FAILED, error=f"write: {result.get('error', 'empty reply')}")
+                continue
+            item.update(status=DONE, status_code=200, payload=draft_payload(item["request"], pipeline, text))
+
+        results = [
+            {key: item.get(key) for key in ("thread_id", "fingerprint", "status_code", "payload")}
+            for item in self.manifest["items"]
+            if item["status"] == DONE
+        ]
+        with open(os.path.join(self.path, RESULTS_FILE), "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2, default=str)
+        self.manifest["stage"] = FINISHED
+        self.manifest["batches"] = {}
+        self.manifest["finished_at"] = time.time()
+        self.save()
+
+    def advance(self) -> str:
+        """Move to the next stage if the current batches finished; returns the stage."""
+        if self.stage == ANALYZE:
+            analyses = self._collect(self.analyze_backend)
+            if analyses is not None:
+                self._submit_writes(analyses)
+        if self.stage == WRITE:
+            replies = self._collect(self.write_backend)
+            if replies is not None:
+                self._finish(replies)
+        return self.stage
+
+    def wait(self, poll_seconds: Optional[float] = None, timeout: Optional[float] = None) -> str:
+        poll_seconds = poll_seconds if poll_seconds is not None else Config.BATCH_POLL_SECONDS
+        deadline = time.time() + timeout if timeout else None
+        while self.advance() != FINISHED:
+            if deadline and time.time() >= deadline:
+                break
+            time.sleep(poll_seconds)
+        return self.stage
+
+    def summary(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for item in self.manifest["items"]:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return {
+            "run_id": self.run_id,
+            "stage": self.stage,
+            "batches": self.manifest["batches"],
+            "items": counts,
+            "usage": self.manifest.get("usage", {}),
+        }
+
+    def results(self) -> List[Dict[str, Any]]:
+        with open(os.path.join(self.path, RESULTS_FILE), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+
+def main(argv=None) -> int:
+    from draft_worker import source_from_config
+
+    parser = argparse.ArgumentParser(description="Bulk analyze + draft threads through the provider Batch APIs")
+    parser.add_argument("--work-dir", default=Config.BATCH_WORK_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("submit", "run"):
+        command = sub.add_parser(name, help="Submit a new run" + (" and wait for it" if name == "run" else ""))
+        command.add_argument("--source", help="'supabase' or a JSON file of conversation rows")
+        command.add_argument("--limit", type=int, default=1000, help="Conversation rows to scan")
+        if name == "run":
+            command.add_argument("--poll-seconds", type=float, default=Config.BATCH_POLL_SECONDS)
+    status = sub.add_parser("status", help="Advance a run and print its state")
+    status.add_argument("run_id")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        run = BatchRun.load(args.run_id, work_dir=args.work_dir)
+        run.advance()
+    else:
+        bodies = collect_requests(source_from_config(args.source), args.limit)
+        run = BatchRun.create(bodies, work_dir=args.work_dir)
+        print(f"Submitted run {run.run_id} ({len(bodies)} threads)")
+        if args.command == "run":
+            run.wait(poll_seconds=args.poll_seconds)
+    print(json.dumps(run.summary(), indent=2))
+    if run.stage == FINISHED:
+        print(f"Results: {os.path.join(run.path, RESULTS_FILE)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
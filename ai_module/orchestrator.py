@@ -4,32 +4,33 @@ Emits unified AnalysisResult JSON based on GPT-5-mini's strategic assessment.
 """
 
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from io_models import Conversation
 from analyzer import analyze_conversation
-from knowledge_base import retrieve as kb_retrieve
+from knowledge_base import retrieve as kb_retrieve, retrieve_multi as kb_retrieve_multi
 from static_scripts import get_prompt_blocks, cta_templates, get_conversation_guidance
 from config import Config
+from thread_features import conversation_features
+from usage import TokenBudgetExceeded
 
 
-def _build_kb_query(conv: Conversation, phase: str) -> str:
+def _build_kb_intents(conv: Conversation, phase: str) -> List[Tuple[str, str]]:
     """
-    Build an intelligent query for knowledge base retrieval based on conversation content.
-    Extracts key topics, questions, school names, and context from recent messages.
-    This helps retrieve relevant KB entries about friends, schools, background, etc.
+    Detect the knowledge base topics a conversation touches.
+    Returns ordered (intent, query terms) pairs - friend, school, who, pricing,
+    program, application, names and a phase default - that `_build_kb_query`
+    joins into one query and multi-query retrieval searches separately.
     """
     import re
     
     # Get recent messages (last 10 or all if fewer)
     recent_messages = conv.messages[-10:] if len(conv.messages) > 10 else conv.messages
     
-    # Extract text from prospect messages (they're asking questions/mentioning things)
-    prospect_texts = [msg.text for msg in recent_messages if msg.sender == "prospect"]
-    all_texts = [msg.text for msg in recent_messages]
+    # Names and school mentions in recent prospect messages come from the thread's feature record
+    features = conversation_features(conv)
     
     # Combine all recent conversation text (lowercase for matching)
-    conversation_text = " ".join(all_texts).lower()
-    prospect_conversation = " ".join(prospect_texts)
+    conversation_text = " ".join(msg.text for msg in recent_messages).lower()
     
     # Keywords to look for that indicate what information might be needed
     query_terms = []
@@ -41,75 +42,78 @@ def _build_kb_query(conv: Conversation, phase: str) -> str:
     ]
     for pattern in friend_patterns:
         if re.search(pattern, conversation_text, re.IGNORECASE):
-            query_terms.append("friend background connection school")
+            query_terms.append(("friend", "friend background connection school"))
             break
     
     # Look for school mentions (extract school names)
-    school_patterns = [
-        r"school", r"high school", r"college", r"university", r"academy",
-        r"at\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",  # "at School Name"
-        r"from\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)"  # "from School Name"
-    ]
-    school_mentioned = False
-    for pattern in school_patterns:
-        if re.search(pattern, prospect_conversation, re.IGNORECASE):
-            school_mentioned = True
-            query_terms.append("school friend background")
-            # Try to extract school name
-            matches = re.findall(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b', prospect_conversation)
-            if matches:
-                # Add potential school names (capitalized multi-word phrases)
-                for match in matches[:2]:  # Take first 2 potential school names
-                    if len(match.split()) <= 3:  # Likely a school name if 1-3 words
-                        query_terms.append(match.lower())
-            break
+    capitalized_words = features.recent_names()
+    if features.school_mentioned():
+        query_terms.append(("school", "school friend background"))
+        # Add potential school names (capitalized multi-word phrases)
+        for match in capitalized_words[:2]:  # Take first 2 potential school names
+            if len(match.split()) <= 3:  # Likely a school name if 1-3 words
+                query_terms.append(("school", match.lower()))
     
     # Look for questions about "who" - often asking about friends/people
     # But be careful - "who" alone might be too generic, check for context
     who_patterns = [r"\bwho\b.*\?", r"\bwho\b.*friend", r"\bwho\b.*you", r"\bwho\b.*from"]
     if any(re.search(pattern, conversation_text, re.IGNORECASE) for pattern in who_patterns):
-        query_terms.append("friend who background")
+        query_terms.append(("who", "friend who background"))
     
     # Look for pricing/cost questions
     pricing_keywords = ["cost", "price", "pricing", "expensive", "afford", "fee", "money", "pay", "how much"]
     for keyword in pricing_keywords:
         if keyword in conversation_text:
-            query_terms.append("pricing cost financial aid program fee")
+            query_terms.append(("pricing", "pricing cost financial aid program fee"))
             break
     
     # Look for program details questions
     program_keywords = ["program", "fellowship", "what is", "how does", "works", "about prodicity", "tell me about"]
     for keyword in program_keywords:
         if keyword in conversation_text:
-            query_terms.append("program fellowship details prodicity")
+            query_terms.append(("program", "program fellowship details prodicity"))
             break
     
     # Look for application questions
     app_keywords = ["apply", "application", "deadline", "when", "how to apply", "interested"]
     for keyword in app_keywords:
         if keyword in conversation_text:
-            query_terms.append("application deadline how to apply")
+            query_terms.append(("application", "application deadline how to apply"))
             break
     
-    # Extract capitalized words (likely names, schools, places) from prospect messages
-    capitalized_words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', prospect_conversation)
+    # Capitalized words (likely names, schools, places) from prospect messages
     if capitalized_words:
         # Filter for likely school names or person names (2-3 words, capitalized)
         potential_names = [w for w in capitalized_words if 1 <= len(w.split()) <= 3]
         if potential_names:
-            query_terms.extend([w.lower() for w in potential_names[:3]])
+            query_terms.extend(("names", w.lower()) for w in potential_names[:3])
     
     # Phase-specific default queries
     if phase == "building_rapport":
         # In rapport phase, they often ask about background, friends, connections
-        if not any("friend" in term or "background" in term for term in query_terms):
-            query_terms.append("friend background school connection")
+        if not any("friend" in term or "background" in term for _, term in query_terms):
+            query_terms.append(("phase", "friend background school connection"))
     elif phase == "post_selling":
         # In post-selling phase, they're asking specific questions - prioritize those topics
-        query_terms.append("prodicity program pricing application details logistics")
+        query_terms.append(("phase", "prodicity program pricing application details logistics"))
     elif phase == "doing_the_ask":
         # In selling phase, they might ask about program details, pricing, application
-        query_terms.append("prodicity program pricing application")
+        query_terms.append(("phase", "prodicity program pricing application"))
+    
+    return query_terms
+
+
+def _build_kb_query(conv: Conversation, phase: str) -> str:
+    """
+    Build an intelligent query for knowledge base retrieval based on conversation content.
+    Extracts key topics, questions, school names, and context from recent messages.
+    This helps retrieve relevant KB entries about friends, schools, background, etc.
+    """
+    import re
+    
+    recent_messages = conv.messages[-10:] if len(conv.messages) > 10 else conv.messages
+    conversation_text = " ".join(msg.text for msg in recent_messages).lower()
+    query_terms = [term for _, term in _build_kb_intents(conv, phase)]
     
     # Combine all query terms (remove duplicates, keep order)
     seen = set()
@@ -148,7 +152,23 @@ def _build_kb_query(conv: Conversation, phase: str) -> str:
     return query
 
 
-def run_pipeline(conv: Conversation, current_phase: str = None, confirm_phase_change: bool = None) -> Dict[str, Any]:
+def run_pipeline(
+    conv: Conversation,
+    current_phase: str = None,
+    confirm_phase_change: bool = None,
+    analysis: Optional[Dict[str, Any]] = None,
+    latency_target_ms: Optional[float] = None,
+    analyze_only: bool = False,
+) -> Dict[str, Any]:
+    """
+    Analyze the conversation, apply the phase permission gate and fetch KB context.
+
+    `analysis` is a precomputed analyzer result (e.g. from the offline Batch API);
+    when given, the analyzer call is skipped. `latency_target_ms` is passed to
+    the analyzer router. With `analyze_only` the pipeline stops after the phase
+    decision: no KB query, embedding or retrieval, and no script guidance
+    (`knowledge_context` is empty). /analyze uses it, since it only reports the phase.
+    """
     pipeline_start = time.time()
     
     # Handle empty conversations
@@ -171,13 +191,17 @@ def run_pipeline(conv: Conversation, current_phase: str = None, confirm_phase_ch
     # Analyze with GPT-5-mini to get strategic decision
     analyzer_start = time.time()
     try:
-        analysis = analyze_conversation(conv, current_phase=current_phase)
+        if analysis is None:
+            analysis = analyze_conversation(conv, current_phase=current_phase, latency_target_ms=latency_target_ms)
         analyzer_time = time.time() - analyzer_start
         if Config.DEBUG:
             if analyzer_time < 1:
                 print(f"[Orchestrator] Analyzer (OpenAI API) completed: {analyzer_time*1000:.0f}ms")
             else:
                 print(f"[Orchestrator] Analyzer (OpenAI API) completed: {analyzer_time:.2f}s")
+    except TokenBudgetExceeded:
+        # Not an analyzer failure: the request is out of tokens, so no default analysis either
+        raise
     except Exception as e:
         error_msg = str(e)
         if Config.DEBUG:
@@ -297,6 +321,22 @@ def run_pipeline(conv: Conversation, current_phase: str = None, confirm_phase_ch
         if Config.DEBUG:
             print(f"[Orchestrator] Using analyzer's phase decision: {phase}")
     
+    if analyze_only:
+        if Config.DEBUG:
+            print(f"[Orchestrator] Analyze-only pipeline time: {(time.time() - pipeline_start)*1000:.0f}ms")
+        return {
+            "phase": phase,
+            "ready_for_ask": ready_for_ask,
+            "instruction_for_writer": instruction_for_writer,
+            "reasoning": reasoning,
+            "recommendation": instruction_for_writer,
+            "knowledge_context": [],
+            "next_message_suggestion": {"text": "", "cta": None, "variables": {}},
+            "conversation_guidance": {},
+            "raw_llm": analysis,
+            "timestamps": {},
+        }
+    
     # Build intelligent KB query based on conversation content and phase
     kb_query_start = time.time()
     kb_query = _build_kb_query(conv, phase)
@@ -310,7 +350,11 @@ def run_pipeline(conv: Conversation, current_phase: str = None, confirm_phase_ch
     # Retrieve KB snippets (with error handling)
     kb_start = time.time()
     try:
-        kb_snippets = kb_retrieve(query=kb_query, k=5)
+        if Config.KB_MULTI_QUERY:
+            # One sub-query per detected topic, embedded and searched in a single batch
+            kb_snippets = kb_retrieve_multi(_build_kb_intents(conv, phase), k=5)
+        else:
+            kb_snippets = kb_retrieve(query=kb_query, k=5)
         kb_time = time.time() - kb_start
         if Config.DEBUG:
             if kb_time < 1:
@@ -334,7 +378,7 @@ def run_pipeline(conv: Conversation, current_phase: str = None, confirm_phase_ch
     # Get conversation state for guidance (minimal - only what's needed)
     conversation_state = {
         "message_count": len(conv.messages),
-        "prospect_message_count": sum(1 for m in conv.messages if m.sender == "prospect"),
+        "prospect_message_count": conversation_features(conv).prospect_message_count,
     }
     
     # Get guidance from static scripts
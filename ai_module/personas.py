@@ -0,0 +1,125 @@
+"""
+Prospect personas for simulator self-play.
+
+Each persona can answer either from a fixed script (deterministic, free) or
+by asking an LLM to stay in character (realistic, costs tokens).
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from io_models import Message
+
+
+@dataclass
+class Persona:
+    """A simulated high school prospect."""
+    id: str
+    name: str
+    school: str
+    description: str
+    script: List[str] = field(default_factory=list)
+
+    def scripted_reply(self, turn: int) -> Optional[str]:
+        """Return the scripted reply for this prospect turn, or None when the script is exhausted."""
+        if turn < len(self.script):
+            return self.script[turn]
+        return None
+
+
+PERSONAS: Dict[str, Persona] = {
+    "engaged_builder": Persona(
+        id="engaged_builder",
+        name="Ivan",
+        school="Lynbrook",
+        description="Junior building a tutoring app, talkative and curious, open to mentorship.",
+        script=[
+            "Yeah! I'm building a tutoring app that matches students with peer tutors",
+            "I started it because a lot of my friends were struggling in AP Calc and couldn't afford tutors",
+            "Honestly the hardest part is finding time with APs and robotics, and I'm not sure how to grow it",
+            "I'd love to turn it into a nonprofit and get it into other schools in the district",
+            "That sounds really cool, what is Prodicity exactly?",
+            "How much does it cost? Is there financial aid?",
+            "Ok I'll take a look at the application, when is the deadline?",
+        ],
+    ),
+    "busy_junior": Persona(
+        id="busy_junior",
+        name="Maya",
+        school="Monta Vista",
+        description="Overwhelmed junior doing research, short replies, worried about time.",
+        script=[
+            "kinda, doing some bio research at a lab",
+            "it's cool but super busy with APs and SAT prep",
+            "idk, maybe publish something eventually",
+            "how much time would it take per week?",
+            "I'm pretty busy this semester tbh",
+            "maybe over the summer",
+        ],
+    ),
+    "price_sensitive": Persona(
+        id="price_sensitive",
+        name="Daniel",
+        school="Cupertino",
+        description="Sophomore with a small nonprofit, interested but worried about cost.",
+        script=[
+            "I run a small nonprofit that collects used laptops for families",
+            "We've donated like 40 so far, mostly through word of mouth",
+            "Getting more donors is tough, and I don't really know how to scale",
+            "Is this free? How much does it cost?",
+            "That's a lot for my family, is there any financial aid?",
+            "Ok, I'll ask my parents about it",
+        ],
+    ),
+    "no_project": Persona(
+        id="no_project",
+        name="Sofia",
+        school="Saratoga",
+        description="Freshman without a project yet, unsure of her interests, feels unqualified.",
+        script=[
+            "not really working on anything rn",
+            "I like art and maybe psychology?",
+            "I don't really know where to start honestly",
+            "is this for people who already have projects?",
+            "oh ok that's good to know",
+        ],
+    ),
+    "quick_yes": Persona(
+        id="quick_yes",
+        name="Ethan",
+        school="Harker",
+        description="Senior founder who explicitly asks for help early and moves fast.",
+        script=[
+            "Yes, I'm building an AI study tool and already have 200 users",
+            "Honestly I could use help, can you help me figure out fundraising?",
+            "Sounds great, how do I apply?",
+            "Cool, what does the interview look like?",
+        ],
+    ),
+}
+
+
+class LLMProspect:
+    """Generates in-character prospect replies with the OpenAI client."""
+
+    def __init__(self, persona: Persona, model: Optional[str] = None):
+        from llm_service import ResponsesClient
+
+        self.persona = persona
+        self.client = ResponsesClient(model=model)
+
+    def reply(self, messages: List[Message], turn: int) -> Optional[str]:
+        transcript = "\n".join(
+            f"{'Them' if m.sender == 'you' else 'You'}: {m.text}" for m in messages[-10:]
+        )
+        system_prompt = (
+            f"You are {self.persona.name}, a high school student at {self.persona.school}. "
+            f"{self.persona.description} You are chatting on LinkedIn with someone who reached out to you. "
+            "Reply the way a real teenager texts: short, casual, no emojis, lowercase is fine. "
+            "Stay in character and react to what they actually said."
+        )
+        user_prompt = f"Conversation so far:\n{transcript}\n\nWrite your next reply as JSON: {{\"reply\": \"...\"}}"
+        result = self.client.json_response(system_prompt=system_prompt, user_prompt=user_prompt, reasoning_effort="low", stage="persona")
+        text = str(result.get("reply") or "").strip()
+        # Fall back to the script if the model returns nothing usable
+        return text or self.persona.scripted_reply(turn)
@@ -0,0 +1,74 @@
+"""
+Deterministic pitch/phase signals for the analyzer.
+
+The analyzer prompt used to ask the model to scan the history for pitch
+indicators and to apply the post_selling one-way rules itself, which cost
+prompt and reasoning tokens on every call. These facts are cheap to compute
+from the thread's feature record (thread_features.py) and `current_phase`, so
+they are computed here and stated in the prompt. The phases the model may
+pick are also narrowed in the response schema's enum.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+from io_models import Conversation
+from thread_features import conversation_features
+
+PHASES = ("building_rapport", "doing_the_ask", "post_selling")
+
+
+@dataclass
+class PhaseSignals:
+    """Pitch facts and the phase options that follow from them."""
+    current_phase: Optional[str]
+    has_pitched: bool
+    last_pitch_index: int
+    messages_since_pitch: int
+    questions_since_pitch: int
+    allowed_phases: List[str]
+
+    def facts(self) -> List[str]:
+        """Prompt lines stating the signals."""
+        if self.has_pitched:
+            pitch = (
+                f"- Prodicity already pitched: yes ({self.messages_since_pitch} messages ago, "
+                f"{self.questions_since_pitch} prospect question(s) since)"
+            )
+        else:
+            pitch = "- Prodicity already pitched: no"
+        return [pitch, f"- Allowed phases: {', '.join(self.allowed_phases)}"]
+
+    def phase_rule(self) -> str:
+        """The one phase rule that applies to this conversation."""
+        if self.current_phase == "post_selling":
+            return (
+                "Current phase is 'post_selling', which is one-way: keep 'post_selling'. Use 'building_rapport' "
+                "only if the conversation has clearly gone back to rapport (rare)."
+            )
+        if "post_selling" in self.allowed_phases:
+            return (
+                "We already pitched and they asked follow-up questions: 'post_selling' "
+                "('building_rapport' only if move_forward is False)."
+            )
+        return "'doing_the_ask' if move_forward is True, otherwise 'building_rapport'."
+
+
+def extract_signals(conv: Conversation, current_phase: Optional[str] = None) -> PhaseSignals:
+    """Signals for `conv`, read from its feature record (O(new messages))."""
+    features = conversation_features(conv)
+
+    if current_phase == "post_selling" or (features.has_pitched and features.questions_since_pitch):
+        allowed = ["post_selling", "building_rapport"]
+    else:
+        # Nothing to follow up on yet, so post_selling is not an option
+        allowed = ["building_rapport", "doing_the_ask"]
+
+    return PhaseSignals(
+        current_phase=current_phase,
+        has_pitched=features.has_pitched,
+        last_pitch_index=features.last_pitch_index,
+        messages_since_pitch=(features.message_count - 1 - features.last_pitch_index) if features.has_pitched else 0,
+        questions_since_pitch=features.questions_since_pitch,
+        allowed_phases=allowed,
+    )
@@ -0,0 +1,161 @@
+"""
+Process-wide OpenAI and Anthropic SDK clients.
+
+A client owns an httpx connection pool. Clients used to be built per call,
+so every analyzer, embedding and writer call paid for its own TCP/TLS
+handshake. They are now shared per process, and calls reuse pooled
+keep-alive connections; warmup.py opens those connections before the first
+request. A client is rebuilt after a fork (connections are not shared across
+processes) or when the settings it was built from change: API key, base
+URL or cassette mode.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+
+# Timeout for the warm-up request that opens a provider connection
+WARM_TIMEOUT_SECONDS = 10.0
+
+_clients: Dict[tuple, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _client_key(provider: str, api_key: str) -> tuple:
+    return (
+        provider,
+        os.getpid(),
+        api_key,
+        os.environ.get(f"{provider.upper()}_BASE_URL"),
+        Config.LLM_CASSETTE_MODE,
+        Config.LLM_CASSETTE_PATH,
+        Config.LLM_CASSETTE_REPLAY_LATENCY,
+        Config.RATE_LIMIT_ENABLED,
+    )
+
+
+def _retry_options() -> Dict[str, Any]:
+    # With the rate limiter on, it retries throttled calls; SDK retries would bypass it
+    return {"max_retries": 0} if Config.RATE_LIMIT_ENABLED else {}
+
+
+def _build_openai_client(api_key: str):
+    # Imported here: the SDK (and httpx under it) costs a few hundred ms at import,
+    # which only code that actually calls OpenAI should pay
+    from openai import OpenAI
+    from cassette import build_http_client
+
+    # Fix for httpx version incompatibility with proxies parameter
+    # Issue: httpx 0.28+ removed 'proxies' parameter, but OpenAI SDK may try to use it
+    # Solution: Create httpx client explicitly and handle proxy env vars
+
+    # Save and remove proxy environment variables to prevent auto-detection
+    proxy_vars = ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy',
+                 'ALL_PROXY', 'all_proxy', 'NO_PROXY', 'no_proxy']
+    saved_proxies = {}
+    for var in proxy_vars:
+        if var in os.environ:
+            saved_proxies[var] = os.environ.pop(var)
+
+    try:
+        # Try to create httpx client explicitly (works with newer httpx versions)
+        try:
+            # Create httpx client without proxies to avoid version conflicts
+            # (the cassette layer may wrap it for record/replay)
+            http_client = build_http_client(timeout=60.0)
+            return OpenAI(api_key=api_key, http_client=http_client, **_retry_options())
+        except (TypeError, AttributeError):
+            # If that fails (e.g., httpx version issue), try without explicit client
+            # but with proxy vars still removed
+            return OpenAI(api_key=api_key, **_retry_options())
+    except Exception as init_error:
+        # If initialization still fails, restore env vars and try one more time
+        # This handles edge cases where the error persists
+        for var, value in saved_proxies.items():
+            os.environ[var] = value
+
+        # Last attempt - may work if the issue was something else
+        try:
+            return OpenAI(api_key=api_key, **_retry_options())
+        except Exception:
+            # If all else fails, provide helpful error message
+            raise RuntimeError(
+                f"Failed to initialize OpenAI client. This may be due to httpx version incompatibility.\n"
+                f"Try: pip install httpx==0.27.2\n"
+                f"Or: pip install --upgrade openai\n"
+                f"Original error: {init_error}"
+            ) from init_error
+    finally:
+        # Always restore proxy environment variables
+        for var, value in saved_proxies.items():
+            os.environ[var] = value
+
+
+def _build_anthropic_client(api_key: str):
+    # Deferred: the SDK is slow to import
+    from anthropic import Anthropic
+    from cassette import build_http_client
+
+    return Anthropic(api_key=api_key, http_client=build_http_client(), **_retry_options())
+
+
+def get_openai_client(api_key: Optional[str] = None):
+    """The process's OpenAI client for `api_key` (default Config.OPENAI_API_KEY)."""
+    api_key = api_key or Config.OPENAI_API_KEY
+    key = _client_key("openai", api_key)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = _build_openai_client(api_key)
+        return _clients[key]
+
+
+def get_anthropic_client():
+    """The process's Anthropic client."""
+    key = _client_key("anthropic", Config.ANTHROPIC_API_KEY)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = _build_anthropic_client(Config.ANTHROPIC_API_KEY)
+        return _clients[key]
+
+
+def _open_connection(client) -> Dict[str, Any]:
+    """
+    Make one cheap request (list models) so the client's pool holds an open
+    connection. Any HTTP response counts: the handshake is what is being paid.
+    """
+    start = time.perf_counter()
+    status = 200
+    try:
+        client.with_options(timeout=WARM_TIMEOUT_SECONDS, max_retries=0).models.list()
+    except Exception as e:
+        status = getattr(e, "status_code", None)
+        if status is None:
+            raise
+    return {"ms": round((time.perf_counter() - start) * 1000, 1), "status": status}
+
+
+def warm_connections() -> Dict[str, Any]:
+    """
+    Open a pooled connection to each configured provider. Returns per-provider
+    timing, the error, or why it was skipped.
+    """
+    mode = (Config.LLM_CASSETTE_MODE or "passthrough").lower()
+    if mode != "passthrough":
+        # Replay never touches the network, and record would store the warm-up requests
+        return {"skipped": f"cassette mode {mode}"}
+    warmed: Dict[str, Any] = {}
+    for provider, api_key, getter in (
+        ("openai", Config.OPENAI_API_KEY, get_openai_client),
+        ("anthropic", Config.ANTHROPIC_API_KEY, get_anthropic_client),
+    ):
+        if not api_key:
+            warmed[provider] = {"skipped": "no API key"}
+            continue
+        try:
+            warmed[provider] = _open_connection(getter())
+        except Exception as e:
+            warmed[provider] = {"error": str(e)}
+    return warmed
@@ -0,0 +1,373 @@
+"""
+Client-side rate limiting for OpenAI and Anthropic calls.
+
+Many drafts at once used to mean a burst of 429s: every call went out right
+away, and the SDKs retried on their own. Each call now goes through a
+limiter per (provider, model) that combines three controls:
+
+- Token buckets for requests per minute and tokens per minute
+  (OPENAI_RPM/TPM, ANTHROPIC_RPM/TPM, per-model overrides in RATE_LIMITS).
+  A call takes its estimated size (prompt characters / 4 plus the output
+  cap) up front. The difference is settled against the usage the provider
+  reports.
+- An AIMD concurrency window. The number of calls in flight grows by about
+  one per window's worth of successful calls (doubling per round trip until
+  the first decrease, as in TCP slow start). It halves on a 429, and shrinks
+  by RATE_LIMIT_LATENCY_BACKOFF when latency rises above
+  RATE_LIMIT_LATENCY_FACTOR times its baseline. At most one decrease happens
+  per baseline latency, so a burst of 429s from calls already in flight only
+  counts once.
+- Retry-After backoff. A call that gets a 429 (or an overloaded 529) waits
+  for the provider's Retry-After, or an exponential, jittered delay without
+  one. It then queues again, up to RATE_LIMIT_MAX_RETRIES times. Other calls
+  are held back by the halved window rather than a blanket pause, which on a
+  concurrency ceiling cost more throughput than it saved. The SDK clients
+  are built with max_retries=0 (see provider_clients.py), so retries happen
+  only here.
+- Transient failures (5xx, 408/409, connection errors and timeouts) are
+  retried up to RATE_LIMIT_TRANSIENT_RETRIES times with a short jittered
+  backoff, as the SDKs did before. They leave the window alone.
+
+The buckets and window live in each process. Under the pre-fork server every
+worker would otherwise get the full RPM/TPM, so N workers could together send
+N times the configured limit. serving.after_fork() therefore gives each
+worker 1/SERVER_WORKERS of the configured limits (`set_process_count`). A
+busy worker cannot borrow an idle one's share; that is the price of not
+coordinating across processes on every call.
+
+Together these keep throughput near the provider's ceiling. Without them it
+would swing between saturation and error storms. Window size, waits and
+throttles are reported in /metrics under `ratelimit.<provider>.<model>.*`.
+"""
+
+import email.utils
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+from config import Config
+from usage import normalize_usage
+
+# Status codes that mean "slow down": rate limited, and Anthropic's overloaded
+THROTTLE_STATUSES = (429, 529)
+# Status codes worth another attempt (the set the SDKs retry, minus the throttles)
+TRANSIENT_STATUSES = (408, 409, 500, 502, 503, 504)
+# SDK exception classes for failures with no HTTP response (both SDKs use these names)
+CONNECTION_ERRORS = ("APIConnectionError", "APITimeoutError")
+# Weight of a new latency sample in the short-term average
+LATENCY_ALPHA = 0.2
+# Weight of a new sample in the baseline (it also snaps down to faster samples)
+BASELINE_ALPHA = 0.02
+# Successful calls before the latency signal is trusted
+MIN_LATENCY_SAMPLES = 10
+# Exponential backoff without Retry-After: base * 2^attempt, capped
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+# Backoff between transient-failure retries (the SDKs' defaults)
+TRANSIENT_BACKOFF_BASE_SECONDS = 0.5
+TRANSIENT_BACKOFF_MAX_SECONDS = 8.0
+
+
+class RateLimitTimeout(RuntimeError):
+    """A call could not get through the limiter within RATE_LIMIT_MAX_WAIT_SECONDS."""
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` units per second up to `per_minute`. A take
+    may drive the level negative (a call larger than the bucket, or usage
+    settled above the estimate); later takes wait until it refills.
+    """
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60.0)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if now). Amounts above the capacity only need a full bucket."""
+        self._refill(now)
+        needed = min(amount, self.per_minute)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) * 60.0 / self.per_minute
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give(self, amount: float):
+        self.level = min(self.per_minute, self.level + amount)
+
+
+def estimate_request_tokens(request: Dict[str, Any]) -> int:
+    """Rough token count of a request body: its JSON size / 4, plus the output cap it sets."""
+    output_cap = request.get("max_tokens") or request.get("max_output_tokens") or 0
+    return len(json.dumps(request, default=str)) // 4 + int(output_cap)
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    usage = getattr(result, "usage", None)
+    if usage is None:
+        return None
+    counts = normalize_usage(usage)
+    return counts["input_tokens"] + counts["output_tokens"]
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_transient(error: Exception) -> bool:
+    """A server error, request timeout/conflict, or a failure to get a response at all."""
+    if _status_code(error) in TRANSIENT_STATUSES:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in CONNECTION_ERRORS for cls in type(error).__mro__)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay the provider asked for (retry-after-ms, or retry-after in seconds or as an HTTP date)."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token buckets, AIMD concurrency window and shared backoff for one provider model."""
+
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.window = float(Config.RATE_LIMIT_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self._latency: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._samples = 0
+        self._last_decrease = 0.0
+        self._slow_start = True  # Until the first decrease the window doubles per round trip
+        self._cond = threading.Condition()
+        metrics.register_gauge(f"ratelimit.{name}.window", lambda: round(self.window, 2))
+        metrics.register_gauge(f"ratelimit.{name}.in_flight", lambda: self.in_flight)
+
+    def _acquire(self, tokens: int, deadline: float):
+        waited = False
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                delay = max(
+                    self.requests.wait_time(1, now) if self.requests else 0.0,
+                    self.tokens.wait_time(tokens, now) if self.tokens else 0.0,
+                )
+                if delay <= 0 and self.in_flight < max(1, int(self.window)):
+                    break
+                if now + max(delay, 0.0) > deadline:
+                    metrics.increment(f"ratelimit.{self.name}.timeouts")
+                    raise RateLimitTimeout(
+                        f"{self.name}: no capacity within {Config.RATE_LIMIT_MAX_WAIT_SECONDS:g}s "
+                        f"(window {self.window:.1f}, {self.in_flight} in flight)"
+                    )
+                waited = True
+                # Woken early when a call finishes; otherwise when the buckets allow
+                self._cond.wait(timeout=delay if delay > 0 else min(1.0, deadline - now))
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+        if waited:
+            metrics.observe(f"ratelimit.{self.name}.wait_ms", (time.monotonic() - start) * 1000)
+
+    def _decrease(self, factor: float, now: float) -> bool:
+        """Shrink the window, at most once per baseline latency. Caller holds the lock."""
+        if now - self._last_decrease < (self._baseline or 1.0):
+            return False
+        self.window = max(1.0, self.window * factor)
+        self._last_decrease = now
+        self._slow_start = False
+        return True
+
+    def _on_success(self, latency: float, estimated: int, actual: Optional[int]):
+        now = time.monotonic()
+        with self._cond:
+            self.in_flight -= 1
+            if self.tokens and actual is not None:
+                # Settle the estimate against what the provider counted
+                if actual > estimated:
+                    self.tokens.take(actual - estimated)
+                else:
+                    self.tokens.give(estimated - actual)
+            self._samples += 1
+            self._latency = latency if self._latency is None else (1 - LATENCY_ALPHA) * self._latency + LATENCY_ALPHA * latency
+            self._baseline = latency if self._baseline is None else min(
+                self._latency, (1 - BASELINE_ALPHA) * self._baseline + BASELINE_ALPHA * self._latency
+            )
+            congested = (
+                self._samples >= MIN_LATENCY_SAMPLES
+                and self._latency > Config.RATE_LIMIT_LATENCY_FACTOR * self._baseline
+            )
+            if congested:
+                if self._decrease(Config.RATE_LIMIT_LATENCY_BACKOFF, now):
+                    metrics.increment(f"ratelimit.{self.name}.latency_backoffs")
+            elif self.in_flight + 1 >= int(self.window):
+                # Grow only while the window is full: an idle limiter has learned nothing.
+                # Slow start adds 1 per success; afterwards about 1 per window of successes
+                step = 1.0 if self._slow_start else 1.0 / self.window
+                self.window = min(float(Config.RATE_LIMIT_MAX_CONCURRENCY), self.window + step)
+            self._cond.notify_all()
+
+    def _on_failure(self, throttled: bool, retry_after: Optional[float], attempt: int, estimated: int) -> float:
+        """
+        Release the slot and the attempt's tokens (a retry takes them again); on a
+        throttle, halve the window and return how long this call should back off.
+        """
+        now = time.monotonic()
+        backoff = 0.0
+        with self._cond:
+            self.in_flight -= 1
+            if self.tokens:
+                self.tokens.give(estimated)
+            if throttled:
+                metrics.increment(f"ratelimit.{self.name}.throttled")
+                self._decrease(0.5, now)
+                if retry_after is None:
+                    # Full jitter, so throttled callers do not all come back at once
+                    retry_after = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                backoff = retry_after
+            self._cond.notify_all()
+        return backoff
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0) -> Tuple[Any, float]:
+        """
+        Run `fn` (one provider request) within the limits, retrying throttled
+        and transient failures. Returns (result, latency_ms of the successful attempt).
+        """
+        deadline = time.monotonic() + Config.RATE_LIMIT_MAX_WAIT_SECONDS
+        attempt = 0
+        transient_attempt = 0
+        while True:
+            self._acquire(estimated_tokens, deadline)
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                # An exhausted quota is also a 429, but waiting does not help
+                throttled = _status_code(e) in THROTTLE_STATUSES and getattr(e, "code", None) != "insufficient_quota"
+                backoff = self._on_failure(
+                    throttled, retry_after_seconds(e) if throttled else None, attempt, estimated_tokens
+                )
+                if not throttled:
+                    if not is_transient(e) or transient_attempt >= Config.RATE_LIMIT_TRANSIENT_RETRIES:
+                        raise
+                    backoff = retry_after_seconds(e) or random.uniform(
+                        0, min(TRANSIENT_BACKOFF_MAX_SECONDS, TRANSIENT_BACKOFF_BASE_SECONDS * 2 ** transient_attempt)
+                    )
+                    if time.monotonic() + backoff > deadline:
+                        raise
+                    transient_attempt += 1
+                    metrics.increment(f"ratelimit.{self.name}.transient_retries")
+                    if Config.DEBUG:
+                        print(f"[RateLimit] {self.name} {type(e).__name__}, retry {transient_attempt} in {backoff:.1f}s")
+                    time.sleep(backoff)
+                    continue
+                if attempt >= Config.RATE_LIMIT_MAX_RETRIES or time.monotonic() + backoff > deadline:
+                    raise
+                attempt += 1
+                if Config.DEBUG:
+                    print(f"[RateLimit] {self.name} throttled, retry {attempt} in {backoff:.1f}s (window {self.window:.1f})")
+                time.sleep(backoff)
+                continue
+            latency = time.perf_counter() - start
+            self._on_success(latency, estimated_tokens, _usage_tokens(result))
+            return result, latency * 1000
+
+
+def configured_limits(provider: str, model: str) -> Tuple[float, float]:
+    """
+    (rpm, tpm) for a model in this process: its RATE_LIMITS entry, else the
+    provider default, divided among the serving processes. 0 means unlimited.
+    """
+    rpm, tpm = None, None
+    for entry in Config.RATE_LIMITS.split(","):
+        name, _, limits = entry.strip().partition("=")
+        if name.strip() == f"{provider}/{model}" and limits:
+            rpm, _, tpm = limits.partition(":")
+            rpm, tpm = float(rpm or 0), float(tpm or 0)
+            break
+    else:
+        if provider == "anthropic":
+            rpm, tpm = Config.ANTHROPIC_RPM, Config.ANTHROPIC_TPM
+        else:
+            rpm, tpm = Config.OPENAI_RPM, Config.OPENAI_TPM
+    return rpm / _process_count, tpm / _process_count
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+# Serving processes that share the configured limits (see set_process_count)
+_process_count = 1
+
+
+def set_process_count(count: int):
+    """
+    Give this process 1/count of the configured limits, for `count` worker
+    processes serving side by side. Limiters created before (e.g. inherited
+    from the pre-fork master) are dropped and rebuilt on next use.
+    """
+    global _process_count
+    with _limiters_lock:
+        _process_count = max(1, int(count))
+        _limiters.clear()
+
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """The process-wide limiter for one provider model (created on first use)."""
+    name = f"{provider}.{model}"
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(name, *configured_limits(provider, model))
+        return _limiters[name]
+
+
+def limited_call(provider: str, model: str, fn: Callable[[], Any], request: Optional[Dict[str, Any]] = None) -> Tuple[Any, float]:
+    """
+    Run one provider request through its model's limiter (or directly when
+    RATE_LIMIT_ENABLED is off). `request` is the body, used to estimate its
+    tokens. Returns (result, latency_ms).
+    """
+    if not Config.RATE_LIMIT_ENABLED:
+        start = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - start) * 1000
+    estimated = estimate_request_tokens(request) if request else 0
+    return get_rate_limiter(provider, model).call(fn, estimated)
+
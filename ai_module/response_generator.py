@@ -3,7 +3,10 @@ Response generator that uses the orchestrator pipeline to generate actual respon
 This is the real AI module that should be used by both simulator and production.
 """
 
+import hashlib
+import re
 import time
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from io_models import Conversation
 from orchestrator import run_pipeline
@@ -15,16 +18,89 @@ from static_scripts import (
     get_prodicity_introduction_variants,
     get_application_info,
     get_prodicity_examples,
+    list_phases,
 )
 from knowledge_base import retrieve as kb_retrieve
 from config import Config
-from anthropic import Anthropic
+from thread_features import conversation_features, is_deleted
+from usage import check_budget, record_usage
+from provider_clients import get_anthropic_client
+from rate_limiter import limited_call
 
 
-def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, Any]] = None) -> str:
+# Remove emojis and non-printable characters, but preserve newlines (\n), spaces, and basic punctuation
+# \w = word characters, \s = whitespace (includes \n), so we should keep newlines
+# IMPORTANT: Include em dash (—), en dash (–), and regular hyphen (-) to preserve formatting
+_SANITIZE_PATTERN = re.compile(r'[^\w\s\.,!?\-\(\)\':/=&_\n\r—–]')
+
+# Writer model settings
+WRITER_MODEL = "claude-sonnet-4-5"
+# Hard safety limit to prevent walls of text
+# Average English: ~4 chars per token
+# 250 tokens ≈ 1000 chars - safe ceiling for all responses
+# Let the prompt control brevity, not the token limit
+WRITER_MAX_TOKENS = 250
+WRITER_TEMPERATURE = 0.7
+# Bump when the writer prompt in build_writer_request changes, so stored drafts are regenerated
+WRITER_PROMPT_REVISION = 1
+
+
+def _sanitize_response(response_text: str) -> str:
+    """Strip emojis/markdown from a raw model reply while keeping newlines and basic punctuation."""
+    response_text = _SANITIZE_PATTERN.sub('', response_text)
+    # Only strip leading/trailing whitespace, not internal newlines
+    return response_text.strip('"').strip("'").strip()
+
+
+@lru_cache(maxsize=None)
+def compiled_scripts_context(phase: str) -> str:
     """
-    Generate an AI response using the full orchestrator pipeline.
-    This is the actual production response generator.
+    The static per-phase guidelines block of the writer system prompt. Built
+    once per phase (compile_prompts() builds them all before workers fork).
+    """
+    # Build static scripts context - frame as GUIDELINES, not templates
+    scripts_context = "\n\n=== CONVERSATION GUIDELINES (NOT TEMPLATES) ===\n"
+    scripts_context += "IMPORTANT: The scripts below are GUIDELINES for conversation flow, NOT templates to copy word-for-word. "
+    scripts_context += "You must adapt to the actual conversation naturally. If the student asks a question or the conversation "
+    scripts_context += "takes an interesting turn, respond authentically to that - don't force the script. Build genuine rapport first.\n\n"
+    
+    scripts_context += get_phase_specific_context(phase) + "\n\n"
+    
+    prompt_blocks = get_prompt_blocks(phase)
+    if prompt_blocks:
+        scripts_context += "These are reference points for the conversation direction, but always prioritize natural flow:\n"
+        scripts_context += "\n".join(prompt_blocks)
+    return scripts_context
+
+
+def compile_prompts() -> int:
+    """Build the static prompt blocks for every phase; returns the number compiled."""
+    phases = set(list_phases()) | {"building_rapport", "doing_the_ask", "post_selling"}
+    for phase in phases:
+        compiled_scripts_context(phase)
+    return len(phases)
+
+
+@lru_cache(maxsize=1)
+def prompt_version() -> str:
+    """
+    Short hash of everything that shapes a draft besides the conversation: the
+    writer model and settings, WRITER_PROMPT_REVISION and the static prompt blocks.
+    """
+    digest = hashlib.sha256(
+        f"{WRITER_PROMPT_REVISION}|{WRITER_MODEL}|{WRITER_MAX_TOKENS}|{WRITER_TEMPERATURE}".encode("utf-8")
+    )
+    for phase in sorted(set(list_phases()) | {"building_rapport", "doing_the_ask", "post_selling"}):
+        digest.update(compiled_scripts_context(phase).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def build_writer_request(conv: Conversation, analysis_result: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Build the Anthropic Messages request (messages.create kwargs) for the writer.
+    
+    Returns None when no reply should be written (empty conversation, or the
+    last message is ours). Shared by generate_response and the offline Batch API path.
     
     Args:
         conv: The conversation to generate a response for
@@ -48,13 +124,14 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
     if not conv.messages:
         if Config.DEBUG:
             print("[Generator] Warning: Empty conversation, cannot generate response")
-        return ""  # Return empty string, don't generate response
+        return None  # No reply to write
     
     prospect_name = next((p.name for p in conv.participants if p.role == "prospect"), "Prospect")
     
     # Safety check: If conversation history is missing the initial message but we have a prospect reply
     # (Edge case where history ingest misses the first message)
-    has_our_messages = any(m.sender == "you" for m in conv.messages)
+    features = conversation_features(conv)
+    has_our_messages = features.your_message_count > 0
     initial_message_context = ""
     if not has_our_messages and len(conv.messages) > 0:
         # We have prospect messages but no "you" messages - initial outreach is missing from history
@@ -69,37 +146,25 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
     
     # Check if last non-deleted message is from us - if so, don't generate response
     # Deleted messages have text "This message has been deleted." and should be disregarded
-    if recent_messages:
-        # Find the last non-deleted message by iterating backwards
-        last_non_deleted_msg = None
-        for msg in reversed(recent_messages):
-            if msg.text.strip() != "This message has been deleted.":
-                last_non_deleted_msg = msg
-                break
-        
-        # If we found a non-deleted message and it's from us, don't generate response
-        if last_non_deleted_msg and last_non_deleted_msg.sender == "you":
-            if Config.DEBUG:
-                print("[Generator] Last non-deleted message is from us - no response needed")
-            return ""  # Return empty string, don't generate response
+    if features.last_sender == "you" and features.last_index >= len(conv.messages) - len(recent_messages):
+        if Config.DEBUG:
+            print("[Generator] Last non-deleted message is from us - no response needed")
+        return None  # No reply to write
     
     # Get conversation state for guidance (minimal - only message counts)
     conversation_state = {
         "message_count": len(conv.messages),
-        "prospect_message_count": sum(1 for m in conv.messages if m.sender == "prospect"),
+        "prospect_message_count": features.prospect_message_count,
     }
     
     # Get static scripts guidance
     prompt_build_start = time.time()
     guidance = get_conversation_guidance(phase, conversation_state)
-    prompt_blocks = get_prompt_blocks(phase)
-    phase_context = get_phase_specific_context(phase)
     if Config.DEBUG:
         print(
             "[Generator] Guidance next_step:",
             guidance.get("next_step", ""),
         )
-        print("[Generator] Prompt blocks included:", len(prompt_blocks))
     
     # Build system prompt with KB context and static scripts
     kb_context_text = ""
@@ -120,17 +185,7 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
                 kb_context_text += f"   Source: {source}\n"
             kb_context_text += "\n"
     
-    # Build static scripts context - frame as GUIDELINES, not templates
-    scripts_context = "\n\n=== CONVERSATION GUIDELINES (NOT TEMPLATES) ===\n"
-    scripts_context += "IMPORTANT: The scripts below are GUIDELINES for conversation flow, NOT templates to copy word-for-word. "
-    scripts_context += "You must adapt to the actual conversation naturally. If the student asks a question or the conversation "
-    scripts_context += "takes an interesting turn, respond authentically to that - don't force the script. Build genuine rapport first.\n\n"
-    
-    scripts_context += phase_context + "\n\n"
-    
-    if prompt_blocks:
-        scripts_context += "These are reference points for the conversation direction, but always prioritize natural flow:\n"
-        scripts_context += "\n".join(prompt_blocks)
+    scripts_context = compiled_scripts_context(phase)
     
     # Add specific guidance for selling phase
     if phase == "doing_the_ask" and result.get("ready_for_ask", False):
@@ -198,7 +253,7 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
     
     # Filter out deleted messages from conversation history
     # Deleted messages have text "This message has been deleted." and should be disregarded
-    non_deleted_messages = [msg for msg in recent_messages if msg.text.strip() != "This message has been deleted."]
+    non_deleted_messages = [msg for msg in recent_messages if not is_deleted(msg.text)]
     
     # 1. Add conversation history as alternating user/assistant messages
     # Only include messages up to (but not including) the last non-deleted one
@@ -251,13 +306,13 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
             # This shouldn't happen since we checked above, but handle gracefully
             if Config.DEBUG:
                 print("[Generator] Warning: Last message is not from prospect, cannot generate response")
-            return ""
+            return None
     
     # Ensure we have at least one user message
     if not any(msg["role"] == "user" for msg in anthropic_messages):
         if Config.DEBUG:
             print("[Generator] Warning: No user messages in conversation, cannot generate response")
-        return ""  # Return empty string, don't return status message
+        return None  # No reply to write
     
     message_build_time = time.time() - message_build_start
     if Config.DEBUG:
@@ -267,36 +322,51 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
         else:
             print(f"[Generator] Message building completed: {message_build_time*1000:.2f}ms")
     
+    return {
+        "model": WRITER_MODEL,
+        "system": system_prompt,
+        "messages": anthropic_messages,
+        "max_tokens": WRITER_MAX_TOKENS,
+        "temperature": WRITER_TEMPERATURE,
+    }
+
+
+def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Generate an AI response using the full orchestrator pipeline.
+    This is the actual production response generator.
+    
+    Args:
+        conv: The conversation to generate a response for
+        analysis_result: Optional pre-computed analysis result. If provided, skips calling run_pipeline.
+    """
+    request = build_writer_request(conv, analysis_result)
+    if request is None:
+        return ""  # Return empty string, don't generate response
+    
     # Generate response using Anthropic Claude
     if not Config.ANTHROPIC_API_KEY:
         if Config.DEBUG:
             print("[Generator] Error: ANTHROPIC_API_KEY not set")
         return ""
     
-    anthropic_client = Anthropic(api_key=Config.ANTHROPIC_API_KEY)
+    # Raised outside the try so an exhausted budget is not reported as a failed generation
+    check_budget("writer")
+    anthropic_client = get_anthropic_client()
     
     try:
-        # Calculate max_tokens: Hard safety limit to prevent walls of text
-        # Average English: ~4 chars per token
-        # 250 tokens ≈ 1000 chars - safe ceiling for all responses
-        # Let the prompt control brevity, not the token limit
-        max_tokens_for_response = 250
-        
         # Time the Anthropic API call
         api_start = time.time()
         if Config.DEBUG:
             print("[Generator] Calling Anthropic API (claude-sonnet-4-5)...")
         
-        # Use Claude Sonnet 4.5
-        resp = anthropic_client.messages.create(
-            model="claude-sonnet-4-5",
-            system=system_prompt,
-            messages=anthropic_messages,
-            max_tokens=max_tokens_for_response,
-            temperature=0.7,
+        # Use Claude Sonnet 4.5 (queued and retried by the rate limiter)
+        resp, latency_ms = limited_call(
+            "anthropic", request["model"], lambda: anthropic_client.messages.create(**request), request
         )
         
         api_time = time.time() - api_start
+        record_usage("writer", "anthropic", request["model"], getattr(resp, "usage", None), latency_ms=latency_ms)
         if Config.DEBUG:
             if api_time < 1:
                 print(f"[Generator] Anthropic API call completed: {api_time*1000:.0f}ms")
@@ -306,24 +376,17 @@ def generate_response(conv: Conversation, analysis_result: Optional[Dict[str, An
         response_text = resp.content[0].text.strip() if resp.content else ""
         
         # DEBUG: Print raw Claude response
-        print("\n" + "="*80)
-        print("RAW CLAUDE RESPONSE:")
-        print("="*80)
-        print(response_text)
-        print("="*80 + "\n")
+        if Config.DEBUG:
+            print("\n" + "="*80)
+            print("RAW CLAUDE RESPONSE:")
+            print("="*80)
+            print(response_text)
+            print("="*80 + "\n")
         
         if response_text:
             # Clean up response - remove emojis and markdown BUT preserve newlines and spaces
             processing_start = time.time()
-            import re
-            # Remove emojis and special characters BUT preserve newlines (\n), spaces, and basic punctuation
-            original_response = response_text
-            # Remove emojis and non-printable characters, but preserve newlines (\n), spaces, and basic punctuation
-            # \w = word characters, \s = whitespace (includes \n), so we should keep newlines
-            # IMPORTANT: Include em dash (—), en dash (–), and regular hyphen (-) to preserve formatting
-            response_text = re.sub(r'[^\w\s\.,!?\-\(\)\':/=&_\n\r—–]', '', response_text)
-            # Only strip leading/trailing whitespace, not internal newlines
-            response_text = response_text.strip('"').strip("'").strip()
+            response_text = _sanitize_response(response_text)
             processing_time = time.time() - processing_start
             if Config.DEBUG:
                 if processing_time < 0.001:
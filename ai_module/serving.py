@@ -0,0 +1,133 @@
+"""
+Process setup for serving the API.
+
+Development runs `python main.py` (Flask's single-process server). Production
+runs the pre-fork server configured in gunicorn.conf.py:
+
+  gunicorn -c gunicorn.conf.py main:app
+
+The master imports the app once (preload_app), runs check_config() and calls
+preload(). That compiles the writer's static prompt blocks and builds the KB
+lexical index, local vector store and HNSW graph. freeze() then moves
+everything allocated so far into the permanent GC generation. Workers forked
+afterwards share those pages copy-on-write, and their garbage collections
+never touch them. The vector matrix is memory-mapped (embedding_store.py), so
+workers share the page cache as well.
+
+Connections, clients and background threads are not shared across a fork.
+Provider clients, the Supabase client, embedding batcher and job queue are
+created lazily per process (their getters check the pid). In each worker,
+after_fork() starts the job queue and the rest of the warm-up (see
+warmup.py). The one worker that holds SERVER_BACKGROUND_LOCK_PATH runs the
+draft worker and is the only writer of the local KB vector store; the other
+workers reopen the store when it changes.
+"""
+
+import gc
+import importlib
+import os
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+
+_background_lock = None  # Open file holding the flock for this process's lifetime
+
+
+def worker_count() -> int:
+    """Worker processes the pre-fork server runs (SERVER_WORKERS, default one per CPU, at most 4)."""
+    return Config.SERVER_WORKERS or min(os.cpu_count() or 1, 4)
+
+
+def check_config() -> bool:
+    """Validate the configuration once at startup; warns instead of failing (for development)."""
+    try:
+        return Config.validate()
+    except ValueError as e:
+        print(f"Warning: {e}")
+        return False
+
+
+def start_background_services(draft_worker: bool = True):
+    """Start the draft worker (when enabled and requested) and resume queued jobs."""
+    from draft_worker import start_background_worker
+    from jobs import get_job_queue
+
+    if draft_worker:
+        start_background_worker()
+    # Resume jobs left queued by a previous run
+    get_job_queue()
+
+
+def preload() -> Dict[str, Any]:
+    """Build the shared read-only state in the master, before any worker is forked."""
+    from jobs import recover_interrupted_jobs
+    from warmup import warm_up
+
+    start = time.time()
+    # Warm-up components whose state workers can share (see warmup.py); a
+    # component that fails here is retried in each worker
+    shared = ["prompts"] + (["kb"] if Config.SERVER_PRELOAD_KB else [])
+    components = warm_up(shared)["components"]
+    loaded: Dict[str, Any] = {name: components[name]["status"] for name in shared}
+    # `import main` leaves the provider SDKs for first use; import them here
+    # so forked workers share the modules instead of each importing their own
+    for module in ("openai", "anthropic", "supabase"):
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"[Server] Could not preload {module}: {e}")
+    # Re-queue jobs interrupted by the previous run once here, not in every worker
+    recover_interrupted_jobs()
+    loaded["seconds"] = round(time.time() - start, 3)
+    print(f"[Server] Preloaded {loaded}")
+    return loaded
+
+
+def freeze():
+    """Move every object allocated so far (the preloaded state) out of reach of the garbage collector."""
+    gc.collect()
+    gc.freeze()
+    print(f"[Server] Froze {gc.get_freeze_count()} objects before forking workers")
+
+
+def _acquire_background_lock() -> bool:
+    """True for the one process that holds SERVER_BACKGROUND_LOCK_PATH (released when it exits)."""
+    global _background_lock
+    try:
+        import fcntl
+    except ImportError:
+        return True  # No flock (Windows): single-process serving only
+    handle = open(Config.SERVER_BACKGROUND_LOCK_PATH, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _background_lock = handle
+    return True
+
+
+def after_fork(worker_id: Optional[int] = None):
+    """Per-worker setup, run in each forked worker."""
+    # The master already re-queued interrupted jobs; a respawned worker must not
+    # re-queue jobs its siblings are running
+    Config.JOBS_RECOVER_ON_START = False
+    # Provider limits apply to the whole server, so each worker takes its share
+    from rate_limiter import set_process_count
+    set_process_count(worker_count())
+    primary = _acquire_background_lock()
+    from knowledge_base import set_store_writer
+    set_store_writer(primary)
+    runs_drafts = Config.DRAFT_WORKER_ENABLED and primary
+    start_background_services(draft_worker=runs_drafts)
+    # Connections and the query cache are per process; /health/ready reports
+    # this worker warming until they are done
+    from warmup import get_readiness, start_warm_up
+    get_readiness().restart_clock()
+    start_warm_up()
+    print(
+        f"[Server] Worker {worker_id or os.getpid()} started"
+        + (" (primary)" if primary else "")
+        + (" (draft worker)" if runs_drafts else "")
+    )
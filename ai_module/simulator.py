@@ -3,13 +3,22 @@ CLI simulator: you play the engaged lead, AI tries to convert you.
 
 Usage:
   python -m ai_module.simulator
+  python simulator.py --selfplay 20 --concurrency 8 --turns 6
+  python simulator.py --selfplay 50 --concurrency 16 --stubs --output selfplay.json
 """
 
+import argparse
+import json
+import sys
+import threading
 import time
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional
 from io_models import Conversation, Participant, Message
 from orchestrator import run_pipeline
 from response_generator import generate_response
+from metrics import summarize
+from usage import sum_records, usage_scope
 
 
 def _format_time(seconds: float) -> str:
@@ -40,7 +49,7 @@ def _print_header():
 
 
 
-def main():
+def interactive():
     _print_header()
 
     title = "Simulator Conversation"
@@ -98,10 +107,9 @@ def main():
             print({
                 "phase": result["phase"],
                 "ready_for_ask": result["ready_for_ask"],
-                "scores": result["scores"],
-                "signals": result["signals"],
-                "criteria_met": result["criteria_met"],
-                "recommendation": result["recommendation"],
+                "instruction_for_writer": result.get("instruction_for_writer", ""),
+                "reasoning": result.get("reasoning", ""),
+                "recommendation": result.get("recommendation", ""),
             })
             continue
 
@@ -137,7 +145,261 @@ def main():
         print(f"\nai> {ai_text}\n")
 
 
-if __name__ == "__main__":
-    main()
+# --------------------------------------------------------------------------- #
+# Self-play: scripted or LLM-driven personas against the real pipeline
+# --------------------------------------------------------------------------- #
+
+def _selfplay_conversation(index: int, persona, turns: int, llm_personas: bool) -> Dict[str, Any]:
+    """Hold one full conversation and return its per-turn timings, phase history and provider token usage."""
+    with usage_scope(thread_id=f"selfplay-{index}") as scope:
+        record = _selfplay_turns(index, persona, turns, llm_personas)
+    # Tokens reported by the providers, not counting the simulated prospect or shared embedding batches
+    agent_records = [r for r in scope.records if r.stage != "persona"]
+    record["usage"] = sum_records(agent_records)
+    record["usage_by_stage"] = {
+        stage: sum_records(r for r in agent_records if r.stage == stage)
+        for stage in sorted({r.stage for r in agent_records})
+    }
+    return record
+
+
+def _selfplay_turns(index: int, persona, turns: int, llm_personas: bool) -> Dict[str, Any]:
+    from personas import LLMProspect
+    from static_scripts import get_initial_message_template
+
+    participants = [
+        Participant(id="you", name="You", role="you"),
+        Participant(id="prospect", name=persona.name, role="prospect"),
+    ]
+    opener = get_initial_message_template().format(name=persona.name, school=persona.school)
+    messages: List[Message] = [Message(sender="you", text=opener)]
+    prospect = LLMProspect(persona) if llm_personas else None
+
+    current_phase = "building_rapport"
+    conv_start = time.time()
+    record: Dict[str, Any] = {
+        "conversation": index,
+        "persona": persona.id,
+        "turns": [],
+        "phase_transitions": [],
+        "errors": 0,
+    }
+
+    for turn in range(turns):
+        prospect_start = time.time()
+        reply = prospect.reply(messages, turn) if prospect else persona.scripted_reply(turn)
+        prospect_time = time.time() - prospect_start
+        if not reply:
+            break
+        messages.append(Message(sender="prospect", text=reply))
+        conv = Conversation(
+            title=f"Conversation with {persona.name}",
+            participants=participants,
+            messages=list(messages),
+        )
+
+        turn_start = time.time()
+        # Self-play auto-approves the selling transition so the gate never blocks a run
+        result = run_pipeline(conv, current_phase=current_phase, confirm_phase_change=True)
+        pipeline_time = time.time() - turn_start
+
+        generation_start = time.time()
+        ai_text = generate_response(conv, analysis_result=result)
+        generation_time = time.time() - generation_start
+
+        phase = result.get("phase", current_phase)
+        if phase != current_phase:
+            record["phase_transitions"].append({
+                "from": current_phase,
+                "to": phase,
+                "turn": turn + 1,
+                "elapsed_s": time.time() - conv_start,
+            })
+            current_phase = phase
+
+        record["turns"].append({
+            "turn": turn + 1,
+            "phase": phase,
+            "prospect_s": prospect_time,
+            "pipeline_s": pipeline_time,
+            "generation_s": generation_time,
+            "total_s": pipeline_time + generation_time,
+        })
+        if not ai_text:
+            record["errors"] += 1
+            break
+        messages.append(Message(sender="you", text=ai_text))
+
+    record["final_phase"] = current_phase
+    record["duration_s"] = time.time() - conv_start
+    return record
+
+
+def _usage_by_stage(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-stage usage summed over all conversations."""
+    totals: Dict[str, Dict[str, float]] = {}
+    for r in records:
+        for stage, usage in r["usage_by_stage"].items():
+            bucket = totals.setdefault(stage, dict.fromkeys(usage, 0))
+            for key, value in usage.items():
+                bucket[key] += value
+    return totals
 
 
+def _selfplay_report(records: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    turns = [t for r in records for t in r["turns"]]
+    to_ms = lambda key: [t[key] * 1000 for t in turns]
+
+    transitions: Dict[str, Dict[str, List[float]]] = {}
+    for r in records:
+        for tr in r["phase_transitions"]:
+            bucket = transitions.setdefault(f"{tr['from']}->{tr['to']}", {"turn": [], "elapsed_s": []})
+            bucket["turn"].append(tr["turn"])
+            bucket["elapsed_s"].append(tr["elapsed_s"])
+
+    return {
+        "conversations": len(records),
+        "turns": len(turns),
+        "errors": sum(r["errors"] for r in records),
+        "wall_seconds": wall,
+        "turns_per_second": len(turns) / wall if wall else 0.0,
+        "latency_ms": {
+            "pipeline": summarize(to_ms("pipeline_s")),
+            "generation": summarize(to_ms("generation_s")),
+            "turn_total": summarize(to_ms("total_s")),
+        },
+        "phase_transitions": {
+            name: {
+                "count": len(values["turn"]),
+                "turn": summarize(values["turn"]),
+                "elapsed_s": summarize(values["elapsed_s"]),
+            }
+            for name, values in transitions.items()
+        },
+        "final_phases": {
+            phase: sum(1 for r in records if r["final_phase"] == phase)
+            for phase in sorted({r["final_phase"] for r in records})
+        },
+        "tokens_per_conversation": summarize([r["usage"]["input_tokens"] + r["usage"]["output_tokens"] for r in records]),
+        "cost_usd_per_conversation": summarize([r["usage"]["cost_usd"] for r in records]),
+        "usage": _usage_by_stage(records),
+        "records": records,
+    }
+
+
+def _print_selfplay_report(report: Dict[str, Any]):
+    print("\n" + "="*60)
+    print(
+        f"Self-play: {report['conversations']} conversations, {report['turns']} turns, "
+        f"{report['errors']} errors in {_format_time(report['wall_seconds'])} "
+        f"({report['turns_per_second']:.2f} turns/s)"
+    )
+    for stage, stats in report["latency_ms"].items():
+        print(
+            f"  {stage:<12} p50={stats['p50']:.0f}ms p95={stats['p95']:.0f}ms "
+            f"p99={stats['p99']:.0f}ms max={stats['max']:.0f}ms"
+        )
+    for name, stats in report["phase_transitions"].items():
+        print(
+            f"  {name}: {stats['count']}x, median turn {stats['turn']['p50']:.1f}, "
+            f"median {stats['elapsed_s']['p50']:.1f}s into the conversation"
+        )
+    print(f"  Final phases: {report['final_phases']}")
+    tokens = report["tokens_per_conversation"]
+    cost = report["cost_usd_per_conversation"]
+    print(f"  Conversation tokens: mean={tokens['mean']:.0f} p95={tokens['p95']:.0f} (cost mean=${cost['mean']:.4f})")
+    for stage, usage in report["usage"].items():
+        print(
+            f"  {stage:<12} calls={usage['calls']} input={usage['input_tokens']} "
+            f"(cached {usage['cached_input_tokens']}) output={usage['output_tokens']} "
+            f"(reasoning {usage['reasoning_tokens']}) cost=${usage['cost_usd']:.4f}"
+        )
+    print("="*60)
+
+
+def selfplay(
+    conversations: int,
+    concurrency: int,
+    turns: int,
+    persona_ids: Optional[List[str]] = None,
+    llm_personas: bool = False,
+) -> Dict[str, Any]:
+    """Run N persona conversations concurrently and return an aggregate report."""
+    from config import Config
+    from personas import PERSONAS
+
+    # Per-call debug prints would interleave across threads and dominate the timings
+    Config.DEBUG = False
+    personas = [PERSONAS[p] for p in persona_ids] if persona_ids else list(PERSONAS.values())
+
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def run_one(i: int):
+        persona = personas[i % len(personas)]
+        try:
+            record = _selfplay_conversation(i, persona, turns, llm_personas)
+        except Exception as e:
+            record = {
+                "conversation": i, "persona": persona.id, "turns": [], "phase_transitions": [],
+                "errors": 1, "usage": sum_records([]), "usage_by_stage": {}, "final_phase": "error", "duration_s": 0.0, "error": str(e),
+            }
+        with lock:
+            records.append(record)
+            print(
+                f"  [{len(records)}/{conversations}] {persona.id}: {len(record['turns'])} turns, "
+                f"final phase {record['final_phase']}"
+            )
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_one, range(conversations)))
+    records.sort(key=lambda r: r["conversation"])
+    return _selfplay_report(records, time.time() - start)
+
+
+def main(argv=None) -> int:
+    from personas import PERSONAS
+
+    parser = argparse.ArgumentParser(description="Prodicity sales simulator")
+    parser.add_argument("--selfplay", type=int, metavar="N", help="Run N automated persona conversations")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent self-play conversations")
+    parser.add_argument("--turns", type=int, default=6, help="Max prospect turns per conversation")
+    parser.add_argument("--persona", action="append", choices=sorted(PERSONAS), help="Restrict to these personas")
+    parser.add_argument("--llm-personas", action="store_true", help="Let an LLM play the prospect instead of the script")
+    parser.add_argument("--stubs", action="store_true", help="Use local provider stand-ins (no API credits)")
+    parser.add_argument("--output", help="Write the self-play report as JSON")
+    args = parser.parse_args(argv)
+
+    if not args.selfplay:
+        interactive()
+        return 0
+
+    def run():
+        print(f"Self-play: {args.selfplay} conversations at concurrency {args.concurrency}...")
+        return selfplay(args.selfplay, args.concurrency, args.turns, args.persona, args.llm_personas)
+
+    if args.stubs:
+        from benchmarks.fixtures import KB_DOCUMENTS
+        from benchmarks.stubs import LatencyProfile, StubProviders
+
+        with StubProviders(
+            openai=LatencyProfile("lognormal", 400, 200),
+            anthropic=LatencyProfile("lognormal", 800, 400),
+            supabase=LatencyProfile("lognormal", 40, 20),
+        ) as stubs:
+            stubs.seed_kb(KB_DOCUMENTS)
+            report = run()
+    else:
+        report = run()
+
+    _print_selfplay_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""
+Test setup: modules import each other flat (as when run from ai_module/), so
+ai_module/ goes on sys.path. Run from ai_module/:
+  python -m pytest tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
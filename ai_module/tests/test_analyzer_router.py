@@ -0,0 +1,77 @@
+"""Health-based skipping and recovery in analyzer_router.py."""
+
+import pytest
+
+import analyzer_router
+from analyzer import ANALYZER_ROUTES
+from analyzer_router import STANDARD, AnalyzerRouter
+from config import Config
+from ingest import build_conversation
+from phase_signals import extract_signals
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(analyzer_router.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(Config, "ANALYZER_ROUTER_ENABLED", True)
+    monkeypatch.setattr(Config, "ANALYZER_ROUTER_PROBE_RATE", 0.0)
+    return now
+
+
+def _standard_request():
+    # Past early rapport, no pitch and no question: the standard tier
+    messages = [
+        {"sender": "you" if i % 2 else "prospect", "text": f"message number {i}"} for i in range(8)
+    ]
+    conv = build_conversation({"title": "t", "participants": []}, messages)
+    return conv, extract_signals(conv, "building_rapport")
+
+
+def _fail_standard(router, conv, signals, calls=5):
+    for _ in range(calls):
+        decision = router.route(conv, signals)
+        assert decision.option == STANDARD
+        router.record(decision, ok=False, latency_ms=100)
+
+
+def test_failing_option_is_skipped_until_its_samples_expire(clock):
+    router = AnalyzerRouter(ANALYZER_ROUTES)
+    conv, signals = _standard_request()
+    _fail_standard(router, conv, signals)
+
+    assert router.route(conv, signals).option != STANDARD
+
+    clock[0] += Config.ANALYZER_ROUTER_STATS_MAX_AGE_SECONDS + 1
+    assert router.route(conv, signals).option == STANDARD
+
+
+def test_probes_let_a_skipped_option_recover(clock, monkeypatch):
+    router = AnalyzerRouter(ANALYZER_ROUTES)
+    conv, signals = _standard_request()
+    _fail_standard(router, conv, signals)
+
+    monkeypatch.setattr(Config, "ANALYZER_ROUTER_PROBE_RATE", 1.0)
+    for _ in range(15):
+        probe = router.route(conv, signals)
+        assert probe.option == STANDARD
+        assert f"probing {STANDARD}" in probe.reasons
+        router.record(probe, ok=True, latency_ms=100)
+
+    # 5 errors in 20 calls is within the default 25% limit again
+    monkeypatch.setattr(Config, "ANALYZER_ROUTER_PROBE_RATE", 0.0)
+    decision = router.route(conv, signals)
+    assert decision.option == STANDARD
+    assert not any(reason.startswith("skipping") for reason in decision.reasons)
+
+
+@pytest.mark.parametrize("mode, probes", [("passthrough", True), ("record", False), ("replay", False)])
+def test_probes_are_off_while_a_cassette_records_or_replays(clock, monkeypatch, mode, probes):
+    monkeypatch.setattr(Config, "LLM_CASSETTE_MODE", mode)
+    router = AnalyzerRouter(ANALYZER_ROUTES)
+    conv, signals = _standard_request()
+    _fail_standard(router, conv, signals)
+
+    monkeypatch.setattr(Config, "ANALYZER_ROUTER_PROBE_RATE", 1.0)
+
+    assert (router.route(conv, signals).option == STANDARD) is probes
@@ -0,0 +1,59 @@
+"""Record/replay of provider HTTP calls in cassette.py."""
+
+import json
+
+import httpx
+import pytest
+
+from cassette import Cassette, CassetteMissError, CassetteTransport, canonical_request_key
+
+URL = "https://api.openai.com/v1/embeddings"
+
+
+def test_key_ignores_body_key_order_and_query_order():
+    body = json.dumps({"model": "m", "input": ["a", "b"]}).encode()
+    reordered = json.dumps({"input": ["a", "b"], "model": "m"}).encode()
+
+    key = canonical_request_key("post", "/v1/embeddings", "a=1&b=2", body)
+
+    assert canonical_request_key("POST", "/v1/embeddings", "b=2&a=1", reordered) == key
+    assert canonical_request_key("POST", "/v1/embeddings", "a=1&b=3", body) != key
+    assert canonical_request_key("POST", "/v1/embeddings", "a=1&b=2", json.dumps({"model": "n"}).encode()) != key
+    assert canonical_request_key("GET", "/v1/embeddings", "a=1&b=2", body) != key
+
+
+def _client(mode, cassette, handler):
+    return httpx.Client(transport=CassetteTransport(mode, cassette, inner=httpx.MockTransport(handler)))
+
+
+@pytest.mark.parametrize("name", ["calls.jsonl", "calls.jsonl.gz"])
+def test_recorded_calls_replay_without_the_network(tmp_path, name):
+    path = str(tmp_path / name)
+    calls = []
+
+    def provider(request):
+        calls.append(request)
+        return httpx.Response(200, json={"data": [{"embedding": [0.1, 0.2]}]}, headers={"x-request-id": "req-1"})
+
+    with _client("record", Cassette(path), provider) as client:
+        recorded = client.post(URL, params={"b": "2", "a": "1"}, json={"model": "m", "input": "hi"})
+
+    def offline(request):
+        raise AssertionError("replay must not reach the network")
+
+    with _client("replay", Cassette(path), offline) as client:
+        replayed = client.post(URL, params={"a": "1", "b": "2"}, json={"input": "hi", "model": "m"})
+
+    assert len(calls) == 1
+    assert replayed.status_code == recorded.status_code == 200
+    assert replayed.json() == recorded.json()
+    assert replayed.headers["x-request-id"] == "req-1"
+
+
+def test_replay_miss_raises(tmp_path):
+    cassette = Cassette(str(tmp_path / "empty.jsonl"))
+
+    with _client("replay", cassette, lambda request: httpx.Response(200)) as client:
+        with pytest.raises(CassetteMissError):
+            client.post(URL, json={"model": "m", "input": "never recorded"})
+
@@ -0,0 +1,83 @@
+"""Merge plans and the guarded rewrite in conversation_sync.py."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks.stubs import StubProviders
+from conversation_sync import message_hash, plan_merge, sync_conversation
+from thread_features import DELETED_MESSAGE_TEXT
+
+
+def _messages(*texts):
+    return [{"sender": "prospect" if i % 2 else "you", "text": text} for i, text in enumerate(texts)]
+
+
+def _hashes(messages):
+    return [message_hash(message) for message in messages]
+
+
+def test_unchanged_scrape_maps_to_the_stored_tail():
+    plan = plan_merge(list("ABAB"), list("AB"))
+    assert plan.action == "unchanged"
+    assert plan.indices == [2, 3]
+
+
+def test_deleted_message_is_replaced_in_place():
+    stored = _messages("hi", "sounds good", "great")
+    scraped = _messages("hi", DELETED_MESSAGE_TEXT, "great", "when can we talk?")
+    scraped[1]["sender"] = "prospect"
+
+    plan = plan_merge(_hashes(stored), _hashes(scraped))
+
+    assert plan.action == "rewritten"
+    assert plan.indices == [0, 1, 2, 3]
+    assert plan.replace == [1]
+    assert plan.append == [3]
+
+
+def test_edited_message_is_replaced_in_place():
+    plan = plan_merge(list("ABC"), list("AXCD"))
+    assert plan.action == "rewritten"
+    assert plan.indices == [0, 1, 2, 3]
+    assert plan.layout == [("scraped", 0), ("scraped", 1), ("scraped", 2), ("scraped", 3)]
+
+
+def test_edit_outside_the_scrape_keeps_the_stored_messages():
+    # The scrape shows the end of the thread only; the stored head stays as it is
+    plan = plan_merge(list("ABCDE"), list("DXF"))
+    assert plan.action == "rewritten"
+    assert plan.indices == [3, 4, 5]
+    assert plan.layout[:3] == [("stored", 0), ("stored", 1), ("stored", 2)]
+    assert plan.replace == [1]
+    assert plan.append == [2]
+
+
+def test_disjoint_scrape_is_appended():
+    plan = plan_merge(list("ABC"), list("XYZ"))
+    assert plan.action == "appended"
+    assert plan.indices == [3, 4, 5]
+
+
+@pytest.mark.parametrize("replacement", [DELETED_MESSAGE_TEXT, "sounds good (edited)"])
+def test_sync_rewrites_a_changed_message_without_duplicating_the_thread(replacement):
+    stored = _messages("hi", "sounds good", "great")
+    scraped = _messages("hi", replacement, "great", "when can we talk?")
+    with StubProviders() as stubs:
+        stubs.supabase.seed("conversations", [{
+            "thread_id": "t1",
+            "messages": [{**message, "index": i} for i, message in enumerate(stored)],
+            "message_count": 3,
+            "updated_at": "2020-01-01T00:00:00+00:00",
+        }])
+
+        result = sync_conversation("t1", scraped)
+
+        row = stubs.supabase.tables["conversations"][0]
+    assert result["action"] == "rewritten"
+    assert result["indices"] == [0, 1, 2, 3]
+    assert [message["text"] for message in row["messages"]] == [message["text"] for message in scraped]
+    assert row["message_count"] == 4
+    # The last_activity_at trigger copies updated_at, so a rewrite must move it
+    updated_at = datetime.fromisoformat(row["updated_at"])
+    assert (datetime.now(timezone.utc) - updated_at).total_seconds() < 60
@@ -0,0 +1,146 @@
+"""The persistent draft store in drafts.py and how /generate uses it."""
+
+import time
+
+import pytest
+
+import drafts
+import generation
+import idempotency
+from config import Config
+from drafts import SOURCE_WORKER, DraftStore, get_draft_store
+from main import app
+
+MESSAGES = [{"sender": "prospect", "text": "Hi, what does the program cost?"}]
+REQUEST = {"prospect_name": "Sam", "thread_id": "thread-1", "messages": MESSAGES}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DraftStore(db_path=str(tmp_path / "drafts.sqlite3"), ttl_seconds=3600, max_entries=10)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def shared_store(tmp_path, monkeypatch):
+    """The process-wide store, opened on a temporary database."""
+    monkeypatch.setattr(Config, "DRAFT_STORE_PATH", str(tmp_path / "drafts.sqlite3"))
+    monkeypatch.setattr(drafts, "_store", None)
+    monkeypatch.setattr(drafts, "_store_pid", None)
+    yield get_draft_store()
+    drafts._store.close()
+
+
+@pytest.fixture
+def counting_generation(monkeypatch):
+    """Replace the pipeline with a stub that writes a numbered draft per call."""
+    calls = []
+
+    def run_generation(data):
+        calls.append(data)
+        return {"response": f"draft {len(calls)}", "phase": "building_rapport"}, 200
+
+    monkeypatch.setattr(generation, "run_generation", run_generation)
+    return calls
+
+
+def test_get_returns_the_draft_for_the_same_state(store):
+    store.put("t1", "fp", {"response": "hello", "phase": "building_rapport"}, 200, prompt_version="v1")
+
+    draft = store.get("t1", "fp", "v1")
+
+    assert draft.payload["response"] == "hello"
+    assert draft.phase == "building_rapport"
+    assert draft.served == 1
+    assert store.get("t1", "fp", "v1").served == 2
+
+
+def test_a_new_fingerprint_drops_the_stored_draft(store):
+    store.put("t1", "fp", {"response": "hello"}, 200, prompt_version="v1")
+
+    assert store.get("t1", "other", "v1") is None
+    # The stale draft is gone, not just skipped
+    assert store.get("t1", "fp", "v1") is None
+
+
+def test_a_new_prompt_version_drops_the_stored_draft(store):
+    store.put("t1", "fp", {"response": "hello"}, 200, prompt_version="v1")
+
+    assert store.needs_draft("t1", "fp", "v2")
+    assert store.get("t1", "fp", "v2") is None
+    assert store.get("t1", "fp", "v1") is None
+
+
+def test_gc_drops_expired_drafts(store):
+    store.put("old", "fp", {"response": "old"}, 200)
+    store.put("new", "fp", {"response": "new"}, 200)
+    with store._db:
+        store._db.execute("UPDATE drafts SET created_at = ? WHERE thread_id = 'old'", (time.time() - 7200,))
+
+    assert store.gc() == 1
+    assert store.get("old", "fp") is None
+    assert store.get("new", "fp") is not None
+
+
+def test_gc_keeps_the_most_recently_used_drafts(tmp_path):
+    store = DraftStore(db_path=str(tmp_path / "drafts.sqlite3"), ttl_seconds=0, max_entries=2)
+    try:
+        store.put("a", "fp", {"response": "a"}, 200)
+        store.put("b", "fp", {"response": "b"}, 200)
+        assert store.get("a", "fp") is not None  # "b" is now the least recently used
+        store.put("c", "fp", {"response": "c"}, 200)
+
+        assert store.stats()["drafts"] == 2
+        assert store.get("b", "fp") is None
+        assert store.get("a", "fp") is not None
+        assert store.get("c", "fp") is not None
+    finally:
+        store.close()
+
+
+def test_store_is_reopened_after_a_fork(shared_store, monkeypatch):
+    shared_store.put("t1", "fp", {"response": "hello"}, 200, source=SOURCE_WORKER)
+    monkeypatch.setattr(drafts, "_store_pid", -1)  # As seen from a forked child
+
+    reopened = get_draft_store()
+
+    assert reopened is not shared_store
+    assert reopened.get("t1", "fp").source == SOURCE_WORKER
+    shared_store.close()
+
+
+def test_generate_serves_the_stored_draft(shared_store, counting_generation):
+    first, _ = generation.generate_for_request(dict(REQUEST))
+    second, status = generation.generate_for_request(dict(REQUEST))
+
+    assert len(counting_generation) == 1
+    assert status == 200
+    assert second["response"] == first["response"] == "draft 1"
+    assert second["cached"] and not second["pregenerated"]
+
+
+def test_regenerate_bypasses_and_replaces_the_stored_draft(shared_store, counting_generation):
+    generation.generate_for_request(dict(REQUEST))
+
+    payload, _ = generation.generate_for_request({**REQUEST, "regenerate": True})
+
+    assert len(counting_generation) == 2
+    assert payload["response"] == "draft 2"
+    assert "cached" not in payload
+    stored, _ = generation.generate_for_request(dict(REQUEST))
+    assert stored["response"] == "draft 2"
+
+
+def test_regenerate_forgets_the_replayed_result(shared_store, counting_generation, monkeypatch):
+    monkeypatch.setattr(Config, "IDEMPOTENCY_ENABLED", True)
+    monkeypatch.setattr(idempotency, "_single_flight", None)
+    client = app.test_client()
+
+    assert client.post("/generate", json=REQUEST).get_json()["response"] == "draft 1"
+    assert client.post("/generate", json={**REQUEST, "regenerate": True}).get_json()["response"] == "draft 2"
+    # The plain request is not answered with a replay of the first draft
+    response = client.post("/generate", json=REQUEST)
+
+    assert response.get_json()["response"] == "draft 2"
+    assert response.headers["Idempotency-Status"] != idempotency.REPLAYED
@@ -0,0 +1,43 @@
+"""Usage attribution for micro-batched embedding calls in embedding_batcher.py."""
+
+import threading
+
+import knowledge_base
+from embedding_batcher import EmbeddingBatcher
+from usage import usage_scope
+
+
+def test_batch_usage_is_recorded_in_each_callers_scope():
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        return [[float(len(text))] for text in texts], {"prompt_tokens": 30, "total_tokens": 30}
+
+    batcher = EmbeddingBatcher(embed, window_ms=200, record_fn=knowledge_base._record_embedding_usage)
+    scopes = {}
+    ready = threading.Barrier(2)
+
+    def caller(name, texts):
+        with usage_scope(thread_id=name) as scope:
+            ready.wait()
+            batcher.embed_many(texts)
+            scopes[name] = scope
+
+    try:
+        threads = [
+            threading.Thread(target=caller, args=("a", ["aaaa", "bbbb"])),
+            threading.Thread(target=caller, args=("b", ["cccc"])),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+    finally:
+        batcher.stop()
+
+    assert len(calls) == 1
+    assert scopes["a"].used_tokens == 20
+    assert scopes["b"].used_tokens == 10
+    assert [record.thread_id for record in scopes["a"].records] == ["a"]
+    assert [record.thread_id for record in scopes["b"].records] == ["b"]
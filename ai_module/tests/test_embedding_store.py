@@ -0,0 +1,101 @@
+"""The local embedding store in embedding_store.py."""
+
+import os
+
+import numpy as np
+import pytest
+
+from embedding_store import CURRENT_FILE, EmbeddingStore, quantize, store_exists, truncate
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(20, 64)).astype(np.float32)
+
+
+def test_reader_sees_appended_rows_only_after_reopening(tmp_path, vectors):
+    writer = EmbeddingStore.create(str(tmp_path), list(range(10)), vectors[:10], dim=32, dtype="int8")
+    reader = EmbeddingStore(str(tmp_path))
+
+    assert writer.append([10, 11], vectors[10:12]) == [10, 11]
+
+    assert len(reader) == 10 and reader.changed()
+    reopened = EmbeddingStore(str(tmp_path))
+    assert reopened.ids == list(range(12)) and not reopened.changed()
+    assert reopened.search(vectors[11], k=1)[0][0] == 11
+
+
+def test_rebuild_leaves_open_readers_on_their_generation(tmp_path, vectors):
+    EmbeddingStore.create(str(tmp_path), list(range(10)), vectors[:10], dtype="float16")
+    reader = EmbeddingStore(str(tmp_path))
+    before = reader.search(vectors[3], k=3)
+
+    for _ in range(3):
+        EmbeddingStore.create(str(tmp_path), ["a", "b"], vectors[:2], dtype="float16")
+
+    assert reader.changed()
+    assert reader.search(vectors[3], k=3) == before
+    assert EmbeddingStore(str(tmp_path)).ids == ["a", "b"]
+    # The live generation and the one before it are kept
+    generations = [name for name in os.listdir(tmp_path) if name != CURRENT_FILE]
+    assert len(generations) == 2
+
+
+def test_store_written_before_generations_is_still_read(tmp_path, vectors):
+    generation = EmbeddingStore.create(str(tmp_path / "new"), list(range(5)), vectors[:5]).path
+    legacy = tmp_path / "legacy"
+    os.rename(generation, legacy)
+
+    assert store_exists(str(legacy))
+    store = EmbeddingStore(str(legacy))
+    store.append([5], vectors[5:6])
+    assert EmbeddingStore(str(legacy)).ids == list(range(6))
+
+
+def test_truncate_keeps_the_leading_components_at_unit_length(vectors):
+    truncated = truncate(vectors, 16)
+
+    assert truncated.shape == (20, 16)
+    np.testing.assert_allclose(np.linalg.norm(truncated, axis=1), 1.0, rtol=1e-6)
+    # Same direction as the leading components
+    np.testing.assert_allclose(truncated[0] * np.linalg.norm(vectors[0, :16]), vectors[0, :16], rtol=1e-5)
+    assert truncate(vectors[0], 16).shape == (16,)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("float32", 1e-6), ("float16", 1e-3), ("int8", 2e-2)])
+def test_quantized_store_scores_match_float32(tmp_path, vectors, dtype, tolerance):
+    store = EmbeddingStore.create(str(tmp_path), list(range(20)), vectors, dim=32, dtype=dtype)
+    reference = truncate(vectors, 32)
+
+    assert store.dim == 32 and store.vectors.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(store.dequantize(slice(None)), reference, atol=tolerance)
+    for query in vectors[:5]:
+        expected = reference @ truncate(query, 32)
+        np.testing.assert_allclose(store.similarities(store.prepare_query(query)), expected, atol=tolerance)
+        assert store.search(query, k=1)[0][0] == int(np.argmax(expected))
+
+
+def test_int8_store_keeps_one_scale_per_row(tmp_path, vectors):
+    store = EmbeddingStore.create(str(tmp_path), list(range(20)), vectors, dtype="int8")
+    _, scales = quantize(truncate(vectors, 64), "int8")
+
+    assert os.path.getsize(os.path.join(store.path, "scales.bin")) == 20 * 4
+    np.testing.assert_array_equal(np.asarray(store.scales), scales)
+    assert np.abs(np.asarray(store.vectors)).max() == 127
+
+    store.append([20], vectors[:1])
+    assert os.path.getsize(os.path.join(store.path, "scales.bin")) == 21 * 4
+    np.testing.assert_array_equal(EmbeddingStore(str(tmp_path)).scales[20], scales[0])
+
+
+def test_append_persists_ids_and_meta(tmp_path, vectors):
+    store = EmbeddingStore.create(str(tmp_path), ["a", "b"], vectors[:2], dim=32, dtype="float16", model="m")
+
+    assert store.append(["c", "d"], vectors[2:4]) == [2, 3]
+
+    reopened = EmbeddingStore(str(tmp_path))
+    assert reopened.ids == ["a", "b", "c", "d"]
+    assert reopened.meta == {"dim": 32, "dtype": "float16", "count": 4, "model": "m"}
+    assert reopened.row("d") == 3
+    assert os.path.getsize(os.path.join(reopened.path, "vectors.bin")) == 4 * 32 * 2
+    assert reopened.search(vectors[3], k=1)[0][0] == "d"
@@ -0,0 +1,92 @@
+"""The HNSW graph in hnsw_index.py, checked against exact search on small seeded data."""
+
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore
+from hnsw_index import HNSWIndex
+
+
+@pytest.fixture
+def vectors():
+    # Clustered, like real embeddings, so the graph has structure to exploit
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(10, 32))
+    return (centres[rng.integers(0, 10, size=500)] + 0.3 * rng.normal(size=(500, 32))).astype(np.float32)
+
+
+@pytest.fixture
+def store(tmp_path, vectors):
+    return EmbeddingStore.create(str(tmp_path), list(range(len(vectors))), vectors)
+
+
+def _recall(index, store, queries, k=10):
+    found = 0
+    for query in queries:
+        exact = {doc_id for doc_id, _ in store.search(query, k=k)}
+        found += len(exact & {doc_id for doc_id, _ in index.search(query, k=k)})
+    return found / (k * len(queries))
+
+
+def test_search_recall_against_brute_force(store, vectors):
+    index = HNSWIndex.build(store, m=8, ef_construction=64, ef_search=64)
+    queries = vectors[:50] + 0.1 * np.random.default_rng(1).normal(size=(50, 32)).astype(np.float32)
+
+    assert len(index) == len(vectors)
+    assert _recall(index, store, queries) >= 0.95
+    # Similarities are the store's exact scores for the rows returned
+    doc_id, similarity = index.search(vectors[7], k=1)[0]
+    assert doc_id == 7 and similarity == pytest.approx(1.0, abs=1e-5)
+
+
+def test_incremental_inserts_are_searchable(store, vectors):
+    index = HNSWIndex.build(store, m=8, ef_construction=64)
+    extra = np.random.default_rng(2).normal(size=(5, 32)).astype(np.float32)
+
+    rows = store.append([1000 + i for i in range(5)], extra)
+    for row in rows:
+        index.insert(row)
+
+    assert len(index) == len(vectors) + 5
+    assert [index.search(vector, k=1)[0][0] for vector in extra] == [1000 + i for i in range(5)]
+    with pytest.raises(ValueError):
+        index.insert(rows[0])
+
+
+def test_deleted_documents_are_never_returned(store, vectors):
+    index = HNSWIndex.build(store, m=8, ef_construction=64)
+    nearest = [doc_id for doc_id, _ in index.search(vectors[3], k=5)]
+
+    for doc_id in nearest[:3]:
+        assert index.delete(doc_id)
+    assert not index.delete("missing")
+
+    results = [doc_id for doc_id, _ in index.search(vectors[3], k=5)]
+    assert len(results) == 5
+    assert not set(results) & set(nearest[:3])
+    assert len(index) == len(vectors) - 3
+
+
+def test_saved_graph_loads_with_the_same_results(store, vectors):
+    index = HNSWIndex.build(store, m=8, ef_construction=64, ef_search=32)
+    index.delete(0)
+    index.save()
+
+    loaded = HNSWIndex.load(EmbeddingStore(store.root))
+
+    assert loaded.ef_search == 32
+    assert loaded.tombstones == {0}
+    assert (loaded.levels, loaded.links, loaded.entry_point) == (index.levels, index.links, index.entry_point)
+    for query in vectors[10:20]:
+        assert loaded.search(query, k=5) == index.search(query, k=5)
+
+
+def test_load_links_in_rows_appended_after_the_save(store, vectors):
+    HNSWIndex.build(store, m=8, ef_construction=64).save()
+    extra = np.random.default_rng(3).normal(size=(1, 32)).astype(np.float32)
+    store.append([1000], extra)
+
+    loaded = HNSWIndex.load(EmbeddingStore(store.root))
+
+    assert len(loaded) == len(vectors) + 1
+    assert loaded.search(extra[0], k=1)[0][0] == 1000
@@ -0,0 +1,124 @@
+"""Single-flight coalescing and replay in idempotency.py."""
+
+import threading
+import time
+
+import pytest
+
+from idempotency import COALESCED, EXECUTED, REPLAYED, IdempotencyConflict, SingleFlight
+
+
+class Counter:
+    """A slow function that counts its calls and can be made to fail."""
+
+    def __init__(self, delay: float = 0.0, error: Exception = None):
+        self.calls = 0
+        self.delay = delay
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return f"result {call}"
+
+
+def _run_concurrently(flights: SingleFlight, key: str, fn, callers: int):
+    results, errors = [], []
+    start = threading.Barrier(callers)
+
+    def call():
+        start.wait()
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results, errors
+
+
+def test_concurrent_callers_share_one_run():
+    fn = Counter(delay=0.2)
+
+    results, errors = _run_concurrently(SingleFlight(replay_seconds=60), "k", fn, callers=5)
+
+    assert not errors
+    assert fn.calls == 1
+    assert {result for result, _ in results} == {"result 1"}
+    assert sorted(outcome for _, outcome in results) == [COALESCED] * 4 + [EXECUTED]
+
+
+def test_a_failure_is_shared_with_waiting_callers_but_not_replayed():
+    flights = SingleFlight(replay_seconds=60)
+    fn = Counter(delay=0.2, error=RuntimeError("provider down"))
+
+    results, errors = _run_concurrently(flights, "k", fn, callers=3)
+
+    assert not results
+    assert fn.calls == 1
+    assert [str(e) for e in errors] == ["provider down"] * 3
+
+    fn.error = None
+    assert flights.do("k", fn) == ("result 2", EXECUTED)
+
+
+def test_a_finished_result_is_replayed_within_the_window():
+    flights = SingleFlight(replay_seconds=60)
+    fn = Counter()
+
+    assert flights.do("k", fn) == ("result 1", EXECUTED)
+    assert flights.do("k", fn) == ("result 1", REPLAYED)
+    assert fn.calls == 1
+
+
+def test_an_expired_result_runs_again():
+    flights = SingleFlight(replay_seconds=0.05)
+    fn = Counter()
+
+    flights.do("k", fn)
+    time.sleep(0.1)
+
+    assert flights.do("k", fn) == ("result 2", EXECUTED)
+
+
+def test_a_reused_key_with_a_different_body_is_a_conflict():
+    flights = SingleFlight(replay_seconds=60)
+    fn = Counter()
+    flights.do("k", fn, request_hash="body-a")
+
+    with pytest.raises(IdempotencyConflict):
+        flights.do("k", fn, request_hash="body-b")
+    assert flights.do("k", fn, request_hash="body-a") == ("result 1", REPLAYED)
+    assert fn.calls == 1
+
+
+def test_forget_drops_a_finished_result():
+    flights = SingleFlight(replay_seconds=60)
+    fn = Counter()
+    flights.do("k", fn)
+
+    assert flights.forget("k")
+    assert not flights.forget("k")
+    assert flights.do("k", fn) == ("result 2", EXECUTED)
+
+
+def test_forget_leaves_a_running_call_alone():
+    flights = SingleFlight(replay_seconds=60)
+    fn = Counter(delay=0.3)
+    thread = threading.Thread(target=flights.do, args=("k", fn))
+    thread.start()
+    time.sleep(0.1)
+
+    assert flights.in_flight() == 1
+    assert not flights.forget("k")
+    thread.join(timeout=10)
+    assert flights.in_flight() == 0
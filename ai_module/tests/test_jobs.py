@@ -0,0 +1,215 @@
+"""The SQLite job queue in jobs.py: claims, recovery, long-polling, SSE and callback checks."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from config import Config
+from jobs import (
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobQueue,
+    QueueFullError,
+    check_callback_url,
+    recover_interrupted_jobs,
+    sse_events,
+)
+from main import app
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8080/done",
+    "http://localhost/done",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.20/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "ftp://93.184.216.34/hook",
+    "not a url",
+])
+def test_callback_to_a_non_public_address_is_refused(url):
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+
+def test_callback_to_a_public_address_is_accepted():
+    check_callback_url("https://93.184.216.34/hooks/job")
+
+
+def test_allow_list_replaces_the_address_check(monkeypatch):
+    monkeypatch.setattr(Config, "JOBS_CALLBACK_ALLOWED_HOSTS", "localhost, hooks.example.com")
+    check_callback_url("http://localhost:8080/done")
+    with pytest.raises(ValueError):
+        check_callback_url("https://93.184.216.34/hooks/job")
+
+
+def test_submit_rejects_an_internal_callback_url():
+    response = app.test_client().post("/jobs/generate", json={
+        "prospect_name": "Sam",
+        "messages": [{"sender": "prospect", "text": "hi"}],
+        "callback_url": "http://169.254.169.254/latest/meta-data/",
+    })
+    assert response.status_code == 400
+    assert "non-public" in response.get_json()["error"]
+
+
+@pytest.fixture
+def make_queue(tmp_path, monkeypatch):
+    """JobQueues on one temporary database (several act like several worker processes)."""
+    monkeypatch.setattr(Config, "JOBS_DB_PATH", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(Config, "JOBS_RECOVER_ON_START", False)
+    queues = []
+
+    def make(runner=None, **kwargs):
+        queue = JobQueue(runner=runner or (lambda data: ({"response": f"hi {data['n']}"}, 200)), workers=1, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.stop()
+        queue._db.close()
+
+
+def test_a_job_is_claimed_by_exactly_one_queue(make_queue):
+    queues = [make_queue(), make_queue()]
+    for n in range(20):
+        queues[0].submit({"n": n})
+    claimed = []
+
+    def drain(queue):
+        while True:
+            row = queue._claim()
+            if row is None:
+                return
+            claimed.append(row["id"])
+
+    threads = [threading.Thread(target=drain, args=(queue,)) for queue in queues for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert len(claimed) == len(set(claimed)) == 20
+    assert queues[0].count(RUNNING) == 20
+
+
+def test_interrupted_jobs_are_requeued(make_queue):
+    queue = make_queue()
+    job = queue.submit({"n": 1})
+    queue._claim()
+
+    assert recover_interrupted_jobs() == 1
+    requeued = queue.get(job["job_id"])
+    assert requeued["status"] == QUEUED
+    assert requeued["started_at"] is None
+
+
+def test_workers_run_jobs_and_record_failures(make_queue):
+    def runner(data):
+        if data["n"] == 2:
+            raise RuntimeError("writer failed")
+        return {"response": "hi"}, 200
+
+    queue = make_queue(runner).start()
+    ok, failed = queue.submit({"n": 1}), queue.submit({"n": 2})
+
+    ok = queue.wait(ok["job_id"], timeout=5)
+    failed = queue.wait(failed["job_id"], timeout=5)
+
+    assert (ok["status"], ok["status_code"], ok["result"]) == (SUCCEEDED, 200, {"response": "hi"})
+    assert (failed["status"], failed["status_code"], failed["error"]) == (FAILED, 500, "writer failed")
+    assert "wait_ms" in ok and "run_ms" in ok
+
+
+def test_wait_returns_the_unfinished_job_on_timeout(make_queue):
+    queue = make_queue()  # No workers: the job stays queued
+    job = queue.submit({"n": 1})
+
+    start = time.time()
+    waited = queue.wait(job["job_id"], timeout=0.2)
+
+    assert waited["status"] == QUEUED
+    assert 0.2 <= time.time() - start < 2
+    assert queue.wait("missing", timeout=0.2) is None
+
+
+def _blocking_runner(release):
+    def runner(data):
+        release.wait(5)
+        return {"response": "hi"}, 200
+    return runner
+
+
+def test_wait_returns_on_a_status_change(make_queue):
+    release = threading.Event()
+    queue = make_queue(_blocking_runner(release)).start()
+    job = queue.submit({"n": 1})
+
+    running = queue.wait(job["job_id"], timeout=5, seen_status=QUEUED)
+    assert running["status"] == RUNNING
+    release.set()
+    assert queue.wait(job["job_id"], timeout=5, seen_status=RUNNING)["status"] == SUCCEEDED
+
+
+def test_submit_refuses_jobs_when_the_queue_is_full(make_queue):
+    queue = make_queue(max_queued=2)
+    queue.submit({"n": 1})
+    queue.submit({"n": 2})
+
+    with pytest.raises(QueueFullError):
+        queue.submit({"n": 3})
+
+
+def test_prune_deletes_finished_jobs_past_retention(make_queue):
+    queue = make_queue()
+    old, recent, pending = (queue.submit({"n": n}) for n in range(3))
+    for job in (old, recent):
+        queue._finish(job["job_id"], SUCCEEDED, result={"response": "hi"}, status_code=200)
+    with queue._db:
+        queue._db.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", (time.time() - 3600, old["job_id"]))
+
+    assert queue.prune(retention_seconds=60) == 1
+    assert queue.get(old["job_id"]) is None
+    assert queue.get(recent["job_id"]) is not None
+    assert queue.get(pending["job_id"]) is not None
+
+
+def _parse_event(event):
+    assert event.endswith("\n\n")
+    name, data = event[:-2].split("\n")
+    assert name.startswith("event: ") and data.startswith("data: ")
+    return name[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_sse_streams_status_changes_then_the_result(make_queue):
+    release = threading.Event()
+    queue = make_queue(_blocking_runner(release))
+    job = queue.submit({"n": 1})
+    events = sse_events(queue, job["job_id"], keepalive_seconds=0.1)
+
+    assert _parse_event(next(events)) == ("status", {"job_id": job["job_id"], "status": QUEUED})
+    assert next(events) == ": keepalive\n\n"
+    queue.start()
+    event = next(events)
+    while event == ": keepalive\n\n":
+        event = next(events)
+    assert _parse_event(event) == ("status", {"job_id": job["job_id"], "status": RUNNING})
+    release.set()
+    remaining = list(events)
+
+    name, result = _parse_event(remaining[-1])
+    assert name == "result"
+    assert result["status"] == SUCCEEDED and result["result"] == {"response": "hi"}
+    assert all(event == ": keepalive\n\n" for event in remaining[:-1])
+
+
+def test_sse_reports_an_unknown_job(make_queue):
+    events = list(sse_events(make_queue(), "missing"))
+
+    assert [_parse_event(event) for event in events] == [("error", {"error": "Job not found"})]
@@ -0,0 +1,110 @@
+"""The retrieval result cache in kb_cache.py and its invalidation by knowledge_base.py."""
+
+import time
+
+import pytest
+
+import knowledge_base
+from benchmarks.stubs import StubProviders, fake_embedding
+from config import Config
+from kb_cache import KBResultCache
+
+RESULTS = [{"source": "faq", "snippet": "Tuition is paid monthly.", "similarity": 0.9}]
+
+
+def test_key_normalizes_the_query():
+    assert KBResultCache.key("  How MUCH\n does it cost? ", 5, 0.7, 1) == KBResultCache.key("how much does it cost?", 5, 0.7, 1)
+    assert KBResultCache.key("cost", 5, 0.7, 1) != KBResultCache.key("cost", 5, 0.7, 2)
+
+
+def test_entries_expire_after_the_ttl():
+    cache = KBResultCache(max_entries=10, ttl_seconds=0.05)
+    key = cache.key("cost", 5, 0.7, 1)
+    cache.put(key, RESULTS)
+
+    assert cache.get(key) == RESULTS
+    time.sleep(0.1)
+    assert cache.get(key) is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 1, "hit_ratio": 0.5}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = KBResultCache(max_entries=2, ttl_seconds=0)
+    a, b, c = (cache.key(query, 5, 0.7, 1) for query in "abc")
+    cache.put(a, RESULTS)
+    cache.put(b, RESULTS)
+    cache.get(a)
+    cache.put(c, RESULTS)
+
+    assert cache.get(b) is None
+    assert cache.get(a) is not None and cache.get(c) is not None
+
+
+def test_callers_cannot_mutate_cached_results():
+    cache = KBResultCache(max_entries=10, ttl_seconds=0)
+    key = cache.key("cost", 5, 0.7, 1)
+    results = [dict(row) for row in RESULTS]
+    cache.put(key, results)
+
+    results[0]["snippet"] = "changed before get"
+    cache.get(key)[0]["snippet"] = "changed after get"
+
+    assert cache.get(key) == RESULTS
+
+
+def test_older_versions_are_evicted():
+    cache = KBResultCache(max_entries=10, ttl_seconds=0)
+    old, current = cache.key("cost", 5, 0.7, 1), cache.key("cost", 5, 0.7, 2)
+    cache.put(old, RESULTS)
+    cache.put(current, RESULTS)
+
+    cache.evict_versions_before(2)
+
+    assert cache.get(old) is None
+    assert cache.get(current) == RESULTS
+
+
+DOCUMENTS = [
+    {"question": "How much does the program cost?", "answer": "Tuition is paid monthly."},
+    {"question": "Who are the mentors?", "answer": "Mentors are founders and engineers."},
+]
+
+
+@pytest.fixture
+def kb(monkeypatch):
+    monkeypatch.setattr(Config, "KB_HYBRID_SEARCH", False)
+    monkeypatch.setattr(Config, "KB_VECTOR_BACKEND", "supabase")
+    monkeypatch.setattr(Config, "KB_CHANGE_POLL_SECONDS", 30.0)
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_ENABLED", False)
+    with StubProviders() as stubs:
+        stubs.seed_kb(DOCUMENTS)
+        yield stubs
+
+
+def _retrieve(stubs):
+    """Retrieve the first document; returns (results, embedding calls made)."""
+    before = stubs.openai.request_count
+    results = knowledge_base.retrieve("How much does the program cost?", k=1, threshold=0.0)
+    return results, stubs.openai.request_count - before
+
+
+def test_retrieve_serves_cached_results_until_the_corpus_version_changes(kb):
+    first, calls = _retrieve(kb)
+    assert calls == 1 and first[0]["snippet"] == DOCUMENTS[0]["answer"]
+
+    assert _retrieve(kb) == (first, 0)
+
+    knowledge_base.bump_corpus_version("test")
+    assert _retrieve(kb) == (first, 1)
+
+
+def test_external_change_found_by_polling_invalidates_cached_results(kb):
+    first, _ = _retrieve(kb)  # The first poll records the corpus signature
+    knowledge_base._corpus_checked_at = 0.0
+    assert _retrieve(kb) == (first, 0)
+
+    text = "Tuition can also be paid upfront."
+    kb.supabase.seed("kb_documents", [{"answer": text, "tags": [], "embedding": fake_embedding(text)}])
+    knowledge_base._corpus_checked_at = 0.0
+
+    assert _retrieve(kb)[1] == 1
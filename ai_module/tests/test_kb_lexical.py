@@ -0,0 +1,97 @@
+"""BM25 search and rank fusion in kb_lexical.py, and hybrid retrieval in knowledge_base.py."""
+
+import pytest
+
+import knowledge_base
+from config import Config
+from kb_lexical import BM25Index, rrf_fuse, tokenize
+
+CORPUS = [
+    {"id": 1, "question": "How much does tuition cost?", "answer": "Tuition is paid monthly.", "tags": ["pricing"]},
+    {"id": 2, "question": "Who are the mentors?", "answer": "Founders and engineers from Stanford.", "tags": []},
+    {"id": 3, "question": "How long is the program?", "answer": "Twelve weeks, with optional tuition support.", "tags": []},
+    {"id": 4, "question": "Is there a scholarship?", "answer": "Need-based scholarships cover tuition.", "tags": ["pricing"]},
+]
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.build(CORPUS)
+    return index
+
+
+def test_tokenize_drops_stopwords_and_possessives():
+    assert tokenize("What's the Program's COST in 2024?") == ["program", "cost", "2024"]
+
+
+def test_question_and_tag_terms_outrank_answer_terms(index):
+    ranking = [doc_id for doc_id, _ in index.search("tuition", k=4)]
+
+    # "tuition" is in doc 1's question, but only in the answers of docs 3 and 4
+    assert ranking[0] == 1
+    assert set(ranking) == {1, 3, 4}
+    assert [doc_id for doc_id, _ in index.search("pricing", k=4)] in ([1, 4], [4, 1])
+
+
+def test_removed_and_readded_documents(index):
+    index.remove(2)
+    assert index.search("mentors") == []
+    assert len(index) == 3
+
+    index.add({**CORPUS[1], "answer": "Our mentors are alumni."})
+    assert index.search("alumni")[0][0] == 2
+    assert index.search("stanford") == []
+
+
+def test_coverage_reports_how_much_of_the_query_the_top_hit_explains(index):
+    hits, coverage = index.search_with_coverage("mentors stanford")
+    assert hits[0][0] == 2 and coverage == pytest.approx(1.0)
+
+    hits, coverage = index.search_with_coverage("mentors berkeley")
+    assert hits[0][0] == 2 and 0 < coverage < 0.6
+
+    assert index.search_with_coverage("the and of") == ([], 0.0)
+
+
+def test_rrf_fuse_rewards_documents_ranked_by_both_lists():
+    fused = rrf_fuse([["a", "b", "c"], ["b", "d"]], k=60)
+
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "d", "c"]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[-1][1] == pytest.approx(1 / 63)
+
+
+@pytest.fixture
+def hybrid(index, monkeypatch):
+    """Hybrid search over the in-memory index with a vector search that records its calls."""
+    calls = []
+
+    def vector_search(query, k, threshold):
+        calls.append(query)
+        return [dict(CORPUS[3], similarity=0.9), dict(CORPUS[2], similarity=0.8)]
+
+    monkeypatch.setattr(Config, "KB_LEXICAL_MIN_COVERAGE", 0.6)
+    monkeypatch.setattr(Config, "KB_LEXICAL_MIN_MARGIN", 1.5)
+    monkeypatch.setattr(Config, "KB_RRF_K", 60)
+    monkeypatch.setattr(knowledge_base, "_get_lexical_index", lambda: index)
+    monkeypatch.setattr(knowledge_base, "_vector_search", vector_search)
+    return calls
+
+
+def test_confident_lexical_match_skips_the_embedding(hybrid):
+    results = knowledge_base._hybrid_search("mentors stanford", k=2, threshold=0.7)
+
+    assert hybrid == []
+    assert results[0]["id"] == 2
+    assert {result["retrieval"] for result in results} == {"lexical"}
+
+
+def test_ambiguous_query_is_fused_with_vector_results(hybrid):
+    # "installments" is not in the corpus, so no lexical hit explains the query
+    results = knowledge_base._hybrid_search("tuition installments", k=3, threshold=0.7)
+
+    assert hybrid == ["tuition installments"]
+    # Docs 4 and 3 are ranked by both searches and overtake doc 1, the top lexical hit
+    assert [result["id"] for result in results] == [4, 3, 1]
+    assert {result["retrieval"] for result in results} == {"hybrid"}
@@ -0,0 +1,159 @@
+"""Corpus change polling and the local indexes in knowledge_base.py."""
+
+import threading
+
+import pytest
+
+import knowledge_base
+from benchmarks.stubs import StubProviders, fake_embedding
+from config import Config
+
+DOCUMENTS = [
+    {"question": "How much does the program cost?", "answer": "Tuition is paid monthly."},
+    {"question": "Who are the mentors?", "answer": "Mentors are founders and engineers."},
+    {"question": "How long is the program?", "answer": "It runs for twelve weeks."},
+]
+
+
+@pytest.fixture
+def local_kb(monkeypatch):
+    monkeypatch.setattr(Config, "KB_VECTOR_BACKEND", "local")
+    monkeypatch.setattr(Config, "KB_ANN_INDEX", "hnsw")
+    monkeypatch.setattr(Config, "KB_CHANGE_POLL_SECONDS", 30.0)
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_ENABLED", False)
+    with StubProviders() as stubs:
+        stubs.seed_kb(DOCUMENTS)
+        knowledge_base.preload()
+        _poll()
+        yield stubs
+
+
+def _poll():
+    knowledge_base._corpus_checked_at = 0.0
+    knowledge_base._poll_corpus_changes()
+
+
+def test_own_add_does_not_look_like_an_external_change(local_kb):
+    store, index = knowledge_base._embedding_store, knowledge_base._ann_index
+    version = knowledge_base.corpus_version()
+
+    knowledge_base.add_document(question="Is there a scholarship?", answer="Yes, need-based aid is available.")
+    _poll()
+
+    assert not knowledge_base._embedding_store_stale
+    assert knowledge_base._get_embedding_store() is store
+    assert knowledge_base._get_ann_index() is index
+    assert len(index) == len(DOCUMENTS) + 1
+    # Only the add itself bumped the version
+    assert knowledge_base.corpus_version() == version + 1
+
+
+def test_own_delete_does_not_look_like_an_external_change(local_kb):
+    store = knowledge_base._embedding_store
+
+    assert knowledge_base.delete_document(1)
+    _poll()
+
+    assert not knowledge_base._embedding_store_stale
+    assert knowledge_base._get_embedding_store() is store
+
+
+def test_external_change_is_picked_up(local_kb):
+    version = knowledge_base.corpus_version()
+    text = "Classes meet twice a week."
+    local_kb.supabase.seed("kb_documents", [{"answer": text, "tags": [], "embedding": fake_embedding(text)}])
+
+    _poll()
+
+    assert knowledge_base._embedding_store_stale
+    assert knowledge_base.corpus_version() == version + 1
+
+
+def test_only_the_writer_builds_or_appends_to_the_local_store(monkeypatch):
+    monkeypatch.setattr(Config, "KB_VECTOR_BACKEND", "local")
+    monkeypatch.setattr(Config, "KB_ANN_INDEX", "hnsw")
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_ENABLED", False)
+    with StubProviders() as stubs:
+        stubs.seed_kb(DOCUMENTS)
+        knowledge_base.set_store_writer(False)
+
+        # No store yet: a reader searches through Supabase instead of building one
+        embedding = fake_embedding(DOCUMENTS[1]["question"])
+        assert knowledge_base._vector_search_many([embedding], 1, 0.0)[0][0]["id"] == 2
+        knowledge_base.add_document(question="Is there a scholarship?", answer="Yes, need-based aid is available.")
+        assert knowledge_base._get_embedding_store() is None
+
+        knowledge_base.set_store_writer(True)
+        knowledge_base._embedding_store_stale = True
+        writer_store = knowledge_base._get_embedding_store()
+        assert len(writer_store) == len(DOCUMENTS) + 1
+
+        # The reader reopens the store once the writer has appended to it
+        knowledge_base.set_store_writer(False)
+        knowledge_base._embedding_store = None
+        reader_store = knowledge_base._get_embedding_store()
+        assert knowledge_base._get_ann_index() is None  # No saved graph yet: exact search
+        writer_store.append(["x"], [fake_embedding("appended")])
+        assert knowledge_base._get_embedding_store() is not reader_store
+        assert len(knowledge_base._get_embedding_store()) == len(DOCUMENTS) + 2
+
+
+def test_hnsw_graph_is_built_in_the_background(monkeypatch):
+    monkeypatch.setattr(Config, "KB_VECTOR_BACKEND", "local")
+    monkeypatch.setattr(Config, "KB_ANN_INDEX", "hnsw")
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_ENABLED", False)
+    with StubProviders() as stubs:
+        stubs.seed_kb(DOCUMENTS)
+        embedding = fake_embedding("\n".join([DOCUMENTS[2]["question"], DOCUMENTS[2]["answer"]]))
+
+        # The graph is not ready on the first lookup: the store is searched exactly
+        assert knowledge_base._get_ann_index() is None
+        assert knowledge_base._local_vector_search([embedding], 1, 0.0)[0][0]["id"] == 3
+
+        for thread in threading.enumerate():
+            if thread.name == "kb-hnsw-build":
+                thread.join(timeout=10)
+        index = knowledge_base._get_ann_index()
+        assert index is not None and len(index) == len(DOCUMENTS)
+        assert knowledge_base._ann_building is None
+        assert knowledge_base._local_vector_search([embedding], 1, 0.0)[0][0]["id"] == 3
+
+
+def test_lexical_index_is_refreshed_in_the_background(monkeypatch):
+    monkeypatch.setattr(Config, "KB_HYBRID_SEARCH", True)
+    monkeypatch.setattr(Config, "EMBEDDING_BATCH_ENABLED", False)
+    with StubProviders() as stubs:
+        stubs.seed_kb(DOCUMENTS)
+        index = knowledge_base._get_lexical_index()
+        assert len(index) == len(DOCUMENTS)
+
+        text = "Classes meet twice a week."
+        stubs.supabase.seed("kb_documents", [{"answer": text, "tags": [], "embedding": fake_embedding(text)}])
+        fetching, release = threading.Event(), threading.Event()
+        fetch_corpus = knowledge_base._fetch_corpus
+
+        def slow_fetch():
+            rows = fetch_corpus()
+            fetching.set()
+            release.wait(timeout=10)
+            return rows
+
+        monkeypatch.setattr(knowledge_base, "_fetch_corpus", slow_fetch)
+        knowledge_base._lexical_loaded_at = 0.0
+
+        # Callers keep the current index while the refresh fetches the corpus
+        assert knowledge_base._get_lexical_index() is index
+        assert fetching.wait(timeout=10)
+        assert knowledge_base._get_lexical_index() is index
+        # A local add during the refresh is replayed onto the new index
+        added = knowledge_base.add_document(question="Is there a scholarship?", answer="Yes, need-based aid.")
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "kb-lexical-refresh":
+                thread.join(timeout=10)
+
+        refreshed = knowledge_base._get_lexical_index()
+        assert refreshed is not index
+        assert len(refreshed) == len(DOCUMENTS) + 2
+        assert refreshed.get(added["id"]) is not None
+        assert not knowledge_base._lexical_refreshing
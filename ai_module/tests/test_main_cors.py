@@ -0,0 +1,18 @@
+"""CORS headers on the Flask app."""
+
+from main import app
+
+
+def test_idempotency_headers_are_allowed_and_exposed():
+    client = app.test_client()
+    preflight = client.options("/generate", headers={
+        "Origin": "https://example.com",
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "Content-Type, Idempotency-Key",
+    })
+    assert "idempotency-key" in preflight.headers["Access-Control-Allow-Headers"].lower()
+
+    response = client.get("/health", headers={"Origin": "https://example.com"})
+    exposed = response.headers["Access-Control-Expose-Headers"].lower()
+    assert "idempotency-key" in exposed
+    assert "idempotency-status" in exposed
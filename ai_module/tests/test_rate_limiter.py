@@ -0,0 +1,90 @@
+"""Retries in rate_limiter.RateLimiter.call."""
+
+import pytest
+
+import rate_limiter
+from benchmarks.stubs import LatencyProfile, StubProviders
+from config import Config
+from provider_clients import get_openai_client
+from rate_limiter import RateLimiter, limited_call
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limiter, "TRANSIENT_BACKOFF_BASE_SECONDS", 0.01)
+
+
+def _embed(client):
+    request = {"model": "text-embedding-3-small", "input": ["hello"]}
+    return limited_call("openai", "test-retry", lambda: client.embeddings.create(**request), request)
+
+
+def test_server_error_is_retried():
+    with StubProviders() as stubs:
+        stubs.openai.fail_next = 1
+        response, _ = _embed(get_openai_client())
+    assert len(response.data) == 1
+    assert stubs.openai.request_count == 2
+
+
+def test_server_errors_beyond_the_retry_limit_are_raised():
+    with StubProviders(openai=LatencyProfile(error_status=503)) as stubs:
+        stubs.openai.fail_next = Config.RATE_LIMIT_TRANSIENT_RETRIES + 1
+        with pytest.raises(Exception) as excinfo:
+            _embed(get_openai_client())
+    assert getattr(excinfo.value, "status_code", None) == 503
+    assert stubs.openai.request_count == Config.RATE_LIMIT_TRANSIENT_RETRIES + 1
+
+
+def test_client_error_is_not_retried():
+    with StubProviders(openai=LatencyProfile(error_status=400)) as stubs:
+        stubs.openai.fail_next = 1
+        with pytest.raises(Exception):
+            _embed(get_openai_client())
+    assert stubs.openai.request_count == 1
+
+
+def test_connection_error_is_retried_without_shrinking_the_window():
+    limiter = RateLimiter("test.connection")
+    window = limiter.window
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("reset by peer")
+        return "ok"
+
+    result, _ = limiter.call(flaky)
+    assert result == "ok"
+    assert len(attempts) == 2
+    assert limiter.window >= window
+
+
+def test_failed_attempts_return_their_tokens():
+    limiter = RateLimiter("test.refund", tpm=10_000)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset by peer")
+        return "ok"
+
+    limiter.call(flaky, estimated_tokens=1_000)
+    # Only the successful attempt is charged (no usage reported to settle against)
+    assert limiter.tokens.level == pytest.approx(9_000, abs=5)
+
+
+def test_limits_are_shared_among_worker_processes(monkeypatch):
+    monkeypatch.setattr(Config, "OPENAI_RPM", 600.0)
+    monkeypatch.setattr(Config, "OPENAI_TPM", 400_000.0)
+    monkeypatch.setattr(Config, "RATE_LIMITS", "openai/gpt-5-mini=100:40000")
+    try:
+        rate_limiter.set_process_count(4)
+        assert rate_limiter.configured_limits("openai", "gpt-5-nano") == (150.0, 100_000.0)
+        assert rate_limiter.configured_limits("openai", "gpt-5-mini") == (25.0, 10_000.0)
+        assert rate_limiter.get_rate_limiter("openai", "gpt-5-nano").requests.per_minute == 150.0
+    finally:
+        rate_limiter.set_process_count(1)
@@ -0,0 +1,22 @@
+"""StubProviders keeps each run's local SQLite state apart."""
+
+import os
+
+from benchmarks.stubs import StubProviders
+from config import Config
+from drafts import get_draft_store
+
+
+def test_each_run_starts_with_an_empty_draft_store():
+    saved_path = Config.DRAFT_STORE_PATH
+    with StubProviders():
+        store = get_draft_store()
+        assert os.path.dirname(store.db_path) != os.getcwd()
+        store.put("t1", "fp", {"response": "hi"}, 200)
+        state_dir = os.path.dirname(store.db_path)
+
+    assert Config.DRAFT_STORE_PATH == saved_path
+    assert not os.path.exists(state_dir)
+
+    with StubProviders():
+        assert get_draft_store().stats()["drafts"] == 0
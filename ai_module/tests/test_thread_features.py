@@ -0,0 +1,47 @@
+"""Incremental feature records in thread_features.py."""
+
+from thread_features import DELETED_MESSAGE_TEXT, ThreadFeatures, advance
+
+
+def _messages(*pairs):
+    return [{"sender": sender, "text": text} for sender, text in pairs]
+
+
+def test_appended_messages_are_folded_in():
+    messages = _messages(("you", "hey"), ("prospect", "hi, who is this?"))
+    features = advance(None, messages)
+    messages += _messages(("you", "I run the Prodicity fellowship"))
+
+    updated = advance(features, messages)
+
+    assert updated.message_count == 3
+    assert updated.has_pitched
+    assert updated.to_dict() == ThreadFeatures().extend((m["sender"], m["text"]) for m in messages).to_dict()
+
+
+def test_message_deleted_before_the_tail_rebuilds_the_record():
+    messages = _messages(
+        ("you", "Want to hear about the Prodicity fellowship?"),
+        ("prospect", "sure, what is it?"),
+        ("you", "ok"),
+    )
+    features = advance(None, messages)
+    assert features.has_pitched
+
+    messages[0]["text"] = DELETED_MESSAGE_TEXT
+    updated = advance(features, messages)
+
+    assert not updated.has_pitched
+    assert updated.deleted_count == 1
+    assert updated.questions_since_pitch == 0
+
+
+def test_edited_message_before_the_tail_rebuilds_the_record():
+    messages = _messages(("prospect", "I go to Lincoln High"), ("you", "nice"), ("you", "how is it?"))
+    features = advance(None, messages)
+    messages[0]["text"] = "I took a gap year"
+
+    updated = advance(features, messages)
+
+    assert updated.recent_names() == []
+    assert not updated.school_mentioned()
@@ -0,0 +1,253 @@
+"""
+Per-thread feature record, updated incrementally as messages are appended.
+
+The orchestrator, analyzer and writer each used to rescan the message list
+for the same facts: message counts, whether we have pitched yet, the last
+non-deleted sender, and the names/schools mentioned recently. The record
+below is folded forward one message at a time, so serving a request that
+adds k messages costs O(k) rather than O(thread length).
+
+Records live in a per-process LRU keyed by thread_id and in the
+`conversations.features` column (migration_add_thread_features.sql), which
+/conversations/sync keeps current as it appends. A record only applies to a
+message list whose first `message_count` messages it has seen. Its
+`prefix_hash` chains the hash of every folded message, so a message deleted
+or edited anywhere in that prefix is caught. Re-hashing the prefix is cheap
+next to re-scanning it, and anything that does not line up is rebuilt from
+scratch.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+
+DELETED_MESSAGE_TEXT = "This message has been deleted."
+
+# Mentions in our own messages that mean Prodicity has been pitched (see the analyzer's phase rules)
+PITCH_INDICATORS = ("prodicity", "fellowship", "application", "stanford/mit mentors")
+
+# Messages whose names/school mentions feed KB intents (matches the 10-message window used elsewhere)
+RECENT_WINDOW = 10
+
+FEATURES_VERSION = 3
+
+# Prospect messages that read as a question even without a question mark
+_QUESTION_START = re.compile(
+    r"^\s*(what|how|when|where|who|why|which|is|are|can|could|do|does|did|will|would|should)\b", re.IGNORECASE
+)
+
+_CAPITALIZED = re.compile(r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\b")
+_SCHOOL_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"school", r"high school", r"college", r"university", r"academy",
+        r"at\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+        r"from\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)",
+    )
+]
+
+
+def is_deleted(text: str) -> bool:
+    return (text or "").strip() == DELETED_MESSAGE_TEXT
+
+
+def is_question(text: str) -> bool:
+    return "?" in (text or "") or bool(_QUESTION_START.match(text or ""))
+
+
+def _message_hash(sender: str, text: str) -> str:
+    """Same md5(sender|text) as conversation_sync.message_hash / the message_hashes trigger."""
+    return hashlib.md5(f"{sender or ''}|{text or ''}".encode("utf-8")).hexdigest()
+
+
+def _chain(prefix_hash: Optional[str], sender: str, text: str) -> str:
+    """Rolling hash of a message prefix extended by one message."""
+    return hashlib.md5(f"{prefix_hash or ''}{_message_hash(sender, text)}".encode("utf-8")).hexdigest()
+
+
+def prefix_hash(messages: Iterable[Tuple[str, str]]) -> Optional[str]:
+    value = None
+    for sender, text in messages:
+        value = _chain(value, sender, text)
+    return value
+
+
+@dataclass
+class ThreadFeatures:
+    """Thread-level facts for messages[0:message_count]."""
+    message_count: int = 0
+    prospect_message_count: int = 0
+    your_message_count: int = 0
+    deleted_count: int = 0
+    last_sender: Optional[str] = None  # last non-deleted message
+    last_index: int = -1
+    has_pitched: bool = False
+    last_pitch_index: int = -1
+    questions_since_pitch: int = 0  # Prospect questions after our latest pitch message
+    # Prospect messages inside the recent window: {"index", "names", "school"}
+    recent_prospect: List[Dict[str, Any]] = field(default_factory=list)
+    prefix_hash: Optional[str] = None  # Rolling hash of messages[0:message_count]
+    version: int = FEATURES_VERSION
+
+    def add(self, sender: str, text: str):
+        """Fold the next message into the record."""
+        index = self.message_count
+        self.message_count += 1
+        self.prefix_hash = _chain(self.prefix_hash, sender, text)
+        if sender == "prospect":
+            self.prospect_message_count += 1
+        elif sender == "you":
+            self.your_message_count += 1
+
+        if is_deleted(text):
+            self.deleted_count += 1
+        else:
+            self.last_sender = sender
+            self.last_index = index
+            if sender == "you" and any(indicator in text.lower() for indicator in PITCH_INDICATORS):
+                self.has_pitched = True
+                self.last_pitch_index = index
+                self.questions_since_pitch = 0
+            if sender == "prospect" and self.has_pitched and is_question(text):
+                self.questions_since_pitch += 1
+            if sender == "prospect":
+                self.recent_prospect.append({
+                    "index": index,
+                    "names": _CAPITALIZED.findall(text),
+                    "school": any(pattern.search(text) for pattern in _SCHOOL_PATTERNS),
+                })
+
+        cutoff = self.message_count - RECENT_WINDOW
+        while self.recent_prospect and self.recent_prospect[0]["index"] < cutoff:
+            self.recent_prospect.pop(0)
+
+    def extend(self, messages: Iterable[Tuple[str, str]]) -> "ThreadFeatures":
+        for sender, text in messages:
+            self.add(sender, text)
+        return self
+
+    def recent_names(self) -> List[str]:
+        """Capitalized phrases from recent prospect messages, oldest first."""
+        return [name for entry in self.recent_prospect for name in entry["names"]]
+
+    def school_mentioned(self) -> bool:
+        return any(entry["school"] for entry in self.recent_prospect)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> Optional["ThreadFeatures"]:
+        if not data or data.get("version") != FEATURES_VERSION:
+            return None
+        try:
+            return cls(**{key: data[key] for key in cls.__dataclass_fields__ if key in data})
+        except TypeError:
+            return None
+
+
+def _pairs(messages: Iterable[Any]) -> List[Tuple[str, str]]:
+    """(sender, text) for Message objects or message dicts."""
+    pairs = []
+    for message in messages:
+        if isinstance(message, dict):
+            pairs.append((message.get("sender") or "", message.get("text") or ""))
+        else:
+            pairs.append((message.sender, message.text))
+    return pairs
+
+
+def advance(features: Optional[ThreadFeatures], messages: List[Any]) -> ThreadFeatures:
+    """
+    Record for `messages`, reusing `features` when it covers a prefix of them.
+
+    Only the messages after the prefix are folded in; a record whose prefix
+    hash does not match (a message deleted or edited since, a different
+    thread) is discarded and rebuilt.
+    """
+    if features is not None and 0 < features.message_count <= len(messages):
+        if prefix_hash(_pairs(messages[:features.message_count])) == features.prefix_hash:
+            if features.message_count == len(messages):
+                return features
+            updated = ThreadFeatures.from_dict(features.to_dict())
+            return updated.extend(_pairs(messages[features.message_count:]))
+    return ThreadFeatures().extend(_pairs(messages))
+
+
+class FeatureStore:
+    """Per-process LRU of thread features, backed by conversations.features in Supabase."""
+
+    def __init__(self, max_threads: Optional[int] = None):
+        self.max_threads = max_threads or Config.THREAD_FEATURES_CACHE_SIZE
+        self._records: "OrderedDict[str, ThreadFeatures]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str) -> Optional[ThreadFeatures]:
+        with self._lock:
+            features = self._records.get(thread_id)
+            if features is not None:
+                self._records.move_to_end(thread_id)
+            return features
+
+    def put(self, thread_id: str, features: ThreadFeatures):
+        with self._lock:
+            self._records[thread_id] = features
+            self._records.move_to_end(thread_id)
+            while len(self._records) > self.max_threads:
+                self._records.popitem(last=False)
+
+    def _load(self, thread_id: str) -> Optional[ThreadFeatures]:
+        """Stored record from Supabase (None when missing or unreachable)."""
+        if not Config.THREAD_FEATURES_PERSIST:
+            return None
+        try:
+            from knowledge_base import _get_supabase
+
+            rows = (
+                _get_supabase().table("conversations").select("features").eq("thread_id", thread_id).limit(1).execute()
+            ).data or []
+        except Exception as e:
+            if Config.DEBUG:
+                print(f"[Features] Could not load stored features for {thread_id}: {e}")
+            return None
+        return ThreadFeatures.from_dict(rows[0].get("features")) if rows else None
+
+    def features_for(self, thread_id: Optional[str], messages: List[Any]) -> ThreadFeatures:
+        """Up-to-date record for a thread's message list, folding in only unseen messages."""
+        if not thread_id:
+            return advance(None, messages)
+        cached = self.get(thread_id)
+        if cached is None or cached.message_count > len(messages):
+            cached = self._load(thread_id) or cached
+        features = advance(cached, messages)
+        if Config.DEBUG and features is not cached:
+            print(f"[Features] {thread_id}: updated to {features.message_count} messages")
+        self.put(thread_id, features)
+        return features
+
+
+_store: Optional[FeatureStore] = None
+
+
+def get_feature_store() -> FeatureStore:
+    global _store
+    if _store is None:
+        _store = FeatureStore()
+    return _store
+
+
+def conversation_features(conv) -> ThreadFeatures:
+    """Features for a Conversation, computed once per object and shared by every stage."""
+    cached = getattr(conv, "features", None)
+    if cached is None:
+        features = get_feature_store().features_for(getattr(conv, "thread_id", None), conv.messages)
+    else:
+        # Messages appended to this object since the last call are folded in
+        features = advance(cached, conv.messages)
+    conv.features = features
+    return features
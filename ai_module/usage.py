@@ -0,0 +1,306 @@
+"""
+Per-stage token and cost ledger for every provider call.
+
+Each call to OpenAI (Responses, chat completions, embeddings) or Anthropic
+records its input, cached-input, reasoning and output tokens, latency and
+estimated cost. The record is tagged with the pipeline stage, model, phase
+and thread_id. Records go into a bounded in-process ledger (queried by
+GET /usage) and into the metrics registry (`usage.<stage>.*`, see /metrics).
+
+Requests can carry a token budget: `usage_scope(max_tokens=...)` makes
+`check_budget()` raise TokenBudgetExceeded before the next provider call once
+the calls made so far have used it up.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+import metrics
+from config import Config
+
+# USD per 1M tokens: (input, cached input, output). Reasoning tokens are billed as output.
+PRICES: Dict[str, tuple] = {
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-5.1": (1.25, 0.125, 10.00),
+    "gpt-5-mini": (0.25, 0.025, 2.00),
+    "gpt-5-nano": (0.05, 0.005, 0.40),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "claude-sonnet-4-5": (3.00, 0.30, 15.00),
+    "claude-haiku-4-5": (1.00, 0.10, 5.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+}
+
+# Batch API requests are billed at half price by both providers
+BATCH_DISCOUNT = 0.5
+
+TOKEN_FIELDS = ("input_tokens", "cached_input_tokens", "reasoning_tokens", "output_tokens")
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """The request has used its token budget; no further provider calls are made."""
+
+
+@dataclass
+class UsageRecord:
+    """One provider call."""
+    timestamp: float
+    stage: str
+    provider: str
+    model: str
+    input_tokens: int = 0  # Includes cached input
+    cached_input_tokens: int = 0
+    reasoning_tokens: int = 0  # Included in output_tokens
+    output_tokens: int = 0
+    latency_ms: Optional[float] = None
+    cost_usd: Optional[float] = None
+    phase: Optional[str] = None
+    thread_id: Optional[str] = None
+    batch: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+
+@dataclass
+class _Scope:
+    thread_id: Optional[str] = None
+    phase: Optional[str] = None
+    max_tokens: Optional[int] = None
+    used_tokens: int = 0
+    records: List[UsageRecord] = field(default_factory=list)
+
+
+_scope: ContextVar[Optional[_Scope]] = ContextVar("usage_scope", default=None)
+
+
+@contextmanager
+def usage_scope(thread_id: Optional[str] = None, phase: Optional[str] = None, max_tokens: Optional[int] = None):
+    """Tag provider calls made inside the block with thread_id/phase and enforce an optional token budget."""
+    scope = _Scope(thread_id=thread_id, phase=phase, max_tokens=max_tokens or None)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def check_budget(stage: str):
+    """Raise TokenBudgetExceeded if the current request has no tokens left."""
+    scope = _scope.get()
+    if scope is not None and scope.max_tokens and scope.used_tokens >= scope.max_tokens:
+        metrics.increment("usage.budget_exceeded")
+        raise TokenBudgetExceeded(
+            f"Token budget of {scope.max_tokens} exhausted ({scope.used_tokens} used) before {stage}"
+        )
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def normalize_usage(usage: Any) -> Dict[str, int]:
+    """
+    Token counts from a Responses, chat completions, embeddings or Anthropic
+    `usage` object (or its JSON dict).
+    """
+    counts = dict.fromkeys(TOKEN_FIELDS, 0)
+    if usage is None:
+        return counts
+    if _field(usage, "prompt_tokens") is not None:
+        # chat completions / embeddings
+        counts["input_tokens"] = _field(usage, "prompt_tokens") or 0
+        counts["cached_input_tokens"] = _field(_field(usage, "prompt_tokens_details"), "cached_tokens") or 0
+        counts["output_tokens"] = _field(usage, "completion_tokens") or 0
+        counts["reasoning_tokens"] = _field(_field(usage, "completion_tokens_details"), "reasoning_tokens") or 0
+    elif _field(usage, "cache_read_input_tokens") is not None or _field(usage, "cache_creation_input_tokens") is not None:
+        # Anthropic: input_tokens excludes cache reads/writes
+        cache_read = _field(usage, "cache_read_input_tokens") or 0
+        cache_write = _field(usage, "cache_creation_input_tokens") or 0
+        counts["input_tokens"] = (_field(usage, "input_tokens") or 0) + cache_read + cache_write
+        counts["cached_input_tokens"] = cache_read
+        counts["output_tokens"] = _field(usage, "output_tokens") or 0
+    else:
+        # Responses API (and Anthropic without cache fields)
+        counts["input_tokens"] = _field(usage, "input_tokens") or 0
+        counts["cached_input_tokens"] = _field(_field(usage, "input_tokens_details"), "cached_tokens") or 0
+        counts["output_tokens"] = _field(usage, "output_tokens") or 0
+        counts["reasoning_tokens"] = _field(_field(usage, "output_tokens_details"), "reasoning_tokens") or 0
+    return {key: int(value) for key, value in counts.items()}
+
+
+def estimate_cost(model: str, input_tokens: int, cached_input_tokens: int, output_tokens: int, batch: bool = False) -> Optional[float]:
+    """USD cost from PRICES, or None for models without a price."""
+    prices = PRICES.get(model)
+    if prices is None:
+        # Dated snapshots ("gpt-5-mini-2025-08-07") use the base model's price
+        prices = next((p for name, p in sorted(PRICES.items(), key=lambda kv: -len(kv[0])) if model.startswith(name)), None)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    cost = (
+        (input_tokens - cached_input_tokens) * input_price
+        + cached_input_tokens * cached_price
+        + output_tokens * output_price
+    ) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+class UsageLedger:
+    """Bounded window of recent usage records plus all-time totals per (stage, model)."""
+
+    def __init__(self, max_records: Optional[int] = None):
+        self._records: Deque[UsageRecord] = deque(maxlen=max_records or Config.USAGE_LEDGER_SIZE)
+        self._totals: Dict[tuple, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: UsageRecord):
+        with self._lock:
+            self._records.append(record)
+            totals = self._totals.setdefault((record.stage, record.model), empty_totals())
+            accumulate(totals, record)
+
+    def records(
+        self,
+        stage: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> List[UsageRecord]:
+        with self._lock:
+            records = list(self._records)
+        return [
+            record for record in records
+            if (stage is None or record.stage == stage)
+            and (thread_id is None or record.thread_id == thread_id)
+            and (since is None or record.timestamp >= since)
+        ]
+
+    def totals(self) -> List[Dict[str, Any]]:
+        """All-time totals per (stage, model) since the process started."""
+        with self._lock:
+            items = [(key, dict(values)) for key, values in self._totals.items()]
+        return [{"stage": stage, "model": model, **values} for (stage, model), values in sorted(items)]
+
+    def summary(
+        self,
+        group_by: Iterable[str] = ("stage", "model"),
+        stage: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        since: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """Ledger-window records grouped by the given record fields, with token sums, cost and latency percentiles."""
+        group_by = list(group_by)
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        latencies: Dict[tuple, List[float]] = {}
+        for record in self.records(stage=stage, thread_id=thread_id, since=since):
+            key = tuple(getattr(record, name) for name in group_by)
+            accumulate(groups.setdefault(key, empty_totals()), record)
+            if record.latency_ms is not None:
+                latencies.setdefault(key, []).append(record.latency_ms)
+        rows = []
+        for key, values in groups.items():
+            latency = metrics.summarize(latencies.get(key, []))
+            rows.append({
+                **dict(zip(group_by, key)),
+                **values,
+                "latency_ms": {name: latency[name] for name in ("p50", "p95", "max")},
+            })
+        rows.sort(key=lambda row: -row["input_tokens"] - row["output_tokens"])
+        return rows
+
+
+def empty_totals() -> Dict[str, float]:
+    """Zeroed call count, token sums and cost."""
+    return {"calls": 0, **dict.fromkeys(TOKEN_FIELDS, 0), "cost_usd": 0.0}
+
+
+def accumulate(totals: Dict[str, float], record: UsageRecord):
+    """Add `record` to totals from empty_totals()."""
+    totals["calls"] += 1
+    for name in TOKEN_FIELDS:
+        totals[name] += getattr(record, name)
+    totals["cost_usd"] += record.cost_usd or 0.0
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> UsageLedger:
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger()
+        return _ledger
+
+
+def record_usage(
+    stage: str,
+    provider: str,
+    model: str,
+    usage: Any,
+    latency_ms: Optional[float] = None,
+    phase: Optional[str] = None,
+    thread_id: Optional[str] = None,
+    batch: bool = False,
+) -> UsageRecord:
+    """
+    Record one provider call. thread_id/phase default to the enclosing
+    usage_scope; the tokens count against its budget.
+    """
+    scope = _scope.get()
+    counts = normalize_usage(usage)
+    record = UsageRecord(
+        timestamp=time.time(),
+        stage=stage,
+        provider=provider,
+        model=model,
+        latency_ms=latency_ms,
+        cost_usd=estimate_cost(model, counts["input_tokens"], counts["cached_input_tokens"], counts["output_tokens"], batch),
+        phase=phase or (scope.phase if scope else None),
+        thread_id=thread_id or (scope.thread_id if scope else None),
+        batch=batch,
+        **counts,
+    )
+    get_ledger().add(record)
+    if scope is not None:
+        scope.used_tokens += record.total_tokens
+        scope.records.append(record)
+
+    for name in TOKEN_FIELDS:
+        metrics.increment(f"usage.{stage}.{name}", counts[name])
+    metrics.increment(f"usage.{stage}.calls")
+    if record.cost_usd:
+        metrics.increment(f"usage.{stage}.cost_usd", record.cost_usd)
+    if latency_ms is not None:
+        metrics.observe(f"usage.{stage}.latency_ms", latency_ms)
+    if Config.DEBUG:
+        print(
+            f"[Usage] {stage} {model}: in={record.input_tokens} (cached {record.cached_input_tokens}) "
+            f"out={record.output_tokens} (reasoning {record.reasoning_tokens})"
+            + (f" {latency_ms:.0f}ms" if latency_ms is not None else "")
+        )
+    return record
+
+
+def record_dict(record: UsageRecord) -> Dict[str, Any]:
+    return asdict(record)
+
+
+def sum_records(records: Iterable[UsageRecord]) -> Dict[str, float]:
+    """Call count, token sums and cost of `records`."""
+    totals = empty_totals()
+    for record in records:
+        accumulate(totals, record)
+    return totals
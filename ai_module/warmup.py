@@ -0,0 +1,228 @@
+"""
+Boot-time warm-up and the readiness state behind GET /health/ready.
+
+Without warm-up, the first /generate after a start pays for everything that
+is built lazily: provider clients and their TLS handshakes, the writer's
+compiled prompt blocks, the KB indexes, and the embedding of its query. The
+warm-up runs these components (WARMUP_COMPONENTS) once at boot:
+
+- prompts: compile the writer's static prompt blocks for every phase.
+- kb: load the KB lexical index, local vector store and HNSW graph.
+- connections: open pooled connections to OpenAI, Anthropic and Supabase.
+- queries: retrieve WARMUP_QUERIES, which embeds them and fills the KB result cache.
+
+Each component's status (pending, warming, ready, skipped, failed) and timing
+is kept in a process-wide Readiness. /health/ready answers 503 until every
+component has finished, so a load balancer only routes to warm workers. A
+failed component does not keep a worker out of rotation: it is reported as
+"degraded", and the first request builds what is missing. The same goes for
+components still warming after WARMUP_TIMEOUT_SECONDS.
+
+Under gunicorn the master warms prompts and kb before forking (serving.preload),
+and workers inherit that state. Each worker then warms its own connections
+and queries, since neither survives a fork.
+"""
+
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import metrics
+from config import Config
+
+COMPONENTS = ("prompts", "kb", "connections", "queries")
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class SkipComponent(Exception):
+    """Raised by a component that does not apply to this configuration."""
+
+
+class _ComponentFailed(Exception):
+    """A component that failed but still has per-part detail to report."""
+
+    def __init__(self, message: str, detail: Dict[str, Any]):
+        super().__init__(message)
+        self.detail = detail
+
+
+@dataclass
+class ComponentStatus:
+    name: str
+    status: str = PENDING
+    started_at: Optional[float] = None
+    seconds: Optional[float] = None
+    detail: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def configured_components() -> List[str]:
+    if not Config.WARMUP_ENABLED:
+        return []
+    names = [name.strip() for name in Config.WARMUP_COMPONENTS.split(",") if name.strip()]
+    unknown = [name for name in names if name not in COMPONENTS]
+    if unknown:
+        print(f"Warning: ignoring unknown WARMUP_COMPONENTS {unknown}. Valid components: {list(COMPONENTS)}")
+    return [name for name in names if name in COMPONENTS]
+
+
+def warmup_queries() -> List[str]:
+    return [query.strip() for query in Config.WARMUP_QUERIES.split("|") if query.strip()]
+
+
+def _kb_configured() -> bool:
+    return bool(Config.SUPABASE_URL and Config.SUPABASE_SERVICE_KEY)
+
+
+def _warm_prompts() -> Dict[str, Any]:
+    from response_generator import compile_prompts
+
+    return {"phases": compile_prompts()}
+
+
+def _warm_kb() -> Dict[str, Any]:
+    if not _kb_configured():
+        raise SkipComponent("Supabase not configured")
+    from knowledge_base import preload
+
+    return preload()
+
+
+def _warm_connections() -> Dict[str, Any]:
+    from provider_clients import warm_connections
+
+    detail = warm_connections()
+    if _kb_configured():
+        from knowledge_base import ping
+
+        try:
+            detail["supabase"] = ping()
+        except Exception as e:
+            detail["supabase"] = {"error": str(e)}
+    else:
+        detail["supabase"] = {"skipped": "not configured"}
+    errors = [f"{name}: {value['error']}" for name, value in detail.items() if isinstance(value, dict) and "error" in value]
+    if errors:
+        raise _ComponentFailed("; ".join(errors), detail)
+    return detail
+
+
+def _warm_queries() -> Dict[str, Any]:
+    queries = warmup_queries()
+    if not queries:
+        raise SkipComponent("WARMUP_QUERIES is empty")
+    if not _kb_configured():
+        raise SkipComponent("Supabase not configured")
+    from knowledge_base import retrieve
+
+    # Same k/threshold as the orchestrator, so these are the cache entries requests hit
+    results = {query: len(retrieve(query, k=5)) for query in queries}
+    return {"queries": len(queries), "results": sum(results.values())}
+
+
+_WARMERS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "prompts": _warm_prompts,
+    "kb": _warm_kb,
+    "connections": _warm_connections,
+    "queries": _warm_queries,
+}
+
+
+class Readiness:
+    """Warm-up status of each configured component in this process."""
+
+    def __init__(self, components: Iterable[str]):
+        self._components: Dict[str, ComponentStatus] = {name: ComponentStatus(name) for name in components}
+        self._created_at = time.time()
+        self._lock = threading.Lock()
+
+    def unfinished(self) -> List[str]:
+        """Components that are pending or failed (a worker retries what its master could not warm)."""
+        with self._lock:
+            return [name for name, state in self._components.items() if state.status in (PENDING, FAILED)]
+
+    def restart_clock(self):
+        """Start WARMUP_TIMEOUT_SECONDS over (in a freshly forked worker)."""
+        with self._lock:
+            self._created_at = time.time()
+
+    def run(self, name: str) -> ComponentStatus:
+        """Warm one component and record the outcome."""
+        with self._lock:
+            state = self._components.setdefault(name, ComponentStatus(name))
+            state.status, state.started_at, state.error = WARMING, time.time(), None
+        start = time.perf_counter()
+        try:
+            detail, status, error = _WARMERS[name](), READY, None
+        except SkipComponent as e:
+            detail, status, error = {"reason": str(e)}, SKIPPED, None
+        except _ComponentFailed as e:
+            detail, status, error = e.detail, FAILED, str(e)
+        except Exception as e:
+            detail, status, error = {}, FAILED, str(e)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            state.status, state.seconds, state.detail, state.error = status, round(seconds, 3), detail, error
+        metrics.observe(f"warmup.{name}.seconds", seconds)
+        if status == FAILED:
+            metrics.increment(f"warmup.{name}.failures")
+            print(f"[Warmup] {name} failed after {seconds:.2f}s: {error}")
+        elif Config.DEBUG:
+            print(f"[Warmup] {name} {status} in {seconds:.2f}s {detail}")
+        return state
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Overall status plus each component's; `ready` is what /health/ready answers with."""
+        with self._lock:
+            components = {name: asdict(state) for name, state in self._components.items()}
+            age = time.time() - self._created_at
+        statuses = [state["status"] for state in components.values()]
+        warming = any(status in (PENDING, WARMING) for status in statuses)
+        timed_out = warming and age > Config.WARMUP_TIMEOUT_SECONDS
+        if warming and not timed_out:
+            status = "warming"
+        elif timed_out or FAILED in statuses:
+            status = "degraded"
+        else:
+            status = "ready"
+        return {
+            "status": status,
+            "ready": status != "warming",
+            "timed_out": timed_out,
+            "seconds_since_start": round(age, 3),
+            "components": components,
+        }
+
+
+_readiness: Optional[Readiness] = None
+_readiness_lock = threading.Lock()
+
+
+def get_readiness() -> Readiness:
+    global _readiness
+    with _readiness_lock:
+        if _readiness is None:
+            _readiness = Readiness(configured_components())
+        return _readiness
+
+
+def warm_up(components: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Warm `components` (default: every unfinished configured one) in order; returns the readiness snapshot."""
+    readiness = get_readiness()
+    names = list(components) if components is not None else readiness.unfinished()
+    for name in names:
+        readiness.run(name)
+    return readiness.snapshot()
+
+
+def start_warm_up(components: Optional[Iterable[str]] = None) -> threading.Thread:
+    """Warm up in a background thread so the server can answer /health meanwhile."""
+    thread = threading.Thread(target=warm_up, args=(components,), name="warmup", daemon=True)
+    thread.start()
+    return thread
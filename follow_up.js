@@ -1,6 +1,8 @@
 // Follow-Up Service for LinkedIn Sales Agent
 class FollowUpService {
-  constructor() {
+  constructor(aiService = null) {
+    // AI backend (/followups) - preferred over scanning conversations client-side
+    this.aiService = aiService;
     this.config = window.supabaseConfig;
     if (!this.config || !this.config.url || !this.config.anonKey) {
       console.warn(
@@ -80,6 +82,43 @@ class FollowUpService {
     });
   }
 
+  /**
+   * Load follow-up candidates from the AI backend's /followups endpoint.
+   * The server filters on precomputed last-message fields and returns only
+   * candidate rows with the script already rendered (no message arrays).
+   * @param {string} status - Status value ("unknown" or "interested")
+   * @returns {Promise<Array|null>} Candidates, or null if the backend is unavailable
+   */
+  async _fetchServerCandidates(status) {
+    if (!this.aiService || !this.aiService.baseUrl) {
+      return null;
+    }
+    try {
+      const candidates = [];
+      let cursor = null;
+      do {
+        const params = new URLSearchParams({ status, limit: "200" });
+        if (cursor) params.set("cursor", cursor);
+        const response = await fetch(
+          `${this.aiService.baseUrl}/followups?${params.toString()}`
+        );
+        if (!response.ok) {
+          console.warn("FollowUpService: /followups failed, falling back", {
+            status: response.status,
+          });
+          return null;
+        }
+        const page = await response.json();
+        candidates.push(...(page.candidates || []));
+        cursor = page.next_cursor;
+      } while (cursor);
+      return candidates;
+    } catch (error) {
+      console.warn("FollowUpService: AI backend unavailable, falling back", error);
+      return null;
+    }
+  }
+
   /**
    * Get the static script template for a given status
    * @param {string} status - Status value ("unknown" or "interested")
@@ -96,6 +135,11 @@ class FollowUpService {
    * @returns {string} Formatted script
    */
   formatScript(status, conversationData) {
+    // Candidates from /followups arrive with the script already rendered
+    if (conversationData.script && conversationData.status === status) {
+      return conversationData.script;
+    }
+
     const template = this.getScript(status);
     if (!template) {
       return "";
@@ -125,6 +169,11 @@ class FollowUpService {
    * @returns {Promise<Array>} Array of conversation objects
    */
   async getUnknownStatusConversations() {
+    const serverCandidates = await this._fetchServerCandidates("unknown");
+    if (serverCandidates) {
+      return serverCandidates;
+    }
+
     try {
       if (!this.baseUrl || !this.config?.anonKey) {
         console.error("FollowUpService: Supabase configuration missing");
@@ -180,6 +229,11 @@ class FollowUpService {
    * @returns {Promise<Array>} Array of conversation objects
    */
   async getInterestedStatusConversations() {
+    const serverCandidates = await this._fetchServerCandidates("interested");
+    if (serverCandidates) {
+      return serverCandidates;
+    }
+
     try {
       if (!this.baseUrl || !this.config?.anonKey) {
         console.error("FollowUpService: Supabase configuration missing");
@@ -232,12 +286,49 @@ class FollowUpService {
     }
   }
 
+  /**
+   * Mark many conversations as reminded through the AI backend in one request
+   * @param {Array<string>} threadIds - Thread IDs to mark
+   * @returns {Promise<number|null>} Number updated, or null if the backend is unavailable
+   */
+  async markManyAsReminded(threadIds) {
+    if (!this.aiService || !this.aiService.baseUrl) {
+      return null;
+    }
+    try {
+      const response = await fetch(
+        `${this.aiService.baseUrl}/followups/reminded`,
+        {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ thread_ids: threadIds }),
+        }
+      );
+      if (!response.ok) {
+        return null;
+      }
+      const result = await response.json();
+      return result.updated || 0;
+    } catch (error) {
+      console.warn(
+        "FollowUpService: /followups/reminded unavailable, falling back",
+        error
+      );
+      return null;
+    }
+  }
+
   /**
    * Mark a conversation as reminded by setting the reminded_at timestamp
    * @param {string} threadId - The thread ID of the conversation
    * @returns {Promise<boolean>} True if successful, false otherwise
    */
   async markAsReminded(threadId) {
+    const marked = await this.markManyAsReminded([threadId]);
+    if (marked !== null) {
+      return marked > 0;
+    }
+
     try {
       if (!this.baseUrl || !this.config?.anonKey) {
         console.error("FollowUpService: Supabase configuration missing");
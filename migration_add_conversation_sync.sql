@@ -0,0 +1,76 @@
+-- ============================================================================
+-- Migration: Incremental conversation sync
+-- Run this in your Supabase SQL editor (after migration_add_followup_candidates.sql)
+-- ============================================================================
+--
+-- saveConversation used to download the whole row, merge message arrays in the
+-- browser and PATCH the complete messages array back. /conversations/sync
+-- compares per-message hashes instead and appends only the new suffix.
+--
+-- message_hashes[i] = md5(sender || '|' || text) of messages[i], kept current by
+-- a trigger (the Python side computes the same value).
+
+ALTER TABLE public.conversations
+ADD COLUMN IF NOT EXISTS message_hashes TEXT[] NOT NULL DEFAULT '{}';
+
+COMMENT ON COLUMN public.conversations.message_hashes IS
+  'md5(sender || ''|'' || text) per message, in array order. Maintained by trigger.';
+
+CREATE OR REPLACE FUNCTION public.conversation_message_hashes(messages JSONB)
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT COALESCE(
+    array_agg(md5(COALESCE(msg->>'sender', '') || '|' || COALESCE(msg->>'text', '')) ORDER BY pos),
+    '{}'
+  )
+  FROM jsonb_array_elements(COALESCE(messages, '[]'::jsonb)) WITH ORDINALITY AS m(msg, pos);
+$$;
+
+CREATE OR REPLACE FUNCTION public.conversations_set_message_hashes()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  NEW.message_hashes := public.conversation_message_hashes(NEW.messages);
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_conversations_message_hashes ON public.conversations;
+CREATE TRIGGER trg_conversations_message_hashes
+BEFORE INSERT OR UPDATE OF messages ON public.conversations
+FOR EACH ROW
+EXECUTE FUNCTION public.conversations_set_message_hashes();
+
+-- Backfill existing rows
+UPDATE public.conversations
+SET message_hashes = public.conversation_message_hashes(messages)
+WHERE message_hashes = '{}' AND jsonb_array_length(COALESCE(messages, '[]'::jsonb)) > 0;
+
+-- Append messages only if nobody changed the thread since it was read.
+-- Returns the new message_count, or -1 when message_count no longer matches
+-- p_expected_count (the caller re-reads and merges again).
+CREATE OR REPLACE FUNCTION public.append_conversation_messages(
+  p_thread_id TEXT,
+  p_expected_count INT,
+  p_messages JSONB
+)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  new_count INT;
+BEGIN
+  UPDATE public.conversations
+  SET messages = COALESCE(messages, '[]'::jsonb) || p_messages,
+      message_count = message_count + jsonb_array_length(p_messages),
+      updated_at = now()
+  WHERE thread_id = p_thread_id
+    AND message_count = p_expected_count
+  RETURNING message_count INTO new_count;
+
+  RETURN COALESCE(new_count, -1);
+END;
+$$;
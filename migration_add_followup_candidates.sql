@@ -0,0 +1,72 @@
+-- ============================================================================
+-- Migration: Precomputed follow-up fields on conversations
+-- Run this in your Supabase SQL editor (after migration_add_reminded_at.sql)
+-- ============================================================================
+--
+-- The follow-up panel used to download every conversation (including the full
+-- messages array) for a date range and find the last message in JavaScript.
+-- These columns hold the last message's sender and the time of the last new
+-- message, kept current by a trigger, so /followups can answer from a
+-- partial index without reading messages at all.
+
+ALTER TABLE public.conversations
+ADD COLUMN IF NOT EXISTS last_sender TEXT NULL,
+ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMPTZ NULL;
+
+COMMENT ON COLUMN public.conversations.last_sender IS
+  'Sender ("you" or "prospect") of the message with the highest index. Maintained by trigger.';
+COMMENT ON COLUMN public.conversations.last_activity_at IS
+  'When the last message last changed (not bumped by re-scrapes that add nothing). Maintained by trigger.';
+
+-- Message with the highest index (messages are stored as a JSONB array)
+CREATE OR REPLACE FUNCTION public.conversation_last_message(messages JSONB)
+RETURNS JSONB
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT msg
+  FROM jsonb_array_elements(COALESCE(messages, '[]'::jsonb)) WITH ORDINALITY AS m(msg, pos)
+  ORDER BY COALESCE((msg->>'index')::INT, pos - 1) DESC
+  LIMIT 1;
+$$;
+
+CREATE OR REPLACE FUNCTION public.conversations_set_last_message()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  new_last JSONB := public.conversation_last_message(NEW.messages);
+  old_last JSONB := NULL;
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    old_last := public.conversation_last_message(OLD.messages);
+  END IF;
+
+  NEW.last_sender := new_last->>'sender';
+  -- Only a different last message counts as activity
+  IF TG_OP = 'INSERT'
+     OR old_last IS NULL
+     OR (new_last->>'sender', new_last->>'text') IS DISTINCT FROM (old_last->>'sender', old_last->>'text') THEN
+    NEW.last_activity_at := COALESCE(NEW.updated_at, now());
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_conversations_last_message ON public.conversations;
+CREATE TRIGGER trg_conversations_last_message
+BEFORE INSERT OR UPDATE OF messages ON public.conversations
+FOR EACH ROW
+EXECUTE FUNCTION public.conversations_set_last_message();
+
+-- Backfill existing rows (updated_at is the best available activity time)
+UPDATE public.conversations
+SET last_sender = public.conversation_last_message(messages)->>'sender',
+    last_activity_at = COALESCE(last_activity_at, updated_at)
+WHERE last_sender IS NULL;
+
+-- Follow-up candidates: not reminded, we sent the last message, newest activity first.
+-- thread_id breaks ties for keyset pagination.
+CREATE INDEX IF NOT EXISTS idx_conversations_followup_candidates
+ON public.conversations (status, last_activity_at DESC, thread_id DESC)
+WHERE reminded_at IS NULL AND last_sender = 'you';
@@ -0,0 +1,49 @@
+-- Migration: Add match_kb_documents_batch RPC for multi-query KB retrieval
+-- Runs several similarity searches (one per query embedding) in a single call,
+-- so a conversation touching several topics costs one round-trip instead of one per topic.
+-- Embeddings are passed as pgvector text literals ('[0.1,0.2,...]') because
+-- PostgREST sends arrays of vectors as arrays of strings.
+
+CREATE OR REPLACE FUNCTION match_kb_documents_batch(
+  query_embeddings TEXT[],
+  match_threshold FLOAT,
+  match_count INT
+)
+RETURNS TABLE (
+  query_index INT,
+  id BIGINT,
+  source TEXT,
+  question TEXT,
+  answer TEXT,
+  tags TEXT[],
+  similarity FLOAT
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    (q.ord - 1)::INT AS query_index,
+    d.id,
+    d.source,
+    d.question,
+    d.answer,
+    d.tags,
+    d.similarity
+  FROM unnest(query_embeddings) WITH ORDINALITY AS q(embedding, ord)
+  CROSS JOIN LATERAL (
+    SELECT
+      kb.id,
+      kb.source,
+      kb.question,
+      kb.answer,
+      kb.tags,
+      1 - (kb.embedding <=> q.embedding::vector) AS similarity
+    FROM kb_documents kb
+    WHERE 1 - (kb.embedding <=> q.embedding::vector) > match_threshold
+    ORDER BY kb.embedding <=> q.embedding::vector
+    LIMIT match_count
+  ) d
+  ORDER BY query_index, d.similarity DESC;
+$$;
+
+-- Allow the service role (used by the AI module) to call it
+GRANT EXECUTE ON FUNCTION match_kb_documents_batch(TEXT[], FLOAT, INT) TO service_role;
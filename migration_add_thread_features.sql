@@ -0,0 +1,21 @@
+-- ============================================================================
+-- Migration: Per-thread feature record on conversations
+-- Run this in your Supabase SQL editor (after migration_add_conversation_sync.sql)
+-- ============================================================================
+--
+-- features holds the thread-level facts the AI pipeline reads on every request
+-- (message counts, pitch indicators, last non-deleted sender, recent names and
+-- school mentions). /conversations/sync folds appended messages into it, so a
+-- request never has to rescan the whole thread. The record names how many
+-- messages it covers and the hash of the last one, so a stale record is
+-- extended rather than trusted blindly.
+--
+-- No backfill is needed: rows without a record get one from the AI module the
+-- next time the thread is created or rewritten through /conversations/sync, and
+-- /generate computes it on demand in the meantime.
+
+ALTER TABLE public.conversations
+ADD COLUMN IF NOT EXISTS features JSONB NULL;
+
+COMMENT ON COLUMN public.conversations.features IS
+  'Incremental per-thread features maintained by the AI module (see ai_module/thread_features.py).';
@@ -1,12 +1,13 @@
 // Simple DOM Extractor Popup
 class DOMExtractor {
   constructor() {
-    this.supabaseService = new SupabaseService();
     this.aiService = new AIService();
-    this.followUpService = new FollowUpService();
+    this.supabaseService = new SupabaseService(this.aiService);
+    this.followUpService = new FollowUpService(this.aiService);
     this.lastThreadId = null;
     this.consoleEntries = [];
     this.responseHistoryByThread = {};
+    this.draftShownForThreadId = null; // Generating again for this thread asks for a new draft
     this.kbStatusEl = null;
     this.followUpConversations = []; // Store loaded follow-up conversations
     this.selectedFollowUpThreadId = null; // Track selected profile for copy button
@@ -302,14 +303,19 @@ class DOMExtractor {
         );
       }
 
+      // The server keeps each thread's draft; clicking Generate again while that
+      // draft is on screen means the user wants a different one
+      const regenerate = this.draftShownForThreadId === threadId;
       this.addConsoleLog("AI", "Requesting /generate", {
         phase: convo.phase,
         messageCount: convo.messages.length,
         confirm_phase_change: convo.confirm_phase_change,
+        regenerate,
       });
       let aiResult = await this.aiService.generateResponse(
         convo,
-        convo.prospectName || convo.title || ""
+        convo.prospectName || convo.title || "",
+        { regenerate }
       );
 
       // Handle approval required
@@ -334,7 +340,8 @@ class DOMExtractor {
           convoUpdated.confirm_phase_change = true;
           aiResult = await this.aiService.generateResponse(
             convoUpdated,
-            convoUpdated.prospectName || convoUpdated.title || ""
+            convoUpdated.prospectName || convoUpdated.title || "",
+            { regenerate }
           );
         } else {
           await this.updatePhaseInSupabase(
@@ -348,7 +355,8 @@ class DOMExtractor {
           convoUpdated.confirm_phase_change = false;
           aiResult = await this.aiService.generateResponse(
             convoUpdated,
-            convoUpdated.prospectName || convoUpdated.title || ""
+            convoUpdated.prospectName || convoUpdated.title || "",
+            { regenerate }
           );
         }
       }
@@ -390,6 +398,7 @@ class DOMExtractor {
       // Show suggested response in the top bar and add to history
       this.setStatus("Suggested", aiResult.response);
       this.addToHistory(threadId, aiResult.response);
+      this.draftShownForThreadId = threadId;
 
       // Update phase display
       this.updatePhaseDisplay(aiResult.phase);
@@ -3066,6 +3075,7 @@ class DOMExtractor {
       // Show suggested response in the top bar (same as manual generation)
       this.setStatus("Suggested", aiResult.response);
       this.addToHistory(threadId, aiResult.response);
+      this.draftShownForThreadId = threadId;
 
       // Update phase display
       this.updatePhaseDisplay(aiResult.phase);
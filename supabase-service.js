@@ -1,8 +1,58 @@
 // Supabase Service for LinkedIn Sales Agent
 class SupabaseService {
-  constructor() {
+  constructor(aiService = null) {
     this.config = window.supabaseConfig;
     this.baseUrl = `${this.config.url}/rest/v1`;
+    // Optional AIService: saves go through /conversations/sync (deltas only) when reachable
+    this.aiService = aiService;
+  }
+
+  /**
+   * Save through the AI backend's incremental sync. Returns the thread id, or
+   * null when the backend is unavailable so the caller falls back to the
+   * full read-merge-PATCH path.
+   */
+  async _syncViaBackend(conversationData) {
+    if (!this.aiService || !this.aiService.baseUrl) {
+      return null;
+    }
+    try {
+      const messages = (conversationData.messages || [])
+        .slice()
+        .sort(
+          (a, b) =>
+            (a.index ?? a.localIndex ?? 0) - (b.index ?? b.localIndex ?? 0)
+        );
+      const payload = {
+        thread_id: conversationData.threadId,
+        messages,
+        // Same rule as the PATCH path: placeholders always come from this extraction
+        placeholders: conversationData.placeholders || {},
+      };
+      ["url", "description", "status", "phase"].forEach((key) => {
+        if (conversationData[key] !== undefined) {
+          payload[key] = conversationData[key];
+        }
+      });
+      if (conversationData.title) {
+        payload.title = conversationData.title;
+      }
+
+      const result = await this.aiService.syncConversation(payload);
+      if (window.uiConsoleLog)
+        window.uiConsoleLog("DB", "synced via backend", {
+          threadId: conversationData.threadId,
+          action: result.action,
+          appended: result.appended,
+          messageCount: result.message_count,
+        });
+      if (typeof window.showDbToast === "function")
+        window.showDbToast("Database updated");
+      return conversationData.threadId;
+    } catch (error) {
+      console.warn("SupabaseService: backend sync unavailable, falling back", error);
+      return null;
+    }
   }
 
   async testConnection() {
@@ -72,6 +122,14 @@ class SupabaseService {
       );
       console.log("Supabase baseUrl:", this.baseUrl);
 
+      // Incremental sync first; forceReplace still rewrites the full array below
+      if (!conversationData.forceReplace) {
+        const syncedThreadId = await this._syncViaBackend(conversationData);
+        if (syncedThreadId) {
+          return syncedThreadId;
+        }
+      }
+
       // Build payload for insert/update, EXACT schema per requirement
       const normalizeMessage = (m) => ({
         index: